@@ -0,0 +1 @@
+"""Load-test benchmarks; see `benchmarks.run_benchmarks`."""
@@ -0,0 +1,413 @@
+"""
+Local mock of an OpenAI-compatible chat completions endpoint.
+
+Serves `POST /v1/chat/completions` (with `n`, `logprobs`/`top_logprobs` and
+`stream`) and `GET /v1/models` over plain HTTP/1.1 with keep-alive, using only
+the standard library. Responses follow a configurable latency distribution,
+requests beyond the configured rate or concurrency get a 429 with
+Retry-After, and 429/5xx errors can be injected at random. Answers are drawn
+from a weighted mix of the answer options, plus an optional share of
+unparseable replies that exercise the follow-up path.
+
+Point a simulation at it through the Nebius base URL::
+
+    python -m benchmarks.mock_server --port 8089 --latency-median 0.3
+    NEBIUS_API_URL=http://127.0.0.1:8089/v1/ SYNTHCAST_NEBIUS_APIK=mock python demo/run_simulation.py
+
+or start it in-process with `MockOpenAIServer(settings).start()`.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from synthcast.simulation.answers import ANSWER_OPTIONS
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+UNPARSEABLE_REPLY = "It is hard to say; it depends on many things."
+REASONING_REPLY = "Recent developments point that way."
+
+_REASONS = {200: "OK", 404: "Not Found", 405: "Method Not Allowed", 429: "Too Many Requests", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+@dataclass(frozen=True)
+class MockSettings:
+    """Behaviour of the mock endpoint.
+
+    Attributes:
+        latency: One of LATENCY_DISTRIBUTIONS.
+        latency_median: Median time to the (first token of the) response, seconds.
+        latency_spread: Lognormal sigma; for "uniform", the half-width as a
+            fraction of the median. Ignored by "fixed" and "exponential".
+        token_interval: Delay between streamed chunks, seconds.
+        requests_per_second: Admission rate; requests beyond it get a 429.
+            None for unlimited.
+        max_in_flight: Concurrent requests beyond this get a 429. None for
+            unlimited.
+        error_rate_429: Share of admitted requests answered with a random 429.
+        error_rate_5xx: Share of admitted requests failing with a 500/503
+            after their latency.
+        retry_after: Retry-After sent with 429s, seconds.
+        answer_mix: Relative weight of each answer option.
+        unparseable_rate: Share of answers that match no option.
+        seed: Seed for latencies, errors and answers.
+    """
+
+    latency: str = "lognormal"
+    latency_median: float = 0.25
+    latency_spread: float = 0.5
+    token_interval: float = 0.01
+    requests_per_second: Optional[float] = None
+    max_in_flight: Optional[int] = None
+    error_rate_429: float = 0.0
+    error_rate_5xx: float = 0.0
+    retry_after: float = 1.0
+    answer_mix: Dict[str, float] = field(default_factory=lambda: {"very likely": 0.15, "likely": 0.35, "unlikely": 0.35, "highly unlikely": 0.15})
+    unparseable_rate: float = 0.0
+    seed: Optional[int] = None
+
+    def __post_init__(self):
+        if self.latency not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution {self.latency!r}; expected one of {LATENCY_DISTRIBUTIONS}")
+
+
+@dataclass
+class MockStats:
+    """Requests seen by the mock, by outcome."""
+
+    requests: int = 0
+    completed: int = 0
+    rate_limited: int = 0
+    injected_429: int = 0
+    injected_5xx: int = 0
+    streamed: int = 0
+    peak_in_flight: int = 0
+
+
+class MockOpenAIServer:
+    """OpenAI-compatible mock server running on a background event loop.
+
+    Args:
+        settings: Endpoint behaviour
+        host: Interface to bind
+        port: Port to bind; 0 picks a free one
+
+    Use as a context manager, or call `start`/`stop`. `url` is the base URL
+    to hand to a client (it ends in `/v1/`).
+    """
+
+    def __init__(self, settings: Optional[MockSettings] = None, host: str = "127.0.0.1", port: int = 0):
+        self.settings = settings or MockSettings()
+        self.host = host
+        self.port = port
+        self.stats = MockStats()
+        self._rng = random.Random(self.settings.seed)
+        self._options = [o for o in ANSWER_OPTIONS if self.settings.answer_mix.get(o, 0) > 0]
+        self._weights = [self.settings.answer_mix[o] for o in self._options]
+        self._in_flight = 0
+        self._allowance = self.settings.requests_per_second
+        self._refilled = time.monotonic()
+        # System prompts seen recently, to report them as cached prompt tokens
+        self._seen_prefixes: Dict[str, None] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1/"
+
+    def start(self) -> "MockOpenAIServer":
+        ready = threading.Event()
+
+        def _serve():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port, backlog=4096)
+            )
+            self.port = self._server.sockets[0].getsockname()[1]
+            ready.set()
+            self._loop.run_forever()
+            self._server.close()
+            # Cancel handlers of connections the client left open, and let
+            # them close their transports before the loop goes away
+            pending = asyncio.all_tasks(self._loop)
+            for task in pending:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._loop.run_until_complete(self._server.wait_closed())
+            self._loop.run_until_complete(asyncio.sleep(0))
+            self._loop.close()
+
+        self._thread = threading.Thread(target=_serve, name="mock-openai", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self) -> None:
+        if self._loop is not None and self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> "MockOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    # ------------------------------------------------------------------
+    # Behaviour
+
+    def _latency(self) -> float:
+        s = self.settings
+        if s.latency == "fixed":
+            return s.latency_median
+        if s.latency == "uniform":
+            return max(0.0, self._rng.uniform(s.latency_median * (1 - s.latency_spread), s.latency_median * (1 + s.latency_spread)))
+        if s.latency == "exponential":
+            return self._rng.expovariate(math.log(2) / s.latency_median) if s.latency_median > 0 else 0.0
+        return s.latency_median * math.exp(self._rng.gauss(0.0, s.latency_spread))
+
+    def _admit(self) -> bool:
+        """Rate and concurrency admission; False means answer 429 now."""
+        s = self.settings
+        if s.max_in_flight is not None and self._in_flight >= s.max_in_flight:
+            return False
+        if s.requests_per_second is not None:
+            now = time.monotonic()
+            self._allowance = min(s.requests_per_second, self._allowance + (now - self._refilled) * s.requests_per_second)
+            self._refilled = now
+            if self._allowance < 1:
+                return False
+            self._allowance -= 1
+        return True
+
+    def _answer(self, reasoning: bool) -> str:
+        if self._rng.random() < self.settings.unparseable_rate:
+            return UNPARSEABLE_REPLY
+        answer = self._rng.choices(self._options, self._weights)[0]
+        return f"ANSWER: {answer}\nREASONING: {REASONING_REPLY}" if reasoning else answer
+
+    def _logprobs(self, answer: str, top: int) -> Dict:
+        total = sum(self._weights)
+        alternatives = [{"token": o, "logprob": math.log(w / total)} for o, w in zip(self._options, self._weights)]
+        chosen = next((a["logprob"] for a in alternatives if a["token"] == answer), -20.0)
+        return {"content": [{"token": answer, "logprob": chosen, "top_logprobs": alternatives[:max(top, 1)]}]}
+
+    def _usage(self, messages: List[Dict], completion_tokens: int) -> Dict:
+        prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4 + 1
+        cached = 0
+        if messages and messages[0].get("role") == "system":
+            system = messages[0].get("content") or ""
+            digest = hashlib.sha1(system.encode("utf-8")).hexdigest()
+            if digest in self._seen_prefixes:
+                cached = len(system) // 4
+            else:
+                self._seen_prefixes[digest] = None
+                if len(self._seen_prefixes) > 4096:
+                    self._seen_prefixes.pop(next(iter(self._seen_prefixes)))
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached},
+        }
+
+    # ------------------------------------------------------------------
+    # HTTP
+
+    @staticmethod
+    def _head(status: int, headers: Dict[str, str]) -> bytes:
+        lines = [f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}"]
+        lines += [f"{k}: {v}" for k, v in headers.items()]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    def _json(self, writer, status: int, payload: Dict, headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        head = {"Content-Type": "application/json", "Content-Length": str(len(body)), **(headers or {})}
+        writer.write(self._head(status, head) + body)
+
+    def _error(self, writer, status: int, message: str, headers: Optional[Dict[str, str]] = None) -> None:
+        self._json(writer, status, {"error": {"message": message, "type": "mock_error", "code": status}}, headers)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, target = line.decode("latin-1").split(" ", 2)[:2]
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length") or 0))
+                path = target.split("?", 1)[0].rstrip("/")
+                if path.endswith("/chat/completions"):
+                    if method != "POST":
+                        self._error(writer, 405, "Use POST")
+                    else:
+                        await self._chat(writer, json.loads(body or b"{}"))
+                elif path.endswith("/models"):
+                    self._json(writer, 200, {"object": "list", "data": [{"id": "mock", "object": "model", "owned_by": "synthcast"}]})
+                else:
+                    self._error(writer, 404, f"No route for {path}")
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _chat(self, writer, request: Dict) -> None:
+        s = self.settings
+        self.stats.requests += 1
+        retry_after = {"Retry-After": f"{s.retry_after:g}", "retry-after-ms": str(int(s.retry_after * 1000))}
+        if not self._admit():
+            self.stats.rate_limited += 1
+            self._error(writer, 429, "Rate limit exceeded", retry_after)
+            return
+        if self._rng.random() < s.error_rate_429:
+            self.stats.injected_429 += 1
+            self._error(writer, 429, "Injected rate limit", retry_after)
+            return
+        self._in_flight += 1
+        self.stats.peak_in_flight = max(self.stats.peak_in_flight, self._in_flight)
+        try:
+            await asyncio.sleep(self._latency())
+            if self._rng.random() < s.error_rate_5xx:
+                self.stats.injected_5xx += 1
+                self._error(writer, self._rng.choice((500, 503)), "Injected server error")
+                return
+            messages = request.get("messages") or []
+            reasoning = any("ANSWER:" in (m.get("content") or "") for m in messages)
+            if request.get("stream"):
+                self.stats.streamed += 1
+                await self._stream(writer, request, self._answer(reasoning), messages)
+            else:
+                self._json(writer, 200, self._completion(request, messages, reasoning))
+            self.stats.completed += 1
+        finally:
+            self._in_flight -= 1
+
+    def _completion(self, request: Dict, messages: List[Dict], reasoning: bool) -> Dict:
+        choices = []
+        completion_tokens = 0
+        for index in range(int(request.get("n") or 1)):
+            text = self._answer(reasoning)
+            completion_tokens += len(text) // 4 + 1
+            choice = {"index": index, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+            if request.get("logprobs"):
+                choice["logprobs"] = self._logprobs(text, int(request.get("top_logprobs") or 1))
+            choices.append(choice)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:16]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": choices,
+            "usage": self._usage(messages, completion_tokens),
+        }
+
+    async def _stream(self, writer, request: Dict, text: str, messages: List[Dict]) -> None:
+        """Send `text` as server-sent events, one word per chunk."""
+        writer.write(self._head(200, {"Content-Type": "text/event-stream", "Transfer-Encoding": "chunked"}))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:16]}"
+
+        def _event(delta: Dict, finish: Optional[str] = None, usage: Optional[Dict] = None) -> None:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}] if usage is None else [],
+            }
+            if usage is not None:
+                chunk["usage"] = usage
+            data = f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+            writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+
+        pieces = text.replace("\n", " \n").split(" ")
+        for i, piece in enumerate(pieces):
+            content = piece if i == 0 or piece.startswith("\n") else " " + piece
+            _event({"role": "assistant", "content": content} if i == 0 else {"content": content})
+            await writer.drain()
+            await asyncio.sleep(self.settings.token_interval)
+        _event({}, finish="stop")
+        if (request.get("stream_options") or {}).get("include_usage"):
+            _event({}, usage=self._usage(messages, len(text) // 4 + 1))
+        done = b"data: [DONE]\n\n"
+        writer.write(f"{len(done):x}\r\n".encode("latin-1") + done + b"\r\n0\r\n\r\n")
+
+
+def _parse_mix(text: str) -> Dict[str, float]:
+    """Parse "very likely=1,likely=3,unlikely=3,highly unlikely=1"."""
+    mix = {}
+    for item in text.split(","):
+        option, _, weight = item.partition("=")
+        option = option.strip().lower()
+        if option not in ANSWER_OPTIONS:
+            raise argparse.ArgumentTypeError(f"Unknown answer option {option!r}")
+        mix[option] = float(weight)
+    return mix
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--latency-median", type=float, default=0.25)
+    parser.add_argument("--latency-spread", type=float, default=0.5)
+    parser.add_argument("--token-interval", type=float, default=0.01)
+    parser.add_argument("--rps", type=float, default=None, help="admitted requests per second (excess gets 429)")
+    parser.add_argument("--max-in-flight", type=int, default=None)
+    parser.add_argument("--error-rate-429", type=float, default=0.0)
+    parser.add_argument("--error-rate-5xx", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--answer-mix", type=_parse_mix, default=None)
+    parser.add_argument("--unparseable-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+    settings = MockSettings(
+        latency=args.latency,
+        latency_median=args.latency_median,
+        latency_spread=args.latency_spread,
+        token_interval=args.token_interval,
+        requests_per_second=args.rps,
+        max_in_flight=args.max_in_flight,
+        error_rate_429=args.error_rate_429,
+        error_rate_5xx=args.error_rate_5xx,
+        retry_after=args.retry_after,
+        unparseable_rate=args.unparseable_rate,
+        seed=args.seed,
+        **({"answer_mix": args.answer_mix} if args.answer_mix else {}),
+    )
+    server = MockOpenAIServer(settings, args.host, args.port).start()
+    print(f"Mock OpenAI endpoint at {server.url} (Ctrl-C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(f"\n{server.stats}")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
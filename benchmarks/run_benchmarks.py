@@ -0,0 +1,390 @@
+"""
+Load-test benchmarks against a local mock OpenAI-compatible endpoint.
+
+Cases:
+
+    persona_generation[N]  sample a population of N personas and render them
+    ask_question[N]        end-to-end `Simulation.ask_question` for N agents
+                           against `benchmarks.mock_server` (no API spend)
+    save_results[N]        save N results as JSON and as compact files
+    aggregation[N]         build a ResponseFrame from N results, group and
+                           bootstrap it
+
+Every case runs in a fresh process so its peak memory (max RSS) is its own.
+Each reports throughput (items per second), p50/p99 latency (per request
+for ask_question, per repeat otherwise) and peak memory. Results are compared
+with `benchmarks/baselines.json`; a case regresses when its throughput drops,
+or its p99 or memory grows, by more than the tolerance. The ENG.md targets
+(50k personas in 2 hours, 50k agents in 30 minutes per period) are checked
+against the largest size run, extrapolated linearly.
+
+    python -m benchmarks.run_benchmarks                    # quick suite
+    python -m benchmarks.run_benchmarks --suite full       # up to 50k agents
+    python -m benchmarks.run_benchmarks --save-baseline    # record baselines
+    python -m benchmarks.run_benchmarks --case ask_question --sizes 5000 --latency-median 0.8
+
+Exits with status 1 when any case regresses against its baseline.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.mock_server import MockOpenAIServer, MockSettings
+
+BASELINES_PATH = Path(__file__).parent / "baselines.json"
+
+SUITES = {
+    "quick": {
+        "persona_generation": [1000, 10000],
+        "ask_question": [100, 1000],
+        "save_results": [10000],
+        "aggregation": [10000],
+    },
+    "full": {
+        "persona_generation": [1000, 10000, 50000],
+        "ask_question": [100, 1000, 10000, 50000],
+        "save_results": [10000, 50000],
+        "aggregation": [10000, 50000],
+    },
+}
+
+# ENG.md performance targets: case -> (items, seconds)
+TARGETS = {
+    "persona_generation": (50000, 2 * 3600),
+    "ask_question": (50000, 30 * 60),
+}
+
+# Mock endpoint used by the suites: moderate latency with a few injected
+# failures and unparseable answers, so retries and follow-ups are exercised
+SUITE_MOCK = MockSettings(latency_median=0.25, latency_spread=0.5, error_rate_429=0.005, error_rate_5xx=0.01, retry_after=0.5, unparseable_rate=0.03, seed=0)
+
+QUESTION = "Will your country face significant domestic protests against globalization by 2030?"
+COUNTRIES = ("USA", "DEU", "GBR", "FRA", "JPN")
+
+
+@dataclass
+class CaseResult:
+    """Measurements of one benchmark case.
+
+    Attributes:
+        name: Case and size, e.g. "ask_question[1000]".
+        items: Personas, agents or records processed per repeat.
+        seconds: Median wall time of a repeat.
+        throughput: Items per second at the median wall time.
+        p50: Median latency (per request for ask_question, per repeat otherwise).
+        p99: 99th percentile latency, same unit.
+        peak_mb: Peak resident memory of the case's process.
+    """
+
+    name: str
+    items: int
+    seconds: float
+    throughput: float
+    p50: Optional[float]
+    p99: Optional[float]
+    peak_mb: Optional[float]
+
+
+def _peak_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _quantile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    position = q * (len(values) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def _counts(size: int) -> Dict[str, int]:
+    """Split `size` agents over COUNTRIES."""
+    share, rest = divmod(size, len(COUNTRIES))
+    return {code: share + (i < rest) for i, code in enumerate(COUNTRIES)}
+
+
+def _population(size: int):
+    from synthcast.population.persona_generator import PersonaGenerator
+    return PersonaGenerator().generate_population(_counts(size), seed=0)
+
+
+def _results(population) -> Dict[str, List[Dict]]:
+    """Synthetic `ask_question` output for every persona of `population`."""
+    import numpy as np
+    from synthcast.simulation.answers import ANSWER_OPTIONS
+    rng = np.random.default_rng(0)
+    answers = rng.choice(len(ANSWER_OPTIONS), size=len(population), p=[0.15, 0.35, 0.35, 0.15])
+    results: Dict[str, List[Dict]] = {}
+    for code in population.counts():
+        for persona_id in population.indices_for(code):
+            persona_id = int(persona_id)
+            results.setdefault(code, []).append({
+                "persona": population.render(persona_id),
+                "response": ANSWER_OPTIONS[answers[persona_id]],
+                "raw_response": ANSWER_OPTIONS[answers[persona_id]],
+                "temperature": 0.7,
+                "persona_id": persona_id,
+            })
+    return results
+
+
+def _timed(work: Callable[[], None], repeats: int) -> List[float]:
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        work()
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def _repeat_result(name: str, items: int, times: List[float]) -> CaseResult:
+    seconds = statistics.median(times)
+    return CaseResult(name, items, seconds, items / seconds, _quantile(times, 0.5), _quantile(times, 0.99), _peak_mb())
+
+
+def bench_persona_generation(size: int, repeats: int) -> CaseResult:
+    from synthcast.population.persona_generator import PersonaGenerator
+    generator = PersonaGenerator()
+
+    def _work():
+        population = generator.generate_population(_counts(size), seed=0)
+        for i in range(len(population)):
+            population.render(i)
+
+    return _repeat_result(f"persona_generation[{size}]", size, _timed(_work, repeats))
+
+
+def bench_ask_question(size: int, repeats: int, max_concurrency: int = 64) -> CaseResult:
+    from synthcast.simulation.simulation import Simulation
+    population = _population(size)
+    simulation = Simulation(population=population, max_concurrency=max_concurrency)
+    times, histograms = [], []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        simulation.ask_question(QUESTION, save_results=False)
+        times.append(time.perf_counter() - started)
+        # Provider latency of each request; whole-call times are dominated by
+        # queueing when every agent is scheduled at once
+        histograms.append(simulation.last_metrics.histogram("request_seconds"))
+    requests = histograms[0]
+    for histogram in histograms[1:]:
+        requests.merge(histogram)
+    seconds = statistics.median(times)
+    return CaseResult(f"ask_question[{size}]", size, seconds, size / seconds, requests.quantile(0.5), requests.quantile(0.99), _peak_mb())
+
+
+def bench_save_results(size: int, repeats: int) -> CaseResult:
+    from synthcast.simulation.results import save_simulation_results
+    results = _results(_population(size))
+    directory = tempfile.mkdtemp(prefix="synthcast-bench-")
+
+    def _work():
+        for result_format in ("json", "compact"):
+            for code, records in results.items():
+                save_simulation_results(records, QUESTION, code, base_path=directory, result_format=result_format)
+
+    return _repeat_result(f"save_results[{size}]", size, _timed(_work, repeats))
+
+
+def bench_aggregation(size: int, repeats: int) -> CaseResult:
+    from synthcast.simulation.aggregation import ResponseFrame
+    population = _population(size)
+    results = _results(population)
+
+    def _work():
+        frame = ResponseFrame.from_results(results, population)
+        frame.group_by(("country", "age_cohort", "income"))
+        frame.bootstrap(("country",), n_boot=200)
+
+    return _repeat_result(f"aggregation[{size}]", size, _timed(_work, repeats))
+
+
+CASES = {
+    "persona_generation": bench_persona_generation,
+    "ask_question": bench_ask_question,
+    "save_results": bench_save_results,
+    "aggregation": bench_aggregation,
+}
+
+
+def _case_process(case: str, size: int, repeats: int, options: Dict, queue) -> None:
+    import logging
+    # Per-agent INFO logging would dominate the profile
+    logging.disable(logging.INFO)
+    try:
+        queue.put(asdict(CASES[case](size, repeats, **options)))
+    except BaseException as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+        raise
+
+
+def run_case(case: str, size: int, repeats: int, options: Optional[Dict] = None) -> CaseResult:
+    """Run one case in a fresh process and return its measurements."""
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_case_process, args=(case, size, repeats, options or {}, queue))
+    process.start()
+    outcome = queue.get()
+    process.join()
+    if "error" in outcome:
+        raise RuntimeError(f"{case}[{size}] failed: {outcome['error']}")
+    return CaseResult(**outcome)
+
+
+def environment() -> Dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results: List[CaseResult], baselines: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Regression messages for results that are worse than their baseline."""
+    regressions = []
+    for result in results:
+        baseline = baselines.get(result.name)
+        if baseline is None:
+            continue
+        if result.throughput < baseline["throughput"] * (1 - tolerance):
+            regressions.append(f"{result.name}: throughput {result.throughput:.1f}/s vs baseline {baseline['throughput']:.1f}/s")
+        for key in ("p99", "peak_mb"):
+            value = getattr(result, key)
+            if value is not None and baseline.get(key) and value > baseline[key] * (1 + tolerance):
+                regressions.append(f"{result.name}: {key} {value:.3f} vs baseline {baseline[key]:.3f}")
+    return regressions
+
+
+def target_checks(results: List[CaseResult]) -> List[str]:
+    """ENG.md targets, extrapolated from the largest size of each case."""
+    lines = []
+    for case, (items, budget) in TARGETS.items():
+        measured = [r for r in results if r.name.startswith(case + "[")]
+        if not measured:
+            continue
+        largest = max(measured, key=lambda r: r.items)
+        projected = items / largest.throughput
+        verdict = "meets" if projected <= budget else "MISSES"
+        lines.append(f"{case}: {items} in {projected / 60:.1f} min (from {largest.name}) {verdict} the {budget / 60:.0f} min target")
+    return lines
+
+
+def _format(value: Optional[float], digits: int = 3) -> str:
+    return "-" if value is None else f"{value:.{digits}f}"
+
+
+def report(results: List[CaseResult], baselines: Dict[str, Dict]) -> str:
+    header = f"{'case':<28}{'seconds':>10}{'items/s':>12}{'p50':>9}{'p99':>9}{'peak MB':>9}{'vs base':>9}"
+    lines = [header, "-" * len(header)]
+    for r in results:
+        baseline = baselines.get(r.name)
+        change = f"{r.throughput / baseline['throughput'] - 1:+.0%}" if baseline else "new"
+        lines.append(
+            f"{r.name:<28}{r.seconds:>10.2f}{r.throughput:>12.1f}{_format(r.p50):>9}{_format(r.p99):>9}{_format(r.peak_mb, 1):>9}{change:>9}"
+        )
+    return "\n".join(lines)
+
+
+def load_baselines(path: Path = BASELINES_PATH) -> Dict:
+    if not path.exists():
+        return {"environment": None, "results": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baselines(results: List[CaseResult], mock: MockSettings, path: Path = BASELINES_PATH) -> None:
+    """Merge `results` into the stored baselines (other cases are kept)."""
+    stored = load_baselines(path)
+    stored["environment"] = environment()
+    stored["recorded"] = datetime.now().isoformat(timespec="seconds")
+    stored["mock"] = asdict(mock)
+    for result in results:
+        entry = asdict(result)
+        del entry["name"]
+        stored["results"][result.name] = {k: round(v, 4) if isinstance(v, float) else v for k, v in entry.items()}
+    stored["results"] = dict(sorted(stored["results"].items()))
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(stored, f, indent=2)
+        f.write("\n")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="SynthCast load-test benchmarks")
+    parser.add_argument("--suite", choices=sorted(SUITES), default="quick")
+    parser.add_argument("--case", action="append", choices=sorted(CASES), help="run only these cases (repeatable)")
+    parser.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], help="override sizes, e.g. 100,1000")
+    parser.add_argument("--repeats", type=int, default=3, help="repeats per case (ask_question runs once)")
+    parser.add_argument("--max-concurrency", type=int, default=64)
+    parser.add_argument("--latency-median", type=float, default=SUITE_MOCK.latency_median)
+    parser.add_argument("--error-rate-5xx", type=float, default=SUITE_MOCK.error_rate_5xx)
+    parser.add_argument("--rps", type=float, default=None, help="mock admission rate (excess gets 429)")
+    parser.add_argument("--baselines", type=Path, default=BASELINES_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baselines")
+    parser.add_argument("--tolerance", type=float, default=0.35, help="allowed relative regression (small cases are noisy)")
+    parser.add_argument("--output", type=Path, help="also write the results as JSON here")
+    args = parser.parse_args(argv)
+
+    mock = MockSettings(**{
+        **asdict(SUITE_MOCK),
+        "latency_median": args.latency_median,
+        "error_rate_5xx": args.error_rate_5xx,
+        "requests_per_second": args.rps,
+    })
+    plan = {case: args.sizes or sizes for case, sizes in SUITES[args.suite].items() if not args.case or case in args.case}
+
+    server = MockOpenAIServer(mock).start()
+    # Inherited by the case processes; NebiusAgent reads both at construction
+    os.environ["NEBIUS_API_URL"] = server.url
+    os.environ["SYNTHCAST_NEBIUS_APIK"] = "mock"
+    results: List[CaseResult] = []
+    try:
+        for case, sizes in plan.items():
+            for size in sizes:
+                options = {"max_concurrency": args.max_concurrency} if case == "ask_question" else {}
+                repeats = 1 if case == "ask_question" else args.repeats
+                print(f"running {case}[{size}] ...", flush=True)
+                results.append(run_case(case, size, repeats, options))
+    finally:
+        server.stop()
+
+    baselines = load_baselines(args.baselines)
+    print()
+    print(report(results, baselines["results"]))
+    print(f"\nmock endpoint: {server.stats}")
+    for line in target_checks(results):
+        print(line)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"environment": environment(), "results": [asdict(r) for r in results]}, f, indent=2)
+    if args.save_baseline:
+        save_baselines(results, mock, args.baselines)
+        print(f"\nBaselines saved to {args.baselines}")
+        return 0
+    if baselines.get("environment") and baselines["environment"] != environment():
+        print(f"\nNote: baselines were recorded on {baselines['environment']['platform']} ({baselines['environment']['cpus']} CPUs)")
+    regressions = compare(results, baselines["results"], args.tolerance)
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,11 +2,12 @@
 PersonaGenerator: A module for generating diverse synthetic personas based on demographic data
 """
 
-import json
 import random
-from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass, field
+from synthcast.population.population import Population
+from synthcast.population.reference import get_reference_data
+from synthcast.population.sampler import BulkPersonaSampler, PersonaBatch, Vocabulary, render_persona_prompt
 
 @dataclass
 class OccupationCategories:
@@ -68,6 +69,10 @@ class PersonaTraits:
             "supporting family", "growing business opportunities"
         ]
 
+def default_vocabulary() -> Vocabulary:
+    """Vocabulary built from the default occupation and trait lists."""
+    return Vocabulary.from_generator_lists(OccupationCategories(), PersonaTraits())
+
 class PersonaGenerator:
     """
     Generate synthetic personas based on demographic data.
@@ -77,25 +82,24 @@ class PersonaGenerator:
     reflect the actual distribution of population characteristics.
     """
 
-    def __init__(self, population_data_path: Optional[str] = None):
+    def __init__(self, population_data_path: Optional[str] = None, disk_cache: bool = False):
         """
         Initialize the PersonaGenerator with population data.
         
         Args:
             population_data_path: Path to the JSON file containing population data.
                                 If None, uses the default data file.
-        """
-        if population_data_path is None:
-            population_data_path = str(Path(__file__).parent.parent / 'data'/"reference"/ 'population.json')
+            disk_cache: Use the pickled reference-data cache next to the data file.
         
-        self.population_data = self._load_population_data(population_data_path)
+        The file is parsed once per process and shared through
+        `synthcast.population.reference.get_reference_data`.
+        """
+        self.reference = get_reference_data(population_data_path, disk_cache=disk_cache)
+        self.population_data = self.reference.countries
         self.occupations = OccupationCategories()
         self.traits = PersonaTraits()
-
-    def _load_population_data(self, file_path: str) -> Dict:
-        """Load and parse the population data JSON file."""
-        with open(file_path, 'r') as f:
-            return json.load(f)
+        self.vocabulary = Vocabulary.from_generator_lists(self.occupations, self.traits)
+        self._samplers: Dict[Optional[int], BulkPersonaSampler] = {}
 
     def _get_random_age(self, age_distribution: Dict) -> int:
         """Generate a random age based on the country's age distribution."""
@@ -185,39 +189,60 @@ class PersonaGenerator:
         financial_attitude = random.choice(self.traits.financial_attitudes)
         economic_concern = random.choice(self.traits.economic_concerns)
         
-        # Pronouns
-        pronoun = "he" if gender == "male" else "she"
-        possessive = "his" if gender == "male" else "her"
-        
-        # Build the prompt
-        prompt = (
-            f"You are a {age}-year-old {gender} working as a {occupation} in {city}, {country_data['iso_code']}. "
-            f"Living in a {country_data['political_regime']}, with a {income_level} economic background, "
-            f"{pronoun} has a {personality} outlook on economic policies. {financial_attitude}, and {economic_concern}. "
-            f"Working in the {occupation} field shapes {possessive} perspective on labor markets and tax policies. "
-            f"The local currency ({country_data['currency']}) has a strength of {country_data['currency_strength_vs_usd']:.2f} vs USD, "
-            f"and you face a top income tax rate of {country_data['tax_levels']['personal_income_tax_top_rate']}%. "
-            f"Make decisions considering your economic circumstances, personal background, and the broader economic environment."
+        return render_persona_prompt(
+            age=age,
+            gender=gender,
+            occupation=occupation,
+            city=city,
+            income_level=income_level,
+            personality=personality,
+            financial_attitude=financial_attitude,
+            economic_concern=economic_concern,
+            country_data=country_data,
         )
-        
-        return prompt
+
+    def _find_country(self, country_code: str) -> Dict:
+        """Look up a country by its key in the data file, its name or its ISO code."""
+        return self.reference.country(country_code)
 
     def generate_country_personas(self, country_code: str, num_personas: int = 100) -> List[str]:
         """Generate multiple personas for a specific country identified by its ISO code."""
-        # Flexible lookup: allow direct key (if data is keyed by ISO), or match iso_code field
-        # Normalize code for comparison
-        if country_code in self.population_data:
-            country_data = self.population_data[country_code]
-        else:
-            # try to find by matching the iso_code field inside the values
-            matched = None
-            for name, data in self.population_data.items():
-                iso = data.get('iso_code') if isinstance(data, dict) else None
-                if iso and str(iso).upper() == str(country_code).upper():
-                    matched = data
-                    break
-            if matched is None:
-                raise KeyError(f"Country with ISO code '{country_code}' not found in population data")
-            country_data = matched
-
-        return [self.generate_persona(country_data) for _ in range(num_personas)]
\ No newline at end of file
+        country_data = self._find_country(country_code)
+        return [self.generate_persona(country_data) for _ in range(num_personas)]
+
+    def generate_country_personas_bulk(self, country_code: str, num_personas: int = 100, seed: Optional[int] = None) -> PersonaBatch:
+        """
+        Sample personas for a country in one vectorized pass.
+
+        Args:
+            country_code: ISO code (or data file key) of the country
+            num_personas: Number of personas to draw
+            seed: Run seed; persona i depends only on (seed, country, i)
+
+        Returns:
+            PersonaBatch: Columnar attribute codes; call `render(i)` or
+                `render_all()` for prompt text
+        """
+        country_data = self._find_country(country_code)
+        sampler = self._samplers.get(seed)
+        if sampler is None:
+            sampler = BulkPersonaSampler(self.vocabulary, seed=seed, reference=self.reference)
+            self._samplers[seed] = sampler
+        return sampler.sample(country_data, num_personas)
+
+    def generate_population(self, country_agent_counts: Dict[str, int], seed: Optional[int] = None) -> Population:
+        """
+        Sample a columnar population for several countries.
+
+        Args:
+            country_agent_counts: Number of personas per country ISO code
+            seed: Run seed; persona i of a country depends only on (seed, country, i)
+
+        Returns:
+            Population: Integer-coded personas that can be saved as a snapshot
+        """
+        batches = [
+            self.generate_country_personas_bulk(country_code, count, seed=seed)
+            for country_code, count in country_agent_counts.items()
+        ]
+        return Population.from_batches(batches, seed=seed)
@@ -0,0 +1,247 @@
+"""
+Compact columnar population store.
+
+A `Population` keeps every persona as one fixed-width record of integer codes
+(11 bytes) plus a small side table of vocabularies, instead of a ~700-byte
+prompt string per agent. Prompts are rendered lazily by index.
+
+Snapshots are a single file: a JSON header (vocabularies, dtype, row count,
+snapshot id) followed by the raw record array, page-aligned so `load` can
+memory-map it. A 1M-agent population is ~11 MB on disk and loads in
+milliseconds regardless of size.
+"""
+
+import hashlib
+import json
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from synthcast.population.sampler import PersonaBatch, Vocabulary, render_persona_prompt
+
+RECORD_DTYPE = np.dtype([
+    ("country", "<u2"),
+    ("gender", "u1"),
+    ("age", "u1"),
+    ("occupation", "<u2"),
+    ("income", "u1"),
+    ("city", "u1"),
+    ("personality", "u1"),
+    ("financial_attitude", "u1"),
+    ("economic_concern", "u1"),
+])
+
+SNAPSHOT_MAGIC = b"SYNTHPOP1\n"
+_ALIGNMENT = 4096
+
+# Country fields needed to render a prompt; the rest of the reference data
+# is not copied into snapshots
+_COUNTRY_FIELDS = ("iso_code", "political_regime", "currency", "currency_strength_vs_usd", "tax_levels")
+
+
+class Population:
+    """Integer-coded persona records with their vocabularies.
+
+    Args:
+        records: Structured array with RECORD_DTYPE (may be a read-only memmap).
+        vocab: Occupation and trait vocabularies.
+        countries: Per-country vocabularies, indexed by the `country` column.
+            Each entry holds `data` (fields used for rendering), `income_levels`
+            and `cities`.
+        seed: Seed the population was sampled with, if any.
+        snapshot_id: Content hash of the saved snapshot, if loaded or saved.
+    """
+
+    def __init__(self, records: np.ndarray, vocab: Vocabulary, countries: List[Dict], seed: Optional[int] = None, snapshot_id: Optional[str] = None):
+        self.records = records
+        self.vocab = vocab
+        self.countries = countries
+        self.seed = seed
+        self.snapshot_id = snapshot_id
+        self._country_index = {c["data"]["iso_code"]: i for i, c in enumerate(countries)}
+
+    @classmethod
+    def from_batches(cls, batches: Sequence[PersonaBatch], seed: Optional[int] = None) -> "Population":
+        """Concatenate per-country `PersonaBatch`es into one population."""
+        if not batches:
+            raise ValueError("At least one persona batch is required")
+        vocab = batches[0].vocab
+        countries: List[Dict] = []
+        index: Dict[str, int] = {}
+        records = np.empty(sum(len(b) for b in batches), dtype=RECORD_DTYPE)
+        offset = 0
+        for batch in batches:
+            iso = batch.country_code
+            if iso not in index:
+                index[iso] = len(countries)
+                countries.append({
+                    "data": {k: batch.tables.country_data[k] for k in _COUNTRY_FIELDS},
+                    "income_levels": list(batch.tables.income_levels),
+                    "cities": list(batch.tables.cities),
+                })
+            rows = records[offset:offset + len(batch)]
+            rows["country"] = index[iso]
+            for column in RECORD_DTYPE.names[1:]:
+                rows[column] = getattr(batch, column)
+            offset += len(batch)
+        return cls(records, vocab, countries, seed=seed)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def country_codes(self) -> List[str]:
+        return [c["data"]["iso_code"] for c in self.countries]
+
+    def country_code(self, i: int) -> str:
+        return self.countries[self.records["country"][i]]["data"]["iso_code"]
+
+    def indices_for(self, country_code: str) -> np.ndarray:
+        """Row indices (persona IDs) belonging to a country."""
+        code = self._country_index.get(country_code)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(self.records["country"] == code)
+
+    def counts(self) -> Dict[str, int]:
+        """Number of personas per country."""
+        counts = np.bincount(self.records["country"], minlength=len(self.countries))
+        return {code: int(n) for code, n in zip(self.country_codes, counts)}
+
+    def attributes(self, i: int) -> Dict:
+        """Decoded attributes for persona `i`."""
+        row = self.records[i]
+        country = self.countries[row["country"]]
+        vocab = self.vocab
+        return {
+            "country_code": country["data"]["iso_code"],
+            "gender": vocab.genders[row["gender"]],
+            "age": int(row["age"]),
+            "occupation": vocab.occupations[row["occupation"]],
+            "income_level": country["income_levels"][row["income"]],
+            "city": country["cities"][row["city"]],
+            "personality": vocab.personalities[row["personality"]],
+            "financial_attitude": vocab.financial_attitudes[row["financial_attitude"]],
+            "economic_concern": vocab.economic_concerns[row["economic_concern"]],
+        }
+
+    def render(self, i: int, age_offset: int = 0) -> str:
+        """Render the persona prompt for persona `i`, `age_offset` years older."""
+        attrs = self.attributes(i)
+        country_data = self.countries[self.records["country"][i]]["data"]
+        attrs.pop("country_code")
+        attrs["age"] += age_offset
+        return render_persona_prompt(country_data=country_data, **attrs)
+
+    def iter_prompts(self, indices: Optional[Sequence[int]] = None) -> Iterator[str]:
+        for i in (range(len(self)) if indices is None else indices):
+            yield self.render(int(i))
+
+    def _header(self) -> Dict:
+        vocab = self.vocab
+        return {
+            "dtype": RECORD_DTYPE.descr,
+            "count": len(self),
+            "seed": self.seed,
+            "vocab": {
+                "occupations": vocab.occupations,
+                "industry_slices": {k: list(v) for k, v in vocab.industry_slices.items()},
+                "personalities": vocab.personalities,
+                "financial_attitudes": vocab.financial_attitudes,
+                "economic_concerns": vocab.economic_concerns,
+                "genders": list(vocab.genders),
+            },
+            "countries": self.countries,
+        }
+
+    def _snapshot_id(self, header: Dict, records: np.ndarray) -> str:
+        digest = hashlib.sha256(json.dumps(header, sort_keys=True).encode("utf-8"))
+        digest.update(records.tobytes())
+        return digest.hexdigest()[:16]
+
+    def save(self, path: str) -> str:
+        """
+        Write a memory-mappable snapshot.
+
+        Args:
+            path: Destination file (conventionally `*.synthpop`)
+
+        Returns:
+            str: The snapshot id (SHA-256 of header and records)
+        """
+        header = self._header()
+        records = np.ascontiguousarray(self.records, dtype=RECORD_DTYPE)
+        header["snapshot_id"] = self._snapshot_id(header, records)
+        header_bytes = json.dumps(header).encode("utf-8")
+        prefix = len(SNAPSHOT_MAGIC) + 8 + len(header_bytes)
+        padding = (-prefix) % _ALIGNMENT
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(struct.pack("<Q", len(header_bytes)))
+            f.write(header_bytes)
+            f.write(b"\0" * padding)
+            f.write(records.tobytes())
+        self.snapshot_id = header["snapshot_id"]
+        return self.snapshot_id
+
+    def save_to_directory(self, directory: str) -> str:
+        """
+        Save the snapshot as `<directory>/<snapshot_id>.synthpop` unless it exists.
+
+        Result files reference personas by row index into a snapshot, so runs
+        over the same population share one file.
+
+        Returns:
+            str: Path of the snapshot file
+        """
+        if self.snapshot_id is None:
+            self.snapshot_id = self._snapshot_id(self._header(), np.ascontiguousarray(self.records, dtype=RECORD_DTYPE))
+        path = Path(directory) / f"{self.snapshot_id}.synthpop"
+        if not path.exists():
+            # Write under a temporary name so concurrent runs never see a partial file
+            tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+            self.save(str(tmp_path))
+            os.replace(tmp_path, path)
+        return str(path)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "Population":
+        """
+        Load a snapshot written by `save`.
+
+        Args:
+            path: Snapshot file
+            mmap: Memory-map the records read-only instead of reading them
+
+        Returns:
+            Population: The loaded population
+        """
+        with open(path, "rb") as f:
+            if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                raise ValueError(f"{path} is not a population snapshot")
+            (header_len,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_len).decode("utf-8"))
+        prefix = len(SNAPSHOT_MAGIC) + 8 + header_len
+        offset = prefix + (-prefix) % _ALIGNMENT
+        dtype = np.dtype([tuple(field) for field in header["dtype"]])
+        count = header["count"]
+        if mmap and count:
+            records = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+        else:
+            records = np.fromfile(path, dtype=dtype, count=count, offset=offset)
+
+        v = header["vocab"]
+        vocab = Vocabulary(
+            occupations=v["occupations"],
+            industry_slices={k: tuple(s) for k, s in v["industry_slices"].items()},
+            personalities=v["personalities"],
+            financial_attitudes=v["financial_attitudes"],
+            economic_concerns=v["economic_concerns"],
+            genders=tuple(v["genders"]),
+        )
+        return cls(records, vocab, header["countries"], seed=header.get("seed"), snapshot_id=header.get("snapshot_id"))
@@ -0,0 +1,188 @@
+"""
+Process-wide registry of country reference data.
+
+`population.json` is parsed and validated once per process (per path) and
+indexed by ISO code, country name and geopolitical bloc. Compiled sampling
+tables are cached alongside, so every `PersonaGenerator` and sampler in the
+process shares them. An optional pickled cache next to the source file skips
+parsing entirely on later runs; it is invalidated whenever the source file's
+size or modification time changes.
+"""
+
+import json
+import pickle
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_REFERENCE_PATH = str(Path(__file__).parent.parent / 'data' / 'reference' / 'population.json')
+
+REQUIRED_FIELDS = (
+    "iso_code",
+    "political_regime",
+    "currency",
+    "currency_strength_vs_usd",
+    "gender_distribution",
+    "age_distribution",
+    "income_distribution",
+    "industry_of_work",
+    "tax_levels",
+    "top_cities",
+)
+
+_PICKLE_VERSION = 1
+
+
+def validate_country(name: str, data: Dict) -> None:
+    """Raise ValueError if a country entry is missing fields persona sampling needs."""
+    if not isinstance(data, dict):
+        raise ValueError(f"Reference entry '{name}' is not an object")
+    missing = [f for f in REQUIRED_FIELDS if f not in data]
+    if missing:
+        raise ValueError(f"Reference entry '{name}' is missing fields: {', '.join(missing)}")
+    for field in ("gender_distribution", "age_distribution", "income_distribution", "industry_of_work"):
+        if not data[field] or sum(float(v) for v in data[field].values()) <= 0:
+            raise ValueError(f"Reference entry '{name}' has an empty or zero-weight {field}")
+    if "personal_income_tax_top_rate" not in data["tax_levels"]:
+        raise ValueError(f"Reference entry '{name}' has no tax_levels.personal_income_tax_top_rate")
+
+
+class ReferenceData:
+    """Validated, indexed country reference data.
+
+    Attributes:
+        countries: Raw entries keyed by country name, in file order.
+        by_iso: Country name for each upper-case ISO code.
+        by_bloc: ISO codes for each geopolitical bloc.
+    """
+
+    def __init__(self, countries: Dict[str, Dict]):
+        for name, data in countries.items():
+            validate_country(name, data)
+        self.countries = countries
+        self.by_iso: Dict[str, str] = {}
+        self.by_bloc: Dict[str, List[str]] = {}
+        self._by_name_lower = {name.lower(): name for name in countries}
+        for name, data in countries.items():
+            iso = str(data["iso_code"]).upper()
+            self.by_iso[iso] = name
+            for bloc in data.get("geopolitical_bloc", []):
+                self.by_bloc.setdefault(bloc, []).append(iso)
+        self._tables: Dict[Tuple[str, Tuple], object] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def iso_codes(self) -> List[str]:
+        return list(self.by_iso)
+
+    def country(self, code_or_name: str) -> Dict:
+        """Look up a country by ISO code or name (case-insensitive)."""
+        key = str(code_or_name)
+        if key in self.countries:
+            return self.countries[key]
+        name = self.by_iso.get(key.upper()) or self._by_name_lower.get(key.lower())
+        if name is None:
+            raise KeyError(f"Country with ISO code '{code_or_name}' not found in population data")
+        return self.countries[name]
+
+    def bloc(self, bloc: str) -> List[str]:
+        """ISO codes of the countries in a geopolitical bloc."""
+        return list(self.by_bloc.get(bloc, []))
+
+    def sampling_tables(self, code_or_name: str, vocab):
+        """Compiled `CountrySamplingTables` for a country, built once per vocabulary."""
+        from synthcast.population.sampler import CountrySamplingTables
+        data = self.country(code_or_name)
+        key = (str(data["iso_code"]).upper(), vocab.key)
+        tables = self._tables.get(key)
+        if tables is None:
+            with self._lock:
+                tables = self._tables.get(key)
+                if tables is None:
+                    tables = CountrySamplingTables.build(data, vocab)
+                    self._tables[key] = tables
+        return tables
+
+    def precompile(self, vocab) -> None:
+        """Build sampling tables for every country."""
+        for iso in self.by_iso:
+            self.sampling_tables(iso, vocab)
+
+
+_registry: Dict[str, ReferenceData] = {}
+_registry_lock = threading.Lock()
+
+
+def _pickle_path(path: Path) -> Path:
+    return path.with_name(f".{path.name}.cache.pkl")
+
+
+def _source_signature(path: Path) -> Tuple[int, int]:
+    stat = path.stat()
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def _load_pickled(path: Path) -> Optional[ReferenceData]:
+    cache_path = _pickle_path(path)
+    if not cache_path.exists():
+        return None
+    try:
+        with open(cache_path, "rb") as f:
+            version, signature, reference = pickle.load(f)
+    except Exception:
+        return None
+    if version != _PICKLE_VERSION or signature != _source_signature(path):
+        return None
+    return reference
+
+
+def _store_pickled(path: Path, reference: ReferenceData) -> None:
+    try:
+        with open(_pickle_path(path), "wb") as f:
+            pickle.dump((_PICKLE_VERSION, _source_signature(path), reference), f, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        # Read-only installs simply skip the on-disk cache
+        pass
+
+
+def get_reference_data(path: Optional[str] = None, disk_cache: bool = False) -> ReferenceData:
+    """
+    Return the shared `ReferenceData` for a reference file.
+
+    Args:
+        path: Path to the population JSON. Defaults to the bundled reference file
+        disk_cache: Load from / write to a pickled cache next to the source
+            file, with all sampling tables precompiled
+
+    Returns:
+        ReferenceData: The same instance for every call with the same path
+    """
+    resolved = Path(path or DEFAULT_REFERENCE_PATH).resolve()
+    key = str(resolved)
+    reference = _registry.get(key)
+    if reference is not None:
+        return reference
+    with _registry_lock:
+        reference = _registry.get(key)
+        if reference is not None:
+            return reference
+        if disk_cache:
+            reference = _load_pickled(resolved)
+        if reference is None:
+            with open(resolved, 'r') as f:
+                reference = ReferenceData(json.load(f))
+            if disk_cache:
+                from synthcast.population.persona_generator import default_vocabulary
+                reference.precompile(default_vocabulary())
+                _store_pickled(resolved, reference)
+        _registry[key] = reference
+        return reference
@@ -0,0 +1,309 @@
+"""
+Vectorized, seedable bulk persona sampling.
+
+`PersonaGenerator.generate_persona` re-normalizes every weight table and calls
+`random.choices` once per attribute per persona. The sampler here compiles each
+country's distributions into cumulative tables once, then draws every
+attribute for N personas in a single NumPy pass from a seeded `Generator`.
+
+Samples are returned as a columnar `PersonaBatch` of small integer codes; the
+prompt text is only rendered on demand and is byte-identical to what
+`PersonaGenerator.generate_persona` produces for the same attributes.
+"""
+
+import zlib
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+GENDERS = ["male", "female"]
+
+# Maps age_distribution keys onto the inclusive age range they represent
+AGE_BUCKETS: List[Tuple[Tuple[str, ...], Tuple[int, int]]] = [
+    (("0-14", "0-17"), (0, 17)),
+    (("15-64", "18-64"), (18, 64)),
+    (("65_plus",), (65, 90)),
+]
+
+# Industry keys of `industry_of_work`, in the order their occupations are
+# laid out in the flattened occupation vocabulary
+INDUSTRIES = ["agriculture", "industry", "manufacturing", "services"]
+
+
+def render_persona_prompt(
+    age: int,
+    gender: str,
+    occupation: str,
+    city: str,
+    income_level: str,
+    personality: str,
+    financial_attitude: str,
+    economic_concern: str,
+    country_data: Dict,
+) -> str:
+    """Render the persona system prompt for one set of attributes."""
+    # Pronouns
+    pronoun = "he" if gender == "male" else "she"
+    possessive = "his" if gender == "male" else "her"
+
+    return (
+        f"You are a {age}-year-old {gender} working as a {occupation} in {city}, {country_data['iso_code']}. "
+        f"Living in a {country_data['political_regime']}, with a {income_level} economic background, "
+        f"{pronoun} has a {personality} outlook on economic policies. {financial_attitude}, and {economic_concern}. "
+        f"Working in the {occupation} field shapes {possessive} perspective on labor markets and tax policies. "
+        f"The local currency ({country_data['currency']}) has a strength of {country_data['currency_strength_vs_usd']:.2f} vs USD, "
+        f"and you face a top income tax rate of {country_data['tax_levels']['personal_income_tax_top_rate']}%. "
+        f"Make decisions considering your economic circumstances, personal background, and the broader economic environment."
+    )
+
+
+def _cdf(weights: Sequence[float]) -> np.ndarray:
+    w = np.asarray(weights, dtype=np.float64)
+    w = np.clip(w, 0.0, None)
+    total = w.sum()
+    if total <= 0:
+        raise ValueError("Sampling weights must have a positive sum")
+    cdf = np.cumsum(w / total)
+    cdf[-1] = 1.0
+    return cdf
+
+
+def _draw(cdf: np.ndarray, u: np.ndarray) -> np.ndarray:
+    return np.searchsorted(cdf, u, side="right").clip(max=len(cdf) - 1)
+
+
+# Uniform draws consumed per persona (one row of the draw matrix)
+DRAWS_PER_PERSONA = 10
+
+
+@dataclass
+class Vocabulary:
+    """Attribute vocabularies shared by every country.
+
+    Occupations are flattened in INDUSTRIES order; `industry_slices` gives the
+    (offset, size) of each industry's block.
+    """
+
+    occupations: List[str]
+    industry_slices: Dict[str, Tuple[int, int]]
+    personalities: List[str]
+    financial_attitudes: List[str]
+    economic_concerns: List[str]
+    genders: Tuple[str, ...] = tuple(GENDERS)
+
+    @cached_property
+    def key(self) -> Tuple:
+        """Hashable fingerprint, used to cache tables compiled for this vocabulary."""
+        return (
+            tuple(self.occupations),
+            tuple(sorted(self.industry_slices.items())),
+            tuple(self.personalities),
+            tuple(self.financial_attitudes),
+            tuple(self.economic_concerns),
+            tuple(self.genders),
+        )
+
+    @classmethod
+    def from_generator_lists(cls, occupations, traits) -> "Vocabulary":
+        """Build from `OccupationCategories` / `PersonaTraits` instances."""
+        flat: List[str] = []
+        slices: Dict[str, Tuple[int, int]] = {}
+        for industry in INDUSTRIES:
+            jobs = list(getattr(occupations, industry))
+            slices[industry] = (len(flat), len(jobs))
+            flat.extend(jobs)
+        return cls(
+            occupations=flat,
+            industry_slices=slices,
+            personalities=list(traits.personality),
+            financial_attitudes=list(traits.financial_attitudes),
+            economic_concerns=list(traits.economic_concerns),
+        )
+
+
+@dataclass
+class CountrySamplingTables:
+    """Precompiled cumulative distributions for one country."""
+
+    iso_code: str
+    country_data: Dict
+    gender_cdf: np.ndarray
+    age_cdf: np.ndarray
+    age_low: np.ndarray
+    age_span: np.ndarray
+    industry_cdf: np.ndarray
+    industry_offset: np.ndarray
+    industry_size: np.ndarray
+    income_levels: List[str]
+    income_cdf: np.ndarray
+    cities: List[str]
+    city_cdf: np.ndarray
+
+    @classmethod
+    def build(cls, country_data: Dict, vocab: Vocabulary) -> "CountrySamplingTables":
+        gender = country_data["gender_distribution"]
+        gender_cdf = _cdf([float(gender["male"]), float(gender["female"])])
+
+        age_weights, age_low, age_high = [], [], []
+        for key, value in country_data["age_distribution"].items():
+            for names, (low, high) in AGE_BUCKETS:
+                if any(name in key for name in names):
+                    age_weights.append(float(value))
+                    age_low.append(low)
+                    age_high.append(high)
+                    break
+        age_low_arr = np.asarray(age_low, dtype=np.int64)
+
+        industries = list(country_data["industry_of_work"].keys())
+        industry_weights = [float(country_data["industry_of_work"][i]) for i in industries]
+        # Unknown industries fall back to services, as in PersonaGenerator
+        blocks = [vocab.industry_slices.get(i, vocab.industry_slices["services"]) for i in industries]
+
+        income = country_data["income_distribution"]
+        income_levels = list(income.keys())
+
+        top_cities = country_data["top_cities"]
+        other_percent = 100 - sum(city["percent_of_country"] for city in top_cities)
+        cities = [city["city"] for city in top_cities] + ["other"]
+        city_weights = [float(city["percent_of_country"]) for city in top_cities] + [float(other_percent)]
+
+        return cls(
+            iso_code=country_data["iso_code"],
+            country_data=country_data,
+            gender_cdf=gender_cdf,
+            age_cdf=_cdf(age_weights),
+            age_low=age_low_arr,
+            age_span=np.asarray(age_high, dtype=np.int64) - age_low_arr + 1,
+            industry_cdf=_cdf(industry_weights),
+            industry_offset=np.asarray([b[0] for b in blocks], dtype=np.int64),
+            industry_size=np.asarray([b[1] for b in blocks], dtype=np.int64),
+            income_levels=income_levels,
+            income_cdf=_cdf([float(income[level]) for level in income_levels]),
+            cities=cities,
+            city_cdf=_cdf(city_weights),
+        )
+
+
+@dataclass
+class PersonaBatch:
+    """Columnar sample of personas for one country.
+
+    Every column is an integer code array of length N: `occupation` indexes
+    `vocab.occupations`, `income` indexes `tables.income_levels`, `city`
+    indexes `tables.cities`, and the trait columns index the matching
+    `vocab` lists. `age` holds the age itself.
+    """
+
+    tables: CountrySamplingTables
+    vocab: Vocabulary
+    gender: np.ndarray
+    age: np.ndarray
+    occupation: np.ndarray
+    income: np.ndarray
+    city: np.ndarray
+    personality: np.ndarray
+    financial_attitude: np.ndarray
+    economic_concern: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.age)
+
+    @property
+    def country_code(self) -> str:
+        return self.tables.iso_code
+
+    def render(self, i: int) -> str:
+        """Render the persona prompt for row `i`."""
+        vocab = self.vocab
+        return render_persona_prompt(
+            age=int(self.age[i]),
+            gender=vocab.genders[self.gender[i]],
+            occupation=vocab.occupations[self.occupation[i]],
+            city=self.tables.cities[self.city[i]],
+            income_level=self.tables.income_levels[self.income[i]],
+            personality=vocab.personalities[self.personality[i]],
+            financial_attitude=vocab.financial_attitudes[self.financial_attitude[i]],
+            economic_concern=vocab.economic_concerns[self.economic_concern[i]],
+            country_data=self.tables.country_data,
+        )
+
+    def iter_prompts(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self.render(i)
+
+    def render_all(self) -> List[str]:
+        return list(self.iter_prompts())
+
+
+def country_seed(seed: Optional[int], country_code: str) -> Optional[np.random.SeedSequence]:
+    """Per-country seed derived from a run seed.
+
+    Mixing in a checksum of the country code keeps each country's sample
+    stable when other countries are added to or removed from a run.
+    """
+    if seed is None:
+        return None
+    return np.random.SeedSequence([int(seed), zlib.crc32(country_code.upper().encode("utf-8"))])
+
+
+class BulkPersonaSampler:
+    """Draw whole persona populations in one vectorized pass per country.
+
+    Args:
+        vocab: Attribute vocabularies (see `Vocabulary.from_generator_lists`).
+        seed: Run seed. The same seed and country always give the same
+            personas; None draws fresh entropy.
+        reference: Optional `ReferenceData` registry whose shared, precompiled
+            tables are used instead of compiling per sampler.
+    """
+
+    def __init__(self, vocab: Vocabulary, seed: Optional[int] = None, reference=None):
+        self.vocab = vocab
+        self.seed = seed
+        self.reference = reference
+        self._tables: Dict[str, CountrySamplingTables] = {}
+
+    def tables_for(self, country_data: Dict) -> CountrySamplingTables:
+        iso = country_data["iso_code"]
+        if self.reference is not None:
+            return self.reference.sampling_tables(iso, self.vocab)
+        tables = self._tables.get(iso)
+        if tables is None:
+            tables = CountrySamplingTables.build(country_data, self.vocab)
+            self._tables[iso] = tables
+        return tables
+
+    def sample(self, country_data: Dict, n: int, start: int = 0) -> PersonaBatch:
+        """Sample `n` personas for one country.
+
+        Each persona consumes one fixed-width row of uniform draws, so persona
+        `i` depends only on (seed, country, i): `sample(c, n, start=k)` returns
+        exactly rows k..k+n-1 of a larger sample with the same seed.
+        """
+        tables = self.tables_for(country_data)
+        vocab = self.vocab
+        bit_generator = np.random.PCG64(country_seed(self.seed, tables.iso_code))
+        if start:
+            bit_generator.advance(start * DRAWS_PER_PERSONA)
+        u = np.random.Generator(bit_generator).random((n, DRAWS_PER_PERSONA))
+
+        age_bucket = _draw(tables.age_cdf, u[:, 1])
+        age = tables.age_low[age_bucket] + (u[:, 2] * tables.age_span[age_bucket]).astype(np.int64)
+
+        industry = _draw(tables.industry_cdf, u[:, 3])
+        occupation = tables.industry_offset[industry] + (u[:, 4] * tables.industry_size[industry]).astype(np.int64)
+
+        return PersonaBatch(
+            tables=tables,
+            vocab=vocab,
+            gender=_draw(tables.gender_cdf, u[:, 0]).astype(np.uint8),
+            age=age.astype(np.uint8),
+            occupation=occupation.astype(np.uint16),
+            income=_draw(tables.income_cdf, u[:, 5]).astype(np.uint8),
+            city=_draw(tables.city_cdf, u[:, 6]).astype(np.uint8),
+            personality=(u[:, 7] * len(vocab.personalities)).astype(np.uint8),
+            financial_attitude=(u[:, 8] * len(vocab.financial_attitudes)).astype(np.uint8),
+            economic_concern=(u[:, 9] * len(vocab.economic_concerns)).astype(np.uint8),
+        )
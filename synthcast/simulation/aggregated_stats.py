@@ -0,0 +1,295 @@
+"""
+Streaming canonicalizer and compactor for `aggregated_stats.json`.
+
+The aggregated stats file has the structure::
+
+    {country: {"meta": {...},
+               "questions": {question: {"distribution": {completion: count},
+                                        "total": n, "category": ...}}}}
+
+Its `distribution` maps are keyed by full completions
+("ANSWER: NO\\nREASONING: ..."), almost all with count 1, so the file grows
+with every answer. `compact_aggregated_stats` reads it incrementally,
+one key at a time, and never loads the whole document. It maps each
+completion to its answer category, writes the reasoning text to a JSONL side
+store (gzip-compressed when the path ends in `.gz`), and writes a compact
+aggregate with the same meta/questions structure whose distributions are
+keyed by category.
+
+Command line::
+
+    python -m synthcast.simulation.aggregated_stats aggregated_stats.json \\
+        -o aggregated_stats.compact.json --reasoning aggregated_reasoning.jsonl.gz
+"""
+
+import argparse
+import gzip
+import json
+import re
+from json.decoder import scanstring
+from pathlib import Path
+from typing import IO, Callable, Dict, Iterator, Optional, Tuple
+
+from synthcast.simulation.answers import normalize_response
+
+_WHITESPACE = " \t\n\r"
+_ANSWER_PATTERN = re.compile(r"^\s*\**\s*answer\s*\**\s*:\s*\**\s*(?P<answer>[^\n]*)", re.IGNORECASE)
+_REASONING_PATTERN = re.compile(r"reasoning\s*\**\s*:\s*\**", re.IGNORECASE)
+
+
+class _JsonReader:
+    """Pull parser over a text stream, reading it in chunks.
+
+    Objects are walked with `iter_object`, which yields each key and expects
+    the caller to consume the value (`read_value`, or a nested
+    `iter_object`) before asking for the next key.
+    """
+
+    def __init__(self, f: IO[str], chunk_size: int = 1 << 16):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        chunk = self._f.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _peek(self) -> str:
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON input")
+
+    def _expect(self, char: str) -> None:
+        found = self._peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' but found '{found}'")
+        self._pos += 1
+
+    def read_string(self) -> str:
+        self._expect('"')
+        while True:
+            try:
+                value, end = scanstring(self._buf, self._pos)
+            except ValueError:
+                # The string continues past the buffered chunk
+                self._pos -= 1
+                if not self._fill():
+                    raise
+                self._pos += 1
+                continue
+            self._pos = end
+            return value
+
+    def read_value(self):
+        """Materialize the next value (intended for small subtrees and scalars)."""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number may continue in the next chunk
+            if end == len(self._buf) and not self._eof and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def iter_object(self) -> Iterator[str]:
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.read_string()
+            self._expect(":")
+            yield key
+            sep = self._peek()
+            self._pos += 1
+            if sep == "}":
+                return
+            if sep != ",":
+                raise ValueError(f"Expected ',' or '}}' but found '{sep}'")
+
+
+def split_completion(completion: str) -> Tuple[str, str]:
+    """
+    Split an "ANSWER: ...\\nREASONING: ..." completion into (category, reasoning).
+
+    The category is the upper-cased answer with trailing punctuation removed
+    ("YES", "NO", "MAYBE"). Completions without an ANSWER label fall back to
+    `normalize_response` (Likert options) and keep their whole text as
+    reasoning.
+    """
+    match = _ANSWER_PATTERN.match(completion)
+    if match is None:
+        return normalize_response(completion), completion.strip()
+    answer = match.group("answer").strip().strip("*\"'`.!,;").strip().upper()
+    rest = completion[match.end():]
+    reasoning = _REASONING_PATTERN.split(rest, maxsplit=1)
+    text = reasoning[1] if len(reasoning) == 2 else rest
+    return answer or "invalid_response", text.strip()
+
+
+def iter_aggregated_stats(path: str) -> Iterator[Tuple[str, str, Optional[str], object]]:
+    """
+    Stream an aggregated stats file as (country, kind, question, value) events.
+
+    kinds:
+        "meta": value is the country's meta dict (question is None)
+        "answer": value is (completion, count)
+        "field": value is (name, value) for other question fields (total, category)
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        reader = _JsonReader(f)
+        for country in reader.iter_object():
+            for section in reader.iter_object():
+                if section == "questions":
+                    for question in reader.iter_object():
+                        for field in reader.iter_object():
+                            if field == "distribution":
+                                for completion in reader.iter_object():
+                                    yield country, "answer", question, (completion, reader.read_value())
+                            else:
+                                yield country, "field", question, (field, reader.read_value())
+                elif section == "meta":
+                    yield country, "meta", None, reader.read_value()
+                else:
+                    reader.read_value()
+
+
+def _open_side_store(path: str):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    if path.endswith(".gz"):
+        return gzip.open(path, "wt", encoding="utf-8")
+    return open(path, "w", encoding="utf-8")
+
+
+def compact_aggregated_stats(
+    source: str,
+    output: str,
+    reasoning_path: Optional[str] = None,
+    canonicalize: Callable[[str], Tuple[str, str]] = split_completion,
+) -> Dict[str, int]:
+    """
+    Write a canonicalized, compact copy of an aggregated stats file.
+
+    Args:
+        source: The aggregated stats JSON
+        output: Compact aggregate to write (same structure, distributions
+            keyed by answer category)
+        reasoning_path: Optional JSONL side store for reasoning text, one
+            line per completion: {country, question, answer, count, reasoning}.
+            Gzip-compressed if the path ends in `.gz`
+        canonicalize: Maps a completion to (category, reasoning)
+
+    Returns:
+        Dict with counts of countries, questions and completions processed
+    """
+    stats = {"countries": 0, "questions": 0, "completions": 0}
+    side = _open_side_store(reasoning_path) if reasoning_path else None
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    tmp_output = f"{output}.tmp"
+    try:
+        with open(tmp_output, "w", encoding="utf-8") as out:
+            out.write("{")
+            country: Optional[str] = None
+            meta: Dict = {}
+            questions: Dict[str, Dict] = {}
+
+            def _flush_country():
+                if country is None:
+                    return
+                if stats["countries"]:
+                    out.write(",")
+                out.write(f"\n{json.dumps(country)}: ")
+                json.dump({"meta": meta, "questions": questions}, out, separators=(",", ":"))
+                stats["countries"] += 1
+
+            for event_country, kind, question, value in iter_aggregated_stats(source):
+                if event_country != country:
+                    _flush_country()
+                    country, meta, questions = event_country, {}, {}
+                if kind == "meta":
+                    meta = value
+                    continue
+                entry = questions.get(question)
+                if entry is None:
+                    entry = questions[question] = {"distribution": {}}
+                    stats["questions"] += 1
+                if kind == "field":
+                    name, field_value = value
+                    entry[name] = field_value
+                    continue
+                completion, count = value
+                category, reasoning = canonicalize(completion)
+                entry["distribution"][category] = entry["distribution"].get(category, 0) + count
+                stats["completions"] += 1
+                if side is not None and reasoning:
+                    side.write(json.dumps({
+                        "country": country,
+                        "question": question,
+                        "answer": category,
+                        "count": count,
+                        "reasoning": reasoning,
+                    }) + "\n")
+            _flush_country()
+            out.write("\n}\n")
+        Path(tmp_output).replace(output)
+    finally:
+        if side is not None:
+            side.close()
+    return stats
+
+
+def load_compact_stats(path: str) -> Dict:
+    """Load a compact aggregate written by `compact_aggregated_stats`."""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def iter_reasoning(path: str, country: Optional[str] = None, question: Optional[str] = None) -> Iterator[Dict]:
+    """Stream reasoning side-store entries, optionally for one country/question."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            if country is not None and entry["country"] != country:
+                continue
+            if question is not None and entry["question"] != question:
+                continue
+            yield entry
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Canonicalize and compact an aggregated stats JSON file")
+    parser.add_argument("source", help="aggregated_stats.json to read")
+    parser.add_argument("-o", "--output", help="Compact output (default: <source>.compact.json)")
+    parser.add_argument("--reasoning", help="Reasoning side store (.jsonl or .jsonl.gz); omitted if not given")
+    args = parser.parse_args(argv)
+
+    output = args.output or str(Path(args.source).with_suffix(".compact.json"))
+    stats = compact_aggregated_stats(args.source, output, reasoning_path=args.reasoning)
+    print(
+        f"Wrote {output}: {stats['countries']} countries, {stats['questions']} questions, "
+        f"{stats['completions']} completions canonicalized"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,439 @@
+"""
+Segment-level aggregation of simulation responses.
+
+A `ResponseFrame` holds one row per response: the answer as an option code,
+plus integer-coded persona attributes looked up from the `Population` by
+`persona_id` (country, gender, age cohort, income level, industry,
+occupation, city). Every statistic is computed from a single `bincount` over
+combined segment keys, so grouping 50k responses by any combination of
+segments is a handful of array operations.
+
+Confidence intervals use a stratified bootstrap: responses are resampled
+within each segment, which for categorical answers is exactly a multinomial
+draw from the segment's observed shares. All replicates for all segments are
+drawn in one call, so 1000 resamples of dozens of segments take milliseconds
+regardless of the number of agents.
+
+Sentiment scores map options onto [-1, 1] with OPTION_SCORES; answers outside
+the options (e.g. "invalid_response") count in distributions but not in
+scores.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from synthcast.simulation.answers import ANSWER_OPTIONS
+
+OPTION_SCORES = {"very likely": 1.0, "likely": 0.5, "unlikely": -0.5, "highly unlikely": -1.0}
+
+# (label, lowest age, highest age), inclusive
+AGE_COHORTS: List[Tuple[str, int, int]] = [
+    ("0-17", 0, 17),
+    ("18-34", 18, 34),
+    ("35-54", 35, 54),
+    ("55-64", 55, 64),
+    ("65+", 65, 255),
+]
+
+SEGMENTS = ("country", "gender", "age_cohort", "income", "industry", "occupation", "city")
+
+
+@dataclass
+class SegmentTable:
+    """Response counts per segment.
+
+    Attributes:
+        by: Segment names the table is grouped by.
+        keys: One tuple of labels per group, in `by` order.
+        options: Response labels, the columns of `counts`.
+        counts: (groups, options) response counts.
+        scores: Mean sentiment score per group (NaN if no scorable answers).
+        share_ci: (groups, options, 2) bootstrap interval for each share, if computed.
+        score_ci: (groups, 2) bootstrap interval for each score, if computed.
+    """
+
+    by: Tuple[str, ...]
+    keys: List[Tuple[str, ...]]
+    options: List[str]
+    counts: np.ndarray
+    scores: np.ndarray
+    share_ci: Optional[np.ndarray] = None
+    score_ci: Optional[np.ndarray] = None
+
+    @property
+    def n(self) -> np.ndarray:
+        return self.counts.sum(axis=1)
+
+    @property
+    def shares(self) -> np.ndarray:
+        return self.counts / np.maximum(self.n, 1)[:, None]
+
+    def to_records(self) -> List[Dict]:
+        """One dict per group: segment labels, n, distribution, score and intervals."""
+        records = []
+        shares = self.shares
+        for g, key in enumerate(self.keys):
+            record: Dict = dict(zip(self.by, key))
+            record["n"] = int(self.n[g])
+            record["distribution"] = {o: int(c) for o, c in zip(self.options, self.counts[g])}
+            record["shares"] = {o: float(s) for o, s in zip(self.options, shares[g])}
+            record["score"] = float(self.scores[g])
+            if self.score_ci is not None:
+                record["score_ci"] = [float(x) for x in self.score_ci[g]]
+            if self.share_ci is not None:
+                record["share_ci"] = {o: [float(x) for x in self.share_ci[g, j]] for j, o in enumerate(self.options)}
+            records.append(record)
+        return records
+
+
+def _scores(counts: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Mean score along the last axis; `weights` is NaN for unscored options."""
+    scored = ~np.isnan(weights)
+    total = counts[..., scored].sum(axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (counts[..., scored] @ weights[scored]) / total
+
+
+class ResponseFrame:
+    """Responses with structured persona attributes, one row per agent.
+
+    Args:
+        response: Option code per row (indexes `options`).
+        options: Response labels.
+        segments: Segment name -> (codes per row, labels).
+        persona_id: Persona id per row, if known.
+    """
+
+    def __init__(
+        self,
+        response: np.ndarray,
+        options: Sequence[str],
+        segments: Dict[str, Tuple[np.ndarray, List[str]]],
+        persona_id: Optional[np.ndarray] = None,
+    ):
+        self.response = np.asarray(response, dtype=np.int64)
+        self.options = list(options)
+        self.segments = dict(segments)
+        self.persona_id = persona_id
+        self._option_scores = np.array([OPTION_SCORES.get(o, np.nan) for o in self.options])
+
+    def __len__(self) -> int:
+        return len(self.response)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict], population, options: Sequence[str] = ANSWER_OPTIONS) -> "ResponseFrame":
+        """
+        Build from result records that carry a `persona_id` into `population`.
+
+        Records without a persona id (results saved before personas had ids)
+        are skipped; their attributes only exist inside the prompt text.
+        """
+        options = list(options)
+        index = {o: i for i, o in enumerate(options)}
+        ids: List[int] = []
+        codes: List[int] = []
+        for record in records:
+            if record.get("persona_id") is None:
+                continue
+            response = record["response"].lower().strip()
+            code = index.get(response)
+            if code is None:
+                code = index[response] = len(options)
+                options.append(response)
+            ids.append(int(record["persona_id"]))
+            codes.append(code)
+        return cls.from_population(np.asarray(ids, dtype=np.int64), np.asarray(codes, dtype=np.int64), options, population)
+
+    @classmethod
+    def from_results(cls, results_by_country: Mapping[str, List[Dict]], population) -> "ResponseFrame":
+        """Build from `Simulation.ask_question` output."""
+        return cls.from_records((r for results in results_by_country.values() for r in results), population)
+
+    @classmethod
+    def from_compact(cls, paths: Sequence[str], population) -> "ResponseFrame":
+        """Build from compact result files without materializing per-record dicts."""
+        from synthcast.simulation.result_format import MISSING_PERSONA_ID, iter_compact_batches
+        options = list(ANSWER_OPTIONS)
+        index = {o: i for i, o in enumerate(options)}
+        ids, codes = [], []
+        for path in paths:
+            for batch in iter_compact_batches(path):
+                lut = np.empty(len(batch.codebook), dtype=np.int64)
+                for j, response in enumerate(batch.codebook):
+                    if response not in index:
+                        index[response] = len(options)
+                        options.append(response)
+                    lut[j] = index[response]
+                keep = batch.persona_id != MISSING_PERSONA_ID
+                ids.append(batch.persona_id[keep].astype(np.int64))
+                codes.append(lut[batch.response[keep]])
+        if not ids:
+            return cls.from_population(np.empty(0, np.int64), np.empty(0, np.int64), options, population)
+        return cls.from_population(np.concatenate(ids), np.concatenate(codes), options, population)
+
+    @classmethod
+    def from_population(cls, persona_id: np.ndarray, response: np.ndarray, options: Sequence[str], population) -> "ResponseFrame":
+        """Attach the standard SEGMENTS for each persona id from the population's records."""
+        rows = population.records[persona_id]
+        vocab = population.vocab
+        countries = population.countries
+        country = rows["country"].astype(np.int64)
+
+        segments: Dict[str, Tuple[np.ndarray, List[str]]] = {
+            "country": (country, population.country_codes),
+            "gender": (rows["gender"].astype(np.int64), list(vocab.genders)),
+            "occupation": (rows["occupation"].astype(np.int64), list(vocab.occupations)),
+        }
+
+        bounds = np.array([high for _, _, high in AGE_COHORTS])
+        segments["age_cohort"] = (np.searchsorted(bounds, rows["age"], side="left"), [c[0] for c in AGE_COHORTS])
+
+        industries = sorted(vocab.industry_slices, key=lambda name: vocab.industry_slices[name][0])
+        industry_of = np.zeros(len(vocab.occupations), dtype=np.int64)
+        for i, name in enumerate(industries):
+            offset, size = vocab.industry_slices[name]
+            industry_of[offset:offset + size] = i
+        segments["industry"] = (industry_of[rows["occupation"]], industries)
+
+        # Income levels and cities are coded per country; map them onto
+        # shared labels with a (country, local code) lookup table
+        for name, column, vocab_key, qualify in (("income", "income", "income_levels", False), ("city", "city", "cities", True)):
+            labels: List[str] = []
+            label_index: Dict[str, int] = {}
+            width = max(len(c[vocab_key]) for c in countries)
+            lut = np.zeros((len(countries), width), dtype=np.int64)
+            for ci, c in enumerate(countries):
+                for li, label in enumerate(c[vocab_key]):
+                    # "other" is a different place in every country
+                    if qualify and label == "other":
+                        label = f"other ({c['data']['iso_code']})"
+                    if label not in label_index:
+                        label_index[label] = len(labels)
+                        labels.append(label)
+                    lut[ci, li] = label_index[label]
+            segments[name] = (lut[country, rows[column].astype(np.int64)], labels)
+
+        return cls(response, options, segments, persona_id=persona_id)
+
+    def add_segment(self, name: str, codes: np.ndarray, labels: Sequence[str]) -> None:
+        """Add a custom per-row segment column."""
+        codes = np.asarray(codes, dtype=np.int64)
+        if len(codes) != len(self):
+            raise ValueError(f"Segment '{name}' has {len(codes)} rows, expected {len(self)}")
+        self.segments[name] = (codes, list(labels))
+
+    def map_segment(self, name: str, source: str, mapping: Mapping[str, str], default: str = "other") -> None:
+        """
+        Derive a coarser segment by relabelling an existing one.
+
+        Example:
+            frame.map_segment("region", "country", {"DEU": "North", "ITA": "South", "POL": "East"})
+        """
+        codes, labels = self.segments[source]
+        new_labels: List[str] = []
+        new_index: Dict[str, int] = {}
+        lut = np.empty(len(labels), dtype=np.int64)
+        for i, label in enumerate(labels):
+            target = mapping.get(label, default)
+            if target not in new_index:
+                new_index[target] = len(new_labels)
+                new_labels.append(target)
+            lut[i] = new_index[target]
+        self.segments[name] = (lut[codes], new_labels)
+
+    def _group_codes(self, by: Sequence[str]) -> Tuple[np.ndarray, Tuple[int, ...]]:
+        unknown = [b for b in by if b not in self.segments]
+        if unknown:
+            raise ValueError(f"Unknown segments {unknown}; available: {sorted(self.segments)}")
+        shape = tuple(len(self.segments[b][1]) for b in by)
+        if not by:
+            return np.zeros(len(self), dtype=np.int64), ()
+        key = np.ravel_multi_index([self.segments[b][0] for b in by], shape)
+        return key, shape
+
+    def _counts(self, by: Sequence[str], mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, Tuple[int, ...]]:
+        """Dense (all combinations, options) counts, restricted to non-empty groups."""
+        key, shape = self._group_codes(by)
+        k = len(self.options)
+        response = self.response
+        if mask is not None:
+            key, response = key[mask], response[mask]
+        cells = int(np.prod(shape)) if shape else 1
+        dense = np.bincount(key * k + response, minlength=cells * k).reshape(cells, k)
+        groups = np.flatnonzero(dense.sum(axis=1))
+        return dense[groups], groups, shape
+
+    def _keys(self, by: Sequence[str], groups: np.ndarray, shape: Tuple[int, ...]) -> List[Tuple[str, ...]]:
+        if not by:
+            return [()]
+        coords = np.unravel_index(groups, shape)
+        return [
+            tuple(self.segments[b][1][coords[j][g]] for j, b in enumerate(by))
+            for g in range(len(groups))
+        ]
+
+    def group_by(self, by: Sequence[str] = (), min_count: int = 1) -> SegmentTable:
+        """
+        Response distribution and score for every non-empty combination of segments.
+
+        Args:
+            by: Segment names (see SEGMENTS, plus any added segments)
+            min_count: Drop groups with fewer responses
+        """
+        by = tuple(by)
+        counts, groups, shape = self._counts(by)
+        keep = counts.sum(axis=1) >= min_count
+        counts, groups = counts[keep], groups[keep]
+        return SegmentTable(by, self._keys(by, groups, shape), list(self.options), counts, _scores(counts, self._option_scores))
+
+    def _resample(self, counts: np.ndarray, n_boot: int, rng: np.random.Generator) -> np.ndarray:
+        """(n_boot, groups, options) multinomial resamples of each group's counts."""
+        n = counts.sum(axis=1)
+        shares = counts / np.maximum(n, 1)[:, None]
+        return rng.multinomial(n, shares, size=(n_boot, len(n)))
+
+    def bootstrap(
+        self,
+        by: Sequence[str] = (),
+        n_boot: int = 1000,
+        ci: float = 0.95,
+        seed: Optional[int] = None,
+        min_count: int = 1,
+    ) -> SegmentTable:
+        """`group_by` with percentile bootstrap intervals for every share and score."""
+        table = self.group_by(by, min_count=min_count)
+        rng = np.random.default_rng(seed)
+        samples = self._resample(table.counts, n_boot, rng)
+        alpha = (1 - ci) / 2
+        shares = samples / np.maximum(samples.sum(axis=2, keepdims=True), 1)
+        table.share_ci = np.moveaxis(np.quantile(shares, [alpha, 1 - alpha], axis=0), 0, -1)
+        table.score_ci = np.nanquantile(_scores(samples, self._option_scores), [alpha, 1 - alpha], axis=0).T
+        return table
+
+    def income_gap(
+        self,
+        within: Sequence[str] = ("country",),
+        high: str = "high_income",
+        low: str = "low_income",
+        n_boot: int = 1000,
+        ci: float = 0.95,
+        seed: Optional[int] = None,
+    ) -> List[Dict]:
+        """High-income minus low-income mean score inside each `within` segment."""
+        return self.segment_gap("income", high, low, within=within, n_boot=n_boot, ci=ci, seed=seed)
+
+    def segment_gap(
+        self,
+        segment: str,
+        high: str,
+        low: str,
+        within: Sequence[str] = ("country",),
+        n_boot: int = 1000,
+        ci: float = 0.95,
+        seed: Optional[int] = None,
+    ) -> List[Dict]:
+        """
+        Score difference between two labels of one segment (e.g. income levels,
+        age cohorts) inside each combination of `within` segments.
+
+        Returns:
+            One dict per `within` group with both labels present: the group
+            labels, `gap`, `high_score`, `low_score`, their sizes and `gap_ci`.
+        """
+        labels = self.segments[segment][1]
+        hi, lo = labels.index(high), labels.index(low)
+        within = tuple(within)
+        by = within + (segment,)
+        counts, groups, shape = self._counts(by)
+        coords = np.unravel_index(groups, shape)
+        outer = np.ravel_multi_index(coords[:-1], shape[:-1]) if within else np.zeros(len(groups), dtype=np.int64)
+        label = coords[-1]
+
+        # Pair each outer group's high and low rows
+        rows_hi = {int(o): g for g, (o, l) in enumerate(zip(outer, label)) if l == hi}
+        rows_lo = {int(o): g for g, (o, l) in enumerate(zip(outer, label)) if l == lo}
+        pairs = sorted(set(rows_hi) & set(rows_lo))
+        if not pairs:
+            return []
+        gh = np.array([rows_hi[o] for o in pairs])
+        gl = np.array([rows_lo[o] for o in pairs])
+
+        scores = _scores(counts, self._option_scores)
+        samples = _scores(self._resample(counts, n_boot, np.random.default_rng(seed)), self._option_scores)
+        alpha = (1 - ci) / 2
+        gap_ci = np.nanquantile(samples[:, gh] - samples[:, gl], [alpha, 1 - alpha], axis=0).T
+
+        results = []
+        for j, o in enumerate(pairs):
+            record: Dict = {}
+            if within:
+                outer_coords = np.unravel_index(o, shape[:-1])
+                record.update({b: self.segments[b][1][int(c)] for b, c in zip(within, outer_coords)})
+            record.update({
+                "gap": float(scores[gh[j]] - scores[gl[j]]),
+                "high_score": float(scores[gh[j]]),
+                "low_score": float(scores[gl[j]]),
+                "high_n": int(counts[gh[j]].sum()),
+                "low_n": int(counts[gl[j]].sum()),
+                "gap_ci": [float(x) for x in gap_ci[j]],
+            })
+            results.append(record)
+        return results
+
+    def regional_spread(
+        self,
+        within: Sequence[str] = ("country",),
+        region: str = "city",
+        min_count: int = 10,
+        n_boot: int = 1000,
+        ci: float = 0.95,
+        seed: Optional[int] = None,
+    ) -> List[Dict]:
+        """
+        Max-minus-min mean score across the regions inside each `within` group.
+
+        Regions with fewer than `min_count` responses are ignored. Use
+        `map_segment` to define coarser regions (e.g. North/South/East Europe
+        from "country", with `within=()`).
+
+        Returns:
+            One dict per `within` group with at least two regions: the group
+            labels, `spread`, `highest`/`lowest` region, `spread_ci` and
+            `regions` (score per region).
+        """
+        within = tuple(within)
+        by = within + (region,)
+        counts, groups, shape = self._counts(by)
+        keep = counts.sum(axis=1) >= min_count
+        counts, groups = counts[keep], groups[keep]
+        coords = np.unravel_index(groups, shape)
+        outer = np.ravel_multi_index(coords[:-1], shape[:-1]) if within else np.zeros(len(groups), dtype=np.int64)
+
+        scores = _scores(counts, self._option_scores)
+        samples = _scores(self._resample(counts, n_boot, np.random.default_rng(seed)), self._option_scores)
+        region_labels = self.segments[region][1]
+        alpha = (1 - ci) / 2
+
+        results = []
+        for o in np.unique(outer):
+            members = np.flatnonzero((outer == o) & ~np.isnan(scores))
+            if len(members) < 2:
+                continue
+            member_scores = scores[members]
+            replicate = samples[:, members]
+            spread_samples = np.nanmax(replicate, axis=1) - np.nanmin(replicate, axis=1)
+            record: Dict = {}
+            if within:
+                outer_coords = np.unravel_index(o, shape[:-1])
+                record.update({b: self.segments[b][1][int(c)] for b, c in zip(within, outer_coords)})
+            record.update({
+                "spread": float(member_scores.max() - member_scores.min()),
+                "highest": region_labels[int(coords[-1][members[member_scores.argmax()]])],
+                "lowest": region_labels[int(coords[-1][members[member_scores.argmin()]])],
+                "spread_ci": [float(x) for x in np.quantile(spread_samples, [alpha, 1 - alpha])],
+                "regions": {region_labels[int(coords[-1][m])]: float(scores[m]) for m in members},
+            })
+            results.append(record)
+        return results
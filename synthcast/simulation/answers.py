@@ -0,0 +1,174 @@
+"""
+Answer options, instructions and normalization for Likert-style questions.
+"""
+
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+ANSWER_OPTIONS = ["very likely", "likely", "unlikely", "highly unlikely"]
+
+ANSWER_INSTRUCTION = (
+    "You MUST answer with exactly one of the following (case-insensitive):\\n"
+    "very likely\\n"
+    "likely\\n"
+    "unlikely\\n"
+    "highly unlikely\\n\\n"
+    "Return ONLY that phrase — no quotes, punctuation, explanation, or additional text. "
+    "Base your answer only on your persona and the information provided."
+)
+
+
+ANSWER_LABEL = "answer:"
+
+
+def _find_option(s: str, options: Sequence[str], final: bool) -> Optional[str]:
+    """Option starting first in `s` (longest at that position), delimited by
+    non-letters. Until the text is `final`, an option at its very end does not
+    count, since it may still grow ("likely" -> "likelyhood")."""
+    best: Optional[Tuple[int, str]] = None
+    for option in sorted(options, key=len, reverse=True):
+        start = s.find(option)
+        while start != -1:
+            end = start + len(option)
+            before_ok = start == 0 or not s[start - 1].isalpha()
+            after_ok = end < len(s) and not s[end].isalpha()
+            if before_ok and (after_ok or (final and end == len(s))):
+                if best is None or start < best[0]:
+                    best = (start, option)
+                break
+            start = s.find(option, start + 1)
+    return best[1] if best else None
+
+
+def labeled_option(text: str, options: Sequence[str] = ANSWER_OPTIONS, final: bool = True) -> Optional[str]:
+    """The option a reply commits to, if it clearly commits to one.
+
+    With an "ANSWER:" label, the first option after the label (whatever
+    precedes it, e.g. reasoning, is ignored). Without one, only a reply that
+    opens with an option. Returns None when the reply needs the looser
+    `normalize_response` rules, or (before the text is `final`) when it has
+    not committed yet.
+    """
+    s = text.lower()
+    label = s.find(ANSWER_LABEL)
+    if label != -1:
+        return _find_option(s[label + len(ANSWER_LABEL):], [o.lower() for o in options], final)
+    body = s.lstrip(" \t\r\n\"'`*")
+    for option in sorted((o.lower() for o in options), key=len, reverse=True):
+        end = len(option)
+        if body.startswith(option) and ((end < len(body) and not body[end].isalpha()) or (final and end == len(body))):
+            return option
+    return None
+
+
+def normalize_response(resp: str) -> str:
+    """Map a free-text completion onto one of ANSWER_OPTIONS or "invalid_response".
+
+    A reply that commits to an option (see `labeled_option`) maps to it, so
+    "ANSWER: likely" after reasoning that mentions "unlikely" is "likely" in
+    every mode. Other replies fall back to keyword matching.
+    """
+    if not resp:
+        return "invalid_response"
+    s = resp.lower().strip()
+    options = ANSWER_OPTIONS
+    if s in options:
+        return s
+    committed = labeled_option(s, options)
+    if committed is not None:
+        return committed
+    if "very unlikely" in s:
+        return "highly unlikely"
+    for opt in options:
+        if opt in s:
+            return opt
+    if "likely" in s and "unlikely" not in s:
+        return "likely"
+    if "unlikely" in s:
+        return "unlikely"
+    if any(k in s for k in ("cannot", "unable", "do not know", "not able", "no information")):
+        return "unlikely"
+    return "invalid_response"
+
+
+def _matching_options(token: str, options: Sequence[str]) -> List[str]:
+    t = token.strip().strip("\"'`*").lower()
+    if not t:
+        return []
+    return [o for o in options if o.startswith(t) or t.startswith(o)]
+
+
+def distribution_from_top_logprobs(
+    top_logprobs: Iterable[Tuple[str, float]],
+    options: Sequence[str] = ANSWER_OPTIONS,
+) -> Optional[Dict[str, float]]:
+    """Turn the top-k logprobs of the first answer token into option probabilities.
+
+    Every option starts with a distinct word ("very", "likely", "unlikely",
+    "highly"), so the first generated token identifies the option (a partial
+    token such as "un" or "l" counts for the one option it starts). With
+    custom options that share a first word, a token that is a prefix of
+    several of them (e.g. "very" for "very likely" and "very unlikely") splits
+    its mass evenly between them. Probability mass on tokens matching no option
+    is dropped and the rest renormalized.
+
+    Returns:
+        Dict mapping each option to its probability, or None when no top token
+        matches any option.
+    """
+    mass = {o: 0.0 for o in options}
+    for token, logprob in top_logprobs:
+        matches = _matching_options(token, options)
+        if not matches:
+            continue
+        p = math.exp(logprob)
+        for o in matches:
+            mass[o] += p / len(matches)
+    total = sum(mass.values())
+    if total <= 0:
+        return None
+    return {o: v / total for o, v in mass.items()}
+
+
+def most_likely_option(distribution: Dict[str, float]) -> str:
+    """Option with the highest probability (ties go to the earlier option)."""
+    return max(distribution, key=lambda o: distribution[o])
+
+
+ANSWER_WITH_REASONING_INSTRUCTION = (
+    "Reply in exactly this format:\n"
+    "ANSWER: <one of: very likely, likely, unlikely, highly unlikely>\n"
+    "REASONING: <one or two sentences explaining your answer>\n"
+    "Base your answer only on your persona and the information provided."
+)
+
+
+class IncrementalAnswerParser:
+    """Recognize an answer option in a token stream as early as possible.
+
+    Chunks are fed as they arrive. The parser commits early only when the
+    reply commits to an option (see `labeled_option`): the first option after
+    an "ANSWER:" label, or an option the reply opens with. An option counts
+    once it is followed by a non-letter character, so "very" never resolves
+    early and "highly unlikely" is not mistaken for "unlikely". Anything else
+    is resolved by `normalize_response` at the end of the stream, so a
+    streamed reply gets the same answer as the same text in other modes.
+    """
+
+    def __init__(self, options: Sequence[str] = ANSWER_OPTIONS):
+        self.options = [o.lower() for o in options]
+        self.text = ""
+        self.answer: Optional[str] = None
+
+    def feed(self, chunk: str) -> Optional[str]:
+        """Add a chunk; return the answer once it is recognized."""
+        self.text += chunk
+        if self.answer is None and chunk:
+            self.answer = labeled_option(self.text, self.options, final=False)
+        return self.answer
+
+    def finish(self) -> str:
+        """Resolve the answer at end of stream, falling back to `normalize_response`."""
+        if self.answer is None:
+            self.answer = labeled_option(self.text, self.options) or normalize_response(self.text)
+        return self.answer
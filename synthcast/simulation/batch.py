@@ -0,0 +1,330 @@
+"""
+Offline batch inference through OpenAI-compatible batch files.
+
+A batch run writes every request of a simulation to one JSONL file in the
+OpenAI batch format::
+
+    {"custom_id": "a17", "method": "POST", "url": "/v1/chat/completions",
+     "body": {"model": ..., "messages": [...], "temperature": 0.7, ...}}
+
+submits it, polls until the provider has processed it, and reads the output
+file back. Results arrive hours rather than seconds later, but batch calls
+are much cheaper than chat completions and do not count against the
+real-time rate limits.
+
+`OpenAIBatchExecutor` drives the Files and Batches API of any
+OpenAI-compatible endpoint (OpenAI, Nebius AI Studio). `LocalBatchExecutor`
+processes batch files in-process, either with deterministic stand-in
+answers or by sending each request to an `LLMAgent`, so the batch path can
+be exercised without a batch API or network access.
+
+Batch requests bypass the response cache and rate limiter.
+"""
+
+import abc
+import hashlib
+import json
+import logging
+import math
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from synthcast.simulation.answers import ANSWER_OPTIONS, distribution_from_top_logprobs, normalize_response
+from synthcast.simulation.errors import LLMError, classify_error
+
+# A child of the "simulation" logger, whose handlers setup_logging configures
+logger = logging.getLogger("simulation.batch")
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+class BatchFailedError(LLMError):
+    """A batch ended without producing an output file."""
+
+    retryable = False
+
+
+@dataclass
+class BatchJob:
+    """State of a submitted batch.
+
+    Attributes:
+        id: Batch id assigned by the executor.
+        status: Provider status ("validating", "in_progress", "completed", ...).
+        output_file: Id or path of the output file, once available.
+        error_file: Id or path of the per-request error file, if any.
+        request_counts: Provider counts of total/completed/failed requests.
+    """
+
+    id: str
+    status: str
+    output_file: Optional[str] = None
+    error_file: Optional[str] = None
+    request_counts: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+
+def chat_request(custom_id: str, model: str, messages: List[Dict[str, str]], **params) -> Dict:
+    """One batch line for a chat completion."""
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {"model": model, "messages": messages, **params},
+    }
+
+
+def write_batch_file(path: str, requests: Iterable[Dict]) -> int:
+    """Write batch request lines to `path`; returns the number written."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for request in requests:
+            f.write(json.dumps(request) + "\n")
+            count += 1
+    return count
+
+
+def read_batch_output(paths: Sequence[str]) -> Dict[str, Dict]:
+    """
+    Read batch output (and error) files into {custom_id: entry}.
+
+    Each entry has `choices` (the chat completion's choices, as dicts) on
+    success, or `error` (a message) when the request failed.
+    """
+    outputs: Dict[str, Dict] = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                response = entry.get("response") or {}
+                body = response.get("body") or {}
+                if entry.get("error") or response.get("status_code", 200) >= 400:
+                    error = entry.get("error") or body.get("error") or {}
+                    message = error.get("message", str(error)) if isinstance(error, dict) else str(error)
+                    outputs[entry["custom_id"]] = {"error": message or f"HTTP {response.get('status_code')}"}
+                else:
+                    outputs[entry["custom_id"]] = {"choices": body.get("choices") or []}
+    return outputs
+
+
+def choice_content(choice: Dict) -> str:
+    content = (choice.get("message") or {}).get("content")
+    return content.strip() if content else ""
+
+
+def choice_distribution(choice: Dict, options: Sequence[str] = ANSWER_OPTIONS) -> Optional[Dict[str, float]]:
+    """Option distribution from a logprob choice, as in `LLMAgent.score_options_async`."""
+    for position in ((choice.get("logprobs") or {}).get("content") or []):
+        if not position["token"].strip():
+            continue
+        alternatives = [(alt["token"], alt["logprob"]) for alt in (position.get("top_logprobs") or [])]
+        return distribution_from_top_logprobs(alternatives or [(position["token"], position["logprob"])], options)
+    answer = normalize_response(choice_content(choice))
+    if answer not in options:
+        return None
+    return {o: float(o == answer) for o in options}
+
+
+class BatchExecutor(abc.ABC):
+    """Submits batch files and fetches their output.
+
+    Subclasses implement `submit`, `poll` and `download`; `run` drives them.
+
+    Attributes:
+        model_name: Model to put in request bodies, or None to let the
+            caller choose.
+    """
+
+    model_name: Optional[str] = None
+
+    @abc.abstractmethod
+    def submit(self, input_path: str, metadata: Optional[Dict[str, str]] = None) -> BatchJob:
+        """Upload `input_path` and start a batch over it."""
+
+    @abc.abstractmethod
+    def poll(self, job: BatchJob) -> BatchJob:
+        """Current state of a submitted batch."""
+
+    @abc.abstractmethod
+    def download(self, job: BatchJob, directory: str) -> List[str]:
+        """Save the job's output and error files to `directory`; returns their paths."""
+
+    def run(
+        self,
+        input_path: str,
+        directory: str,
+        poll_interval: float = 30.0,
+        timeout: Optional[float] = None,
+        metadata: Optional[Dict[str, str]] = None,
+    ) -> List[str]:
+        """
+        Submit `input_path`, wait for it to finish and download the results.
+
+        Raises:
+            BatchFailedError: The batch finished without an output file
+            TimeoutError: `timeout` seconds passed before it finished (the
+                batch keeps running on the provider)
+        """
+        job = self.submit(input_path, metadata)
+        logger.info(f"Submitted batch {job.id} ({input_path})")
+        started = time.monotonic()
+        while not job.done:
+            if timeout is not None and time.monotonic() - started > timeout:
+                raise TimeoutError(f"Batch {job.id} still {job.status} after {timeout:.0f}s")
+            time.sleep(poll_interval)
+            job = self.poll(job)
+            logger.info(f"Batch {job.id}: {job.status} {job.request_counts}")
+        if job.output_file is None and job.error_file is None:
+            raise BatchFailedError(f"Batch {job.id} ended {job.status} without output")
+        if job.status != "completed":
+            # Expired or cancelled batches still return what they finished
+            logger.warning(f"Batch {job.id} ended {job.status}; using its partial output")
+        return self.download(job, directory)
+
+
+class OpenAIBatchExecutor(BatchExecutor):
+    """Batch API executor for an OpenAI-compatible endpoint.
+
+    Args:
+        agent: `LLMAgent` whose client, endpoint and model are used
+        completion_window: Provider completion window
+    """
+
+    def __init__(self, agent, completion_window: str = "24h"):
+        self.agent = agent
+        self.model_name = agent.model_name
+        self.completion_window = completion_window
+
+    def _call(self, fn, *args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            raise classify_error(e, self.agent.provider) from e
+
+    @staticmethod
+    def _job(batch) -> BatchJob:
+        counts = getattr(batch, "request_counts", None)
+        return BatchJob(
+            id=batch.id,
+            status=batch.status,
+            output_file=getattr(batch, "output_file_id", None),
+            error_file=getattr(batch, "error_file_id", None),
+            request_counts=counts.model_dump() if hasattr(counts, "model_dump") else dict(counts or {}),
+        )
+
+    def submit(self, input_path: str, metadata: Optional[Dict[str, str]] = None) -> BatchJob:
+        client = self.agent.client
+        with open(input_path, "rb") as f:
+            uploaded = self._call(client.files.create, file=f, purpose="batch")
+        batch = self._call(
+            client.batches.create,
+            input_file_id=uploaded.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=self.completion_window,
+            metadata=metadata,
+        )
+        return self._job(batch)
+
+    def poll(self, job: BatchJob) -> BatchJob:
+        return self._job(self._call(self.agent.client.batches.retrieve, job.id))
+
+    def download(self, job: BatchJob, directory: str) -> List[str]:
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        paths = []
+        for suffix, file_id in (("output", job.output_file), ("errors", job.error_file)):
+            if file_id is None:
+                continue
+            path = str(Path(directory) / f"{job.id}.{suffix}.jsonl")
+            content = self._call(self.agent.client.files.content, file_id)
+            with open(path, "wb") as f:
+                f.write(content.read())
+            paths.append(path)
+        return paths
+
+
+def stand_in_choices(body: Dict, custom_id: str) -> List[Dict]:
+    """Deterministic answers for `LocalBatchExecutor` without an agent.
+
+    Each choice picks an answer option from a hash of the request and the
+    choice index; logprob requests get a matching top-logprobs entry.
+    """
+    seed = hashlib.sha256(json.dumps(body, sort_keys=True).encode("utf-8")).hexdigest()
+    choices = []
+    for index in range(body.get("n", 1)):
+        digest = int(hashlib.sha256(f"{seed}:{custom_id}:{index}".encode("utf-8")).hexdigest(), 16)
+        answer = ANSWER_OPTIONS[digest % len(ANSWER_OPTIONS)]
+        choice = {"index": index, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}
+        if body.get("logprobs"):
+            weights = [1.0 + (digest >> (8 * i)) % 7 for i in range(len(ANSWER_OPTIONS))]
+            total = sum(weights)
+            top = [{"token": o, "logprob": math.log(w / total)} for o, w in zip(ANSWER_OPTIONS, weights)]
+            choice["logprobs"] = {"content": [{"token": answer, "logprob": top[ANSWER_OPTIONS.index(answer)]["logprob"], "top_logprobs": top}]}
+        choices.append(choice)
+    return choices
+
+
+class LocalBatchExecutor(BatchExecutor):
+    """Processes batch files in-process, writing provider-format output.
+
+    Args:
+        agent: Optional `LLMAgent`; each request is sent to its blocking
+            client. Without one, `respond` (default: `stand_in_choices`)
+            answers every request offline.
+        respond: Callable (body, custom_id) -> list of choice dicts
+        model_name: Model to put in request bodies when no agent is given
+    """
+
+    def __init__(self, agent=None, respond: Optional[Callable[[Dict, str], List[Dict]]] = None, model_name: str = "local-stand-in"):
+        self.agent = agent
+        self.respond = respond or stand_in_choices
+        self.model_name = agent.model_name if agent is not None else model_name
+
+    def _complete(self, body: Dict, custom_id: str) -> Dict:
+        if self.agent is None:
+            return {"choices": self.respond(body, custom_id)}
+        try:
+            completion = self.agent.client.chat.completions.create(**body)
+        except Exception as e:
+            raise classify_error(e, self.agent.provider) from e
+        return completion.model_dump()
+
+    def submit(self, input_path: str, metadata: Optional[Dict[str, str]] = None) -> BatchJob:
+        batch_id = f"batch_local_{uuid.uuid4().hex[:12]}"
+        output_path = str(Path(input_path).with_name(f"{batch_id}.processed.jsonl"))
+        counts = {"total": 0, "completed": 0, "failed": 0}
+        with open(input_path, "r", encoding="utf-8") as f, open(output_path, "w", encoding="utf-8") as out:
+            for line in f:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                counts["total"] += 1
+                entry = {"id": f"req_{uuid.uuid4().hex[:12]}", "custom_id": request["custom_id"], "response": None, "error": None}
+                try:
+                    body = self._complete(request["body"], request["custom_id"])
+                    entry["response"] = {"status_code": 200, "body": body}
+                    counts["completed"] += 1
+                except LLMError as e:
+                    entry["error"] = {"code": type(e).__name__, "message": str(e)}
+                    counts["failed"] += 1
+                out.write(json.dumps(entry) + "\n")
+        return BatchJob(id=batch_id, status="completed", output_file=output_path, request_counts=counts)
+
+    def poll(self, job: BatchJob) -> BatchJob:
+        return job
+
+    def download(self, job: BatchJob, directory: str) -> List[str]:
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        path = Path(directory) / f"{job.id}.output.jsonl"
+        Path(job.output_file).replace(path)
+        return [str(path)]
@@ -0,0 +1,171 @@
+"""
+Persistent LLM response cache.
+
+Responses are stored in a SQLite file keyed by a SHA-256 of
+(provider, model, system prompt, user prompt, temperature, max_tokens,
+sample index). The sample index keeps repeated draws of the same prompt at
+temperature > 0 distinct, so replaying a run reproduces every agent's answer
+rather than collapsing them onto one.
+
+Modes:
+    read_through: serve hits from the cache, call the provider on a miss and store it.
+    record_only:  always call the provider, store every response.
+    replay_only:  never call the provider; a miss raises `CacheMissError`.
+    off:          bypass the cache entirely.
+
+Entries are evicted least-recently-used once `max_entries` is exceeded, and
+entries older than `max_age_seconds` are treated as misses and purged.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from synthcast.simulation.errors import LLMError
+
+CACHE_MODES = ("read_through", "record_only", "replay_only", "off")
+
+
+class CacheMissError(LLMError):
+    """Raised in replay_only mode when a request has no cached response."""
+
+    retryable = False
+
+
+def cache_key(
+    provider: str,
+    model: str,
+    system_prompt: str,
+    user_prompt: str,
+    temperature: float,
+    max_tokens: int,
+    sample_index: int = 0,
+    **extra: Any,
+) -> str:
+    """Stable hash identifying one sampled completion.
+
+    Extra keyword arguments (e.g. logprob settings) are folded into the key so
+    different request shapes never collide.
+    """
+    payload = [provider, model, system_prompt, user_prompt, round(float(temperature), 6), int(max_tokens), int(sample_index)]
+    if extra:
+        payload.append(sorted(extra.items()))
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed response cache with LRU/age eviction.
+
+    Args:
+        path: SQLite file. Defaults to synthcast/data/cache/responses.sqlite
+        mode: One of CACHE_MODES.
+        max_entries: Keep at most this many entries (LRU eviction), or None.
+        max_age_seconds: Entries older than this are ignored and purged, or None.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        mode: str = "read_through",
+        max_entries: Optional[int] = 1_000_000,
+        max_age_seconds: Optional[float] = None,
+    ):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode '{mode}'. Expected one of {CACHE_MODES}")
+        if path is None:
+            path = str(Path(__file__).parent.parent / 'data' / 'cache' / 'responses.sqlite')
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.mode = mode
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " response TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+
+    @property
+    def reads(self) -> bool:
+        return self.mode in ("read_through", "replay_only")
+
+    @property
+    def writes(self) -> bool:
+        return self.mode in ("read_through", "record_only")
+
+    @property
+    def calls_provider(self) -> bool:
+        return self.mode != "replay_only"
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for `key`, or None on a miss."""
+        if not self.reads:
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.max_age_seconds is not None and now - row[1] > self.max_age_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str) -> None:
+        """Store a response (no-op unless the mode records)."""
+        if not self.writes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            self._writes_since_evict += 1
+            # Evicting on every insert would turn appends into scans
+            if self._writes_since_evict >= 1000:
+                self._evict()
+
+    def _evict(self) -> None:
+        self._writes_since_evict = 0
+        if self.max_age_seconds is not None:
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.max_age_seconds,))
+        if self.max_entries is not None:
+            count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            excess = count - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed ASC LIMIT ?)",
+                    (excess,),
+                )
+
+    def evict(self) -> None:
+        """Apply age and size limits now."""
+        with self._lock:
+            self._evict()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._evict()
+            self._conn.close()
@@ -0,0 +1,403 @@
+"""
+Catalog of saved per-run result files.
+
+Every result file (`<country>_<timestamp>.json` or `.scr`) is indexed once by
+run id, question hash, country, model, temperature, mode, timestamp and
+population snapshot, and its response counts are stored pre-aggregated.
+Cross-run queries ("distribution of Q for DEU over the last 30 days by
+model") are then answered from the catalog without reopening any result file.
+
+`ingest` is incremental: files whose size and modification time are unchanged
+since the last scan are skipped, so re-scanning a directory of tens of
+thousands of runs only reads the new ones. When a resumed run re-saves a
+country's results under the same run id, the newest file supersedes the
+earlier partial one.
+
+Rows are keyed by (path, run id, country). If a file is overwritten by a
+different run, the earlier run keeps its counts in the catalog and a warning
+is logged, since its file no longer holds them.
+"""
+
+import json
+import logging
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from synthcast.simulation.run_store import TIMESTAMP_FORMAT, question_hash
+
+TimeBound = Optional[Union[str, datetime, timedelta]]
+
+# <country>_<YYYYMMDD>_<HHMMSS>_<suffix>.json|.scr, as written by
+# save_simulation_results; files saved before the suffix was added have none
+RESULT_FILE_PATTERN = re.compile(r"^(?P<country>.+?)_(?P<timestamp>\d{8}_\d{6})(?:_[0-9a-f]{8})?\.(?:json|scr)$")
+
+GROUP_COLUMNS = ("run_id", "country_code", "model", "temperature", "mode", "population_snapshot", "question_hash", "day")
+
+_SKIP_DIRS = {"populations", "cache"}
+
+# A child of the "simulation" logger, whose handlers setup_logging configures
+logger = logging.getLogger("simulation.catalog")
+
+_RUNS_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS {table} ("
+    " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+    " path TEXT NOT NULL,"
+    " size INTEGER,"
+    " mtime_ns INTEGER,"
+    " run_id TEXT NOT NULL,"
+    " timestamp TEXT NOT NULL,"
+    " country_code TEXT NOT NULL,"
+    " question_hash TEXT NOT NULL,"
+    " question TEXT NOT NULL,"
+    " model TEXT,"
+    " temperature REAL,"
+    " mode TEXT,"
+    " population_snapshot TEXT,"
+    " total_responses INTEGER,"
+    " superseded INTEGER NOT NULL DEFAULT 0,"
+    " UNIQUE (path, run_id, country_code))"
+)
+
+
+def _bound(value: TimeBound) -> Optional[str]:
+    """Normalize a time bound; a timedelta means "that long before now"."""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, timedelta):
+        value = datetime.now() - value
+    return value.strftime(TIMESTAMP_FORMAT)
+
+
+def _read_run(path: Path) -> Optional[Dict]:
+    """Extract catalog fields and counts from one result file (None if unreadable)."""
+    if path.suffix == ".scr":
+        from synthcast.simulation.result_format import read_compact_header, read_compact_summary
+        try:
+            meta = dict(read_compact_header(str(path)))
+            meta.update(read_compact_summary(str(path)))
+        except (OSError, ValueError):
+            return None
+        top = meta
+    else:
+        try:
+            with open(path, "r") as f:
+                top = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if not isinstance(top, dict) or "question" not in top:
+            return None
+        meta = top.get("metadata", {})
+        if "response_distribution" not in meta:
+            distribution: Dict[str, int] = {}
+            for record in top.get("responses", []):
+                response = record["response"].lower().strip()
+                distribution[response] = distribution.get(response, 0) + 1
+            meta = {**meta, "response_distribution": distribution}
+    timestamp = top.get("timestamp") or ""
+    temperature = meta.get("temperature")
+    return {
+        # Files written before runs had ids: every country file of one
+        # ask_question call shares its timestamp
+        "run_id": meta.get("run_id") or timestamp,
+        "timestamp": timestamp,
+        "country_code": top.get("country_code") or "",
+        "question": top.get("question") or "",
+        "model": meta.get("model"),
+        "temperature": None if temperature is None else float(temperature),
+        "mode": meta.get("mode"),
+        "population_snapshot": meta.get("population_snapshot"),
+        "total_responses": meta.get("total_responses"),
+        "distribution": meta.get("response_distribution", {}),
+        "expected": meta.get("expected_distribution") or {},
+    }
+
+
+class ResultsCatalog:
+    """SQLite index of result files with pre-aggregated response counts.
+
+    Args:
+        base_path: Results directory to index
+        path: Catalog database; defaults to `<base_path>/results_catalog.sqlite`
+    """
+
+    def __init__(self, base_path: str, path: Optional[str] = None):
+        self.base_path = str(base_path)
+        self.path = path or str(Path(base_path) / "results_catalog.sqlite")
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        self._conn.execute(_RUNS_SCHEMA.format(table="runs"))
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(runs)")}
+        if "superseded" not in columns:
+            self._conn.execute("ALTER TABLE runs ADD COLUMN superseded INTEGER NOT NULL DEFAULT 0")
+        self._migrate_path_key()
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS counts ("
+            " run INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,"
+            " response TEXT NOT NULL,"
+            " count INTEGER NOT NULL,"
+            " expected REAL,"
+            " PRIMARY KEY (run, response))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS runs_question ON runs(question_hash, country_code, timestamp)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS runs_country ON runs(country_code, timestamp)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS runs_run_id ON runs(run_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS runs_timestamp ON runs(timestamp)")
+
+    def _migrate_path_key(self) -> None:
+        """Rebuild catalogs created when `path` alone was unique, keeping row ids."""
+        (sql,) = self._conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'runs'").fetchone()
+        if "UNIQUE (path, run_id, country_code)" in sql:
+            return
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute(_RUNS_SCHEMA.format(table="runs_migrated"))
+            columns = ", ".join(row[1] for row in self._conn.execute("PRAGMA table_info(runs)"))
+            self._conn.execute(f"INSERT INTO runs_migrated ({columns}) SELECT {columns} FROM runs")
+            self._conn.execute("DROP TABLE runs")
+            self._conn.execute("ALTER TABLE runs_migrated RENAME TO runs")
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _upsert(self, path: str, size: int, mtime_ns: int, run: Dict) -> None:
+        overwritten = [
+            run_id for (run_id,) in self._conn.execute(
+                "SELECT DISTINCT run_id FROM runs WHERE path = ? AND run_id != ?", (path, run["run_id"])
+            )
+        ]
+        if overwritten:
+            logger.warning(
+                f"{path} now holds run {run['run_id']} and no longer the results of run(s) "
+                f"{', '.join(overwritten)}; the catalog keeps their counts"
+            )
+        key = (path, run["run_id"], run["country_code"])
+        self._conn.execute(
+            "DELETE FROM counts WHERE run IN (SELECT id FROM runs WHERE path = ? AND run_id = ? AND country_code = ?)", key
+        )
+        self._conn.execute("DELETE FROM runs WHERE path = ? AND run_id = ? AND country_code = ?", key)
+        cursor = self._conn.execute(
+            "INSERT INTO runs (path, size, mtime_ns, run_id, timestamp, country_code, question_hash, question,"
+            " model, temperature, mode, population_snapshot, total_responses)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                path, size, mtime_ns, run["run_id"], run["timestamp"], run["country_code"],
+                question_hash(run["question"]), run["question"], run["model"], run["temperature"],
+                run["mode"], run["population_snapshot"], run["total_responses"],
+            ),
+        )
+        row_id = cursor.lastrowid
+        responses = set(run["distribution"]) | set(run["expected"])
+        self._conn.executemany(
+            "INSERT INTO counts (run, response, count, expected) VALUES (?, ?, ?, ?)",
+            [(row_id, r, int(run["distribution"].get(r, 0)), run["expected"].get(r)) for r in responses],
+        )
+        # A resumed run re-saves a country's complete results under the same
+        # run id; only the latest file per (run, country) is counted
+        stale = [
+            r for (r,) in self._conn.execute(
+                "SELECT id FROM runs WHERE run_id = ? AND country_code = ?"
+                " ORDER BY timestamp DESC, id DESC LIMIT -1 OFFSET 1",
+                (run["run_id"], run["country_code"]),
+            )
+        ]
+        for r in stale:
+            self._conn.execute("DELETE FROM counts WHERE run = ?", (r,))
+            self._conn.execute("UPDATE runs SET superseded = 1 WHERE id = ?", (r,))
+
+    def add_file(self, filepath: str) -> bool:
+        """Index (or re-index) one result file. Returns False if it is not a readable result file."""
+        path = Path(filepath).resolve()
+        run = _read_run(path)
+        if run is None:
+            return False
+        stat = path.stat()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._upsert(str(path), stat.st_size, stat.st_mtime_ns, run)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return True
+
+    def _result_files(self) -> Iterable[Path]:
+        root = Path(self.base_path)
+        if not root.exists():
+            return
+        for path in root.rglob("*"):
+            if RESULT_FILE_PATTERN.match(path.name) and not _SKIP_DIRS.intersection(path.relative_to(root).parts[:-1]):
+                yield path
+
+    def ingest(self) -> int:
+        """
+        Index result files added or changed since the last scan.
+
+        Returns:
+            int: Number of files (re)indexed
+        """
+        with self._lock:
+            # The newest row of a path describes its current contents
+            known = {
+                p: (size, mtime)
+                for p, size, mtime in self._conn.execute("SELECT path, size, mtime_ns FROM runs ORDER BY id")
+            }
+        ingested = 0
+        for path in self._result_files():
+            path = path.resolve()
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if known.get(str(path)) == (stat.st_size, stat.st_mtime_ns):
+                continue
+            if self.add_file(str(path)):
+                ingested += 1
+        return ingested
+
+    def _where(
+        self,
+        question: Optional[str],
+        country_code: Optional[Union[str, Sequence[str]]],
+        model: Optional[str],
+        temperature: Optional[float],
+        mode: Optional[str],
+        population_snapshot: Optional[str],
+        run_id: Optional[str],
+        since: TimeBound,
+        until: TimeBound,
+    ) -> Tuple[str, List]:
+        clauses, params = ["runs.superseded = 0"], []
+        if question is not None:
+            clauses.append("runs.question_hash = ? AND runs.question = ?")
+            params.extend([question_hash(question), question])
+        if country_code is not None:
+            codes = [country_code] if isinstance(country_code, str) else list(country_code)
+            clauses.append(f"runs.country_code IN ({', '.join('?' * len(codes))})")
+            params.extend(codes)
+        for column, value in (("model", model), ("mode", mode), ("population_snapshot", population_snapshot), ("run_id", run_id)):
+            if value is not None:
+                clauses.append(f"runs.{column} = ?")
+                params.append(value)
+        if temperature is not None:
+            clauses.append("ABS(runs.temperature - ?) < 1e-9")
+            params.append(float(temperature))
+        if since is not None:
+            clauses.append("runs.timestamp >= ?")
+            params.append(_bound(since))
+        if until is not None:
+            clauses.append("runs.timestamp < ?")
+            params.append(_bound(until))
+        return " WHERE " + " AND ".join(clauses), params
+
+    def runs(
+        self,
+        question: Optional[str] = None,
+        country_code: Optional[Union[str, Sequence[str]]] = None,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        mode: Optional[str] = None,
+        population_snapshot: Optional[str] = None,
+        run_id: Optional[str] = None,
+        since: TimeBound = None,
+        until: TimeBound = None,
+    ) -> List[Dict]:
+        """Catalog entries (one per result file and run) matching the filters, oldest first."""
+        where, params = self._where(question, country_code, model, temperature, mode, population_snapshot, run_id, since, until)
+        sql = (
+            "SELECT path, run_id, timestamp, country_code, question_hash, question, model, temperature,"
+            " mode, population_snapshot, total_responses FROM runs" + where + " ORDER BY timestamp, id"
+        )
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def distribution(
+        self,
+        question: Optional[str] = None,
+        country_code: Optional[Union[str, Sequence[str]]] = None,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        mode: Optional[str] = None,
+        population_snapshot: Optional[str] = None,
+        run_id: Optional[str] = None,
+        since: TimeBound = None,
+        until: TimeBound = None,
+        group_by: Sequence[str] = (),
+        expected: bool = False,
+    ) -> Dict:
+        """
+        Summed response counts over matching runs, from the pre-aggregated counts.
+
+        Args:
+            question, country_code, model, temperature, mode, population_snapshot, run_id:
+                Filters (country_code may be a list)
+            since: Inclusive lower bound: datetime, "%Y%m%d_%H%M%S" string, or a
+                timedelta meaning that long before now
+            until: Exclusive upper bound, same forms as `since`
+            group_by: Columns from GROUP_COLUMNS ("day" is the timestamp's date)
+            expected: Sum expected (probability-weighted) counts from scoring
+                runs instead of answer counts
+
+        Returns:
+            {response: count} without group_by; otherwise a dict keyed by the
+            group value (a tuple when grouping by several columns).
+
+        Example:
+            catalog.distribution(question=q, country_code="DEU",
+                                 since=timedelta(days=30), group_by=["model"])
+        """
+        unknown = [g for g in group_by if g not in GROUP_COLUMNS]
+        if unknown:
+            raise ValueError(f"Cannot group by {unknown}; expected columns from {GROUP_COLUMNS}")
+        where, params = self._where(question, country_code, model, temperature, mode, population_snapshot, run_id, since, until)
+        if expected:
+            where += " AND counts.expected IS NOT NULL"
+        keys = ["substr(runs.timestamp, 1, 8)" if g == "day" else f"runs.{g}" for g in group_by]
+        value = "SUM(counts.expected)" if expected else "SUM(counts.count)"
+        sql = (
+            f"SELECT {', '.join(keys + ['counts.response', value])}"
+            " FROM counts JOIN runs ON runs.id = counts.run" + where
+            + f" GROUP BY {', '.join(keys + ['counts.response'])}"
+        )
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        result: Dict = {}
+        for row in rows:
+            *group, response, total = row
+            bucket = result if not group_by else result.setdefault(group[0] if len(group) == 1 else tuple(group), {})
+            bucket[response] = total
+        return result
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM runs WHERE superseded = 0").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_catalogs: Dict[str, ResultsCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_results_catalog(base_path: str) -> ResultsCatalog:
+    """Return the process-wide `ResultsCatalog` for a results directory."""
+    key = str(Path(base_path).resolve())
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = ResultsCatalog(key)
+            _catalogs[key] = catalog
+        return catalog
@@ -0,0 +1,125 @@
+"""
+Shared, pooled LLM clients.
+
+Creating an `OpenAI` client per persona gives every agent its own HTTP
+connection pool. This module keeps a single client per
+(provider, model, base_url, api key) instead, so a whole simulation shares a
+handful of keep-alive connections.
+
+Async clients are additionally keyed by the running event loop: an httpx
+connection pool cannot be reused across `asyncio.run` calls, so each loop gets
+its own pool and `close_async_clients` releases it before the loop exits.
+"""
+
+import asyncio
+import threading
+import weakref
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class ConnectionSettings:
+    """HTTP pool and concurrency settings shared by all agents of a backend.
+
+    Attributes:
+        max_connections: Hard cap on open sockets per client.
+        max_keepalive_connections: Idle sockets kept open for reuse.
+        keepalive_expiry: Seconds an idle socket is kept before closing.
+        timeout: Per-request timeout in seconds.
+        max_retries: Retries performed inside the SDK itself. Defaults to 0
+            because `synthcast.simulation.rate_limit` owns retries/backoff.
+        max_concurrency: Upper bound on in-flight requests per agent backend.
+    """
+
+    max_connections: int = 64
+    max_keepalive_connections: int = 32
+    keepalive_expiry: float = 30.0
+    timeout: float = 60.0
+    max_retries: int = 0
+    max_concurrency: int = 64
+
+
+ClientKey = Tuple[str, str, Optional[str], Optional[str]]
+
+_sync_clients: Dict[ClientKey, Any] = {}
+_sync_lock = threading.Lock()
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[ClientKey, Any]]" = weakref.WeakKeyDictionary()
+
+
+def _client_key(provider: str, model: str, base_url: Optional[str], api_key: Optional[str]) -> ClientKey:
+    return (provider, model, base_url, api_key)
+
+
+def get_client(
+    provider: str,
+    model: str,
+    base_url: Optional[str],
+    api_key: Optional[str],
+    settings: Optional[ConnectionSettings] = None,
+):
+    """Return the process-wide blocking `OpenAI` client for a backend."""
+    settings = settings or ConnectionSettings()
+    key = _client_key(provider, model, base_url, api_key)
+    with _sync_lock:
+        client = _sync_clients.get(key)
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI(
+                base_url=base_url,
+                api_key=api_key,
+                timeout=settings.timeout,
+                max_retries=settings.max_retries,
+            )
+            _sync_clients[key] = client
+        return client
+
+
+def get_async_client(
+    provider: str,
+    model: str,
+    base_url: Optional[str],
+    api_key: Optional[str],
+    settings: Optional[ConnectionSettings] = None,
+):
+    """Return the `AsyncOpenAI` client shared by a backend on the running loop.
+
+    The first call for a key creates the client with an httpx pool sized by
+    `settings`; later calls on the same loop return the same instance.
+    """
+    settings = settings or ConnectionSettings()
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+    key = _client_key(provider, model, base_url, api_key)
+    client = clients.get(key)
+    if client is None:
+        import httpx
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+        http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=settings.max_connections,
+                max_keepalive_connections=settings.max_keepalive_connections,
+                keepalive_expiry=settings.keepalive_expiry,
+            ),
+            timeout=settings.timeout,
+        )
+        client = AsyncOpenAI(
+            base_url=base_url,
+            api_key=api_key,
+            http_client=http_client,
+            max_retries=settings.max_retries,
+        )
+        clients[key] = client
+    return client
+
+
+async def close_async_clients() -> None:
+    """Close every async client opened on the running loop."""
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.pop(loop, {})
+    for client in clients.values():
+        try:
+            await client.close()
+        except Exception:
+            # Closing is best-effort; the loop is about to go away anyway
+            pass
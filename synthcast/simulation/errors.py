@@ -0,0 +1,105 @@
+"""
+Typed errors raised by the LLM agents.
+
+Provider failures used to come back as `"__NEBIUS_ERROR__: ..."` strings that
+the normalizer treated as unparseable answers. They are now raised as
+`LLMError` subclasses so callers can tell a rate limit from a bad answer and
+back off instead of re-asking immediately.
+"""
+
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Optional
+
+
+class LLMError(Exception):
+    """Base class for provider call failures.
+
+    Attributes:
+        retryable: Whether repeating the same request may succeed.
+        status_code: HTTP status returned by the provider, if any.
+        retry_after: Seconds the provider asked us to wait, if any.
+        provider: Name of the backend that failed.
+    """
+
+    retryable = False
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None, provider: Optional[str] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.provider = provider
+
+
+class RateLimitedError(LLMError):
+    """HTTP 429 or an equivalent quota error."""
+
+    retryable = True
+
+
+class ProviderServerError(LLMError):
+    """HTTP 5xx returned by the provider."""
+
+    retryable = True
+
+
+class ProviderTimeoutError(LLMError):
+    """Request timed out or the connection failed before a response."""
+
+    retryable = True
+
+
+class ProviderRequestError(LLMError):
+    """Non-retryable 4xx such as a bad request or an authentication failure."""
+
+    retryable = False
+
+
+def _parse_retry_after(headers) -> Optional[float]:
+    """Read Retry-After (seconds or HTTP date) or retry-after-ms from headers."""
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000.0)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def classify_error(exc: BaseException, provider: Optional[str] = None) -> LLMError:
+    """Map an SDK or transport exception onto an `LLMError` subclass."""
+    if isinstance(exc, LLMError):
+        return exc
+
+    status_code = getattr(exc, "status_code", None)
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    retry_after = _parse_retry_after(headers)
+    message = f"{type(exc).__name__}: {exc}"
+
+    if status_code == 429 or type(exc).__name__ == "RateLimitError":
+        return RateLimitedError(message, status_code=429, retry_after=retry_after, provider=provider)
+    if status_code is not None and status_code >= 500:
+        return ProviderServerError(message, status_code=status_code, retry_after=retry_after, provider=provider)
+    if status_code is not None and status_code in (408, 409):
+        return ProviderTimeoutError(message, status_code=status_code, retry_after=retry_after, provider=provider)
+    if status_code is not None:
+        return ProviderRequestError(message, status_code=status_code, provider=provider)
+    if type(exc).__name__ in ("APITimeoutError", "APIConnectionError") or isinstance(exc, (TimeoutError, ConnectionError)):
+        return ProviderTimeoutError(message, provider=provider)
+    return LLMError(message, provider=provider)
@@ -0,0 +1,66 @@
+"""
+Per-agent failure isolation for simulation runs.
+
+Every agent (or group of agents sharing one request) runs as its own task.
+A task that fails is not retried in place and does not affect any other
+task: its agents without a result go onto a bounded retry queue served by a
+few concurrent workers, which retry only those agents with exponential
+backoff. Agents with a recorded result are never requested again.
+
+Each failed attempt is charged to a per-run error budget. Once the budget is
+spent the run is aborted with `ErrorBudgetExceeded`, which usually means the
+provider is down rather than that individual agents are failing; a
+checkpointed run can be finished later with `Simulation.resume`.
+"""
+
+import math
+from dataclasses import dataclass
+from typing import Optional
+
+from synthcast.simulation.errors import LLMError
+
+
+@dataclass(frozen=True)
+class FailureSettings:
+    """Retry and abort policy for failed agents.
+
+    Attributes:
+        max_agent_retries: Retry rounds per failed agent or group after the
+            first failure (on top of the rate limiter's own retries).
+        retry_concurrency: Retry workers running alongside the main tasks.
+        retry_queue_size: Bound on queued retries; failing tasks wait for room.
+        retry_delay: Delay before the first retry round, doubled each round.
+        error_budget: Failed attempts allowed, as a fraction of the run's agents.
+        min_error_budget: Failed attempts always allowed, for small runs.
+    """
+
+    max_agent_retries: int = 2
+    retry_concurrency: int = 8
+    retry_queue_size: int = 1024
+    retry_delay: float = 1.0
+    error_budget: float = 0.05
+    min_error_budget: int = 20
+
+
+class ErrorBudgetExceeded(LLMError):
+    """Too many agent calls failed in one run; the run was aborted."""
+
+    retryable = False
+
+
+class ErrorBudget:
+    """Counts failed attempts in a run against its allowance."""
+
+    def __init__(self, settings: FailureSettings, agent_count: int):
+        self.limit = max(settings.min_error_budget, math.ceil(settings.error_budget * agent_count))
+        self.errors = 0
+        self.exceeded: Optional[ErrorBudgetExceeded] = None
+
+    def charge(self, error: BaseException) -> bool:
+        """Record a failed attempt. Returns True once the budget is exhausted."""
+        self.errors += 1
+        if self.errors > self.limit and self.exceeded is None:
+            self.exceeded = ErrorBudgetExceeded(
+                f"{self.errors} failed agent calls exceeded the run's error budget of {self.limit}; last error: {error}"
+            )
+        return self.exceeded is not None
@@ -0,0 +1,131 @@
+"""
+Append-only run journals for checkpointing `Simulation.ask_question`.
+
+Each run writes `<base_path>/journals/<run_id>.jsonl`. The first line
+describes the run (question, mode, model, temperature, population snapshot,
+agent count). Every completed agent then appends one line with its agent
+index and result record, and a final line marks the run complete once its
+results are saved.
+
+Lines are buffered and flushed at least every `flush_interval` seconds, so a
+crash or preemption loses at most that much work. A torn final line from a
+killed process is ignored when the journal is read back.
+"""
+
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+
+def journal_path(run_id: str, base_path: str) -> Path:
+    return Path(base_path) / "journals" / f"{run_id}.jsonl"
+
+
+@dataclass
+class JournalState:
+    """Contents of a journal read back from disk.
+
+    Attributes:
+        header: The run description written when the run started.
+        results: Agent index -> (country code, result record).
+        complete: Whether the run finished and its results were saved.
+    """
+
+    header: Dict
+    results: Dict[int, Tuple[str, Dict]] = field(default_factory=dict)
+    complete: bool = False
+
+
+class RunJournal:
+    """Writer for one run's journal.
+
+    Args:
+        path: Journal file; appended to if it exists (resumed runs)
+        header: Run description, written only when the file is new
+        flush_interval: Maximum seconds between flushes to the OS
+        fsync: Also fsync on every flush (survives machine crashes, not
+            just process kills)
+    """
+
+    def __init__(self, path: str, header: Optional[Dict] = None, flush_interval: float = 1.0, fsync: bool = False):
+        self.path = str(path)
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        new = not Path(self.path).exists() or Path(self.path).stat().st_size == 0
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._last_flush = time.monotonic()
+        if new:
+            if header is None:
+                raise ValueError(f"Journal {self.path} does not exist and no run header was given")
+            self._write({"type": "run", "created": datetime.now().strftime("%Y%m%d_%H%M%S"), **header})
+            self.flush()
+        else:
+            # Start on a fresh line in case the previous process died mid-write
+            self._file.write("\n")
+
+    def _write(self, entry: Dict) -> None:
+        self._file.write(json.dumps(entry) + "\n")
+
+    def append(self, agent_index: int, country_code: str, record: Dict) -> None:
+        """Record one agent's completed result."""
+        self._write({"type": "result", "agent": agent_index, "country_code": country_code, "record": record})
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def mark_complete(self) -> None:
+        self._write({"type": "complete", "completed": datetime.now().strftime("%Y%m%d_%H%M%S")})
+        self.flush()
+
+    def flush(self) -> None:
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self) -> "RunJournal":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def read_journal(path: str) -> JournalState:
+    """
+    Read a journal back, skipping blank or torn lines.
+
+    Raises:
+        FileNotFoundError: If the journal does not exist
+        ValueError: If it has no run header
+    """
+    state: Optional[JournalState] = None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            kind = entry.get("type")
+            if kind == "run" and state is None:
+                state = JournalState(header=entry)
+            elif state is None:
+                continue
+            elif kind == "result":
+                state.results[int(entry["agent"])] = (entry["country_code"], entry["record"])
+            elif kind == "complete":
+                state.complete = True
+    if state is None:
+        raise ValueError(f"{path} has no run header")
+    return state
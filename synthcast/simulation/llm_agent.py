@@ -0,0 +1,403 @@
+"""
+Shared base for OpenAI-compatible LLM agents.
+
+`NebiusAgent` and `OpenAIAgent` only differ in credentials, endpoint and
+defaults; request plumbing (pooled clients, rate limiting, typed errors) lives
+here so both behave identically.
+"""
+
+import json
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from synthcast.simulation.answers import ANSWER_OPTIONS, IncrementalAnswerParser, distribution_from_top_logprobs, normalize_response
+from synthcast.simulation.cache import CacheMissError, ResponseCache, cache_key
+from synthcast.simulation import metrics
+from synthcast.simulation.client_pool import ConnectionSettings, get_async_client, get_client
+from synthcast.simulation.errors import LLMError, classify_error
+from synthcast.simulation.rate_limit import RateLimiter, RateLimitSettings
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) for rate budgeting."""
+    return len(text) // 4 + 1
+
+
+@dataclass
+class StreamResult:
+    """Outcome of a streamed completion.
+
+    Times are seconds measured from the moment the call was requested, so
+    `queue_wait` is time spent waiting on the rate limiter and
+    `time_to_first_token - queue_wait` is provider-side latency.
+    """
+
+    text: str
+    answer: str
+    queue_wait: float = 0.0
+    time_to_first_token: Optional[float] = None
+    time_to_answer: Optional[float] = None
+    total_time: float = 0.0
+    completion_chunks: int = 0
+    cancelled: bool = False
+    cached: bool = False
+
+
+@dataclass
+class TokenUsage:
+    """Provider-reported token counts, summed over calls.
+
+    `cached_tokens` are prompt tokens the provider served from its prefix
+    cache (OpenAI `prompt_tokens_details.cached_tokens`); providers that do
+    not report it count everything as uncached. Streamed calls report no usage.
+    """
+
+    requests: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    completion_tokens: int = 0
+
+    @property
+    def uncached_tokens(self) -> int:
+        return self.prompt_tokens - self.cached_tokens
+
+    def add(self, completion) -> Optional[Tuple[int, int, int]]:
+        """Add a completion's usage; returns its (prompt, cached, completion) tokens."""
+        usage = getattr(completion, "usage", None)
+        if usage is None:
+            return None
+        prompt = getattr(usage, "prompt_tokens", 0) or 0
+        generated = getattr(usage, "completion_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", 0) or 0) if details is not None else 0
+        self.requests += 1
+        self.prompt_tokens += prompt
+        self.cached_tokens += cached
+        self.completion_tokens += generated
+        return prompt, cached, generated
+
+    def __sub__(self, other: "TokenUsage") -> "TokenUsage":
+        return TokenUsage(
+            self.requests - other.requests,
+            self.prompt_tokens - other.prompt_tokens,
+            self.cached_tokens - other.cached_tokens,
+            self.completion_tokens - other.completion_tokens,
+        )
+
+    def __add__(self, other: "TokenUsage") -> "TokenUsage":
+        return TokenUsage(
+            self.requests + other.requests,
+            self.prompt_tokens + other.prompt_tokens,
+            self.cached_tokens + other.cached_tokens,
+            self.completion_tokens + other.completion_tokens,
+        )
+
+
+class LLMAgent:
+    """OpenAI-compatible chat agent with pooled clients and adaptive limits.
+
+    One instance is meant to be shared by every persona talking to the same
+    model: the client pool, token buckets and concurrency limit all hang off it.
+
+    When a `ResponseCache` is attached, completions are looked up/stored by
+    (provider, model, prompts, sampling params, sample_index).
+
+    Raises `synthcast.simulation.errors.LLMError` subclasses on failure.
+    """
+
+    provider = "openai-compatible"
+    # Largest `n` sent in one request; bigger groups are split across calls
+    max_n = 16
+
+    def __init__(
+        self,
+        model_name: str,
+        api_key: Optional[str],
+        base_url: Optional[str] = None,
+        connection_settings: Optional[ConnectionSettings] = None,
+        rate_limit_settings: Optional[RateLimitSettings] = None,
+        cache: Optional[ResponseCache] = None,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model_name = model_name
+        self.connection_settings = connection_settings or ConnectionSettings()
+        if rate_limit_settings is None:
+            rate_limit_settings = RateLimitSettings(
+                initial_concurrency=min(16, self.connection_settings.max_concurrency),
+                max_concurrency=self.connection_settings.max_concurrency,
+            )
+        # Labels for this agent's metrics; a router backend renames "backend"
+        self.metric_labels = {"model": model_name, "backend": self.provider}
+        self.rate_limiter = RateLimiter(rate_limit_settings, provider=self.provider, labels=self.metric_labels)
+        self.cache = cache
+        self.usage = TokenUsage()
+
+    @property
+    def client(self):
+        """Shared blocking client for this model and endpoint."""
+        return get_client(self.provider, self.model_name, self.base_url, self.api_key, self.connection_settings)
+
+    @property
+    def async_client(self):
+        """Shared async client for this model and endpoint on the running loop."""
+        return get_async_client(self.provider, self.model_name, self.base_url, self.api_key, self.connection_settings)
+
+    def _messages(self, persona_prompt: str, user_prompt: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": persona_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+
+    @staticmethod
+    def _content(completion, index: int = 0) -> str:
+        content = completion.choices[index].message.content
+        return content.strip() if content else ""
+
+    def _record_usage(self, completion) -> None:
+        tokens = self.usage.add(completion)
+        if tokens is not None:
+            prompt, cached, generated = tokens
+            metrics.inc("prompt_tokens_total", prompt, self.metric_labels)
+            metrics.inc("cached_tokens_total", cached, self.metric_labels)
+            metrics.inc("completion_tokens_total", generated, self.metric_labels)
+
+    @staticmethod
+    def _usage_tokens(completion) -> Optional[float]:
+        usage = getattr(completion, "usage", None)
+        return getattr(usage, "total_tokens", None) if usage is not None else None
+
+    def _cache_lookup(self, persona_prompt: str, user_prompt: str, max_tokens: int, temperature: float, sample_index: int, **extra):
+        """Return (key, cached response or None); raise on a replay-only miss."""
+        if self.cache is None or self.cache.mode == "off":
+            return None, None
+        key = cache_key(self.provider, self.model_name, persona_prompt, user_prompt, temperature, max_tokens, sample_index, **extra)
+        cached = self.cache.get(key)
+        if cached is None and not self.cache.calls_provider:
+            raise CacheMissError(f"No cached response for sample {sample_index} of this prompt", provider=self.provider)
+        return key, cached
+
+    def _cache_store(self, key: Optional[str], response: str) -> None:
+        if key is not None:
+            self.cache.put(key, response)
+
+    def generate_response(self, persona_prompt: str, user_prompt: str, max_tokens: int = 512, temperature: float = 0.7, sample_index: int = 0) -> str:
+        """Blocking single completion (no rate limiting)."""
+        key, cached = self._cache_lookup(persona_prompt, user_prompt, max_tokens, temperature, sample_index)
+        if cached is not None:
+            return cached
+        try:
+            completion = self.client.chat.completions.create(
+                model=self.model_name,
+                messages=self._messages(persona_prompt, user_prompt),
+                temperature=temperature,
+                max_tokens=max_tokens,
+            )
+        except Exception as e:
+            raise classify_error(e, self.provider) from e
+        self._record_usage(completion)
+        response = self._content(completion)
+        self._cache_store(key, response)
+        return response
+
+    async def _create_completion(self, messages: List[Dict[str, str]], max_tokens: int, temperature: float, **kwargs):
+        """Issue one chat completion through the rate limiter."""
+        client = self.async_client
+        estimated = sum(estimate_tokens(m["content"]) for m in messages) + max_tokens * kwargs.get("n", 1)
+
+        async def _call():
+            return await client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                **kwargs,
+            )
+
+        completion = await self.rate_limiter.run(_call, estimated_tokens=estimated, usage_tokens=self._usage_tokens)
+        self._record_usage(completion)
+        return completion
+
+    async def generate_response_async(self, persona_prompt: str, user_prompt: str, max_tokens: int = 512, temperature: float = 0.7, sample_index: int = 0) -> str:
+        key, cached = self._cache_lookup(persona_prompt, user_prompt, max_tokens, temperature, sample_index)
+        if cached is not None:
+            return cached
+        completion = await self._create_completion(self._messages(persona_prompt, user_prompt), max_tokens, temperature)
+        response = self._content(completion)
+        self._cache_store(key, response)
+        return response
+
+    async def generate_responses_async(
+        self,
+        persona_prompt: str,
+        user_prompt: str,
+        n: int,
+        max_tokens: int = 512,
+        temperature: float = 0.7,
+        first_sample_index: int = 0,
+    ) -> List[str]:
+        """Draw `n` independent completions of one prompt.
+
+        Uses the OpenAI-compatible `n` parameter so a group of agents with an
+        identical persona costs one request (and one prompt) instead of `n`.
+        Sample `i` is cached under `first_sample_index + i`, matching what
+        `generate_response_async` would use for the same agent.
+        """
+        responses: List[Optional[str]] = [None] * n
+        keys: List[Optional[str]] = [None] * n
+        for i in range(n):
+            keys[i], responses[i] = self._cache_lookup(persona_prompt, user_prompt, max_tokens, temperature, first_sample_index + i)
+
+        messages = self._messages(persona_prompt, user_prompt)
+        missing = [i for i, r in enumerate(responses) if r is None]
+        while missing:
+            batch = missing[:self.max_n]
+            kwargs = {"n": len(batch)} if len(batch) > 1 else {}
+            completion = await self._create_completion(messages, max_tokens, temperature, **kwargs)
+            if not completion.choices:
+                raise LLMError("Provider returned no choices", provider=self.provider)
+            # Some providers silently ignore `n`; keep asking until every slot is filled
+            for slot, choice_index in zip(batch, range(len(completion.choices))):
+                responses[slot] = self._content(completion, choice_index)
+                self._cache_store(keys[slot], responses[slot])
+            missing = [i for i, r in enumerate(responses) if r is None]
+        return responses
+
+    async def score_options_async(
+        self,
+        persona_prompt: str,
+        user_prompt: str,
+        options: Sequence[str] = ANSWER_OPTIONS,
+        temperature: float = 0.7,
+        top_logprobs: int = 20,
+        max_tokens: int = 3,
+        sample_index: int = 0,
+    ) -> Dict[str, float]:
+        """Score the answer options with one short logprob request.
+
+        Asks for a few tokens with `logprobs`/`top_logprobs` and converts the
+        first non-blank token's alternatives into a probability distribution
+        over `options`. If the provider returns no usable logprobs, the
+        generated text is normalized and returned as a one-hot distribution.
+
+        Returns:
+            Dict mapping every option to a probability; values sum to 1.
+        """
+        key, cached = self._cache_lookup(
+            persona_prompt, user_prompt, max_tokens, temperature, sample_index,
+            mode="logprobs", top_logprobs=top_logprobs, options=list(options),
+        )
+        if cached is not None:
+            return json.loads(cached)
+
+        completion = await self._create_completion(
+            self._messages(persona_prompt, user_prompt), max_tokens, temperature,
+            logprobs=True, top_logprobs=top_logprobs,
+        )
+        distribution = None
+        choice = completion.choices[0] if completion.choices else None
+        logprobs = getattr(choice, "logprobs", None)
+        for position in (getattr(logprobs, "content", None) or []):
+            if not position.token.strip():
+                continue
+            alternatives = [(alt.token, alt.logprob) for alt in (position.top_logprobs or [])]
+            distribution = distribution_from_top_logprobs(alternatives or [(position.token, position.logprob)], options)
+            break
+        if distribution is None:
+            # Constrained-choice fallback: read the sampled text instead
+            answer = normalize_response(self._content(completion)) if choice is not None else "invalid_response"
+            if answer not in options:
+                raise LLMError(f"Could not score options from completion: {answer}", provider=self.provider)
+            distribution = {o: float(o == answer) for o in options}
+        self._cache_store(key, json.dumps(distribution))
+        return distribution
+
+    async def stream_response_async(
+        self,
+        persona_prompt: str,
+        user_prompt: str,
+        max_tokens: int = 512,
+        temperature: float = 0.7,
+        stop_on_answer: bool = False,
+        options: Sequence[str] = ANSWER_OPTIONS,
+        sample_index: int = 0,
+    ) -> StreamResult:
+        """Stream a completion through an incremental answer parser.
+
+        Args:
+            stop_on_answer: Cancel the stream as soon as an option is
+                recognized ("answer-only" runs). Otherwise the full text,
+                including any reasoning, is read and returned.
+
+        Returns:
+            StreamResult with the text received, the parsed answer and timings.
+        """
+        key, cached = self._cache_lookup(
+            persona_prompt, user_prompt, max_tokens, temperature, sample_index,
+            mode="stream", stop_on_answer=stop_on_answer,
+        )
+        if cached is not None:
+            parser = IncrementalAnswerParser(options)
+            parser.feed(cached)
+            return StreamResult(text=cached, answer=parser.finish(), cached=True)
+
+        client = self.async_client
+        messages = self._messages(persona_prompt, user_prompt)
+        requested = time.monotonic()
+        state: Dict = {}
+
+        async def _call():
+            parser = IncrementalAnswerParser(options)
+            state.clear()
+            state["queue_wait"] = time.monotonic() - requested
+            state["parser"] = parser
+            stream = await client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+            )
+            chunks = 0
+            try:
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content or ""
+                    if not delta:
+                        continue
+                    chunks += 1
+                    if "ttft" not in state:
+                        state["ttft"] = time.monotonic() - requested
+                    if parser.feed(delta) is not None and "tta" not in state:
+                        state["tta"] = time.monotonic() - requested
+                        if stop_on_answer:
+                            state["cancelled"] = True
+                            break
+            finally:
+                state["chunks"] = chunks
+                # Always release the connection back to the shared pool: after
+                # an early stop (which also aborts generation on the provider
+                # side), a transport error, or cancellation (hedge loser,
+                # aborted run, Ctrl-C)
+                await stream.close()
+            return parser
+
+        estimated = sum(estimate_tokens(m["content"]) for m in messages) + max_tokens
+        parser = await self.rate_limiter.run(_call, estimated_tokens=estimated)
+        answer = parser.finish()
+        text = parser.text.strip()
+        self._cache_store(key, text)
+        if state.get("ttft") is not None:
+            metrics.observe("ttft_seconds", state["ttft"], self.metric_labels)
+        return StreamResult(
+            text=text,
+            answer=answer,
+            queue_wait=state.get("queue_wait", 0.0),
+            time_to_first_token=state.get("ttft"),
+            time_to_answer=state.get("tta"),
+            total_time=time.monotonic() - requested,
+            completion_chunks=state.get("chunks", 0),
+            cancelled=state.get("cancelled", False),
+        )
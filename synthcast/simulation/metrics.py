@@ -0,0 +1,383 @@
+"""
+Low-overhead run instrumentation.
+
+The hot path (rate limiter, agents, simulation) reports through the
+module-level `observe` and `inc`. These are no-ops unless a
+`MetricsRegistry` has been activated with `collecting`. Recording a value is
+a context-variable read, a dict lookup and a bisect over fixed bucket bounds,
+cheap enough to leave on for every call of a 50k-agent run.
+
+Every series is labelled with (country, model, backend), and errors also
+with their class. Model and backend come from the agent; country is set per
+task by the simulation with `set_labels`, so breakdowns need no extra
+bookkeeping.
+
+Recorded series:
+
+    call_seconds         histogram  whole call incl. queueing, retries and backoff
+    queue_wait_seconds   histogram  time waiting on rate limits and concurrency
+    request_seconds      histogram  provider latency of the successful attempt
+    ttft_seconds         histogram  time to first streamed token
+    retries              histogram  retries per call
+    calls_total          counter    completed calls
+    errors_total         counter    failed attempts, labelled by error class
+    prompt_tokens_total, cached_tokens_total, completion_tokens_total
+                         counters   provider-reported usage
+    agents_total         counter    agents answered
+
+Exports: `MetricsRegistry.summary()` (run summary JSON, with breakdowns by
+country, model and backend, cost, and throughput per second) and
+`prometheus_text()` (Prometheus text exposition, written to a file or served
+with `serve_prometheus`).
+"""
+
+import bisect
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+LABEL_NAMES = ("country", "model", "backend", "error")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13)
+
+HISTOGRAM_BUCKETS = {
+    "call_seconds": LATENCY_BUCKETS,
+    "queue_wait_seconds": LATENCY_BUCKETS,
+    "request_seconds": LATENCY_BUCKETS,
+    "ttft_seconds": LATENCY_BUCKETS,
+    "retries": COUNT_BUCKETS,
+}
+
+# Price per million tokens: (prompt, cached prompt, completion)
+Prices = Dict[str, Tuple[float, float, float]]
+
+
+def _finite(value):
+    """`value` with every NaN or infinite float replaced by None, for strict JSON."""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {k: _finite(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_finite(v) for v in value]
+    return value
+
+
+class Histogram:
+    """Fixed-bucket histogram (Prometheus semantics: `le` upper bounds)."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: "Histogram") -> None:
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.sum += other.sum
+        self.count += other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Quantile estimate, interpolated linearly within its bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else lower
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.bounds[-1]
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": {("+Inf" if i == len(self.bounds) else str(self.bounds[i])): n for i, n in enumerate(self.counts) if n},
+        }
+
+
+class MetricsRegistry:
+    """Histograms, counters and a per-second throughput timeline for one run.
+
+    Args:
+        run_id: Run the metrics belong to
+        prices: Optional per-model token prices (USD per million prompt,
+            cached prompt and completion tokens) for cost estimates
+    """
+
+    def __init__(self, run_id: Optional[str] = None, prices: Optional[Prices] = None):
+        self.run_id = run_id
+        self.prices = prices or {}
+        self.started = time.time()
+        self._start = time.monotonic()
+        self.histograms: Dict[Tuple[str, Tuple], Histogram] = {}
+        self.counters: Dict[Tuple[str, Tuple], float] = {}
+        self.throughput: List[int] = []
+        # Creating series and exporting take the lock; updates to an existing
+        # series don't, so a concurrent export may be off by an in-flight value
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float, labels: Tuple) -> None:
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(key, Histogram(HISTOGRAM_BUCKETS.get(name, LATENCY_BUCKETS)))
+        histogram.observe(value)
+
+    def inc(self, name: str, amount: float, labels: Tuple) -> None:
+        key = (name, labels)
+        if key not in self.counters:
+            with self._lock:
+                self.counters.setdefault(key, 0)
+        self.counters[key] += amount
+        if name == "calls_total":
+            second = int(time.monotonic() - self._start)
+            if second >= len(self.throughput):
+                self.throughput.extend([0] * (second + 1 - len(self.throughput)))
+            self.throughput[second] += int(amount)
+
+    def _snapshot(self):
+        with self._lock:
+            return list(self.histograms.items()), list(self.counters.items())
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        """Merge of every `name` series matching `labels`."""
+        wanted = [(LABEL_NAMES.index(k), v) for k, v in labels.items()]
+        total = Histogram(HISTOGRAM_BUCKETS.get(name, LATENCY_BUCKETS))
+        for (series, values), histogram in self._snapshot()[0]:
+            if series == name and all(values[i] == v for i, v in wanted):
+                total.merge(histogram)
+        return total
+
+    def counter(self, name: str, **labels) -> float:
+        wanted = [(LABEL_NAMES.index(k), v) for k, v in labels.items()]
+        return sum(
+            value for (series, values), value in self._snapshot()[1]
+            if series == name and all(values[i] == v for i, v in wanted)
+        )
+
+    def _cost(self, counters: Dict[str, float], model: Optional[str]) -> Optional[float]:
+        price = self.prices.get(model) if model is not None else None
+        if price is None:
+            return None
+        prompt, cached, completion = price
+        uncached = counters.get("prompt_tokens_total", 0) - counters.get("cached_tokens_total", 0)
+        return (
+            uncached * prompt + counters.get("cached_tokens_total", 0) * cached
+            + counters.get("completion_tokens_total", 0) * completion
+        ) / 1e6
+
+    def breakdown(self, label: str) -> Dict[str, Dict]:
+        """Calls, errors, tokens, cost and latency percentiles per value of `label`."""
+        index = LABEL_NAMES.index(label)
+        histograms, counters = self._snapshot()
+        rows: Dict[str, Dict] = {}
+        costs: Dict[str, Optional[float]] = {}
+        by_model: Dict[Tuple[str, str], Dict[str, float]] = {}
+        for (name, values), value in counters:
+            key = values[index] or "unknown"
+            row = rows.setdefault(key, {})
+            row[name] = row.get(name, 0) + value
+            model_counters = by_model.setdefault((key, values[1]), {})
+            model_counters[name] = model_counters.get(name, 0) + value
+        for (key, model), model_counters in by_model.items():
+            cost = self._cost(model_counters, model)
+            if cost is not None:
+                costs[key] = (costs.get(key) or 0.0) + cost
+        merged: Dict[Tuple[str, str], Histogram] = {}
+        for (name, values), histogram in histograms:
+            key = values[index] or "unknown"
+            target = merged.setdefault((key, name), Histogram(histogram.bounds))
+            target.merge(histogram)
+        for (key, name), histogram in merged.items():
+            row = rows.setdefault(key, {})
+            row[f"{name}_p50"] = histogram.quantile(0.5)
+            row[f"{name}_p99"] = histogram.quantile(0.99)
+        for key, row in rows.items():
+            row["cost_usd"] = round(costs[key], 6) if key in costs else None
+        return rows
+
+    def summary(self) -> Dict:
+        """Run summary: totals, breakdowns, full series and throughput.
+
+        NaN and infinite values (a non-finite observation poisons its
+        histogram's sum) are reported as None.
+        """
+        histograms, counters = self._snapshot()
+        duration = time.monotonic() - self._start
+        totals: Dict[str, float] = {}
+        for (name, _), value in counters:
+            totals[name] = totals.get(name, 0) + value
+        costs = [c["cost_usd"] for c in self.breakdown("model").values() if c["cost_usd"] is not None]
+
+        def _labels(values):
+            return {k: v for k, v in zip(LABEL_NAMES, values) if v is not None}
+
+        def _series_name(item):
+            return item[0][0], tuple(v or "" for v in item[0][1])
+
+        series: Dict[str, List] = {}
+        for (name, values), histogram in sorted(histograms, key=_series_name):
+            series.setdefault(name, []).append({"labels": _labels(values), **histogram.to_dict()})
+        counter_series: Dict[str, List] = {}
+        for (name, values), value in sorted(counters, key=_series_name):
+            counter_series.setdefault(name, []).append({"labels": _labels(values), "value": value})
+        return _finite({
+            "run_id": self.run_id,
+            "started": self.started,
+            "duration_seconds": round(duration, 3),
+            "totals": {
+                **totals,
+                "calls_per_second": round(totals.get("calls_total", 0) / duration, 3) if duration > 0 else None,
+                "cost_usd": round(sum(costs), 6) if costs else None,
+            },
+            "call_seconds": self.histogram("call_seconds").to_dict(),
+            "queue_wait_seconds": self.histogram("queue_wait_seconds").to_dict(),
+            "request_seconds": self.histogram("request_seconds").to_dict(),
+            "by_country": self.breakdown("country"),
+            "by_model": self.breakdown("model"),
+            "by_backend": self.breakdown("backend"),
+            "histograms": series,
+            "counters": counter_series,
+            "throughput": {"interval_seconds": 1, "calls": list(self.throughput)},
+        })
+
+    def prometheus_text(self, prefix: str = "synthcast_") -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        histograms, counters = self._snapshot()
+        lines: List[str] = []
+
+        def _label_text(values, extra=None) -> str:
+            pairs = [(k, v) for k, v in zip(LABEL_NAMES, values) if v is not None]
+            if self.run_id:
+                pairs.append(("run_id", self.run_id))
+            if extra:
+                pairs.append(extra)
+            if not pairs:
+                return ""
+            escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+            return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+        typed = set()
+        for (name, values), histogram in sorted(histograms, key=lambda item: item[0][0]):
+            metric = prefix + name
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            cumulative = 0
+            for i, n in enumerate(histogram.counts):
+                cumulative += n
+                le = "+Inf" if i == len(histogram.bounds) else repr(float(histogram.bounds[i]))
+                lines.append(f"{metric}_bucket{_label_text(values, ('le', le))} {cumulative}")
+            lines.append(f"{metric}_sum{_label_text(values)} {histogram.sum}")
+            lines.append(f"{metric}_count{_label_text(values)} {histogram.count}")
+        for (name, values), value in sorted(counters, key=lambda item: item[0][0]):
+            metric = prefix + name
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{_label_text(values)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, directory: str) -> Tuple[str, str]:
+        """Write `<run_id>.json` (summary) and `<run_id>.prom` to `directory`."""
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        stem = Path(directory) / (self.run_id or "metrics")
+        summary_path, prom_path = f"{stem}.json", f"{stem}.prom"
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2, allow_nan=False)
+        with open(f"{prom_path}.tmp", "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        # Atomic, for Prometheus textfile collectors reading the directory
+        Path(f"{prom_path}.tmp").replace(prom_path)
+        return summary_path, prom_path
+
+
+_registry: ContextVar[Optional[MetricsRegistry]] = ContextVar("synthcast_metrics", default=None)
+_labels: ContextVar[Dict[str, str]] = ContextVar("synthcast_metric_labels", default={})
+
+
+@contextmanager
+def collecting(registry: Optional[MetricsRegistry]) -> Iterator[Optional[MetricsRegistry]]:
+    """Record metrics into `registry` in this context (and tasks started from it)."""
+    token = _registry.set(registry)
+    try:
+        yield registry
+    finally:
+        _registry.reset(token)
+
+
+def current() -> Optional[MetricsRegistry]:
+    return _registry.get()
+
+
+def set_labels(**labels: str) -> None:
+    """Set default labels (e.g. country) for the current task's metrics."""
+    _labels.set({**_labels.get(), **labels})
+
+
+def _label_values(labels: Dict[str, str]) -> Tuple:
+    merged = {**_labels.get(), **labels}
+    return tuple(merged.get(name) for name in LABEL_NAMES)
+
+
+def observe(name: str, value: float, labels: Dict[str, str]) -> None:
+    registry = _registry.get()
+    if registry is not None:
+        registry.observe(name, value, _label_values(labels))
+
+
+def inc(name: str, amount: float = 1, labels: Optional[Dict[str, str]] = None) -> None:
+    registry = _registry.get()
+    if registry is not None:
+        registry.inc(name, amount, _label_values(labels or {}))
+
+
+def serve_prometheus(registry: Callable[[], Optional[MetricsRegistry]], port: int = 9464, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serve `registry()`'s Prometheus text on http://host:port/metrics from a
+    daemon thread. Returns the server (call `shutdown()` to stop it).
+    """
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            current_registry = registry()
+            body = (current_registry.prometheus_text() if current_registry is not None else "").encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="synthcast-metrics", daemon=True).start()
+    return server
@@ -0,0 +1,477 @@
+"""
+Multi-period simulation with bounded, indexed agent memory.
+
+`MultiPeriodSimulation` runs a sequence of `Period`s over the same agents.
+Between periods every agent keeps:
+
+- an emotional state: four floats in [-1, 1] (see `EMOTIONS`) that move
+  towards each period's shock and persist across periods;
+- episodic memories in a shared `MemoryStore`: one columnar table for the
+  whole population (owner, text id, period, valence, importance) whose
+  distinct texts are embedded once into a float16 matrix;
+- a summary of older memories: a running mean valence, an event count and
+  the few most important folded events.
+
+Each period, the memories most relevant to the period's question are
+retrieved for all agents at once. The score is cosine similarity (a NumPy
+top-k over the text matrix) weighted by importance and exponential recency
+decay. They are rendered after the persona together with the emotional state
+and the summary, within `MemorySettings.token_budget`. Memories beyond
+`max_episodic` per agent are folded into the summary after every period, so
+neither storage per agent nor prompt length grows with the number of
+periods.
+
+Embeddings default to `hash_embed`, a local feature-hashing embedder; pass
+`embed=` to use a real embedding model.
+
+Example:
+    sim = MultiPeriodSimulation({"DEU": 1000}, seed=1)
+    history = sim.run([
+        Period("Will you cut spending next quarter?"),
+        Period("Will you cut spending next quarter?", event="Energy prices doubled this winter",
+               valence=-0.8, importance=0.9, shock={"financial_anxiety": 0.7}),
+    ])
+"""
+
+import json
+import re
+import zlib
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from synthcast.simulation.aggregation import OPTION_SCORES
+from synthcast.simulation.llm_agent import estimate_tokens
+from synthcast.simulation.simulation import Simulation, country_iso_code
+
+EMOTIONS = ("financial_anxiety", "job_security_confidence", "future_optimism", "spending_confidence")
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+@dataclass(frozen=True)
+class MemorySettings:
+    """Memory, retrieval and prompt-budget policy.
+
+    Attributes:
+        embedding_dim: Dimension of `hash_embed` vectors.
+        top_k: Memories retrieved per agent and period.
+        max_episodic: Memories kept per agent; older ones are folded into
+            the agent's summary.
+        summary_events: Folded events kept verbatim in the summary.
+        decay: Retrieval weight multiplier per period of memory age.
+        token_budget: Estimated tokens allowed for the rendered state
+            (emotions, memories and summary) in each prompt.
+        emotional_persistence: Share of the previous emotional state kept
+            each period; the rest moves towards the period's impulse.
+        answer_importance: Importance of an agent's own past answers.
+    """
+
+    embedding_dim: int = 256
+    top_k: int = 4
+    max_episodic: int = 8
+    summary_events: int = 3
+    decay: float = 0.85
+    token_budget: int = 200
+    emotional_persistence: float = 0.7
+    answer_importance: float = 0.3
+
+
+@dataclass
+class Period:
+    """One period of a multi-period run.
+
+    Attributes:
+        question: Question asked to every agent this period.
+        context: Economic conditions shown with the question.
+        event: Experience added to agents' memories this period, if any.
+        valence: Emotional valence of the event (-1 to 1).
+        importance: Importance of the event (0 to 1).
+        shock: Emotional impulse per `EMOTIONS` dimension (-1 to 1).
+        answer_effect: Per-dimension weight of the agent's own answer
+            (scored with `OPTION_SCORES`) in its emotional impulse.
+        countries: Countries the event and shock apply to (default: all).
+    """
+
+    question: str
+    context: str = ""
+    event: Optional[str] = None
+    valence: float = 0.0
+    importance: float = 0.5
+    shock: Dict[str, float] = field(default_factory=dict)
+    answer_effect: Dict[str, float] = field(default_factory=dict)
+    countries: Optional[Sequence[str]] = None
+
+
+def hash_embed(texts: Sequence[str], dim: int = 256) -> np.ndarray:
+    """L2-normalized feature-hashing embeddings of word unigrams and bigrams."""
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        words = _TOKEN_PATTERN.findall(text.lower())
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            h = zlib.crc32(feature.encode("utf-8"))
+            vectors[row, h % dim] += 1.0 if h & 0x80000000 else -1.0
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def _rank_within(keys: np.ndarray) -> np.ndarray:
+    """Position of each element within its run of equal keys (keys sorted)."""
+    n = len(keys)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    starts = np.r_[0, np.flatnonzero(keys[1:] != keys[:-1]) + 1]
+    return np.arange(n) - np.repeat(starts, np.diff(np.r_[starts, n]))
+
+
+class MemoryStore:
+    """Columnar episodic memory for a whole population.
+
+    Args:
+        agent_count: Number of agents (memory owners are agent indices)
+        settings: Memory settings
+        embed: Callable mapping a list of texts to an (n, dim) array
+    """
+
+    _COLUMNS = (("owner", np.int32), ("text", np.int32), ("period", np.int16), ("valence", np.float16), ("importance", np.float16))
+
+    def __init__(self, agent_count: int, settings: Optional[MemorySettings] = None, embed: Optional[Callable[[Sequence[str]], np.ndarray]] = None):
+        self.settings = settings or MemorySettings()
+        self.agent_count = agent_count
+        self.embed = embed or (lambda texts: hash_embed(texts, self.settings.embedding_dim))
+        self.texts: List[str] = []
+        self._text_ids: Dict[str, int] = {}
+        self._vectors: Optional[np.ndarray] = None
+        for name, dtype in self._COLUMNS:
+            setattr(self, name, np.empty(0, dtype=dtype))
+        s = self.settings.summary_events
+        self.summary_text = np.full((agent_count, s), -1, dtype=np.int32)
+        self.summary_importance = np.zeros((agent_count, s), dtype=np.float16)
+        self.summary_valence = np.zeros(agent_count, dtype=np.float32)
+        self.summary_count = np.zeros(agent_count, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.owner)
+
+    def _intern(self, texts: Sequence[str]) -> np.ndarray:
+        new = [t for t in dict.fromkeys(texts) if t not in self._text_ids]
+        if new:
+            vectors = np.asarray(self.embed(new), dtype=np.float16)
+            for text in new:
+                self._text_ids[text] = len(self.texts)
+                self.texts.append(text)
+            self._vectors = vectors if self._vectors is None else np.concatenate([self._vectors, vectors])
+        return np.fromiter((self._text_ids[t] for t in texts), dtype=np.int32, count=len(texts))
+
+    def add(self, owners: Sequence[int], texts, period: int, valence=0.0, importance=0.5) -> None:
+        """Add memories for `owners`; `texts`, `valence` and `importance` may be
+        scalars (shared by every owner) or per-owner sequences."""
+        owners = np.asarray(owners, dtype=np.int32)
+        if len(owners) == 0:
+            return
+        if isinstance(texts, str):
+            text_ids = np.full(len(owners), self._intern([texts])[0], dtype=np.int32)
+        else:
+            text_ids = self._intern(list(texts))
+        new = {
+            "owner": owners,
+            "text": text_ids,
+            "period": np.full(len(owners), period, dtype=np.int16),
+            "valence": np.broadcast_to(np.asarray(valence, dtype=np.float16), owners.shape),
+            "importance": np.broadcast_to(np.asarray(importance, dtype=np.float16), owners.shape),
+        }
+        for name, _ in self._COLUMNS:
+            setattr(self, name, np.concatenate([getattr(self, name), new[name]]))
+
+    def compact(self) -> int:
+        """Fold memories beyond `max_episodic` per agent (oldest and least
+        important first) into the agents' summaries. Returns the number folded."""
+        if not len(self):
+            return 0
+        order = np.lexsort((-self.importance.astype(np.float32), -self.period, self.owner))
+        rank = _rank_within(self.owner[order])
+        fold = order[rank >= self.settings.max_episodic]
+        if fold.size == 0:
+            return 0
+
+        owners = self.owner[fold]
+        added = np.bincount(owners, minlength=self.agent_count)
+        sums = np.bincount(owners, weights=self.valence[fold].astype(np.float64), minlength=self.agent_count)
+        total = self.summary_count + added
+        touched = added > 0
+        self.summary_valence[touched] = (
+            (self.summary_valence[touched] * self.summary_count[touched] + sums[touched]) / total[touched]
+        )
+        self.summary_count = total.astype(np.int32)
+
+        # Keep the most important of the existing notable events and the folded ones
+        held_owner, held_slot = np.nonzero(self.summary_text >= 0)
+        cand_owner = np.concatenate([held_owner.astype(np.int32), owners])
+        cand_text = np.concatenate([self.summary_text[held_owner, held_slot], self.text[fold]])
+        cand_importance = np.concatenate([self.summary_importance[held_owner, held_slot], self.importance[fold]])
+        order = np.lexsort((-cand_importance.astype(np.float32), cand_owner))
+        slot = _rank_within(cand_owner[order])
+        keep = order[slot < self.settings.summary_events]
+        slot = slot[slot < self.settings.summary_events]
+        self.summary_text.fill(-1)
+        self.summary_importance.fill(0)
+        self.summary_text[cand_owner[keep], slot] = cand_text[keep]
+        self.summary_importance[cand_owner[keep], slot] = cand_importance[keep]
+
+        alive = np.ones(len(self), dtype=bool)
+        alive[fold] = False
+        for name, _ in self._COLUMNS:
+            setattr(self, name, getattr(self, name)[alive])
+        return int(fold.size)
+
+    def retrieve(self, query: str, period: int, k: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k memories per agent for `query` at `period`.
+
+        Returns:
+            (offsets, memories): memory row indices for agent `i` are
+            `memories[offsets[i]:offsets[i + 1]]`, best first
+        """
+        k = self.settings.top_k if k is None else k
+        if not len(self) or k <= 0:
+            return np.zeros(self.agent_count + 1, dtype=np.int64), np.empty(0, dtype=np.int64)
+        q = np.asarray(self.embed([query]), dtype=np.float32)[0]
+        similarity = self._vectors.astype(np.float32) @ q
+        relevance = (1.0 + similarity[self.text]) / 2.0
+        recency = self.settings.decay ** (period - self.period).astype(np.float32)
+        score = relevance * self.importance.astype(np.float32) * recency
+        order = np.lexsort((-score, self.owner))
+        chosen = order[_rank_within(self.owner[order]) < k]
+        offsets = np.searchsorted(self.owner[chosen], np.arange(self.agent_count + 1))
+        return offsets, chosen
+
+    def state(self) -> Dict[str, np.ndarray]:
+        arrays = {f"memory_{name}": getattr(self, name) for name, _ in self._COLUMNS}
+        arrays.update({
+            "summary_text": self.summary_text,
+            "summary_importance": self.summary_importance,
+            "summary_valence": self.summary_valence,
+            "summary_count": self.summary_count,
+            "texts": np.frombuffer(json.dumps(self.texts).encode("utf-8"), dtype=np.uint8),
+        })
+        if self._vectors is not None:
+            arrays["vectors"] = self._vectors
+        return arrays
+
+    def restore(self, arrays) -> None:
+        for name, _ in self._COLUMNS:
+            setattr(self, name, arrays[f"memory_{name}"])
+        for name in ("summary_text", "summary_importance", "summary_valence", "summary_count"):
+            setattr(self, name, arrays[name])
+        self.texts = json.loads(arrays["texts"].tobytes().decode("utf-8"))
+        self._text_ids = {t: i for i, t in enumerate(self.texts)}
+        self._vectors = arrays["vectors"] if "vectors" in arrays else None
+
+
+def _level(value: float) -> str:
+    if value <= -0.5:
+        return "very low"
+    if value < -0.15:
+        return "low"
+    if value <= 0.15:
+        return "moderate"
+    if value < 0.5:
+        return "high"
+    return "very high"
+
+
+def _tone(valence: float) -> str:
+    if valence <= -0.2:
+        return "mostly negative"
+    if valence >= 0.2:
+        return "mostly positive"
+    return "mixed"
+
+
+class MultiPeriodSimulation(Simulation):
+    """`Simulation` over several periods with memory and emotional state.
+
+    Args:
+        memory_settings: Retrieval, summarization and prompt-budget policy
+        years_per_period: Years agents age per period (0.25 for quarters)
+        embed: Embedding function for memories (default: `hash_embed`)
+        **kwargs: Passed to `Simulation`
+    """
+
+    def __init__(
+        self,
+        *args,
+        memory_settings: Optional[MemorySettings] = None,
+        years_per_period: float = 0.25,
+        embed: Optional[Callable[[Sequence[str]], np.ndarray]] = None,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.memory_settings = memory_settings or MemorySettings()
+        self.years_per_period = years_per_period
+        self.period = 0
+        self.emotions = np.zeros((len(self.agents), len(EMOTIONS)), dtype=np.float32)
+        self.memory = MemoryStore(len(self.agents), self.memory_settings, embed=embed)
+        self._persona_ids = np.array([a["persona_id"] for a in self.agents], dtype=np.int64)
+        self._countries = np.array([a["country_code"] for a in self.agents])
+        self._age_offset = 0
+        self._retrieved: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def _period_question(self, period: Period) -> str:
+        if period.context:
+            return f"Economic conditions: {period.context}\n\n{period.question}"
+        return period.question
+
+    def _rebase_personas(self) -> None:
+        """Age personas by the whole years elapsed since the first period."""
+        self._age_offset = int(self.years_per_period * (self.period - 1))
+
+    def _state(self, agent: Dict) -> str:
+        return self.render_state(agent["index"], *self._retrieved)
+
+    def _persona(self, agent: Dict) -> str:
+        """Aged persona followed by the agent's state of mind and memories this period."""
+        if self._retrieved is None:
+            return super()._persona(agent)
+        base = self.population.render(agent["persona_id"], self._age_offset)
+        return f"{base}\n\n{self._state(agent)}"
+
+    def _persona_key(self, agent: Dict):
+        if self._retrieved is None:
+            return super()._persona_key(agent)
+        return agent["persona_key"], self._state(agent)
+
+    def render_state(self, i: int, offsets: np.ndarray, memories: np.ndarray) -> str:
+        """Render agent `i`'s emotional state, memories and summary within the token budget."""
+        memory = self.memory
+        budget = self.memory_settings.token_budget
+        emotions = ", ".join(
+            f"{name.replace('_', ' ')} {_level(v)}" for name, v in zip(EMOTIONS, self.emotions[i])
+        )
+        sections = [f"Your current state of mind: {emotions}."]
+        used = estimate_tokens(sections[0])
+
+        recalled = []
+        for m in memories[offsets[i]:offsets[i + 1]]:
+            line = f"- Period {memory.period[m]}: {memory.texts[memory.text[m]]}"
+            cost = estimate_tokens(line)
+            if used + cost > budget:
+                break
+            recalled.append(line)
+            used += cost
+        if recalled:
+            sections.append("Experiences that come to mind:\n" + "\n".join(recalled))
+            used += 6
+
+        if memory.summary_count[i]:
+            notable = [memory.texts[t] for t in memory.summary_text[i] if t >= 0]
+            while True:
+                line = f"Earlier on you had {memory.summary_count[i]} {_tone(memory.summary_valence[i])} experiences"
+                line += f", notably: {'; '.join(notable)}." if notable else "."
+                if used + estimate_tokens(line) <= budget or not notable:
+                    break
+                notable.pop()
+            if used + estimate_tokens(line) <= budget:
+                sections.append(line)
+        return "\n".join(sections)
+
+    def _prepare_agents(self, period: Period) -> None:
+        self._rebase_personas()
+        self._retrieved = self.memory.retrieve(self._period_question(period), self.period)
+
+    def _absorb(self, period: Period, results_by_country: Dict[str, List[Dict]]) -> None:
+        """Store this period's experiences and update emotional states."""
+        settings = self.memory_settings
+        index_of = {int(pid): i for i, pid in enumerate(self._persona_ids)}
+        answered, answers = [], []
+        for records in results_by_country.values():
+            for record in records:
+                answered.append(index_of[int(record["persona_id"])])
+                answers.append(record["response"])
+        answered = np.array(answered, dtype=np.int64)
+
+        affected = np.arange(len(self.agents))
+        if period.countries is not None:
+            affected = np.flatnonzero(np.isin(self._countries, [country_iso_code(c) for c in period.countries]))
+
+        impulse = np.zeros_like(self.emotions)
+        shock = np.array([period.shock.get(name, 0.0) for name in EMOTIONS], dtype=np.float32)
+        impulse[affected] += shock
+        if period.answer_effect and len(answered):
+            effect = np.array([period.answer_effect.get(name, 0.0) for name in EMOTIONS], dtype=np.float32)
+            scores = np.array([OPTION_SCORES.get(a, 0.0) for a in answers], dtype=np.float32)
+            impulse[answered] += scores[:, None] * effect
+        p = settings.emotional_persistence
+        self.emotions = np.clip(p * self.emotions + (1.0 - p) * np.clip(impulse, -1.0, 1.0), -1.0, 1.0)
+
+        if period.event:
+            self.memory.add(affected, period.event, self.period, period.valence, period.importance)
+        if len(answered):
+            texts = [f'Asked "{period.question}", you answered "{a}".' for a in answers]
+            valence = np.array([OPTION_SCORES.get(a, 0.0) for a in answers], dtype=np.float32) * 0.2
+            self.memory.add(answered, texts, self.period, valence, settings.answer_importance)
+        folded = self.memory.compact()
+        self.logger.info(
+            f"Period {self.period}: {len(self.memory)} memories held, {folded} folded into summaries, "
+            f"{len(self.memory.texts)} distinct texts"
+        )
+
+    def run(
+        self,
+        periods: Sequence[Period],
+        save_results: bool = True,
+        base_path: Optional[str] = None,
+        mode: str = "generate",
+        result_format: str = "json",
+        checkpoint: Optional[bool] = None,
+        state_path: Optional[str] = None,
+    ) -> List[Dict[str, List[Dict]]]:
+        """
+        Run `periods` in order, continuing from the current period.
+
+        Args:
+            periods: Periods to run
+            save_results, base_path, mode, result_format, checkpoint: As for
+                `ask_question`, applied to each period
+            state_path: Save agent state here (`save_state`) after every
+                period, so a long run can be continued with `load_state`
+
+        Returns:
+            Responses by country code for each period
+        """
+        history = []
+        for period in periods:
+            self.period += 1
+            self._prepare_agents(period)
+            results = self.ask_question(
+                self._period_question(period),
+                save_results=save_results,
+                base_path=base_path,
+                mode=mode,
+                result_format=result_format,
+                checkpoint=checkpoint,
+            )
+            self._absorb(period, results)
+            if state_path is not None:
+                self.save_state(state_path)
+            history.append(results)
+        return history
+
+    def save_state(self, path: str) -> None:
+        """Save period, emotional states and memories to a compressed `.npz`."""
+        if not path.endswith(".npz"):
+            path += ".npz"
+        np.savez_compressed(path, period=np.array(self.period), emotions=self.emotions, **self.memory.state())
+
+    def load_state(self, path: str) -> None:
+        """Restore state saved by `save_state` for the same population."""
+        if not path.endswith(".npz"):
+            path += ".npz"
+        with np.load(path) as arrays:
+            arrays = {name: arrays[name] for name in arrays.files}
+        if arrays["emotions"].shape != self.emotions.shape:
+            raise ValueError(f"State in {path} is for {len(arrays['emotions'])} agents, not {len(self.agents)}")
+        self.period = int(arrays.pop("period"))
+        self.emotions = arrays.pop("emotions")
+        self.memory.restore(arrays)
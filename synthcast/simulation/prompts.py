@@ -0,0 +1,176 @@
+"""
+Prompt assembly and token budgeting.
+
+Providers with prefix (KV) caching reuse the longest prompt prefix they have
+seen recently, so a prompt is cheapest when it starts with the content shared
+by the most calls. Two layouts are supported:
+
+- "shared_first": the answer instruction is the system message, identical
+  for every call of every run. The user message holds the question (shared by
+  every agent in the run), then the persona (unique per agent), then any
+  follow-up. A re-ask therefore shares its whole first prompt as a prefix.
+- "persona_first": the original layout and the default, with the persona as
+  the system message and the question plus instruction as the user message.
+  Nothing is shared across agents, but prompts are byte-identical to earlier
+  runs, so cached responses still match.
+
+Changing the layout changes what the model sees, so answers are not strictly
+comparable across layouts; runs opt in to "shared_first", and the layout is
+recorded in each run's journal header and result metadata.
+
+Tokens are counted with `tiktoken` when it is installed, or otherwise
+estimated at ~4 characters per token. `PromptAssembler` enforces a per-call
+prompt budget by trimming the persona section, the only part that varies in
+length between agents.
+"""
+
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple
+
+from synthcast.simulation.errors import LLMError
+from synthcast.simulation.llm_agent import estimate_tokens
+
+PROMPT_LAYOUTS = ("shared_first", "persona_first")
+
+PERSONA_HEADER = "Answer as the following person:\n"
+TRUNCATION_MARK = " [...]"
+
+
+class PromptBudgetError(LLMError):
+    """The shared part of a prompt alone exceeds the prompt token budget."""
+
+    retryable = False
+
+
+def _load_tokenizer(encoding: str) -> Tuple[str, Callable[[str], int]]:
+    try:
+        import tiktoken
+        codec = tiktoken.get_encoding(encoding)
+    except Exception:
+        return "estimate", estimate_tokens
+    return encoding, lambda text: len(codec.encode(text, disallowed_special=()))
+
+
+_TOKENIZERS = {}
+
+
+def get_token_counter(encoding: str = "cl100k_base") -> Tuple[str, Callable[[str], int]]:
+    """Return (tokenizer name, count function); "estimate" without tiktoken."""
+    if encoding not in _TOKENIZERS:
+        _TOKENIZERS[encoding] = _load_tokenizer(encoding)
+    return _TOKENIZERS[encoding]
+
+
+def count_tokens(text: str, encoding: str = "cl100k_base") -> int:
+    return get_token_counter(encoding)[1](text)
+
+
+def followup_instruction(response: str) -> str:
+    """Follow-up block re-asking an agent whose answer could not be normalized."""
+    return (
+        f"Your previous answer was: \"{response}\"\n"
+        "That answer is not acceptable.\n"
+        "You MUST now reply with exactly one of (lowercase):\\n"
+        "very likely\\n"
+        "likely\\n"
+        "unlikely\\n"
+        "highly unlikely\\n\\n"
+        "Return ONLY that phrase and nothing else.\n"
+        "If you cannot decide, choose 'unlikely'."
+    )
+
+
+@dataclass
+class PromptStats:
+    """Local token accounting for the prompts of a run.
+
+    Attributes:
+        calls: Prompts assembled.
+        prompt_tokens: Tokens in those prompts (system + user message).
+        shared_tokens: Tokens in the prefix shared with other agents' prompts.
+        truncated: Prompts whose persona section was trimmed to fit the budget.
+    """
+
+    calls: int = 0
+    prompt_tokens: int = 0
+    shared_tokens: int = 0
+    truncated: int = 0
+
+
+class PromptAssembler:
+    """Builds (system, user) prompts for one run in a given layout.
+
+    Args:
+        question: The run's question (plus any scenario context)
+        instruction: Answer instruction for the run's mode
+        layout: One of PROMPT_LAYOUTS
+        max_prompt_tokens: Per-call prompt budget, or None for no limit
+        encoding: tiktoken encoding used for counting
+
+    Raises:
+        PromptBudgetError: If the question and instruction alone exceed the budget
+    """
+
+    def __init__(self, question: str, instruction: str, layout: str = "persona_first", max_prompt_tokens: Optional[int] = None, encoding: str = "cl100k_base"):
+        if layout not in PROMPT_LAYOUTS:
+            raise ValueError(f"Unknown prompt layout {layout!r}; expected one of {PROMPT_LAYOUTS}")
+        self.question = question
+        self.instruction = instruction
+        self.layout = layout
+        self.max_prompt_tokens = max_prompt_tokens
+        self.tokenizer, self.count = get_token_counter(encoding)
+        self.stats = PromptStats()
+        if layout == "shared_first":
+            self._system = instruction
+            self._shared = f"{question}\n\n{PERSONA_HEADER}"
+            self.shared_prefix_tokens = self.count(self._system) + self.count(self._shared)
+        else:
+            self._system = None
+            self._shared = f"{question}\n{instruction}"
+            self.shared_prefix_tokens = 0
+        fixed = self.count(self._shared) + (self.count(self._system) if self._system else 0)
+        if max_prompt_tokens is not None and fixed >= max_prompt_tokens:
+            raise PromptBudgetError(f"The shared prompt ({fixed} tokens) exceeds the {max_prompt_tokens}-token budget")
+
+    def _fit(self, persona: str, reserved: int) -> str:
+        """Trim `persona` so it fits in what the budget leaves after `reserved` tokens."""
+        if self.max_prompt_tokens is None:
+            return persona
+        room = self.max_prompt_tokens - reserved
+        if room <= 0:
+            raise PromptBudgetError(
+                f"The shared prompt ({reserved} tokens) exceeds the {self.max_prompt_tokens}-token budget"
+            )
+        if self.count(persona) <= room:
+            return persona
+        self.stats.truncated += 1
+        # Cut at a character ratio first, then shrink until the count fits
+        cut = max(0, int(len(persona) * room / self.count(persona)) - len(TRUNCATION_MARK))
+        while cut > 0 and self.count(persona[:cut] + TRUNCATION_MARK) > room:
+            cut = int(cut * 0.95)
+        return persona[:cut] + TRUNCATION_MARK
+
+    def assemble(self, persona: str, followup: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Return (system, user) prompts for an agent.
+
+        Args:
+            persona: The agent's persona prompt
+            followup: Follow-up block for a re-ask (see `followup_instruction`)
+
+        Raises:
+            PromptBudgetError: If the shared part alone exceeds the budget
+        """
+        suffix = f"\nFOLLOW-UP: {followup}" if followup else ""
+        if self.layout == "shared_first":
+            user_suffix = f"\n\n{suffix.lstrip()}" if suffix else ""
+            reserved = self.shared_prefix_tokens + self.count(user_suffix)
+            persona = self._fit(persona, reserved)
+            system, user = self._system, f"{self._shared}{persona}{user_suffix}"
+        else:
+            user = f"{self._shared}{suffix}"
+            system = self._fit(persona, self.count(user))
+        self.stats.calls += 1
+        self.stats.prompt_tokens += self.count(system) + self.count(user)
+        self.stats.shared_tokens += self.shared_prefix_tokens
+        return system, user
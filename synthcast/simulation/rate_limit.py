@@ -0,0 +1,266 @@
+"""
+Adaptive rate limiting for LLM calls.
+
+Two layers sit in front of every provider request:
+
+- `TokenBucket`: caps requests per minute and tokens per minute.
+- `AIMDConcurrencyLimiter`: grows the number of in-flight requests additively
+  while calls succeed quickly and halves it on 429/5xx or latency blow-ups.
+
+`RateLimiter` combines both with retry/backoff: retryable `LLMError`s are
+retried after max(Retry-After, exponential backoff with jitter), and a 429 with
+Retry-After pauses *all* callers of the limiter rather than just one.
+
+The limiter holds no event-loop-bound primitives, so one instance can be shared
+across successive `asyncio.run` calls.
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from synthcast.simulation import metrics
+from synthcast.simulation.errors import LLMError, RateLimitedError, classify_error
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class RateLimitSettings:
+    """Limits and backoff policy for one backend.
+
+    Attributes:
+        requests_per_minute: Request budget, or None for unlimited.
+        tokens_per_minute: Prompt+completion token budget, or None for unlimited.
+        initial_concurrency: Starting in-flight limit.
+        min_concurrency: Floor for multiplicative decrease.
+        max_concurrency: Ceiling for additive increase.
+        decrease_factor: Multiplier applied to the limit on overload.
+        latency_tolerance: Overload is also signalled when a call takes longer
+            than this multiple of the best recently observed latency.
+        max_retries: Retries for retryable errors before giving up.
+        base_backoff: First backoff delay in seconds.
+        max_backoff: Upper bound on a single backoff delay.
+    """
+
+    requests_per_minute: Optional[float] = None
+    tokens_per_minute: Optional[float] = None
+    initial_concurrency: int = 16
+    min_concurrency: int = 1
+    max_concurrency: int = 256
+    decrease_factor: float = 0.5
+    latency_tolerance: float = 4.0
+    max_retries: int = 5
+    base_backoff: float = 0.5
+    max_backoff: float = 60.0
+
+
+class TokenBucket:
+    """Continuous-refill token bucket.
+
+    `capacity` tokens are available per `period` seconds. `acquire` waits until
+    the requested amount is available; `adjust` lets callers correct an
+    estimate once the real cost is known (the balance may go negative).
+    """
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay_for(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available (0 when available now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        while True:
+            delay = self.delay_for(amount)
+            if delay <= 0:
+                self.tokens -= amount
+                return
+            await asyncio.sleep(delay)
+
+    def adjust(self, amount: float) -> None:
+        """Consume (positive) or refund (negative) tokens without waiting."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class AIMDConcurrencyLimiter:
+    """Additive-increase / multiplicative-decrease in-flight request limit."""
+
+    def __init__(self, initial: int = 16, minimum: int = 1, maximum: int = 256, decrease_factor: float = 0.5, latency_tolerance: float = 4.0):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._recent_latencies: Deque[float] = deque(maxlen=200)
+        self._last_decrease = 0.0
+
+    @property
+    def current_limit(self) -> int:
+        return int(self.limit)
+
+    async def acquire(self) -> None:
+        while self.in_flight >= self.current_limit:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+            try:
+                await future
+            finally:
+                if future in self._waiters:
+                    self._waiters.remove(future)
+        self.in_flight += 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        free = self.current_limit - self.in_flight
+        while free > 0 and self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                free -= 1
+
+    def on_success(self, latency: float) -> None:
+        baseline = min(self._recent_latencies) if self._recent_latencies else latency
+        self._recent_latencies.append(latency)
+        if len(self._recent_latencies) >= 10 and latency > baseline * self.latency_tolerance:
+            self._decrease(factor=max(self.decrease_factor, 0.9))
+            return
+        # One extra slot per "window" of `limit` successful calls
+        self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+        self._wake()
+
+    def on_overload(self) -> None:
+        self._decrease(self.decrease_factor)
+
+    def _decrease(self, factor: float) -> None:
+        # A burst of failures from the same window should only back off once
+        now = time.monotonic()
+        if now - self._last_decrease < 1.0:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.minimum), self.limit * factor)
+
+
+class RateLimiter:
+    """Token buckets + AIMD concurrency + retry/backoff for one backend.
+
+    Each call's queue wait, provider latency, retries and error classes are
+    reported to `synthcast.simulation.metrics` under `labels`.
+    """
+
+    def __init__(self, settings: Optional[RateLimitSettings] = None, provider: Optional[str] = None, labels: Optional[Dict[str, str]] = None):
+        self.settings = settings or RateLimitSettings()
+        self.provider = provider
+        self.labels = labels if labels is not None else {"backend": provider}
+        self.request_bucket = TokenBucket(self.settings.requests_per_minute) if self.settings.requests_per_minute else None
+        self.token_bucket = TokenBucket(self.settings.tokens_per_minute) if self.settings.tokens_per_minute else None
+        self.concurrency = AIMDConcurrencyLimiter(
+            initial=self.settings.initial_concurrency,
+            minimum=self.settings.min_concurrency,
+            maximum=self.settings.max_concurrency,
+            decrease_factor=self.settings.decrease_factor,
+            latency_tolerance=self.settings.latency_tolerance,
+        )
+        self._paused_until = 0.0
+
+    def backoff_delay(self, attempt: int, error: Optional[LLMError] = None) -> float:
+        """Delay before retry number `attempt` (1-based), honoring Retry-After."""
+        delay = min(self.settings.max_backoff, self.settings.base_backoff * (2 ** (attempt - 1)))
+        delay = random.uniform(delay / 2, delay)
+        if error is not None and error.retry_after is not None:
+            delay = max(delay, error.retry_after)
+        return delay
+
+    async def _wait_for_pause(self) -> None:
+        while True:
+            remaining = self._paused_until - time.monotonic()
+            if remaining <= 0:
+                return
+            await asyncio.sleep(remaining)
+
+    async def _acquire(self, estimated_tokens: float) -> None:
+        await self._wait_for_pause()
+        if self.request_bucket is not None:
+            await self.request_bucket.acquire(1)
+        if self.token_bucket is not None:
+            await self.token_bucket.acquire(estimated_tokens)
+        await self.concurrency.acquire()
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        estimated_tokens: float = 0.0,
+        usage_tokens: Optional[Callable[[T], Optional[float]]] = None,
+    ) -> T:
+        """Run `call` under the limits, retrying retryable failures.
+
+        Args:
+            call: Zero-argument coroutine factory performing one request.
+            estimated_tokens: Token cost charged to the TPM bucket up front.
+            usage_tokens: Optional function returning the real token cost of a
+                result, used to correct the estimate.
+
+        Raises:
+            LLMError: The last error once retries are exhausted, or the first
+                non-retryable error.
+        """
+        attempt = 0
+        requested = time.monotonic()
+        queue_wait = 0.0
+        while True:
+            queued = time.monotonic()
+            await self._acquire(estimated_tokens)
+            started = time.monotonic()
+            queue_wait += started - queued
+            try:
+                result = await call()
+            except asyncio.CancelledError:
+                self.concurrency.release()
+                raise
+            except Exception as exc:
+                self.concurrency.release()
+                error = classify_error(exc, self.provider)
+                metrics.inc("errors_total", 1, {**self.labels, "error": type(error).__name__})
+                if error.retryable:
+                    self.concurrency.on_overload()
+                if isinstance(error, RateLimitedError) and error.retry_after:
+                    self._paused_until = max(self._paused_until, time.monotonic() + error.retry_after)
+                attempt += 1
+                if not error.retryable or attempt > self.settings.max_retries:
+                    raise error from exc
+                await asyncio.sleep(self.backoff_delay(attempt, error))
+                continue
+            self.concurrency.release()
+            finished = time.monotonic()
+            self.concurrency.on_success(finished - started)
+            metrics.observe("request_seconds", finished - started, self.labels)
+            metrics.observe("queue_wait_seconds", queue_wait, self.labels)
+            metrics.observe("call_seconds", finished - requested, self.labels)
+            metrics.observe("retries", attempt, self.labels)
+            metrics.inc("calls_total", 1, self.labels)
+            if self.token_bucket is not None and usage_tokens is not None:
+                actual = usage_tokens(result)
+                if actual is not None:
+                    self.token_bucket.adjust(actual - estimated_tokens)
+            return result
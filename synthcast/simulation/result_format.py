@@ -0,0 +1,452 @@
+"""
+Compact, compressed per-run result files.
+
+The JSON result files copy the full persona prompt into every response and
+must be parsed whole. A compact result file (`*.scr`) instead stores columns:
+
+- `persona_id`: uint32 row index into a saved population snapshot
+  (`Population.save_to_directory`), referenced by id in the file header
+- `response`: uint8 code into a per-batch codebook of answer strings
+- `distribution`: optional float32 option probabilities (scoring runs)
+- `raw`, `persona`, `extra`: optional text columns (raw completions, persona
+  text for files converted from JSON without persona ids, and any remaining
+  per-record fields as JSON)
+
+Layout::
+
+    MAGIC | u32 header length | header JSON
+    frame*                          u8 kind | u32 length | compressed payload
+    summary frame                   totals and response distribution
+    u64 summary offset | END_MAGIC
+
+Records are written in batches, each one compressed frame, so writers never
+hold a whole run in memory and `iter_compact_batches` streams them back. The
+codec is zstandard when installed, zlib otherwise; the header records which.
+"""
+
+import json
+import struct
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from synthcast.simulation.answers import ANSWER_OPTIONS
+
+RESULT_MAGIC = b"SYNTHRES1\n"
+END_MAGIC = b"SRE1"
+COMPACT_SUFFIX = ".scr"
+
+MISSING_PERSONA_ID = 0xFFFFFFFF
+
+_FRAME_BATCH = 1
+_FRAME_SUMMARY = 2
+
+# Record keys stored in dedicated columns; anything else goes to `extra`
+_COLUMN_KEYS = ("persona_id", "response", "distribution", "raw", "persona")
+
+
+def _codec(name: Optional[str] = None):
+    """Return (name, compress, decompress) for a codec, preferring zstandard."""
+    if name in (None, "zstd"):
+        try:
+            import zstandard
+        except ImportError:
+            if name == "zstd":
+                raise ValueError("This result file is zstd-compressed; install the 'zstandard' package to read it")
+        else:
+            return (
+                "zstd",
+                zstandard.ZstdCompressor(level=3).compress,
+                zstandard.ZstdDecompressor().decompress,
+            )
+    if name not in (None, "zlib"):
+        raise ValueError(f"Unknown result codec '{name}'")
+    return ("zlib", lambda data: zlib.compress(data, 6), zlib.decompress)
+
+
+def _pack_text(values: Sequence[Optional[str]]) -> Dict[str, bytes]:
+    encoded = [(v or "").encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u4")
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return {"offsets": offsets.tobytes(), "data": b"".join(encoded)}
+
+
+def _unpack_text(offsets: np.ndarray, data: bytes) -> List[str]:
+    return [data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+
+@dataclass
+class ResultBatch:
+    """One decoded batch of records.
+
+    `persona_id` and `response` are arrays; `codebook[response[i]]` is the
+    answer string. Optional columns are None when the batch has none.
+    """
+
+    persona_id: np.ndarray
+    response: np.ndarray
+    codebook: List[str]
+    distribution: Optional[np.ndarray] = None
+    distribution_options: Optional[List[str]] = None
+    raw: Optional[List[str]] = None
+    persona: Optional[List[str]] = None
+    extra: Optional[List[str]] = None
+
+    def __len__(self) -> int:
+        return len(self.response)
+
+    def responses(self) -> List[str]:
+        return [self.codebook[c] for c in self.response]
+
+    def records(self) -> Iterator[Dict]:
+        """Records in the JSON result shape (`persona` only when stored)."""
+        for i in range(len(self)):
+            record: Dict = {}
+            if self.persona is not None:
+                record["persona"] = self.persona[i]
+            pid = int(self.persona_id[i])
+            if pid != MISSING_PERSONA_ID:
+                record["persona_id"] = pid
+            record["response"] = self.codebook[self.response[i]]
+            if self.distribution is not None and not np.isnan(self.distribution[i, 0]):
+                record["distribution"] = {
+                    o: float(p) for o, p in zip(self.distribution_options, self.distribution[i])
+                }
+            if self.raw is not None:
+                record["raw"] = self.raw[i]
+            if self.extra is not None and self.extra[i]:
+                record.update(json.loads(self.extra[i]))
+            yield record
+
+
+class CompactResultWriter:
+    """Write a compact result file batch by batch.
+
+    Args:
+        filepath: Destination (conventionally `<country>_<timestamp>.scr`)
+        question: The question that was asked
+        country_code: The country code for the responses
+        timestamp: Run timestamp ("%Y%m%d_%H%M%S"); defaults to now
+        population_snapshot: Snapshot id the persona ids index into
+        metadata: Extra header fields (e.g. model, temperature, run_id)
+        batch_size: Records buffered per compressed frame
+        codec: "zstd" or "zlib"; defaults to zstd when installed
+    """
+
+    def __init__(
+        self,
+        filepath: str,
+        question: str,
+        country_code: str,
+        timestamp: Optional[str] = None,
+        population_snapshot: Optional[str] = None,
+        metadata: Optional[Dict] = None,
+        batch_size: int = 8192,
+        codec: Optional[str] = None,
+    ):
+        self.filepath = filepath
+        self.batch_size = batch_size
+        self.codec, self._compress, _ = _codec(codec)
+        self.header = {
+            "version": 1,
+            "codec": self.codec,
+            "timestamp": timestamp or datetime.now().strftime("%Y%m%d_%H%M%S"),
+            "country_code": country_code,
+            "question": question,
+            "population_snapshot": population_snapshot,
+            **(metadata or {}),
+        }
+        self._pending: List[Dict] = []
+        self._total = 0
+        self._distribution: Dict[str, int] = {}
+        self._expected: Dict[str, float] = {}
+        Path(filepath).parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(filepath, "wb")
+        header_bytes = json.dumps(self.header).encode("utf-8")
+        self._file.write(RESULT_MAGIC)
+        self._file.write(struct.pack("<I", len(header_bytes)))
+        self._file.write(header_bytes)
+
+    def __enter__(self) -> "CompactResultWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def _write_frame(self, kind: int, payload: bytes) -> None:
+        compressed = self._compress(payload)
+        self._file.write(struct.pack("<BI", kind, len(compressed)))
+        self._file.write(compressed)
+
+    def write(self, records: Iterable[Dict]) -> None:
+        """Append records (dicts in the JSON result shape)."""
+        for record in records:
+            self._pending.append(record)
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+
+    def flush(self) -> None:
+        """Compress and write the buffered records as one frame."""
+        if not self._pending:
+            return
+        records, self._pending = self._pending, []
+        n = len(records)
+
+        codebook: List[str] = []
+        index: Dict[str, int] = {}
+        codes = np.empty(n, dtype="u1")
+        persona_ids = np.full(n, MISSING_PERSONA_ID, dtype="<u4")
+        for i, record in enumerate(records):
+            response = record["response"].lower().strip()
+            code = index.get(response)
+            if code is None:
+                if len(codebook) == 256:
+                    raise ValueError("More than 256 distinct responses in one batch; store them in the raw column")
+                code = index[response] = len(codebook)
+                codebook.append(response)
+            codes[i] = code
+            if record.get("persona_id") is not None:
+                persona_ids[i] = int(record["persona_id"])
+            self._distribution[response] = self._distribution.get(response, 0) + 1
+
+        columns: Dict[str, bytes] = {"persona_id": persona_ids.tobytes(), "response": codes.tobytes()}
+        batch_header: Dict = {"n": n, "codebook": codebook}
+
+        if any(r.get("distribution") for r in records):
+            options = list(ANSWER_OPTIONS)
+            for r in records:
+                for o in r.get("distribution") or {}:
+                    if o not in options:
+                        options.append(o)
+            dist = np.full((n, len(options)), np.nan, dtype="<f4")
+            for i, r in enumerate(records):
+                if r.get("distribution"):
+                    dist[i] = [float(r["distribution"].get(o, 0.0)) for o in options]
+                    for o, p in r["distribution"].items():
+                        self._expected[o] = self._expected.get(o, 0.0) + float(p)
+            columns["distribution"] = dist.tobytes()
+            batch_header["distribution_options"] = options
+
+        for name in ("raw", "persona"):
+            if any(name in r for r in records):
+                packed = _pack_text([r.get(name) for r in records])
+                columns[f"{name}_offsets"] = packed["offsets"]
+                columns[f"{name}_data"] = packed["data"]
+
+        extras = [{k: v for k, v in r.items() if k not in _COLUMN_KEYS} for r in records]
+        if any(extras):
+            packed = _pack_text([json.dumps(e) if e else "" for e in extras])
+            columns["extra_offsets"] = packed["offsets"]
+            columns["extra_data"] = packed["data"]
+
+        layout = []
+        offset = 0
+        for name, data in columns.items():
+            layout.append([name, offset, len(data)])
+            offset += len(data)
+        batch_header["columns"] = layout
+        header_bytes = json.dumps(batch_header).encode("utf-8")
+        payload = struct.pack("<I", len(header_bytes)) + header_bytes + b"".join(columns.values())
+        self._write_frame(_FRAME_BATCH, payload)
+        self._total += n
+
+    def close(self) -> None:
+        """Flush, write the summary trailer and close the file."""
+        if self._file.closed:
+            return
+        self.flush()
+        summary = {"total_responses": self._total, "response_distribution": self._distribution}
+        if self._expected:
+            summary["expected_distribution"] = self._expected
+        summary_offset = self._file.tell()
+        self._write_frame(_FRAME_SUMMARY, json.dumps(summary).encode("utf-8"))
+        self._file.write(struct.pack("<Q", summary_offset))
+        self._file.write(END_MAGIC)
+        self._file.close()
+
+
+def _read_header(f, filepath: str) -> Dict:
+    if f.read(len(RESULT_MAGIC)) != RESULT_MAGIC:
+        raise ValueError(f"{filepath} is not a compact result file")
+    (length,) = struct.unpack("<I", f.read(4))
+    return json.loads(f.read(length).decode("utf-8"))
+
+
+def read_compact_header(filepath: str) -> Dict:
+    """Read only the header (question, country, snapshot id, run metadata)."""
+    with open(filepath, "rb") as f:
+        return _read_header(f, filepath)
+
+
+def read_compact_summary(filepath: str) -> Dict:
+    """Read only the summary trailer (totals and response distribution)."""
+    with open(filepath, "rb") as f:
+        header = _read_header(f, filepath)
+        _, _, decompress = _codec(header["codec"])
+        f.seek(-(8 + len(END_MAGIC)), 2)
+        (offset,) = struct.unpack("<Q", f.read(8))
+        if f.read(len(END_MAGIC)) != END_MAGIC:
+            raise ValueError(f"{filepath} is truncated (no summary trailer)")
+        f.seek(offset)
+        kind, length = struct.unpack("<BI", f.read(5))
+        return json.loads(decompress(f.read(length)).decode("utf-8"))
+
+
+def _decode_batch(payload: bytes) -> ResultBatch:
+    (header_len,) = struct.unpack_from("<I", payload)
+    header = json.loads(payload[4:4 + header_len].decode("utf-8"))
+    base = 4 + header_len
+    columns = {name: payload[base + offset:base + offset + size] for name, offset, size in header["columns"]}
+    n = header["n"]
+
+    def text(name: str) -> Optional[List[str]]:
+        if f"{name}_offsets" not in columns:
+            return None
+        return _unpack_text(np.frombuffer(columns[f"{name}_offsets"], dtype="<u4"), columns[f"{name}_data"])
+
+    distribution = None
+    options = header.get("distribution_options")
+    if "distribution" in columns:
+        distribution = np.frombuffer(columns["distribution"], dtype="<f4").reshape(n, len(options))
+    return ResultBatch(
+        persona_id=np.frombuffer(columns["persona_id"], dtype="<u4"),
+        response=np.frombuffer(columns["response"], dtype="u1"),
+        codebook=header["codebook"],
+        distribution=distribution,
+        distribution_options=options,
+        raw=text("raw"),
+        persona=text("persona"),
+        extra=text("extra"),
+    )
+
+
+def iter_compact_batches(filepath: str) -> Iterator[ResultBatch]:
+    """Stream decoded record batches; only one batch is in memory at a time."""
+    with open(filepath, "rb") as f:
+        header = _read_header(f, filepath)
+        _, _, decompress = _codec(header["codec"])
+        while True:
+            prefix = f.read(5)
+            if len(prefix) < 5:
+                return
+            kind, length = struct.unpack("<BI", prefix)
+            if kind != _FRAME_BATCH:
+                return
+            yield _decode_batch(decompress(f.read(length)))
+
+
+def iter_compact_records(filepath: str, population=None) -> Iterator[Dict]:
+    """
+    Stream records in the JSON result shape.
+
+    Args:
+        filepath: Compact result file
+        population: Optional `Population` matching the header's snapshot; when
+            given, each record's `persona` text is rendered from its id
+    """
+    if population is not None:
+        snapshot = read_compact_header(filepath).get("population_snapshot")
+        if snapshot is not None and population.snapshot_id not in (None, snapshot):
+            raise ValueError(f"{filepath} references population snapshot {snapshot}, not {population.snapshot_id}")
+    for batch in iter_compact_batches(filepath):
+        for record in batch.records():
+            if population is not None and "persona" not in record and "persona_id" in record:
+                record = {"persona": population.render(record["persona_id"]), **record}
+            yield record
+
+
+def write_compact_results(
+    results: Iterable[Dict],
+    question: str,
+    country_code: str,
+    filepath: str,
+    timestamp: Optional[str] = None,
+    population_snapshot: Optional[str] = None,
+    metadata: Optional[Dict] = None,
+    keep_persona_text: bool = False,
+) -> str:
+    """
+    Write result records to a compact file.
+
+    Persona text is dropped for records that carry a `persona_id` (the id
+    resolves it through the snapshot) unless `keep_persona_text` is set.
+
+    Returns:
+        str: Path to the written file
+    """
+    def _records():
+        for record in results:
+            if not keep_persona_text and record.get("persona_id") is not None and "persona" in record:
+                record = {k: v for k, v in record.items() if k != "persona"}
+            yield record
+
+    with CompactResultWriter(
+        filepath,
+        question=question,
+        country_code=country_code,
+        timestamp=timestamp,
+        population_snapshot=population_snapshot,
+        metadata=metadata,
+    ) as writer:
+        writer.write(_records())
+    return filepath
+
+
+def load_compact_results(filepath: str, population=None) -> Dict:
+    """
+    Load a compact file into the JSON result structure
+    (timestamp, country_code, question, responses, metadata).
+    """
+    header = read_compact_header(filepath)
+    data = {
+        "timestamp": header.get("timestamp"),
+        "country_code": header.get("country_code"),
+        "question": header.get("question"),
+        "responses": list(iter_compact_records(filepath, population=population)),
+        "metadata": read_compact_summary(filepath),
+    }
+    for key, value in header.items():
+        if key not in ("version", "codec", "timestamp", "country_code", "question"):
+            data["metadata"][key] = value
+    return data
+
+
+def convert_json_results(json_path: str, out_path: Optional[str] = None, population_snapshot: Optional[str] = None) -> str:
+    """
+    Convert a JSON result file (from `save_simulation_results`) to the compact format.
+
+    Records without a `persona_id`, as in files written before personas had
+    ids, keep their persona text in the `persona` column; compression
+    collapses the repeated prompt boilerplate.
+
+    Args:
+        json_path: Source JSON result file
+        out_path: Destination; defaults to the same name with a `.scr` suffix
+        population_snapshot: Snapshot id the file's persona ids refer to, if any
+
+    Returns:
+        str: Path to the compact file
+    """
+    with open(json_path, "r") as f:
+        data = json.load(f)
+    if out_path is None:
+        out_path = str(Path(json_path).with_suffix(COMPACT_SUFFIX))
+    metadata = {
+        k: v for k, v in data.get("metadata", {}).items()
+        if k not in ("total_responses", "response_distribution", "expected_distribution")
+    }
+    population_snapshot = population_snapshot or metadata.pop("population_snapshot", None)
+    metadata.pop("population_snapshot", None)
+    return write_compact_results(
+        data["responses"],
+        question=data["question"],
+        country_code=data["country_code"],
+        filepath=out_path,
+        timestamp=data.get("timestamp"),
+        population_snapshot=population_snapshot,
+        metadata=metadata,
+    )
@@ -2,24 +2,58 @@
 
 import json
 import os
+import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Union
+
+from synthcast.simulation.catalog import ResultsCatalog, get_results_catalog
+from synthcast.simulation.run_store import get_run_store
+
+RESULT_FORMATS = ("json", "compact")
+
+def expected_distribution(results: List[Dict]) -> Optional[Dict[str, float]]:
+    """
+    Sum per-agent answer distributions (from scoring runs) into expected counts.
+
+    Returns None when no result carries a "distribution".
+    """
+    expected: Dict[str, float] = {}
+    found = False
+    for result in results:
+        dist = result.get("distribution")
+        if not dist:
+            continue
+        found = True
+        for option, p in dist.items():
+            expected[option] = expected.get(option, 0.0) + float(p)
+    return expected if found else None
 
 def save_simulation_results(
     results: List[Dict],
     question: str,
     country_code: str,
-    base_path: Optional[str] = None
+    base_path: Optional[str] = None,
+    result_format: str = "json",
+    population_snapshot: Optional[str] = None,
+    metadata: Optional[Dict] = None,
 ) -> str:
     """
-    Save simulation results to a JSON file with a unique timestamp.
+    Save simulation results to a JSON file named by country, timestamp and a
+    random suffix, so saves within the same second don't overwrite each other.
     
     Args:
         results: List of agent responses
         question: The question that was asked
         country_code: The country code for the responses
         base_path: Optional base path for saving results. Defaults to synthcast/data/responses
+        result_format: "json", or "compact" for a compressed columnar `.scr`
+            file (see `synthcast.simulation.result_format`)
+        population_snapshot: Id of the saved population snapshot that the
+            results' `persona_id`s index into. Compact files then omit the
+            persona text
+        metadata: Run metadata stored with the results and indexed by the
+            results catalog (run_id, model, temperature, mode)
         
     Returns:
         str: Path to the saved file
@@ -33,8 +67,12 @@ def save_simulation_results(
     # Create unique timestamp
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     
-    # Create filename with timestamp and country code
-    filename = f"{country_code}_{timestamp}.json"
+    if result_format not in RESULT_FORMATS:
+        raise ValueError(f"Unknown result_format '{result_format}'; expected one of {RESULT_FORMATS}")
+
+    # Create filename with country code, timestamp and a unique suffix
+    suffix = ".scr" if result_format == "compact" else ".json"
+    filename = f"{country_code}_{timestamp}_{uuid.uuid4().hex[:8]}{suffix}"
     filepath = str(Path(base_path) / filename)
     
     # Prepare data structure
@@ -55,9 +93,31 @@ def save_simulation_results(
         data["metadata"]["response_distribution"][response] = \
             data["metadata"]["response_distribution"].get(response, 0) + 1
     
+    expected = expected_distribution(results)
+    if expected is not None:
+        data["metadata"]["expected_distribution"] = expected
+
+    if population_snapshot is not None:
+        data["metadata"]["population_snapshot"] = population_snapshot
+    if metadata:
+        data["metadata"].update(metadata)
+
     # Save to file
-    with open(filepath, 'w') as f:
-        json.dump(data, f, indent=2)
+    if result_format == "compact":
+        from synthcast.simulation.result_format import write_compact_results
+        write_compact_results(
+            results,
+            question=question,
+            country_code=country_code,
+            filepath=filepath,
+            timestamp=timestamp,
+            population_snapshot=population_snapshot,
+            metadata=metadata,
+            keep_persona_text=population_snapshot is None,
+        )
+    else:
+        with open(filepath, 'w') as f:
+            json.dump(data, f, indent=2)
 
     # Also append an aggregated datapoint for quick analysis across runs
     try:
@@ -67,16 +127,23 @@ def save_simulation_results(
             question=question,
             distribution=data["metadata"]["response_distribution"],
             base_path=base_path,
+            expected_distribution=expected,
         )
     except Exception:
         # Don't fail the main save if aggregation fails
         pass
 
+    try:
+        get_results_catalog(base_path).add_file(filepath)
+    except Exception:
+        # The next ingest() picks the file up
+        pass
+
     return filepath
 
 def load_simulation_results(filepath: str) -> Dict:
     """
-    Load simulation results from a JSON file.
+    Load simulation results from a JSON or compact (`.scr`) file.
     
     Args:
         filepath: Path to the results file
@@ -84,6 +151,9 @@ def load_simulation_results(filepath: str) -> Dict:
     Returns:
         Dict: The loaded results data
     """
+    if str(filepath).endswith(".scr"):
+        from synthcast.simulation.result_format import load_compact_results
+        return load_compact_results(filepath)
     with open(filepath, 'r') as f:
         return json.load(f)
 
@@ -101,8 +171,8 @@ def list_country_results(country_code: str, base_path: Optional[str] = None) ->
     if base_path is None:
         base_path = str(Path(__file__).parent.parent / 'data' / 'responses')
     
-    pattern = f"{country_code}_*.json"
-    return sorted([str(p) for p in Path(base_path).glob(pattern)])
+    paths = [p for p in Path(base_path).glob(f"{country_code}_*") if p.suffix in (".json", ".scr")]
+    return sorted(str(p) for p in paths)
 
 
 def append_aggregated_datapoint(
@@ -111,22 +181,30 @@ def append_aggregated_datapoint(
     question: str,
     distribution: Dict[str, int],
     base_path: Optional[str] = None,
+    expected_distribution: Optional[Dict[str, float]] = None,
 ) -> str:
     """
-    Append an aggregated datapoint for a run/question to a persistent JSONL file.
+    Append an aggregated datapoint for a run/question to the run store.
+
+    Each datapoint is a JSON object with keys: timestamp, country_code,
+    num_agents, question, distribution, and expected_distribution for scoring
+    runs (summed per-agent option probabilities).
 
-    Each line in the file is a JSON object with keys: timestamp, country_code,
-    num_agents, question, distribution.
+    The datapoint is inserted into the SQLite run store
+    (`aggregated_runs.sqlite`, see `synthcast.simulation.run_store`) and
+    appended as one line to `aggregated_runs.jsonl` for streaming consumers.
+    Both are O(1); the legacy cumulative JSON arrays are no longer rewritten.
 
-    Returns the filepath written to.
+    Returns the run store filepath written to.
     """
     if base_path is None:
         base_path = str(Path(__file__).parent.parent / 'data' / 'responses')
 
     Path(base_path).mkdir(parents=True, exist_ok=True)
-    # Keep an append-only JSONL for streaming and a cumulative JSON array file
+    # Open the store first: on creation it imports the existing JSONL history,
+    # which must not already contain this datapoint
+    store = get_run_store(base_path)
     filepath = str(Path(base_path) / 'aggregated_runs.jsonl')
-    cumulative_path = Path(base_path) / 'aggregated_runs.json'
 
     datapoint = {
         "timestamp": datetime.now().strftime("%Y%m%d_%H%M%S"),
@@ -135,77 +213,52 @@ def append_aggregated_datapoint(
         "question": question,
         "distribution": distribution,
     }
+    if expected_distribution is not None:
+        datapoint["expected_distribution"] = expected_distribution
+
+    store.append(datapoint)
 
     # Append as a single JSON line
     with open(filepath, 'a') as f:
         f.write(json.dumps(datapoint) + "\n")
 
-    # Also maintain a cumulative JSON file with an array of datapoints
-    try:
-        stats_path = Path(base_path) / 'aggregated_statistics.json'
-        if stats_path.exists():
-            try:
-                with open(stats_path, 'r') as sf:
-                    existing = json.load(sf)
-                    if not isinstance(existing, list):
-                        existing = []
-            except Exception:
-                existing = []
-        else:
-            existing = []
-
-        existing.append(datapoint)
-
-        # Write back the cumulative JSON file (pretty printed)
-        with open(stats_path, 'w') as sf:
-            json.dump(existing, sf, indent=2)
-    except Exception:
-        # don't fail on statistics write; the JSONL append already persisted
-        pass
-
-    # Also maintain a cumulative JSON file with an array of datapoints
-    try:
-        if cumulative_path.exists():
-            try:
-                with open(cumulative_path, 'r') as cf:
-                    existing_cum = json.load(cf)
-                    if not isinstance(existing_cum, list):
-                        existing_cum = []
-            except Exception:
-                existing_cum = []
-        else:
-            existing_cum = []
-
-        existing_cum.append(datapoint)
-
-        with open(cumulative_path, 'w') as cf:
-            json.dump(existing_cum, cf, indent=2)
-    except Exception:
-        # best-effort; don't interrupt main flow
-        pass
-
-    return filepath
+    return store.path
 
 
-def load_aggregated_datapoints(base_path: Optional[str] = None) -> List[Dict]:
-    """Load all aggregated datapoints from the cumulative JSON file.
+def load_aggregated_datapoints(
+    base_path: Optional[str] = None,
+    country_code: Optional[str] = None,
+    question: Optional[str] = None,
+    since: Optional[Union[str, datetime]] = None,
+    until: Optional[Union[str, datetime]] = None,
+) -> List[Dict]:
+    """Load aggregated datapoints from the run store, oldest first.
 
-    This reads `aggregated_runs.json` which contains a JSON array of datapoints.
-    If the file does not exist or is malformed, an empty list is returned.
+    Filters are applied by the store's indexes, so only matching datapoints
+    are read. Time bounds accept a datetime or a "%Y%m%d_%H%M%S" string;
+    `since` is inclusive and `until` exclusive.
     """
     if base_path is None:
         base_path = str(Path(__file__).parent.parent / 'data' / 'responses')
-    filepath = Path(base_path) / 'aggregated_runs.json'
-    if not filepath.exists():
+    if not Path(base_path).exists():
         return []
+    return get_run_store(base_path).query(country_code=country_code, question=question, since=since, until=until)
 
-    try:
-        with open(filepath, 'r') as f:
-            data = json.load(f)
-            if isinstance(data, list):
-                return data
-    except Exception:
-        # fallthrough to return empty on any error
-        pass
 
-    return []
\ No newline at end of file
+def get_catalog(base_path: Optional[str] = None, ingest: bool = True) -> ResultsCatalog:
+    """
+    Return the results catalog for a results directory.
+
+    Args:
+        base_path: Results directory. Defaults to synthcast/data/responses
+        ingest: Index result files added since the last scan first
+
+    Returns:
+        ResultsCatalog: Query with `runs(...)` and `distribution(...)`
+    """
+    if base_path is None:
+        base_path = str(Path(__file__).parent.parent / 'data' / 'responses')
+    catalog = get_results_catalog(base_path)
+    if ingest:
+        catalog.ingest()
+    return catalog
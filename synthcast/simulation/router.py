@@ -0,0 +1,362 @@
+"""
+Latency-aware routing across several OpenAI-compatible backends.
+
+`LLMRouter` exposes the same calls as `LLMAgent`, so a `Simulation` can hand
+it to its agents in place of a single `NebiusAgent`. Each call goes to one of
+several backends (any `LLMAgent`: different endpoints, providers or models),
+chosen at random in proportion to
+
+    weight * success_rate**2 / latency_cost
+
+where `latency_cost` blends the backend's moving p50 and p99 latency over its
+last `window` calls. Slow or failing backends therefore receive less traffic
+without being dropped: every backend keeps at least `min_share` of its
+configured weight, so it is still probed and can win traffic back.
+
+With hedging on, a call that is still running after its backend's p95
+latency is duplicated on a different backend, and whichever copy finishes
+first is used (the other is cancelled). Hedges are capped at `hedge_budget`
+of all calls so a backend-wide slowdown cannot double the load.
+
+A call that fails on its backend is retried once on another (`failover`).
+Either way the failure counts against the backend's success rate.
+"""
+
+import asyncio
+import logging
+import math
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Sequence
+
+from synthcast.simulation.answers import ANSWER_OPTIONS
+from synthcast.simulation.errors import LLMError
+from synthcast.simulation.llm_agent import LLMAgent, StreamResult, TokenUsage
+
+# A child of the "simulation" logger, whose handlers setup_logging configures
+logger = logging.getLogger("simulation.router")
+
+
+@dataclass(frozen=True)
+class RouterSettings:
+    """Traffic-shifting and hedging policy.
+
+    Attributes:
+        window: Calls per backend kept for latency percentiles and error rate.
+        min_samples: Calls a backend needs before its statistics are trusted;
+            until then it is scored with the best latency seen on any backend.
+        tail_weight: Share of the p99-p50 gap added to p50 in the latency cost.
+        min_share: Fraction of a backend's weight it keeps however slow or
+            failing it is.
+        hedge: Send a duplicate request when a call passes the backend's p95.
+        hedge_quantile: Latency quantile after which a call is hedged.
+        hedge_budget: Maximum hedged calls as a fraction of all calls.
+        failover: Retry a failed call once on a different backend.
+    """
+
+    window: int = 256
+    min_samples: int = 20
+    tail_weight: float = 0.25
+    min_share: float = 0.05
+    hedge: bool = False
+    hedge_quantile: float = 0.95
+    hedge_budget: float = 0.1
+    failover: bool = True
+
+
+class Backend:
+    """One routing target: an agent plus its traffic weight and statistics.
+
+    Args:
+        agent: The `LLMAgent` (endpoint, credentials and model) to call
+        weight: Relative share of traffic when all backends are healthy
+        name: Label used in logs and stats (default: provider/model)
+    """
+
+    def __init__(self, agent: LLMAgent, weight: float = 1.0, name: Optional[str] = None):
+        if weight <= 0:
+            raise ValueError("Backend weight must be positive")
+        self.agent = agent
+        self.weight = float(weight)
+        self.name = name or f"{agent.provider}/{agent.model_name}"
+        agent.metric_labels["backend"] = self.name
+        self.calls = 0
+        self.errors = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._latencies: Deque[float] = deque()
+        self._outcomes: Deque[bool] = deque()
+        self._sorted: Optional[List[float]] = None
+
+    def _reset_window(self, window: int) -> None:
+        self._latencies = deque(self._latencies, maxlen=window)
+        self._outcomes = deque(self._outcomes, maxlen=window)
+        self._sorted = None
+
+    def record(self, latency: Optional[float], ok: bool) -> None:
+        """Record one finished call (latency None for failures)."""
+        self.calls += 1
+        self._outcomes.append(ok)
+        if ok:
+            self._latencies.append(latency)
+            self._sorted = None
+        else:
+            self.errors += 1
+
+    def record_cancelled(self, elapsed: float) -> None:
+        """Record a call cancelled after `elapsed` seconds (a hedge loser).
+
+        Its latency is at least `elapsed`; keeping that lower bound stops the
+        tail estimate from shrinking just because slow calls get cancelled.
+        """
+        self._latencies.append(elapsed)
+        self._sorted = None
+
+    @property
+    def samples(self) -> int:
+        return len(self._latencies)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self._latencies:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._latencies)
+        position = min(len(self._sorted) - 1, max(0, math.ceil(q * len(self._sorted)) - 1))
+        return self._sorted[position]
+
+    @property
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return 1.0 - sum(self._outcomes) / len(self._outcomes)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "weight": self.weight,
+            "calls": self.calls,
+            "errors": self.errors,
+            "error_rate": round(self.error_rate, 4),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
+
+
+class LLMRouter:
+    """Drop-in `LLMAgent` replacement that spreads calls across backends.
+
+    Caching and rate limiting stay per backend: each backend's agent keeps
+    its own client pool, limiter and cache keys (which include its provider
+    and model).
+
+    Raises `synthcast.simulation.errors.LLMError` subclasses on failure.
+    """
+
+    provider = "router"
+
+    def __init__(self, backends: Sequence[Backend], settings: Optional[RouterSettings] = None, seed: Optional[int] = None):
+        if not backends:
+            raise ValueError("LLMRouter needs at least one backend")
+        names = [b.name for b in backends]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Backend names must be unique: {names}")
+        self.backends = list(backends)
+        self.settings = settings or RouterSettings()
+        for backend in self.backends:
+            backend._reset_window(self.settings.window)
+        self.model_name = "+".join(names)
+        self._rng = random.Random(seed)
+        self._calls = 0
+        self._hedges = 0
+
+    # --- selection ---
+
+    def _latency_cost(self, backend: Backend, fallback: Optional[float]) -> Optional[float]:
+        if backend.samples < self.settings.min_samples:
+            return fallback
+        p50 = backend.quantile(0.5)
+        p99 = backend.quantile(0.99)
+        return p50 + self.settings.tail_weight * (p99 - p50)
+
+    def shares(self, exclude: Sequence[Backend] = ()) -> Dict[str, float]:
+        """Current traffic share of each backend (summing to 1)."""
+        candidates = [b for b in self.backends if b not in exclude]
+        known = [
+            self._latency_cost(b, None) for b in candidates
+            if b.samples >= self.settings.min_samples
+        ]
+        best = min(known) if known else None
+        scores = {}
+        for backend in candidates:
+            score = backend.weight
+            cost = self._latency_cost(backend, best)
+            if cost is not None and best is not None and cost > 0:
+                score *= best / cost
+            if len(backend._outcomes) >= self.settings.min_samples:
+                score *= (1.0 - backend.error_rate) ** 2
+            scores[backend.name] = max(score, backend.weight * self.settings.min_share)
+        total = sum(scores.values())
+        return {name: score / total for name, score in scores.items()}
+
+    def _pick(self, exclude: Sequence[Backend] = ()) -> Optional[Backend]:
+        candidates = [b for b in self.backends if b not in exclude]
+        if not candidates:
+            return None
+        if len(candidates) == 1:
+            return candidates[0]
+        shares = self.shares(exclude)
+        return self._rng.choices(candidates, weights=[shares[b.name] for b in candidates])[0]
+
+    def _hedge_delay(self, backend: Backend) -> Optional[float]:
+        settings = self.settings
+        if not settings.hedge or len(self.backends) < 2 or backend.samples < settings.min_samples:
+            return None
+        if self._hedges >= settings.hedge_budget * self._calls:
+            return None
+        return backend.quantile(settings.hedge_quantile)
+
+    # --- dispatch ---
+
+    async def _timed(self, backend: Backend, method: str, args, kwargs):
+        started = time.monotonic()
+        try:
+            result = await getattr(backend.agent, method)(*args, **kwargs)
+        except asyncio.CancelledError:
+            backend.record_cancelled(time.monotonic() - started)
+            raise
+        except Exception:
+            backend.record(None, ok=False)
+            raise
+        backend.record(time.monotonic() - started, ok=True)
+        return result
+
+    async def _race(self, primary: Backend, method: str, args, kwargs):
+        """Run on `primary`, hedging on a second backend past its p95."""
+        first = asyncio.ensure_future(self._timed(primary, method, args, kwargs))
+        delay = self._hedge_delay(primary)
+        if delay is None:
+            return await first
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        secondary = None if done else self._pick(exclude=[primary])
+        if secondary is None:
+            return await first
+
+        self._hedges += 1
+        secondary.hedges += 1
+        second = asyncio.ensure_future(self._timed(secondary, method, args, kwargs))
+        pending = {first, second}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = None
+                for task in done:
+                    if task.exception() is None:
+                        winner = winner or task
+                    else:
+                        error = error or task.exception()
+                if winner is not None:
+                    if winner is second:
+                        secondary.hedge_wins += 1
+                    return winner.result()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _dispatch(self, method: str, *args, **kwargs):
+        self._calls += 1
+        primary = self._pick()
+        try:
+            return await self._race(primary, method, args, kwargs)
+        except Exception as e:
+            fallback = self._pick(exclude=[primary]) if self.settings.failover else None
+            if fallback is None or (isinstance(e, LLMError) and not e.retryable and e.status_code not in (401, 403, 404)):
+                raise
+            logger.debug(f"{primary.name} failed ({e}); failing over to {fallback.name}")
+            return await self._timed(fallback, method, args, kwargs)
+
+    # --- LLMAgent interface ---
+
+    def generate_response(self, persona_prompt: str, user_prompt: str, max_tokens: int = 512, temperature: float = 0.7, sample_index: int = 0) -> str:
+        """Blocking single completion on one backend (no hedging)."""
+        backend = self._pick()
+        started = time.monotonic()
+        try:
+            response = backend.agent.generate_response(persona_prompt, user_prompt, max_tokens, temperature, sample_index)
+        except Exception:
+            backend.record(None, ok=False)
+            raise
+        backend.record(time.monotonic() - started, ok=True)
+        return response
+
+    async def generate_response_async(self, persona_prompt: str, user_prompt: str, max_tokens: int = 512, temperature: float = 0.7, sample_index: int = 0) -> str:
+        return await self._dispatch(
+            "generate_response_async", persona_prompt, user_prompt,
+            max_tokens=max_tokens, temperature=temperature, sample_index=sample_index,
+        )
+
+    async def generate_responses_async(
+        self,
+        persona_prompt: str,
+        user_prompt: str,
+        n: int,
+        max_tokens: int = 512,
+        temperature: float = 0.7,
+        first_sample_index: int = 0,
+    ) -> List[str]:
+        return await self._dispatch(
+            "generate_responses_async", persona_prompt, user_prompt, n=n,
+            max_tokens=max_tokens, temperature=temperature, first_sample_index=first_sample_index,
+        )
+
+    async def score_options_async(
+        self,
+        persona_prompt: str,
+        user_prompt: str,
+        options: Sequence[str] = ANSWER_OPTIONS,
+        temperature: float = 0.7,
+        top_logprobs: int = 20,
+        max_tokens: int = 3,
+        sample_index: int = 0,
+    ) -> Dict[str, float]:
+        return await self._dispatch(
+            "score_options_async", persona_prompt, user_prompt, options,
+            temperature=temperature, top_logprobs=top_logprobs, max_tokens=max_tokens, sample_index=sample_index,
+        )
+
+    async def stream_response_async(
+        self,
+        persona_prompt: str,
+        user_prompt: str,
+        max_tokens: int = 512,
+        temperature: float = 0.7,
+        stop_on_answer: bool = False,
+        options: Sequence[str] = ANSWER_OPTIONS,
+        sample_index: int = 0,
+    ) -> StreamResult:
+        return await self._dispatch(
+            "stream_response_async", persona_prompt, user_prompt,
+            max_tokens=max_tokens, temperature=temperature, stop_on_answer=stop_on_answer,
+            options=options, sample_index=sample_index,
+        )
+
+    @property
+    def usage(self) -> TokenUsage:
+        """Token usage summed over every backend."""
+        total = TokenUsage()
+        for backend in self.backends:
+            total = total + backend.agent.usage
+        return total
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Per-backend call counts, error rates, latency percentiles and hedges."""
+        shares = self.shares()
+        return [{**b.stats(), "share": round(shares[b.name], 4)} for b in self.backends]
@@ -0,0 +1,198 @@
+"""
+Append-only store for aggregated run datapoints.
+
+Replaces the pattern of re-reading and rewriting whole JSON arrays on every
+append. Datapoints live in a SQLite database in WAL mode: an append is a
+single INSERT, several processes can append concurrently, and queries by
+country, question and time range use indexes instead of loading every run.
+
+On first open the store imports the legacy `aggregated_runs.jsonl` (or
+`aggregated_runs.json`) found next to it, so existing history stays queryable.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+
+TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+
+TimeBound = Optional[Union[str, datetime]]
+
+
+def question_hash(question: str) -> str:
+    """Short stable hash of a question's text."""
+    return hashlib.sha256(question.strip().encode("utf-8")).hexdigest()[:16]
+
+
+def _timestamp(value: TimeBound) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    return value.strftime(TIMESTAMP_FORMAT)
+
+
+class RunStore:
+    """SQLite-backed aggregated datapoint store.
+
+    Args:
+        path: Database file, conventionally `<responses dir>/aggregated_runs.sqlite`
+        import_legacy: Import legacy JSON/JSONL history from the same
+            directory the first time the database is created
+    """
+
+    def __init__(self, path: str, import_legacy: bool = True):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS datapoints ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " timestamp TEXT NOT NULL,"
+            " country_code TEXT NOT NULL,"
+            " question_hash TEXT NOT NULL,"
+            " question TEXT NOT NULL,"
+            " num_agents INTEGER,"
+            " payload TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS datapoints_country_ts ON datapoints(country_code, timestamp)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS datapoints_question_ts ON datapoints(question_hash, timestamp)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS datapoints_ts ON datapoints(timestamp)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        if import_legacy:
+            self._import_legacy()
+
+    def _import_legacy(self) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                done = self._conn.execute("SELECT value FROM meta WHERE key = 'legacy_imported'").fetchone()
+                if done is None:
+                    directory = Path(self.path).parent
+                    for datapoint in _read_legacy(directory):
+                        self._insert(datapoint)
+                    self._conn.execute("INSERT INTO meta (key, value) VALUES ('legacy_imported', '1')")
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _insert(self, datapoint: Dict) -> None:
+        question = datapoint.get("question", "")
+        self._conn.execute(
+            "INSERT INTO datapoints (timestamp, country_code, question_hash, question, num_agents, payload)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                datapoint.get("timestamp", ""),
+                datapoint.get("country_code", ""),
+                question_hash(question),
+                question,
+                datapoint.get("num_agents"),
+                json.dumps(datapoint),
+            ),
+        )
+
+    def append(self, datapoint: Dict) -> None:
+        """Append one datapoint (a single INSERT; safe across processes)."""
+        with self._lock:
+            self._insert(datapoint)
+
+    def iter_query(
+        self,
+        country_code: Optional[str] = None,
+        question: Optional[str] = None,
+        since: TimeBound = None,
+        until: TimeBound = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[Dict]:
+        """
+        Stream datapoints matching the filters, oldest first.
+
+        Args:
+            country_code: Only this country
+            question: Only this exact question text
+            since: Inclusive lower bound (datetime or "%Y%m%d_%H%M%S" string)
+            until: Exclusive upper bound (datetime or "%Y%m%d_%H%M%S" string)
+            limit: Maximum number of datapoints
+        """
+        clauses, params = [], []
+        if country_code is not None:
+            clauses.append("country_code = ?")
+            params.append(country_code)
+        if question is not None:
+            clauses.append("question_hash = ? AND question = ?")
+            params.extend([question_hash(question), question])
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(_timestamp(since))
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(_timestamp(until))
+        sql = "SELECT payload FROM datapoints"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY timestamp, id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        for (payload,) in rows:
+            yield json.loads(payload)
+
+    def query(self, **filters) -> List[Dict]:
+        """List form of `iter_query`."""
+        return list(self.iter_query(**filters))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM datapoints").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _read_legacy(directory: Path) -> Iterator[Dict]:
+    """Yield datapoints from the legacy JSONL log, or the JSON array if there is no log."""
+    jsonl_path = directory / 'aggregated_runs.jsonl'
+    json_path = directory / 'aggregated_runs.json'
+    if jsonl_path.exists():
+        with open(jsonl_path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+    elif json_path.exists():
+        try:
+            with open(json_path, 'r') as f:
+                data = json.load(f)
+        except Exception:
+            return
+        if isinstance(data, list):
+            yield from data
+
+
+_stores: Dict[str, RunStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_run_store(base_path: str) -> RunStore:
+    """Return the process-wide `RunStore` for a responses directory."""
+    path = str((Path(base_path) / 'aggregated_runs.sqlite').resolve())
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = RunStore(path)
+            _stores[path] = store
+        return store
@@ -0,0 +1,287 @@
+"""
+Sequential sampling with early stopping for `Simulation.ask_question`.
+
+An adaptive run does not ask every agent. Agents are split into strata: one
+per country, or per country and persona segment with `segment_by`. Each
+stratum is visited in a seeded random order, so the agents asked so far are
+always a simple random sample of it. Agents are asked in waves. After each
+wave every answer share of a stratum gets a Wilson score interval with a
+finite population correction. A stratum stops once its widest interval is
+within `target_half_width`, when it reaches its cap, or when it has no
+agents left.
+
+Each wave asks an open stratum for roughly the extra sample its observed
+shares say it still needs, so lopsided strata stop after a few dozen calls.
+Calls saved by strata that settle early stay in the run's `max_calls`
+budget and go to the strata that are still uncertain.
+
+Within a stratum the sample is unweighted. With `segment_by`, segments of a
+country are sampled at different rates, so country-level shares should
+weight each segment by `agents / answered` from the sampling summary.
+"""
+
+import logging
+import math
+import random
+from dataclasses import dataclass
+from statistics import NormalDist
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from synthcast.simulation.answers import ANSWER_OPTIONS
+
+# A child of the "simulation" logger, whose handlers setup_logging configures
+logger = logging.getLogger("simulation.sequential")
+
+
+@dataclass(frozen=True)
+class SequentialSettings:
+    """Stopping rule and budget of an adaptive run.
+
+    Attributes:
+        target_half_width: Stop a stratum once every answer share's interval
+            half-width is at most this (0.05 = ±5 percentage points).
+        confidence: Confidence level of the intervals.
+        min_samples: Answers a stratum needs before it may stop; also the
+            size of its first wave.
+        wave_size: Most agents added to one stratum in a single wave.
+        min_wave: Fewest agents added to an open stratum in a wave, so that
+            a stratum just short of the target is not asked one at a time.
+        max_share: Cap on the agents asked per stratum, as a fraction of
+            the stratum.
+        max_calls: Cap on the agents asked in the whole run. When the open
+            strata want more, the rest is split in proportion to what
+            each still needs.
+        segment_by: `Population.attributes` keys (e.g. "income_level") whose
+            values split each country into separate strata.
+    """
+
+    target_half_width: float = 0.05
+    confidence: float = 0.95
+    min_samples: int = 50
+    wave_size: int = 200
+    min_wave: int = 10
+    max_share: float = 1.0
+    max_calls: Optional[int] = None
+    segment_by: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_dict(cls, data: Mapping) -> "SequentialSettings":
+        """Settings from their `dataclasses.asdict` form (e.g. a journal header)."""
+        return cls(**{**data, "segment_by": tuple(data.get("segment_by", ()))})
+
+
+def wilson_half_width(count: float, n: float, z: float, population: Optional[int] = None) -> float:
+    """Half-width of the Wilson score interval for `count` of `n`, with a
+    finite population correction when the stratum's size is given."""
+    if n <= 0:
+        return math.inf
+    p = count / n
+    half = z / (1 + z * z / n) * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n))
+    if population is not None and population > 1:
+        half *= math.sqrt(max(population - n, 0) / (population - 1))
+    return half
+
+
+def required_sample(variance: float, half_width: float, z: float, population: int) -> int:
+    """Sample size giving `half_width` for a share with variance p(1-p), out of `population`."""
+    n0 = z * z * variance / (half_width * half_width)
+    return min(population, math.ceil(n0 / (1 + (n0 - 1) / population)))
+
+
+class _Stratum:
+    def __init__(self, key: Tuple[str, ...], agents: List[Dict], cap: int):
+        self.key = key
+        self.label = "/".join(key)
+        self.size = len(agents)
+        self.cap = cap
+        self.queue: List[Dict] = []
+        self.issued = 0
+        self.counts: Dict[str, int] = {}
+        self.answered = 0
+        self.status = "open"
+
+    def observe(self, option: str) -> None:
+        self.counts[option] = self.counts.get(option, 0) + 1
+        self.answered += 1
+
+    def half_width(self, z: float) -> float:
+        options = set(ANSWER_OPTIONS) | set(self.counts)
+        return max(wilson_half_width(self.counts.get(o, 0), self.answered, z, self.size) for o in options)
+
+    def needed(self, settings: SequentialSettings, z: float) -> int:
+        """Answers this stratum needs in total, projected from its shares so far."""
+        if self.answered == 0:
+            variance = 0.25
+        else:
+            # Shrink towards 1/2 so that an all-one-option start does not
+            # project a sample of zero
+            shrunk = [(self.counts.get(o, 0) + z * z / 2) / (self.answered + z * z) for o in set(ANSWER_OPTIONS) | set(self.counts)]
+            variance = max(p * (1 - p) for p in shrunk)
+        return max(min(settings.min_samples, self.size), required_sample(variance, settings.target_half_width, z, self.size))
+
+
+class SequentialSampler:
+    """Chooses the agents of each wave of an adaptive run.
+
+    Args:
+        settings: Stopping rule and budget
+        agents: Agents the run may ask (Simulation agent dicts)
+        population: Population the agents' `persona_id`s index into; only
+            used with `settings.segment_by`
+        seed: Seed of the per-stratum random order. Resuming with the same
+            seed continues the original order
+        answered: Options already recorded per agent index (when resuming)
+    """
+
+    def __init__(
+        self,
+        settings: SequentialSettings,
+        agents: Sequence[Dict],
+        population=None,
+        seed: Optional[int] = None,
+        answered: Optional[Mapping[int, str]] = None,
+    ):
+        self.settings = settings
+        self.z = NormalDist().inv_cdf((1 + settings.confidence) / 2)
+        self.waves_run = 0
+        answered = answered or {}
+        members: Dict[Tuple[str, ...], List[Dict]] = {}
+        for agent in agents:
+            key = (agent["country_code"],)
+            if settings.segment_by:
+                attributes = population.attributes(agent["persona_id"])
+                key += tuple(str(attributes[name]) for name in settings.segment_by)
+            members.setdefault(key, []).append(agent)
+
+        rng = random.Random(seed)
+        self.strata: List[_Stratum] = []
+        for key in sorted(members):
+            stratum_agents = members[key]
+            stratum = _Stratum(key, stratum_agents, max(1, math.ceil(settings.max_share * len(stratum_agents))))
+            order = list(stratum_agents)
+            rng.shuffle(order)
+            for agent in order:
+                if agent["index"] in answered:
+                    stratum.issued += 1
+                    stratum.observe(answered[agent["index"]])
+                else:
+                    stratum.queue.append(agent)
+            self.strata.append(stratum)
+        self._stratum_of = {agent["index"]: stratum for stratum in self.strata for agent in members[stratum.key]}
+        self.agent_count = len(self._stratum_of)
+
+    @property
+    def issued(self) -> int:
+        return sum(s.issued for s in self.strata)
+
+    @property
+    def finished(self) -> bool:
+        return all(s.status != "open" for s in self.strata)
+
+    def planned_calls(self) -> int:
+        """Calls the run would make if every stratum's answers were split evenly (the worst case)."""
+        s = self.settings
+        worst = sum(min(st.cap, max(min(s.min_samples, st.size), required_sample(0.25, s.target_half_width, self.z, st.size))) for st in self.strata)
+        return worst if s.max_calls is None else min(worst, s.max_calls)
+
+    def observe(self, agent: Dict, option: str) -> None:
+        """Record an agent's answer."""
+        stratum = self._stratum_of.get(agent["index"])
+        if stratum is not None:
+            stratum.observe(option)
+
+    def _close_settled(self) -> None:
+        s = self.settings
+        for stratum in self.strata:
+            if stratum.status != "open":
+                continue
+            if stratum.answered >= min(s.min_samples, stratum.size) and stratum.half_width(self.z) <= s.target_half_width:
+                stratum.status = "settled"
+            elif stratum.issued >= stratum.cap:
+                stratum.status = "capped"
+            elif not stratum.queue:
+                stratum.status = "exhausted"
+
+    def next_wave(self) -> List[Dict]:
+        """Close strata that are settled or out of agents and pick the next wave's agents."""
+        self._close_settled()
+        s = self.settings
+        wants: Dict[int, int] = {}
+        for i, stratum in enumerate(self.strata):
+            if stratum.status != "open":
+                continue
+            if stratum.issued:
+                want = max(stratum.needed(s, self.z) - stratum.answered, s.min_wave)
+            else:
+                want = s.min_samples
+            wants[i] = min(want, s.wave_size, stratum.cap - stratum.issued, len(stratum.queue))
+
+        if s.max_calls is not None:
+            left = max(s.max_calls - self.issued, 0)
+            total = sum(wants.values())
+            if total > left:
+                # Split the rest of the budget in proportion to what each
+                # stratum still wants, largest remainders first
+                shares = {i: want * left / total for i, want in wants.items()}
+                wants = {i: int(share) for i, share in shares.items()}
+                for i in sorted(shares, key=lambda i: shares[i] - wants[i], reverse=True)[:left - sum(wants.values())]:
+                    wants[i] += 1
+            if left == 0:
+                for stratum in self.strata:
+                    if stratum.status == "open":
+                        stratum.status = "budget"
+
+        wave: List[Dict] = []
+        for i, want in wants.items():
+            stratum = self.strata[i]
+            wave.extend(stratum.queue[:want])
+            del stratum.queue[:want]
+            stratum.issued += want
+        if wave:
+            self.waves_run += 1
+            stopped = sum(1 for st in self.strata if st.status != "open")
+            logger.info(
+                f"Wave {self.waves_run}: asking {len(wave)} agents in {sum(1 for want in wants.values() if want)} strata "
+                f"({stopped}/{len(self.strata)} stopped, {self.issued} of {self.agent_count} agents asked)"
+            )
+        return wave
+
+    def waves(self) -> Iterator[List[Dict]]:
+        """Yield waves until every stratum has stopped; answers are observed between waves."""
+        while True:
+            wave = self.next_wave()
+            if not wave:
+                return
+            yield wave
+
+    def summary(self) -> List[Dict]:
+        """Per stratum: size, agents asked and answered, widest half-width and why it stopped."""
+        rows = []
+        for stratum in self.strata:
+            half = stratum.half_width(self.z)
+            rows.append({
+                "stratum": stratum.label,
+                "agents": stratum.size,
+                "asked": stratum.issued,
+                "answered": stratum.answered,
+                "half_width": None if math.isinf(half) else round(half, 4),
+                "status": stratum.status,
+            })
+        return rows
+
+    def log_summary(self) -> None:
+        """Log how many calls the stopping rule saved and how each stratum ended."""
+        statuses: Dict[str, int] = {}
+        for stratum in self.strata:
+            statuses[stratum.status] = statuses.get(stratum.status, 0) + 1
+        issued = self.issued
+        logger.info(
+            f"Sequential sampling asked {issued} of {self.agent_count} agents "
+            f"({1 - issued / max(self.agent_count, 1):.0%} fewer calls) in {self.waves_run} waves; strata: "
+            + ", ".join(f"{count} {status}" for status, count in sorted(statuses.items()))
+        )
+        for row in self.summary():
+            logger.debug(
+                f"{row['stratum']}: {row['answered']}/{row['agents']} answered, "
+                f"half-width {row['half_width']}, {row['status']}"
+            )
@@ -0,0 +1,535 @@
+"""
+Sharded execution of one simulation across processes or hosts.
+
+A sharded run splits the agents of a population into contiguous index ranges
+("shards"). Agent indices are fixed by the population snapshot (country order,
+then persona order), so the split is deterministic for a given seed and
+shard count. The run and its shards are registered in a SQLite work queue;
+any number of workers, whether local processes or hosts sharing the results
+directory, claim shards and answer them with an ordinary `Simulation`.
+
+Each shard checkpoints into its own run journal
+(`<base_path>/journals/<run_id>.shard-0003.jsonl`), which is the shard's
+partial result. A worker that dies loses at most its journal's flush
+interval: its lease expires, another worker re-claims the shard and resumes
+from the journal. Once every shard is done, `merge` reads the journals back
+in agent-index order and saves per-country results and aggregated datapoints
+exactly as a single-process run does.
+
+Usage on one box::
+
+    runner = ShardedRunner()
+    results = runner.run_local(question, population, processes=4)
+
+or across hosts sharing `base_path`::
+
+    python -m synthcast.simulation.sharding submit "Will ...?" --counts USA=25000,DEU=25000 --seed 7 --shards 16
+    python -m synthcast.simulation.sharding work <run_id>      # on every host
+    python -m synthcast.simulation.sharding merge <run_id>
+
+Every worker process has its own rate limiter, so when the provider's limits
+are shared, divide `RateLimitSettings` budgets by the number of workers.
+SQLite locking needs a filesystem that supports it (local disk or a properly
+configured NFS v4 share).
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from synthcast.simulation.journal import journal_path, read_journal
+from synthcast.simulation.results import save_simulation_results
+from synthcast.simulation.simulation import ASK_MODES, DEFAULT_RESULTS_PATH, RESULT_FORMATS, Simulation
+
+# A child of the logger configured by `setup_logging`, so progress is shown
+logger = logging.getLogger("simulation.sharding")
+
+SHARD_STATUSES = ("pending", "running", "done", "failed")
+
+
+def shard_ranges(agent_count: int, shards: int) -> List[Tuple[int, int]]:
+    """Split agent indices [0, agent_count) into `shards` contiguous (start, stop) ranges."""
+    if shards < 1:
+        raise ValueError("shards must be at least 1")
+    shards = min(shards, max(agent_count, 1))
+    size, rest = divmod(agent_count, shards)
+    ranges = []
+    start = 0
+    for i in range(shards):
+        stop = start + size + (i < rest)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def shard_run_id(run_id: str, shard: int) -> str:
+    """Run id of one shard's journal."""
+    return f"{run_id}.shard-{shard:04d}"
+
+
+@dataclass(frozen=True)
+class ShardedRunSpec:
+    """A registered sharded run.
+
+    Attributes:
+        run_id: Id of the merged run.
+        question: The question asked.
+        mode: `Simulation.ask_question` mode.
+        result_format: Format the merged results are saved in.
+        model: Model every worker uses.
+        temperature: Sampling temperature.
+        population_snapshot: Snapshot id under `<base_path>/populations/`.
+        agent_count: Agents in the population.
+        shards: Number of shards.
+    """
+
+    run_id: str
+    question: str
+    mode: str
+    result_format: str
+    model: str
+    temperature: float
+    population_snapshot: str
+    agent_count: int
+    shards: int
+
+
+@dataclass(frozen=True)
+class Shard:
+    """One claimed shard: agents [start, stop) of `run_id`."""
+
+    run_id: str
+    index: int
+    start: int
+    stop: int
+    attempts: int
+
+    @property
+    def size(self) -> int:
+        return self.stop - self.start
+
+
+class ShardQueue:
+    """SQLite work queue of shards.
+
+    Claims are leases: a running shard whose heartbeat is older than the
+    lease is handed to the next worker that asks, so crashed workers do not
+    strand their shards.
+
+    Args:
+        path: Database file, conventionally `<base_path>/shards.sqlite`
+        lease: Seconds without a heartbeat before a running shard is re-claimed
+        max_attempts: Claims of a shard before it is marked failed
+    """
+
+    def __init__(self, path: str, lease: float = 300.0, max_attempts: int = 3):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " run_id TEXT PRIMARY KEY,"
+            " spec TEXT NOT NULL,"
+            " created TEXT NOT NULL,"
+            " merged TEXT)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS shards ("
+            " run_id TEXT NOT NULL,"
+            " shard INTEGER NOT NULL,"
+            " start INTEGER NOT NULL,"
+            " stop INTEGER NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            " worker TEXT,"
+            " heartbeat REAL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " error TEXT,"
+            " PRIMARY KEY (run_id, shard))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS shards_status ON shards(run_id, status)")
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn()
+                self._conn.execute("COMMIT")
+                return result
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def add_run(self, spec: ShardedRunSpec, ranges: List[Tuple[int, int]]) -> None:
+        def _add():
+            self._conn.execute(
+                "INSERT INTO runs (run_id, spec, created) VALUES (?, ?, ?)",
+                (spec.run_id, json.dumps(spec.__dict__), datetime.now().strftime("%Y%m%d_%H%M%S")),
+            )
+            self._conn.executemany(
+                "INSERT INTO shards (run_id, shard, start, stop) VALUES (?, ?, ?, ?)",
+                [(spec.run_id, i, start, stop) for i, (start, stop) in enumerate(ranges)],
+            )
+        self._transaction(_add)
+
+    def run(self, run_id: str) -> ShardedRunSpec:
+        row = self._conn.execute("SELECT spec FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"No sharded run {run_id} in {self.path}")
+        return ShardedRunSpec(**json.loads(row[0]))
+
+    def claim(self, run_id: str, worker: str) -> Optional[Shard]:
+        """
+        Lease the next pending (or abandoned) shard to `worker`; None when none is left.
+
+        An abandoned shard that has used up `max_attempts` is marked failed
+        instead, so a shard that keeps killing its workers is not handed out
+        forever.
+        """
+        def _claim():
+            now = time.time()
+            # Abandoned shards out of attempts fail instead of being re-claimed
+            self._conn.execute(
+                "UPDATE shards SET status = 'failed', error = 'lease expired after ' || attempts || ' attempts'"
+                " WHERE run_id = ? AND status = 'running' AND heartbeat < ? AND attempts >= ?",
+                (run_id, now - self.lease, self.max_attempts),
+            )
+            row = self._conn.execute(
+                "SELECT shard, start, stop, attempts FROM shards WHERE run_id = ?"
+                " AND (status = 'pending' OR (status = 'running' AND heartbeat < ?))"
+                " ORDER BY status DESC, shard LIMIT 1",
+                (run_id, now - self.lease),
+            ).fetchone()
+            if row is None:
+                return None
+            shard, start, stop, attempts = row
+            self._conn.execute(
+                "UPDATE shards SET status = 'running', worker = ?, heartbeat = ?, attempts = attempts + 1"
+                " WHERE run_id = ? AND shard = ?",
+                (worker, now, run_id, shard),
+            )
+            return Shard(run_id, shard, start, stop, attempts + 1)
+        return self._transaction(_claim)
+
+    def heartbeat(self, shard: Shard, worker: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE shards SET heartbeat = ? WHERE run_id = ? AND shard = ? AND worker = ?",
+                (time.time(), shard.run_id, shard.index, worker),
+            )
+
+    def complete(self, shard: Shard, worker: str) -> bool:
+        """
+        Mark a shard done. Returns False when `worker` no longer holds its
+        lease (it lapsed and another worker re-claimed the shard).
+        """
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE shards SET status = 'done', error = NULL"
+                " WHERE run_id = ? AND shard = ? AND worker = ? AND status = 'running'",
+                (shard.run_id, shard.index, worker),
+            ).rowcount == 1
+
+    def fail(self, shard: Shard, worker: str, error: str) -> bool:
+        """
+        Release a shard after an error; it is retried until `max_attempts`.
+        Returns False when `worker` no longer holds its lease.
+        """
+        status = "failed" if shard.attempts >= self.max_attempts else "pending"
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE shards SET status = ?, error = ?"
+                " WHERE run_id = ? AND shard = ? AND worker = ? AND status = 'running'",
+                (status, error, shard.run_id, shard.index, worker),
+            ).rowcount == 1
+
+    def reset_failed(self, run_id: str) -> int:
+        """Return failed shards to the queue with fresh attempts; returns how many."""
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE shards SET status = 'pending', attempts = 0 WHERE run_id = ? AND status = 'failed'", (run_id,)
+            ).rowcount
+
+    def shards(self, run_id: str) -> List[Dict]:
+        rows = self._conn.execute(
+            "SELECT shard, start, stop, status, worker, attempts, error FROM shards WHERE run_id = ? ORDER BY shard",
+            (run_id,),
+        ).fetchall()
+        return [dict(zip(("shard", "start", "stop", "status", "worker", "attempts", "error"), row)) for row in rows]
+
+    def status(self, run_id: str) -> Dict[str, int]:
+        counts = dict.fromkeys(SHARD_STATUSES, 0)
+        for status, n in self._conn.execute("SELECT status, COUNT(*) FROM shards WHERE run_id = ? GROUP BY status", (run_id,)):
+            counts[status] = n
+        return counts
+
+    def mark_merged(self, run_id: str) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE runs SET merged = ? WHERE run_id = ?", (datetime.now().strftime("%Y%m%d_%H%M%S"), run_id))
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class _Heartbeat(threading.Thread):
+    """Keeps a shard's lease alive while a worker answers it."""
+
+    def __init__(self, queue: ShardQueue, shard: Shard, worker: str):
+        super().__init__(daemon=True)
+        self.queue, self.shard, self.worker = queue, shard, worker
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.queue.lease / 3):
+            self.queue.heartbeat(self.shard, self.worker)
+
+
+class ShardedRunner:
+    """Submits, works and merges sharded runs.
+
+    Args:
+        base_path: Results directory shared by all workers
+        queue_path: Work queue database; defaults to `<base_path>/shards.sqlite`
+        lease: Seconds without a heartbeat before a shard is re-claimed
+        max_attempts: Claims of a shard before it is marked failed
+    """
+
+    def __init__(self, base_path: Optional[str] = None, queue_path: Optional[str] = None, lease: float = 300.0, max_attempts: int = 3):
+        self.base_path = str(base_path or DEFAULT_RESULTS_PATH)
+        self.queue = ShardQueue(queue_path or str(Path(self.base_path) / "shards.sqlite"), lease, max_attempts)
+
+    def submit(
+        self,
+        question: str,
+        population,
+        shards: int,
+        mode: str = "generate",
+        result_format: str = "json",
+        model_name: str = "Qwen/Qwen2.5-Coder-7B-fast",
+        temperature: float = 0.7,
+    ) -> str:
+        """
+        Save the population snapshot and queue its agents as `shards` shards.
+
+        Returns:
+            str: The run id, for `work` and `merge`
+        """
+        if mode not in ASK_MODES:
+            raise ValueError(f"Unknown mode '{mode}'. Expected one of {ASK_MODES}")
+        if result_format not in RESULT_FORMATS:
+            raise ValueError(f"Unknown result_format '{result_format}'. Expected one of {RESULT_FORMATS}")
+        population.save_to_directory(str(Path(self.base_path) / "populations"))
+        run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        ranges = shard_ranges(len(population), shards)
+        spec = ShardedRunSpec(
+            run_id=run_id,
+            question=question,
+            mode=mode,
+            result_format=result_format,
+            model=model_name,
+            temperature=temperature,
+            population_snapshot=population.snapshot_id,
+            agent_count=len(population),
+            shards=len(ranges),
+        )
+        self.queue.add_run(spec, ranges)
+        logger.info(f"Queued run {run_id}: {len(population)} agents in {len(ranges)} shards")
+        return run_id
+
+    def _population(self, spec: ShardedRunSpec):
+        from synthcast.population.population import Population
+        return Population.load(str(Path(self.base_path) / "populations" / f"{spec.population_snapshot}.synthpop"))
+
+    def work(self, run_id: str, worker: Optional[str] = None, max_shards: Optional[int] = None, **simulation_kwargs) -> int:
+        """
+        Claim and answer shards of `run_id` until none are left.
+
+        Keyword arguments are passed to `Simulation` (e.g. `rate_limit_settings`,
+        `cache`); model and temperature come from the run.
+
+        Returns:
+            int: Shards completed by this worker
+        """
+        spec = self.queue.run(run_id)
+        worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+        simulation = Simulation(
+            population=self._population(spec), model_name=spec.model, temperature=spec.temperature, **simulation_kwargs
+        )
+        completed = 0
+        while max_shards is None or completed < max_shards:
+            shard = self.queue.claim(run_id, worker)
+            if shard is None:
+                break
+            logger.info(f"{worker} answering shard {shard.index} (agents {shard.start}-{shard.stop - 1}, attempt {shard.attempts})")
+            heartbeat = _Heartbeat(self.queue, shard, worker)
+            heartbeat.start()
+            try:
+                results = simulation.ask_shard(spec.question, shard_run_id(run_id, shard.index), (shard.start, shard.stop), self.base_path, spec.mode)
+                answered = sum(len(records) for records in results.values())
+                if answered < shard.size:
+                    raise RuntimeError(f"{shard.size - answered} agents failed")
+            except Exception as e:
+                logger.error(f"Shard {shard.index} of {run_id} failed: {e}")
+                if not self.queue.fail(shard, worker, f"{type(e).__name__}: {e}"):
+                    logger.warning(f"{worker} lost the lease on shard {shard.index} of {run_id}; another worker holds it")
+                continue
+            finally:
+                heartbeat.stopped.set()
+                heartbeat.join()
+            if not self.queue.complete(shard, worker):
+                # The lease lapsed and another worker re-claimed the shard;
+                # its journal is that worker's now
+                logger.warning(f"{worker} lost the lease on shard {shard.index} of {run_id}; dropping its result")
+                continue
+            completed += 1
+        return completed
+
+    def merge(self, run_id: str, save_results: bool = True) -> Dict[str, List[Dict]]:
+        """
+        Combine the shards' journals into the run's results.
+
+        Records are ordered by agent index. With `save_results`, per-country
+        result files and aggregated datapoints are written as by
+        `Simulation.ask_question`, with the sharded run's id as their run id.
+
+        Raises:
+            RuntimeError: If any shard is not done yet
+        """
+        spec = self.queue.run(run_id)
+        unfinished = [s for s in self.queue.shards(run_id) if s["status"] != "done"]
+        if unfinished:
+            raise RuntimeError(f"Run {run_id} has {len(unfinished)} unfinished shards: {[s['shard'] for s in unfinished]}")
+        population = self._population(spec)
+        results_by_country: Dict[str, List[Dict]] = {}
+        layouts = set()
+        for shard in range(spec.shards):
+            state = read_journal(str(journal_path(shard_run_id(run_id, shard), self.base_path)))
+            layouts.add(state.header.get("prompt_layout"))
+            for index in sorted(state.results):
+                country_code, record = state.results[index]
+                results_by_country.setdefault(country_code, []).append({"persona": population.render(record["persona_id"]), **record})
+        if len(layouts) > 1:
+            logger.warning(f"Shards of run {run_id} used different prompt layouts: {sorted(map(str, layouts))}")
+        if save_results:
+            snapshot = spec.population_snapshot if spec.result_format == "compact" else None
+            for country_code, country_results in results_by_country.items():
+                filepath = save_simulation_results(
+                    results=country_results,
+                    question=spec.question,
+                    country_code=country_code,
+                    base_path=self.base_path,
+                    result_format=spec.result_format,
+                    population_snapshot=snapshot,
+                    metadata={
+                        "run_id": run_id,
+                        "model": spec.model,
+                        "temperature": spec.temperature,
+                        "mode": spec.mode,
+                        "prompt_layout": "+".join(sorted(map(str, layouts))),
+                    },
+                )
+                logger.info(f"Saved {len(country_results)} responses for {country_code} to {filepath}")
+            self.queue.mark_merged(run_id)
+        return results_by_country
+
+    def run_local(self, question: str, population, processes: int, shards: Optional[int] = None, save_results: bool = True, **kwargs) -> Dict[str, List[Dict]]:
+        """
+        Submit, work with `processes` local worker processes and merge.
+
+        Args:
+            shards: Number of shards (default: 4 per process, so a slow shard
+                does not hold the others back)
+            kwargs: `mode`, `result_format`, `model_name` and `temperature`
+                go to `submit`; the rest to every worker's `Simulation`
+        """
+        submit_keys = ("mode", "result_format", "model_name", "temperature")
+        submit_kwargs = {k: kwargs.pop(k) for k in submit_keys if k in kwargs}
+        run_id = self.submit(question, population, shards or 4 * processes, **submit_kwargs)
+        context = multiprocessing.get_context("spawn")
+        workers = [
+            context.Process(target=_work, args=(self.base_path, self.queue.path, self.queue.lease, self.queue.max_attempts, run_id, kwargs))
+            for _ in range(processes)
+        ]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join()
+        return self.merge(run_id, save_results=save_results)
+
+
+def _work(base_path: str, queue_path: str, lease: float, max_attempts: int, run_id: str, simulation_kwargs: Dict) -> None:
+    """Worker process entry point for `ShardedRunner.run_local`."""
+    from synthcast.simulation.logger import setup_logging
+    setup_logging()
+    ShardedRunner(base_path, queue_path, lease, max_attempts).work(run_id, **simulation_kwargs)
+
+
+def _parse_counts(text: str) -> Dict[str, int]:
+    """Parse "USA=25000,DEU=25000"."""
+    counts = {}
+    for item in text.split(","):
+        code, _, n = item.partition("=")
+        counts[code.strip().upper()] = int(n)
+    return counts
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Sharded SynthCast runs")
+    parser.add_argument("--base-path", default=None, help="results directory shared by all workers")
+    commands = parser.add_subparsers(dest="command", required=True)
+    submit = commands.add_parser("submit", help="sample a population and queue its shards")
+    submit.add_argument("question")
+    submit.add_argument("--counts", type=_parse_counts, required=True, help="agents per country, e.g. USA=25000,DEU=25000")
+    submit.add_argument("--seed", type=int, required=True)
+    submit.add_argument("--shards", type=int, required=True)
+    submit.add_argument("--mode", default="generate")
+    submit.add_argument("--result-format", default="json")
+    submit.add_argument("--model", default="Qwen/Qwen2.5-Coder-7B-fast")
+    submit.add_argument("--temperature", type=float, default=0.7)
+    work = commands.add_parser("work", help="answer shards until none are left")
+    work.add_argument("run_id")
+    work.add_argument("--max-concurrency", type=int, default=64)
+    merge = commands.add_parser("merge", help="save the merged results of a finished run")
+    merge.add_argument("run_id")
+    status = commands.add_parser("status", help="show a run's shards")
+    status.add_argument("run_id")
+    status.add_argument("--retry-failed", action="store_true", help="requeue failed shards")
+    args = parser.parse_args(argv)
+
+    from synthcast.simulation.logger import setup_logging
+    setup_logging()
+    runner = ShardedRunner(args.base_path)
+    if args.command == "submit":
+        from synthcast.population.persona_generator import PersonaGenerator
+        population = PersonaGenerator().generate_population(args.counts, seed=args.seed)
+        print(runner.submit(args.question, population, args.shards, args.mode, args.result_format, args.model, args.temperature))
+    elif args.command == "work":
+        print(f"Completed {runner.work(args.run_id, max_concurrency=args.max_concurrency)} shards")
+    elif args.command == "merge":
+        results = runner.merge(args.run_id)
+        print(f"Merged {sum(len(r) for r in results.values())} responses for {len(results)} countries")
+    else:
+        if args.retry_failed:
+            print(f"Requeued {runner.queue.reset_failed(args.run_id)} failed shards")
+        for shard in runner.queue.shards(args.run_id):
+            print(f"{shard['shard']:>5} {shard['start']:>8}-{shard['stop'] - 1:<8} {shard['status']:<8} {shard['worker'] or '':<24} {shard['error'] or ''}")
+        print(runner.queue.status(args.run_id))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,184 +2,1049 @@
 Simulation module for running multi-agent experiments
 """
 
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
 import asyncio
+import dataclasses
 import functools
 import logging
+import uuid
+from datetime import datetime
 from pathlib import Path
 from synthcast.simulation.nebius import NebiusAgent
-from synthcast.population.persona_generator import PersonaGenerator
+from synthcast.simulation.answers import (
+    ANSWER_INSTRUCTION,
+    ANSWER_OPTIONS,
+    ANSWER_WITH_REASONING_INSTRUCTION,
+    most_likely_option,
+    normalize_response,
+)
+from synthcast.simulation.cache import ResponseCache
+from synthcast.simulation.client_pool import ConnectionSettings, close_async_clients
+from synthcast.simulation.errors import LLMError
+from synthcast.simulation.failures import ErrorBudget, ErrorBudgetExceeded, FailureSettings
+from synthcast.simulation import metrics
+from synthcast.simulation.llm_agent import LLMAgent, TokenUsage
+from synthcast.simulation.journal import JournalState, RunJournal, journal_path, read_journal
+from synthcast.simulation.prompts import PROMPT_LAYOUTS, PromptAssembler, followup_instruction
+from synthcast.simulation.rate_limit import RateLimitSettings
+from synthcast.simulation.router import Backend, LLMRouter, RouterSettings
+from synthcast.simulation.sequential import SequentialSampler, SequentialSettings
 from synthcast.simulation.logger import setup_logging
-from synthcast.simulation.results import save_simulation_results
+from synthcast.simulation.results import RESULT_FORMATS, save_simulation_results
+
+if TYPE_CHECKING:
+    from synthcast.population.population import Population
+    from synthcast.simulation.batch import BatchExecutor
+    from synthcast.simulation.sweep import CallScheduler
+
+ASK_MODES = ("generate", "score", "stream", "answer_only")
+
+DEFAULT_RESULTS_PATH = str(Path(__file__).parent.parent / 'data' / 'responses')
+
+
+def country_iso_code(key: str) -> str:
+    """
+    Upper-case ISO code of a country given by ISO code or reference-data
+    name, in any case.
+
+    Raises:
+        ValueError: If the country is not in the population data
+    """
+    from synthcast.population.reference import get_reference_data
+    try:
+        return str(get_reference_data().country(key)["iso_code"]).upper()
+    except KeyError:
+        raise ValueError(f"Unknown country {key!r}; expected an ISO code or country name from the population data") from None
+
+
+def resolve_country_counts(country_agent_counts: Dict[str, int]) -> Dict[str, int]:
+    """
+    Key agent counts by upper-case ISO code (see `country_iso_code`); counts
+    of keys naming the same country are added up.
+
+    Raises:
+        ValueError: If a country is unknown or has no agents
+    """
+    counts: Dict[str, int] = {}
+    for key, count in country_agent_counts.items():
+        iso_code = country_iso_code(key)
+        if count < 1:
+            raise ValueError(f"Country {key!r} needs at least one agent, got {count}")
+        counts[iso_code] = counts.get(iso_code, 0) + count
+    return counts
+
+
+def _fallback_option(response: Optional[str]) -> str:
+    """Keyword guess for an answer still unparseable after the follow-ups."""
+    s = (response or "").lower()
+    if any(k in s for k in ("cannot", "unable", "do not know", "no information", "not able")):
+        return "unlikely"
+    elif "very" in s and "likely" in s:
+        return "very likely"
+    elif "likely" in s:
+        return "likely"
+    elif "unlikely" in s:
+        return "unlikely"
+    else:
+        return "unlikely"
+
 
 class Simulation:
-    def __init__(self, country_agent_counts: Dict[str, int], temperature: float = 0.7, model_name: str = "Qwen/Qwen2.5-Coder-7B-fast"):
+    def __init__(
+        self,
+        country_agent_counts: Optional[Dict[str, int]] = None,
+        temperature: float = 0.7,
+        model_name: str = "Qwen/Qwen2.5-Coder-7B-fast",
+        max_concurrency: int = 64,
+        connection_settings: Optional[ConnectionSettings] = None,
+        rate_limit_settings: Optional[RateLimitSettings] = None,
+        cache: Optional[ResponseCache] = None,
+        group_identical_personas: bool = True,
+        seed: Optional[int] = None,
+        population: Optional["Population"] = None,
+        failure_settings: Optional[FailureSettings] = None,
+        backends: Optional[List[Backend]] = None,
+        router_settings: Optional[RouterSettings] = None,
+        prompt_layout: str = "persona_first",
+        max_prompt_tokens: Optional[int] = None,
+        collect_metrics: bool = True,
+        token_prices: Optional[metrics.Prices] = None,
+        metrics_port: Optional[int] = None,
+    ):
+        if population is not None:
+            country_agent_counts = population.counts()
+        elif country_agent_counts is None:
+            raise ValueError("Either country_agent_counts or population is required")
+        else:
+            country_agent_counts = resolve_country_counts(country_agent_counts)
         self.logger = setup_logging()
         self.logger.info(f"Initializing simulation with {sum(country_agent_counts.values())} total agents across {len(country_agent_counts)} countries")
         self.country_agent_counts = country_agent_counts
         self.temperature = temperature
         self.model_name = model_name
+        if connection_settings is None:
+            connection_settings = ConnectionSettings(max_concurrency=max_concurrency)
+        self.connection_settings = connection_settings
+        self.rate_limit_settings = rate_limit_settings
+        self.cache = cache
+        self.group_identical_personas = group_identical_personas
+        self.failure_settings = failure_settings or FailureSettings()
+        if prompt_layout not in PROMPT_LAYOUTS:
+            raise ValueError(f"Unknown prompt_layout {prompt_layout!r}; expected one of {PROMPT_LAYOUTS}")
+        self.prompt_layout = prompt_layout
+        self.max_prompt_tokens = max_prompt_tokens
+        # Per-run metrics (see synthcast.simulation.metrics); the latest run's
+        # registry is also served on metrics_port when given
+        self.collect_metrics = collect_metrics
+        self.token_prices = token_prices
+        self.last_metrics: Optional[metrics.MetricsRegistry] = None
+        self.metrics_server = metrics.serve_prometheus(lambda: self.last_metrics, metrics_port) if metrics_port else None
+        # With backends, calls are spread across them by an LLMRouter and
+        # model_name becomes the router's combined backend label
+        self.router = LLMRouter(backends, router_settings, seed=seed) if backends else None
+        if self.router is not None:
+            self.model_name = self.router.model_name
+        self.seed = seed if population is None else population.seed
+        self.population = population
+        self.last_run_id: Optional[str] = None
+        # Per-stratum sample sizes and stopping reasons of the latest adaptive run
+        self.last_sampling: Optional[List[Dict]] = None
         self.agents = self._create_agents()
 
     def _create_agents(self):
-        """Create agents for each country with their personas."""
+        """Create agents for each country with their personas.
+
+        All personas share a single `NebiusAgent` (or the `LLMRouter` over
+        the configured backends), so the whole run uses one pooled client per
+        endpoint instead of one client per persona. Personas come from
+        `self.population` (sampled with the bulk sampler when not supplied; a
+        fixed `seed` reproduces it) and are addressed by `persona_id`; prompts
+        are rendered when an agent is asked (see `_persona`), not held here.
+        """
         agents = []
-        pg = PersonaGenerator()
+        if self.population is None:
+            # Imported here so analysis-only users of this module skip NumPy
+            from synthcast.population.persona_generator import PersonaGenerator
+            self.population = PersonaGenerator().generate_population(self.country_agent_counts, seed=self.seed)
+        population = self.population
+        # Identical records render identical prompts: number them per record
+        persona_keys: Dict[bytes, int] = {}
+        persona_counts: Dict[int, int] = {}
+        agent = self.router or NebiusAgent(
+            model_name=self.model_name,
+            connection_settings=self.connection_settings,
+            rate_limit_settings=self.rate_limit_settings,
+            cache=self.cache,
+        )
         
         for country_code, count in self.country_agent_counts.items():
             self.logger.info(f"Creating {count} agents for country {country_code}")
-            personas = pg.generate_country_personas(country_code, count)
-            
-            for persona_prompt in personas:
-                agent = NebiusAgent(model_name=self.model_name)
+            for persona_id in population.indices_for(country_code):
+                persona_id = int(persona_id)
+                persona_key = persona_keys.setdefault(population.records[persona_id].tobytes(), len(persona_keys))
+                # Identical personas are distinct samples of the same prompt;
+                # the index keeps their cached responses apart
+                sample_index = persona_counts.get(persona_key, 0)
+                persona_counts[persona_key] = sample_index + 1
                 agents.append({
-                    "persona": persona_prompt,
+                    "index": len(agents),
+                    "persona_key": persona_key,
                     "agent": agent,
                     "temperature": self.temperature,
-                    "country_code": country_code  # Add country code to track responses
+                    "country_code": country_code,  # Add country code to track responses
+                    "sample_index": sample_index,
+                    "persona_id": persona_id,
                 })
         
         return agents
 
-    def ask_question(self, question: str, save_results: bool = True, base_path: Optional[str] = None) -> Dict[str, List[Dict]]:
+    def _persona(self, agent: Dict) -> str:
+        """Persona prompt of an agent, rendered from the population."""
+        return self.population.render(agent["persona_id"])
+
+    def _persona_key(self, agent: Dict):
+        """Agents with equal keys have byte-identical persona prompts."""
+        return agent["persona_key"]
+
+    def _persona_groups(self, agents: Optional[List[Dict]] = None) -> List[List[Dict]]:
+        """Group agents whose requests would be byte-identical.
+
+        Agents are grouped by (persona prompt, temperature, backend). Each
+        group is sampled with one `n`-completion request and every agent still
+        receives its own answer, so per-agent results and country counts are
+        statistically unchanged. Groups are split wherever sample indices are
+        not consecutive (e.g. when resuming), since one request serves a
+        contiguous range of samples.
+        """
+        groups: Dict[tuple, List[Dict]] = {}
+        for agent in (self.agents if agents is None else agents):
+            key = (self._persona_key(agent), agent["temperature"], id(agent["agent"]), agent["country_code"])
+            groups.setdefault(key, []).append(agent)
+        runs: List[List[Dict]] = []
+        for group in groups.values():
+            group.sort(key=lambda a: a["sample_index"])
+            run = [group[0]]
+            for agent in group[1:]:
+                if agent["sample_index"] != run[-1]["sample_index"] + 1:
+                    runs.append(run)
+                    run = []
+                run.append(agent)
+            runs.append(run)
+        return runs
+
+    def _log_stream_timings(self, results_by_country: Dict[str, List[Dict]]) -> None:
+        """Log median queue wait, TTFT and time-to-answer for a streamed run."""
+        timings = [r["timing"] for rs in results_by_country.values() for r in rs if "timing" in r]
+        if not timings:
+            return
+
+        def _median(key):
+            values = sorted(t[key] for t in timings if t.get(key) is not None)
+            return values[len(values) // 2] if values else float("nan")
+
+        cancelled = sum(1 for t in timings if t.get("cancelled"))
+        self.logger.info(
+            f"Streaming latency (median): queue {_median('queue_wait'):.3f}s, "
+            f"TTFT {_median('time_to_first_token'):.3f}s, answer {_median('time_to_answer'):.3f}s, "
+            f"total {_median('total_time'):.3f}s; {cancelled}/{len(timings)} streams cancelled early"
+        )
+
+    def _prompt_assembler(self, question: str, instruction: str, layout: Optional[str] = None) -> PromptAssembler:
+        return PromptAssembler(question, instruction, layout or self.prompt_layout, self.max_prompt_tokens)
+
+    def _token_usage(self) -> Optional[TokenUsage]:
+        """Provider-reported usage of the run's agent so far (None if it reports none)."""
+        llm = self.agents[0]["agent"] if self.agents else None
+        usage = getattr(llm, "usage", None)
+        return TokenUsage() + usage if usage is not None else None
+
+    def _log_token_usage(self, assemblers, usage_before: Optional[TokenUsage]) -> None:
+        """Log prompt tokens sent, the share laid out as a cross-agent prefix,
+        and the cached/uncached split reported by the provider."""
+        calls = sum(a.stats.calls for a in assemblers)
+        if not calls:
+            return
+        prompt_tokens = sum(a.stats.prompt_tokens for a in assemblers)
+        shared = sum(a.stats.shared_tokens for a in assemblers)
+        truncated = sum(a.stats.truncated for a in assemblers)
+        tokenizer = next(iter(assemblers)).tokenizer
+        self.logger.info(
+            f"Prompts ({next(iter(assemblers)).layout}, {tokenizer} tokens): {calls} assembled, {prompt_tokens} tokens, "
+            f"{shared} ({shared / max(prompt_tokens, 1):.0%}) in the shared prefix"
+            + (f", {truncated} personas trimmed to the {self.max_prompt_tokens}-token budget" if truncated else "")
+        )
+        usage = self._token_usage()
+        if usage is not None and usage_before is not None:
+            used = usage - usage_before
+            if used.requests:
+                self.logger.info(
+                    f"Provider usage: {used.prompt_tokens} prompt tokens ({used.cached_tokens} cached, "
+                    f"{used.uncached_tokens} uncached, {used.cached_tokens / max(used.prompt_tokens, 1):.0%} cache hit), "
+                    f"{used.completion_tokens} completion tokens over {used.requests} requests"
+                )
+
+    def _log_metrics(self, registry: metrics.MetricsRegistry, base_path: Optional[str]) -> None:
+        """Log where a run's wall time went and write its metrics files."""
+        summary = registry.summary()
+        totals = summary["totals"]
+
+        def _p(name, q):
+            value = summary[name][q]
+            return "n/a" if value is None else f"{value:.3f}s"
+
+        self.logger.info(
+            f"Calls: {int(totals.get('calls_total', 0))} ({totals['calls_per_second']}/s), "
+            f"{int(totals.get('errors_total', 0))} failed attempts; "
+            f"p50/p99 call {_p('call_seconds', 'p50')}/{_p('call_seconds', 'p99')}, "
+            f"queue {_p('queue_wait_seconds', 'p50')}/{_p('queue_wait_seconds', 'p99')}, "
+            f"provider {_p('request_seconds', 'p50')}/{_p('request_seconds', 'p99')}"
+            + (f"; estimated cost ${totals['cost_usd']:.4f}" if totals["cost_usd"] is not None else "")
+        )
+        if base_path is not None:
+            summary_path, _ = registry.write(str(Path(base_path) / 'metrics'))
+            self.logger.info(f"Saved run metrics to {summary_path}")
+
+    def _log_router_stats(self) -> None:
+        """Log each backend's traffic share, error rate, latency and hedges."""
+        for stats in self.router.stats():
+            p50, p99 = stats["p50"], stats["p99"]
+            self.logger.info(
+                f"Backend {stats['name']}: {stats['calls']} calls, share {stats['share']:.0%}, "
+                f"errors {stats['error_rate']:.1%}, "
+                f"p50 {p50 if p50 is None else round(p50, 3)}s, p99 {p99 if p99 is None else round(p99, 3)}s, "
+                f"hedges {stats['hedges']} ({stats['hedge_wins']} won)"
+            )
+
+    def _save_population_snapshot(self, base_path: Optional[str] = None) -> str:
+        """Save the population under `<base_path>/populations/` once and return its snapshot id."""
+        if base_path is None:
+            base_path = DEFAULT_RESULTS_PATH
+        self.population.save_to_directory(str(Path(base_path) / 'populations'))
+        return self.population.snapshot_id
+
+    def ask_question(
+        self,
+        question: str,
+        save_results: bool = True,
+        base_path: Optional[str] = None,
+        mode: str = "generate",
+        result_format: str = "json",
+        checkpoint: Optional[bool] = None,
+        sequential: Optional[SequentialSettings] = None,
+    ) -> Dict[str, List[Dict]]:
         """
         Ask a question to all agents and collect their responses.
         
         Args:
             question: The question to ask
             save_results: Whether to save results to files by country
+            checkpoint: Stream completed responses to a run journal under
+                `<base_path>/journals/` so an interrupted run can be finished
+                with `resume(run_id)`. Defaults to `save_results`. The run id
+                is available as `last_run_id` as soon as the run starts
+            result_format: "json", or "compact" to save compressed columnar
+                files that reference personas by id. The population snapshot
+                they point into is saved under `<base_path>/populations/`
+            mode: "generate" samples a free-text answer and normalizes it
+                (re-asking on unparseable answers). "score" makes one short
+                logprob request per agent and records a full distribution over
+                the answer options alongside the most likely option.
+                "stream" asks for an ANSWER/REASONING reply, streams it and
+                keeps the reasoning text. "answer_only" streams the plain
+                answer and cancels generation as soon as an option is parsed.
+                Both stream modes record time-to-first-token, time-to-answer
+                and rate-limiter queue wait per agent.
+            sequential: Ask adaptively instead of asking every agent: agents
+                are asked in randomized waves per country and a country stops
+                once its answer shares are as precise as the settings ask or
+                its cap is reached (see `synthcast.simulation.sequential`).
+                Only the agents asked appear in the results; per-country
+                sample sizes are in `last_sampling`
             
         Returns:
             Dict[str, List[Dict]]: Dictionary of responses by country code
+
+        Raises:
+            ErrorBudgetExceeded: Too many agent calls failed (see
+                `FailureSettings`); failed agents are otherwise retried on a
+                concurrent retry queue and left out if they keep failing
         """
-        results_by_country = {}
-        self.logger.info(f"Asking question to {len(self.agents)} agents: {question}")
-        instruction = (
-            "You MUST answer with exactly one of the following (case-insensitive):\\n"
-            "very likely\\n"
-            "likely\\n"
-            "unlikely\\n"
-            "highly unlikely\\n\\n"
-            "Return ONLY that phrase — no quotes, punctuation, explanation, or additional text. "
-            "Base your answer only on your persona and the information provided."
+        if mode not in ASK_MODES:
+            raise ValueError(f"Unknown mode '{mode}'. Expected one of {ASK_MODES}")
+        if result_format not in RESULT_FORMATS:
+            raise ValueError(f"Unknown result_format '{result_format}'. Expected one of {RESULT_FORMATS}")
+        run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        if checkpoint is None:
+            checkpoint = save_results
+        return self._run(question, run_id, save_results, base_path, mode, result_format, checkpoint, sequential=sequential)
+
+    def resume(self, run_id: str, base_path: Optional[str] = None, save_results: bool = True) -> Dict[str, List[Dict]]:
+        """
+        Finish an interrupted checkpointed run.
+
+        Completed responses are read back from the run's journal and only the
+        agents without one are queried. The simulation must have the same
+        population as the original run (see `from_run`).
+
+        Args:
+            run_id: Id of the run to resume (`last_run_id` of the original call)
+            base_path: Results directory the run was checkpointed under
+            save_results: Save the completed run's results
+
+        Returns:
+            Dict[str, List[Dict]]: Dictionary of responses by country code
+        """
+        if base_path is None:
+            base_path = DEFAULT_RESULTS_PATH
+        state = read_journal(str(journal_path(run_id, base_path)))
+        header = state.header
+        snapshot = self._save_population_snapshot(base_path)
+        if header.get("population_snapshot") != snapshot or header.get("agent_count") != len(self.agents):
+            raise ValueError(
+                f"Run {run_id} was started with population {header.get('population_snapshot')} "
+                f"({header.get('agent_count')} agents), not {snapshot} ({len(self.agents)} agents)"
+            )
+        if header.get("model") != self.model_name or header.get("temperature") != self.temperature:
+            self.logger.warning(
+                f"Resuming run {run_id} (model {header.get('model')}, temperature {header.get('temperature')}) "
+                f"with model {self.model_name}, temperature {self.temperature}"
+            )
+        if state.complete:
+            self.logger.info(f"Run {run_id} already completed; returning its journaled results")
+            self.last_run_id = run_id
+            results_by_country: Dict[str, List[Dict]] = {}
+            for index in sorted(state.results):
+                country_code, record = state.results[index]
+                results_by_country.setdefault(country_code, []).append({"persona": self._persona(self.agents[index]), **record})
+            return results_by_country
+        # Runs journaled before layouts were recorded resume in this simulation's
+        layout = header.get("prompt_layout")
+        if layout is not None and layout != self.prompt_layout:
+            self.logger.warning(f"Resuming run {run_id} with its {layout} prompt layout, not {self.prompt_layout}")
+        return self._run(
+            header["question"], run_id, save_results, base_path, header["mode"], header["result_format"], True, state=state,
+            agent_range=tuple(header["agent_range"]) if header.get("agent_range") else None,
+            countries=header.get("countries"),
+            sequential=SequentialSettings.from_dict(header["sequential"]) if header.get("sequential") else None,
+            prompt_layout=layout,
         )
 
-        def _normalize_internal(resp: str) -> str:
-            if not resp:
-                return "invalid_response"
-            s = resp.lower().strip()
-            options = ["very likely", "likely", "unlikely", "highly unlikely"]
-            if s in options:
-                return s
-            if "very unlikely" in s:
-                return "highly unlikely"
-            for opt in options:
-                if opt in s:
-                    return opt
-            if "likely" in s and "unlikely" not in s:
-                return "likely"
-            if "unlikely" in s:
-                return "unlikely"
-            if any(k in s for k in ("cannot", "unable", "do not know", "not able", "no information")):
-                return "unlikely"
-            return "invalid_response"
+    def ask_shard(
+        self,
+        question: str,
+        run_id: str,
+        agent_range: Tuple[int, int],
+        base_path: Optional[str] = None,
+        mode: str = "generate",
+    ) -> Dict[str, List[Dict]]:
+        """
+        Ask only agents [start, stop), journaling their results without saving them.
+
+        This is the unit of work of a sharded run (see
+        `synthcast.simulation.sharding`). If the journal of `run_id` already
+        exists, the shard is resumed and only its missing agents are queried.
 
-        async def _handle_agent(agent):
-            persona_prompt = agent["persona"]
+        Returns:
+            Dict[str, List[Dict]]: The shard's responses by country code
+        """
+        if mode not in ASK_MODES:
+            raise ValueError(f"Unknown mode '{mode}'. Expected one of {ASK_MODES}")
+        if base_path is None:
+            base_path = DEFAULT_RESULTS_PATH
+        path = journal_path(run_id, base_path)
+        state = read_journal(str(path)) if path.exists() else None
+        return self._run(
+            question, run_id, False, base_path, mode, "json", True, state=state, agent_range=agent_range,
+            prompt_layout=state.header.get("prompt_layout") if state is not None else None,
+        )
+
+    @classmethod
+    def from_run(cls, run_id: str, base_path: Optional[str] = None, **kwargs) -> "Simulation":
+        """
+        Rebuild the simulation of a checkpointed run from its saved population snapshot.
+
+        Keyword arguments are passed to the constructor (e.g. `cache`,
+        `rate_limit_settings`); model, temperature and prompt layout default
+        to the run's.
+
+        Example:
+            Simulation.from_run(run_id).resume(run_id)
+        """
+        from synthcast.population.population import Population
+        if base_path is None:
+            base_path = DEFAULT_RESULTS_PATH
+        header = read_journal(str(journal_path(run_id, base_path))).header
+        snapshot_path = Path(base_path) / 'populations' / f"{header['population_snapshot']}.synthpop"
+        kwargs.setdefault("model_name", header["model"])
+        kwargs.setdefault("temperature", header["temperature"])
+        if "prompt_layout" in header:
+            kwargs.setdefault("prompt_layout", header["prompt_layout"])
+        return cls(population=Population.load(str(snapshot_path)), **kwargs)
+
+    def _save_results(
+        self,
+        results_by_country: Dict[str, List[Dict]],
+        question: str,
+        run_id: str,
+        base_path: Optional[str],
+        mode: str,
+        result_format: str,
+        population_snapshot: Optional[str] = None,
+        model_name: Optional[str] = None,
+        prompt_layout: Optional[str] = None,
+    ) -> None:
+        """Save results by country (this also appends the country's
+        aggregated datapoint to the run store)."""
+        if result_format == "compact" and population_snapshot is None:
+            population_snapshot = self._save_population_snapshot(base_path)
+        for country_code, country_results in results_by_country.items():
+            filepath = save_simulation_results(
+                results=country_results,
+                question=question,
+                country_code=country_code,
+                base_path=base_path,
+                result_format=result_format,
+                population_snapshot=population_snapshot,
+                metadata={
+                    "run_id": run_id,
+                    "model": model_name or self.model_name,
+                    "temperature": self.temperature,
+                    "mode": mode,
+                    "prompt_layout": prompt_layout or self.prompt_layout,
+                },
+            )
+            self.logger.info(f"Saved {len(country_results)} responses for {country_code} to {filepath}")
+
+    def ask_question_batch(
+        self,
+        question: str,
+        executor: Optional["BatchExecutor"] = None,
+        save_results: bool = True,
+        base_path: Optional[str] = None,
+        mode: str = "generate",
+        result_format: str = "json",
+        poll_interval: float = 30.0,
+        timeout: Optional[float] = None,
+        followup_rounds: int = 1,
+    ) -> Dict[str, List[Dict]]:
+        """
+        Ask a question to all agents through an offline batch instead of
+        real-time chat completions.
+
+        Every request is written to `<base_path>/batches/<run_id>/`, submitted
+        with `executor`, polled until finished and read back. In "generate"
+        mode, a group of identical personas is asked with `n` completions per
+        request, at most `LLMAgent.max_n` at a time. Answers that cannot be
+        normalized, and agents left without a choice by providers that ignore
+        `n`, are re-asked in up to `followup_rounds` further batches;
+        unparseable answers are then guessed from keywords as in
+        `ask_question`. Results are saved exactly like `ask_question`'s.
+
+        Args:
+            question: The question to ask
+            executor: `BatchExecutor` to run the batch (default: the batch API
+                of the simulation's Nebius endpoint); `LocalBatchExecutor`
+                processes it offline
+            mode: "generate" or "score" (logprob scoring)
+            poll_interval: Seconds between status checks
+            timeout: Give up waiting after this many seconds (the batch keeps
+                running on the provider)
+            followup_rounds: Batches for re-asking unparseable answers and
+                agents that got no choice
+
+        Returns:
+            Dict[str, List[Dict]]: Dictionary of responses by country code
+        """
+        from synthcast.simulation.batch import (
+            OpenAIBatchExecutor, chat_request, choice_content, choice_distribution, read_batch_output, write_batch_file,
+        )
+
+        if mode not in ("generate", "score"):
+            raise ValueError(f"Batch mode must be 'generate' or 'score', got {mode!r}")
+        if result_format not in RESULT_FORMATS:
+            raise ValueError(f"Unknown result_format {result_format!r}; expected one of {RESULT_FORMATS}")
+        if executor is None:
+            if self.router is not None:
+                raise ValueError("Pass a batch executor for one backend when routing across several")
+            executor = OpenAIBatchExecutor(self.agents[0]["agent"])
+        if base_path is None:
+            base_path = DEFAULT_RESULTS_PATH
+        run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        self.last_run_id = run_id
+        batch_dir = Path(base_path) / 'batches' / run_id
+        model_name = executor.model_name or self.model_name
+        prompts = self._prompt_assembler(question, ANSWER_INSTRUCTION)
+
+        def _messages(persona: str, followup: Optional[str] = None) -> List[Dict[str, str]]:
+            system, user = prompts.assemble(persona, followup)
+            return [{"role": "system", "content": system}, {"role": "user", "content": user}]
+
+        def _run_batch(name: str, requests: List[Dict]) -> Dict[str, Dict]:
+            input_path = str(batch_dir / f"{name}.input.jsonl")
+            count = write_batch_file(input_path, requests)
+            self.logger.info(f"Batch {name} of run {run_id}: {count} requests in {input_path}")
+            paths = executor.run(
+                input_path, str(batch_dir), poll_interval=poll_interval, timeout=timeout,
+                metadata={"run_id": run_id, "batch": name},
+            )
+            return read_batch_output(paths)
+
+        units = self._persona_groups() if self.group_identical_personas else [[agent] for agent in self.agents]
+        if mode == "generate":
+            # Providers cap `n`; larger groups are split as in real-time runs
+            units = [unit[i:i + LLMAgent.max_n] for unit in units for i in range(0, len(unit), LLMAgent.max_n)]
+        params = {"temperature": self.temperature, "max_tokens": 512}
+        if mode == "score":
+            # One scoring request covers a whole group, as in ask_question
+            params = {"temperature": self.temperature, "max_tokens": 3, "logprobs": True, "top_logprobs": 20}
+        requests = []
+        for unit in units:
+            first = unit[0]
+            unit_params = dict(params)
+            if mode == "generate" and len(unit) > 1:
+                unit_params["n"] = len(unit)
+            requests.append(chat_request(f"a{first['index']}-{len(unit)}", model_name, _messages(self._persona(first)), **unit_params))
+        outputs = _run_batch("main", requests)
+
+        results_by_country: Dict[str, List[Dict]] = {}
+        failed = 0
+        unresolved: Dict[int, str] = {}
+        # Agents whose request returned fewer choices than its `n`
+        unanswered: List[int] = []
+        for unit in units:
+            output = outputs.get(f"a{unit[0]['index']}-{len(unit)}", {"error": "missing from batch output"})
+            choices = output.get("choices") or []
+            if "error" in output or not choices:
+                failed += len(unit)
+                self.logger.debug(f"Batch request for {len(unit)} agents failed: {output.get('error', 'no choices')}")
+                continue
+            if mode == "score":
+                distribution = choice_distribution(choices[0])
+                if distribution is None:
+                    failed += len(unit)
+                    continue
+                for agent in unit:
+                    results_by_country.setdefault(agent["country_code"], []).append({
+                        "persona": self._persona(agent),
+                        "persona_id": agent["persona_id"],
+                        "response": most_likely_option(distribution),
+                        "distribution": distribution,
+                    })
+                continue
+            for agent, choice in zip(unit, choices):
+                unresolved[agent["index"]] = choice_content(choice)
+            # Providers that ignore `n` return fewer choices; the rest are re-asked
+            unanswered.extend(agent["index"] for agent in unit[len(choices):])
+
+        for round_number in range(1, followup_rounds + 1):
+            invalid = [i for i, response in unresolved.items() if normalize_response(response) == "invalid_response"]
+            if not invalid and not unanswered:
+                break
+            requests = [
+                chat_request(f"f{i}", model_name, _messages(self._persona(self.agents[i]), followup_instruction(unresolved[i])), **params)
+                for i in invalid
+            ] + [chat_request(f"r{i}", model_name, _messages(self._persona(self.agents[i])), **params) for i in unanswered]
+            outputs = _run_batch(f"followup{round_number}", requests)
+            for i in invalid:
+                choices = outputs.get(f"f{i}", {}).get("choices")
+                if choices:
+                    unresolved[i] = choice_content(choices[0])
+            still_unanswered = []
+            for i in unanswered:
+                choices = outputs.get(f"r{i}", {}).get("choices")
+                if choices:
+                    unresolved[i] = choice_content(choices[0])
+                else:
+                    still_unanswered.append(i)
+            unanswered = still_unanswered
+        failed += len(unanswered)
+
+        for i in sorted(unresolved):
+            agent = self.agents[i]
+            normalized = normalize_response(unresolved[i])
+            if normalized == "invalid_response":
+                normalized = _fallback_option(unresolved[i])
+            results_by_country.setdefault(agent["country_code"], []).append({
+                "persona": self._persona(agent),
+                "persona_id": agent["persona_id"],
+                "response": normalized,
+            })
+
+        if failed:
+            self.logger.warning(f"{failed} agents failed in the batch and were left out of the results")
+        if save_results:
+            self._save_results(results_by_country, question, run_id, base_path, mode, result_format, model_name=model_name)
+        self.logger.info(f"Collected responses for {len(results_by_country)} countries")
+        return results_by_country
+
+    def _run(
+        self,
+        question: str,
+        run_id: str,
+        save_results: bool,
+        base_path: Optional[str],
+        mode: str,
+        result_format: str,
+        checkpoint: bool,
+        state: Optional[JournalState] = None,
+        agent_range: Optional[Tuple[int, int]] = None,
+        countries: Optional[Sequence[str]] = None,
+        sequential: Optional[SequentialSettings] = None,
+        prompt_layout: Optional[str] = None,
+    ) -> Dict[str, List[Dict]]:
+        """Run `_run_async` on its own event loop."""
+        async def _main():
+            try:
+                return await self._run_async(
+                    question, run_id, save_results, base_path, mode, result_format, checkpoint, state, agent_range, countries,
+                    sequential=sequential, prompt_layout=prompt_layout,
+                )
+            finally:
+                await close_async_clients()
+
+        return asyncio.run(_main())
+
+    async def _run_async(
+        self,
+        question: str,
+        run_id: str,
+        save_results: bool,
+        base_path: Optional[str],
+        mode: str,
+        result_format: str,
+        checkpoint: bool,
+        state: Optional[JournalState] = None,
+        agent_range: Optional[Tuple[int, int]] = None,
+        countries: Optional[Sequence[str]] = None,
+        scheduler: Optional["CallScheduler"] = None,
+        priority: int = 0,
+        sequential: Optional[SequentialSettings] = None,
+        prompt_layout: Optional[str] = None,
+    ) -> Dict[str, List[Dict]]:
+        """
+        Query every agent without a journaled result, then save.
+
+        Args:
+            agent_range: Only ask agents [start, stop)
+            countries: Only ask agents of these countries
+            scheduler: Shared `CallScheduler` that runs this run's calls
+                alongside other runs' on the same event loop (see
+                `synthcast.simulation.sweep`); without one, every call is
+                started at once
+            priority: Scheduler priority of this run's calls (higher first)
+            sequential: Ask in waves until each stratum's shares are precise
+                enough instead of asking every agent
+            prompt_layout: Layout of this run's prompts (default: the
+                simulation's); a resumed run keeps the one it started with
+        """
+        prompt_layout = prompt_layout or self.prompt_layout
+        agents = self.agents if agent_range is None else self.agents[agent_range[0]:agent_range[1]]
+        if countries is not None:
+            agents = [agent for agent in agents if agent["country_code"] in set(countries)]
+        self.last_run_id = run_id
+        results_by_country = {}
+        failures: List[Exception] = []
+        done = set()
+        if state is not None:
+            for index in sorted(state.results):
+                country_code, record = state.results[index]
+                results_by_country.setdefault(country_code, []).append({"persona": self._persona(self.agents[index]), **record})
+                done.add(index)
+        pending = [agent for agent in agents if agent["index"] not in done]
+        sampler = None
+        if sequential is not None:
+            # Journaled answers count towards their strata when resuming
+            answered = {index: state.results[index][1]["response"] for index in done} if state is not None else {}
+            sampler = SequentialSampler(sequential, agents, self.population, self.seed, answered)
+
+        journal = None
+        population_snapshot = None
+        if checkpoint:
+            if base_path is None:
+                base_path = DEFAULT_RESULTS_PATH
+            population_snapshot = self._save_population_snapshot(base_path)
+            journal = RunJournal(
+                str(journal_path(run_id, base_path)),
+                header={
+                    "run_id": run_id,
+                    "question": question,
+                    "mode": mode,
+                    "result_format": result_format,
+                    "model": self.model_name,
+                    "temperature": self.temperature,
+                    "prompt_layout": prompt_layout,
+                    "population_snapshot": population_snapshot,
+                    "agent_count": len(self.agents),
+                    **({"agent_range": list(agent_range)} if agent_range is not None else {}),
+                    **({"countries": list(countries)} if countries is not None else {}),
+                    **({"sequential": dataclasses.asdict(sequential)} if sequential is not None else {}),
+                },
+            )
+            if done:
+                self.logger.info(f"Resuming run {run_id}: {len(done)} responses journaled, {len(pending)} agents left")
+            else:
+                self.logger.info(f"Checkpointing run {run_id} to {journal.path}")
+        if sampler is None:
+            self.logger.info(f"Asking question to {len(pending)} agents: {question}")
+        else:
+            self.logger.info(
+                f"Asking question adaptively to up to {len(pending)} agents in {len(sampler.strata)} strata "
+                f"(at most {sampler.planned_calls()} calls if every answer were split evenly): {question}"
+            )
+
+        def _record(agent, record):
+            results_by_country.setdefault(agent["country_code"], []).append(record)
+            done.add(agent["index"])
+            if sampler is not None:
+                sampler.observe(agent, record["response"])
+            metrics.inc("agents_total", 1, {"country": agent["country_code"]})
+            if journal is not None:
+                # Persona text is re-rendered from the population on resume
+                journal.append(agent["index"], agent["country_code"], {k: v for k, v in record.items() if k != "persona"})
+
+        _normalize_internal = normalize_response
+
+        # Prompts are assembled per agent in the configured layout; stream
+        # mode asks for reasoning but re-asks with the plain instruction
+        prompts = self._prompt_assembler(question, ANSWER_INSTRUCTION, prompt_layout)
+        stream_prompts = self._prompt_assembler(question, ANSWER_WITH_REASONING_INSTRUCTION, prompt_layout) if mode == "stream" else prompts
+        # Usage deltas mean nothing while other runs share the agent
+        usage_before = self._token_usage() if scheduler is None else None
+
+        async def _resolve(agent, persona_prompt, response):
+            """Normalize an agent's first answer, re-asking it if unparseable."""
             llm_agent = agent["agent"]
             country_code = agent["country_code"]
-            self.logger.debug(f"Getting response from agent with persona: {persona_prompt[:100]}...")
 
-            async def _get_response(prompt_text):
-                try:
-                    return await llm_agent.generate_response_async(persona_prompt, prompt_text, temperature=agent["temperature"])
-                except Exception as e:
-                    return f"__NEBIUS_ERROR__: {e}"
+            async def _get_response(followup):
+                # Provider errors raise LLMError after the agent's rate limiter
+                # has already backed off and retried; they are not re-asked here
+                return await llm_agent.generate_response_async(
+                    *prompts.assemble(persona_prompt, followup), temperature=agent["temperature"], sample_index=agent["sample_index"]
+                )
 
-            response = await _get_response(f"{question}\n{instruction}")
             normalized = _normalize_internal(response)
             attempts = 3
             attempt = 1
             while attempt <= attempts and normalized == "invalid_response":
-                followup = (
-                    f"Your previous answer was: \"{response}\"\n"
-                    "That answer is not acceptable.\n"
-                    "You MUST now reply with exactly one of (lowercase):\\n"
-                    "very likely\\n"
-                    "likely\\n"
-                    "unlikely\\n"
-                    "highly unlikely\\n\\n"
-                    "Return ONLY that phrase and nothing else.\n"
-                    "If you cannot decide, choose 'unlikely'."
-                )
-                response = await _get_response(f"{question}\n{instruction}\nFOLLOW-UP: {followup}")
+                try:
+                    response = await _get_response(followup_instruction(response))
+                except LLMError as e:
+                    self.logger.warning(f"Follow-up call failed for {country_code}: {e}")
+                    break
                 normalized = _normalize_internal(response)
                 attempt += 1
 
             if normalized == "invalid_response":
-                s = (response or "").lower()
-                if any(k in s for k in ("cannot", "unable", "do not know", "no information", "not able")):
-                    normalized = "unlikely"
-                elif "very" in s and "likely" in s:
-                    normalized = "very likely"
-                elif "likely" in s:
-                    normalized = "likely"
-                elif "unlikely" in s:
-                    normalized = "unlikely"
-                else:
-                    normalized = "unlikely"
+                normalized = _fallback_option(response)
+
+            _record(agent, {"persona": persona_prompt, "persona_id": agent["persona_id"], "response": normalized})
+
+        # Handlers raise on failure; _run_unit isolates them per agent/group
+        async def _handle_agent(agent):
+            persona = self._persona(agent)
+            self.logger.debug(f"Getting response from agent with persona: {persona[:100]}...")
+            response = await agent["agent"].generate_response_async(
+                *prompts.assemble(persona), temperature=agent["temperature"], sample_index=agent["sample_index"]
+            )
+            await _resolve(agent, persona, response)
+
+        async def _handle_group(group):
+            """Serve agents sharing one persona prompt with a single n-sample request."""
+            first = group[0]
+            persona = self._persona(first)
+            responses = await first["agent"].generate_responses_async(
+                *prompts.assemble(persona), n=len(group), temperature=first["temperature"], first_sample_index=first["sample_index"]
+            )
+            # Let every agent finish before reporting a failure, so a retry
+            # never overlaps an answer that is still being resolved
+            outcomes = await asyncio.gather(
+                *(_resolve(agent, persona, response) for agent, response in zip(group, responses)), return_exceptions=True
+            )
+            for outcome in outcomes:
+                if isinstance(outcome, Exception):
+                    raise outcome
+
+        def _record_distribution(agent, persona, distribution):
+            _record(agent, {
+                "persona": persona,
+                "persona_id": agent["persona_id"],
+                "response": most_likely_option(distribution),
+                "distribution": distribution,
+            })
+
+        async def _score_agent(agent):
+            persona = self._persona(agent)
+            distribution = await agent["agent"].score_options_async(
+                *prompts.assemble(persona), ANSWER_OPTIONS, temperature=agent["temperature"], sample_index=agent["sample_index"]
+            )
+            _record_distribution(agent, persona, distribution)
+
+        async def _score_group(group):
+            """Logprobs don't depend on the sample drawn, so one call scores the whole group."""
+            first = group[0]
+            persona = self._persona(first)
+            distribution = await first["agent"].score_options_async(
+                *prompts.assemble(persona), ANSWER_OPTIONS, temperature=first["temperature"]
+            )
+            for agent in group:
+                _record_distribution(agent, persona, distribution)
+
+        async def _stream_agent(agent):
+            persona = self._persona(agent)
+            result = await agent["agent"].stream_response_async(
+                *stream_prompts.assemble(persona), temperature=agent["temperature"],
+                stop_on_answer=(mode == "answer_only"), sample_index=agent["sample_index"],
+            )
+            if result.answer not in ANSWER_OPTIONS:
+                # Unparseable even after the full stream: use the normal re-ask path
+                await _resolve(agent, persona, result.text)
+                return
+            record = {
+                "persona": persona,
+                "persona_id": agent["persona_id"],
+                "response": result.answer,
+                "timing": {
+                    "queue_wait": result.queue_wait,
+                    "time_to_first_token": result.time_to_first_token,
+                    "time_to_answer": result.time_to_answer,
+                    "total_time": result.total_time,
+                    "cancelled": result.cancelled,
+                },
+            }
+            if mode == "stream":
+                record["raw"] = result.text
+            _record(agent, record)
+
+        if mode in ("stream", "answer_only"):
+            # Streams are per agent: n>1 would interleave several answers
+            handler, grouped = _stream_agent, False
+        elif self.group_identical_personas:
+            handler, grouped = (_score_group if mode == "score" else _handle_group), True
+        else:
+            handler, grouped = (_score_agent if mode == "score" else _handle_agent), False
+
+        failure_settings = self.failure_settings
+        # An adaptive run is charged against the calls it plans, not all agents
+        budget = ErrorBudget(failure_settings, len(pending) if sampler is None else sampler.planned_calls())
+
+        def _units(agents: List[Dict]) -> List[List[Dict]]:
+            """Agents without a result, split into the requests that serve them."""
+            remaining = [a for a in agents if a["index"] not in done]
+            return self._persona_groups(remaining) if grouped else [[a] for a in remaining]
 
-            if country_code not in results_by_country:
-                results_by_country[country_code] = []
-            results_by_country[country_code].append({"persona": persona_prompt, "response": normalized})
+        async def _call(unit: List[Dict]) -> None:
+            metrics.set_labels(country=unit[0]["country_code"])
+            await (handler(unit) if grouped else handler(unit[0]))
 
         async def _gather():
-            tasks = [asyncio.create_task(_handle_agent(a)) for a in self.agents]
-            await asyncio.gather(*tasks)
+            loop = asyncio.get_running_loop()
+            abort = loop.create_future()
+            retry_queue: asyncio.Queue = asyncio.Queue(maxsize=failure_settings.retry_queue_size)
 
-        try:
-            asyncio.run(_gather())
-        except Exception:
-            for agent in self.agents:
-                persona_prompt = agent["persona"]
-                llm_agent = agent["agent"]
-                country_code = agent["country_code"]
-                response = llm_agent.generate_response(persona_prompt, f"{question}\n{instruction}", temperature=agent["temperature"])
-                normalized = _normalize_internal(response)
-                if normalized == "invalid_response":
-                    normalized = "unlikely"
-                if country_code not in results_by_country:
-                    results_by_country[country_code] = []
-                results_by_country[country_code].append({"persona": persona_prompt, "response": normalized})
-        
-        # Save results by country if requested
-        if save_results:
-            for country_code, country_results in results_by_country.items():
-                filepath = save_simulation_results(
-                    results=country_results,
-                    question=question,
-                    country_code=country_code,
-                    base_path=base_path
-                )
-                self.logger.info(f"Saved {len(country_results)} responses for {country_code} to {filepath}")
-                # Also append an aggregated datapoint for this run
-                # Build distribution counts
-                distribution = {}
-                for r in country_results:
-                    key = r.get('response')
-                    distribution[key] = distribution.get(key, 0) + 1
+            def _charge(unit, error) -> None:
+                self.logger.warning(f"Call for {len(unit)} agent(s) failed for {unit[0]['country_code']}: {error}")
+                if budget.charge(error) and not abort.done():
+                    abort.set_result(None)
+
+            async def _run_unit(unit):
                 try:
-                    from synthcast.simulation.results import append_aggregated_datapoint
-                    agg_path = append_aggregated_datapoint(
-                        country_code=country_code,
-                        num_agents=len(country_results),
-                        question=question,
-                        distribution=distribution,
-                        base_path=base_path
-                    )
-                    self.logger.info(f"Appended aggregated datapoint for {country_code} to {agg_path}")
+                    await _call(unit)
                 except Exception as e:
-                    self.logger.warning(f"Failed to append aggregated datapoint for {country_code}: {e}")
-        
+                    _charge(unit, e)
+                    await retry_queue.put((unit, e))
+
+            async def _retry_worker():
+                while True:
+                    unit, error = await retry_queue.get()
+                    try:
+                        for attempt in range(failure_settings.max_agent_retries):
+                            await asyncio.sleep(failure_settings.retry_delay * 2 ** attempt)
+                            try:
+                                for retry_unit in _units(unit):
+                                    await _call(retry_unit)
+                                break
+                            except Exception as e:
+                                error = e
+                                _charge(unit, e)
+                        missing = [a for a in unit if a["index"] not in done]
+                        failures.extend([error] * len(missing))
+                    finally:
+                        retry_queue.task_done()
+
+            workers = [asyncio.create_task(_retry_worker()) for _ in range(failure_settings.retry_concurrency)]
+            tasks: List[asyncio.Task] = []
+            waiters: List[asyncio.Future] = []
+            try:
+                # One wave of every pending agent, or the sampler's waves; a
+                # wave's retries finish before the next wave is chosen
+                for wave in (sampler.waves() if sampler is not None else [pending]):
+                    units = _units(wave)
+                    if grouped:
+                        self.logger.info(f"Serving {len(wave)} agents with {len(units)} distinct persona requests")
+                    if scheduler is None:
+                        tasks = [asyncio.create_task(_run_unit(u)) for u in units]
+                        main = asyncio.gather(*tasks, return_exceptions=True)
+                    else:
+                        tasks = []
+                        main = asyncio.ensure_future(scheduler.run(units, _run_unit, priority))
+                    waiters = [main]
+                    await asyncio.wait([main, abort], return_when=asyncio.FIRST_COMPLETED)
+                    if abort.done():
+                        break
+                    # Every failed unit is queued by now; wait for the retries
+                    waiters.append(asyncio.ensure_future(retry_queue.join()))
+                    await asyncio.wait([waiters[-1], abort], return_when=asyncio.FIRST_COMPLETED)
+                    if abort.done():
+                        break
+            finally:
+                for task in tasks + workers + waiters:
+                    task.cancel()
+                await asyncio.gather(*tasks, *workers, *waiters, return_exceptions=True)
+            if budget.exceeded is not None:
+                raise budget.exceeded
+
+        registry = metrics.MetricsRegistry(run_id, self.token_prices) if self.collect_metrics else None
+        self.last_metrics = registry
+        try:
+            with metrics.collecting(registry):
+                await _gather()
+        except BaseException as e:
+            if journal is not None:
+                # Ctrl-C, a crash or an exhausted error budget: everything
+                # recorded so far is on disk
+                journal.close()
+                if isinstance(e, ErrorBudgetExceeded):
+                    self.logger.error(f"Run {run_id} aborted: {e}. Call resume('{run_id}') once the provider recovers")
+            raise
+
+        if failures:
+            self.logger.warning(f"{len(failures)} agents failed after retries and were left out of the results")
+            if journal is not None:
+                self.logger.warning(f"Call resume('{run_id}') to retry only the missing agents")
+        if sampler is not None:
+            sampler.log_summary()
+            self.last_sampling = sampler.summary()
+        if mode in ("stream", "answer_only"):
+            self._log_stream_timings(results_by_country)
+        if self.router is not None:
+            self._log_router_stats()
+        self._log_token_usage({prompts, stream_prompts}, usage_before)
+        if registry is not None:
+            self._log_metrics(registry, (base_path or DEFAULT_RESULTS_PATH) if save_results else None)
+
+        if save_results:
+            self._save_results(
+                results_by_country, question, run_id, base_path, mode, result_format, population_snapshot, prompt_layout=prompt_layout
+            )
+
+        if journal is not None:
+            # Runs with failed agents stay resumable; a resumed run re-saves
+            # complete results that supersede these in the results catalog.
+            # An adaptive run is complete once every stratum has stopped
+            if len(done) == len(agents) or (sampler is not None and sampler.finished):
+                journal.mark_complete()
+            journal.close()
+
         self.logger.info(f"Collected responses for {len(results_by_country)} countries")
         return results_by_country
\ No newline at end of file
@@ -0,0 +1,470 @@
+"""
+Scenario sweeps: questions × scenarios × countries on one event loop.
+
+`ask_question` runs one question per `asyncio.run`, so concurrency drains to
+zero at the end of every question. A sweep instead starts every run of the
+grid on one loop and feeds all their agent calls through a single
+`CallScheduler`, a priority queue served by a fixed number of workers. The
+worker count is the sweep's global concurrency budget, and calls of the next
+question start as soon as a worker frees up.
+
+A scenario is a piece of context ("Government subsidy for heat pumps: 30%.")
+shown before each question. `scenario_grid` builds one scenario per
+combination of parameter values. Cells whose prompts come out identical,
+e.g. a question repeated across scenarios that do not change its text, are
+deduplicated: the question is asked once, for the union of the cells'
+countries, and each cell reads its countries from that run.
+
+Every distinct (scenario, question) is a normal run: results are saved per
+country under its own run id, so it can be journaled and resumed like any
+run. With `save_results`, a manifest mapping cells to run ids and response
+distributions is written to `<base_path>/sweeps/<sweep_id>.json`.
+
+    python -m synthcast.simulation.sweep sweep.json --concurrency 128
+
+where `sweep.json` looks like::
+
+    {
+      "questions": ["Will you install a heat pump in the next two years?"],
+      "countries": {"DEU": 1000, "FRA": 1000},
+      "seed": 7,
+      "template": "Heat pump subsidy: {subsidy}. Household income change: {income}.",
+      "grid": {"subsidy": ["none", "30%"], "income": ["-10%", "unchanged"]},
+      "scenarios": [{"name": "baseline", "priority": 1}]
+    }
+"""
+
+import argparse
+import asyncio
+import contextvars
+import itertools
+import json
+import logging
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from synthcast.simulation.client_pool import close_async_clients
+
+# Under the "simulation" logger so progress/ETA lines reach its handlers
+logger = logging.getLogger("simulation.sweep")
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """Context shown to agents before each question of a sweep.
+
+    Attributes:
+        name: Label of the scenario in results and the manifest.
+        context: Text prepended to every question ("" for none).
+        parameters: Grid values the context was rendered from.
+        priority: Calls of higher-priority scenarios are scheduled first.
+        countries: Countries to ask (default: every country of the simulation).
+    """
+
+    name: str
+    context: str = ""
+    parameters: Dict[str, str] = field(default_factory=dict)
+    priority: int = 0
+    countries: Optional[Tuple[str, ...]] = None
+
+
+def scenario_grid(template: str, grid: Mapping[str, Sequence], priority: int = 0) -> List[Scenario]:
+    """
+    One scenario per combination of `grid` values.
+
+    Args:
+        template: Context format string with a `{name}` field per grid key
+        grid: Parameter name -> values
+        priority: Priority of every scenario
+
+    Example:
+        scenario_grid("Subsidy: {subsidy}.", {"subsidy": ["none", "30%"]})
+    """
+    names = list(grid)
+    scenarios = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        parameters = {name: str(value) for name, value in zip(names, values)}
+        scenarios.append(Scenario(
+            name=",".join(f"{k}={v}" for k, v in parameters.items()),
+            context=template.format(**parameters),
+            parameters=parameters,
+            priority=priority,
+        ))
+    return scenarios
+
+
+def scenario_question(scenario: Scenario, question: str) -> str:
+    """The question text asked under `scenario`."""
+    if scenario.context:
+        return f"Scenario: {scenario.context}\n\n{question}"
+    return question
+
+
+@dataclass
+class SweepProgress:
+    """Agent calls scheduled and finished so far.
+
+    Attributes:
+        agents_total: Agents whose calls have been queued.
+        agents_done: Agents whose calls have finished (answered or failed).
+        units_total: Requests queued (a grouped request serves several agents).
+        units_done: Requests finished.
+        started: `time.monotonic()` when the first call was queued.
+    """
+
+    agents_total: int = 0
+    agents_done: int = 0
+    units_total: int = 0
+    units_done: int = 0
+    started: Optional[float] = None
+
+    @property
+    def rate(self) -> float:
+        """Agents finished per second."""
+        elapsed = time.monotonic() - self.started if self.started is not None else 0.0
+        return self.agents_done / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Seconds until every queued agent is done, at the current rate."""
+        rate = self.rate
+        return (self.agents_total - self.agents_done) / rate if rate > 0 else None
+
+    def describe(self) -> str:
+        eta = self.eta
+        eta_text = "-" if eta is None else f"{int(eta // 60)}m{int(eta % 60):02d}s"
+        share = self.agents_done / self.agents_total if self.agents_total else 0.0
+        return f"{self.agents_done}/{self.agents_total} agents ({share:.1%}), {self.rate:.1f}/s, ETA {eta_text}"
+
+
+class _Batch:
+    """Units queued by one `CallScheduler.run` call."""
+
+    __slots__ = ("remaining", "done", "cancelled")
+
+    def __init__(self, remaining: int, done: asyncio.Future):
+        self.remaining = remaining
+        self.done = done
+        self.cancelled = False
+
+
+class CallScheduler:
+    """Priority queue of agent calls from many runs, served by a fixed worker pool.
+
+    Must be used from a single event loop. Workers start with the first
+    `run` and stop on `close`.
+
+    Args:
+        concurrency: Calls in flight across all runs (the global budget)
+        progress_interval: Seconds between progress log lines, or None
+    """
+
+    def __init__(self, concurrency: int, progress_interval: Optional[float] = 30.0):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.concurrency = concurrency
+        self.progress_interval = progress_interval
+        self.progress = SweepProgress()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._sequence = itertools.count()
+        self._tasks: List[asyncio.Task] = []
+
+    def _start(self) -> None:
+        if self._queue is not None:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        if self.progress_interval:
+            self._tasks.append(asyncio.create_task(self._report()))
+
+    async def run(self, units: Sequence[Sequence], call: Callable[[Sequence], Awaitable[None]], priority: int = 0) -> None:
+        """
+        Queue `units` and wait until `call(unit)` has finished for each.
+
+        `call` must handle its own errors; they are logged and dropped here.
+        Cancelling `run` drops this batch's units that have not started.
+        Each unit runs in a copy of the caller's context, so context variables
+        (e.g. the run's metrics registry) follow it to the shared workers.
+        """
+        if not units:
+            return
+        self._start()
+        if self.progress.started is None:
+            self.progress.started = time.monotonic()
+        batch = _Batch(len(units), asyncio.get_running_loop().create_future())
+        for unit in units:
+            self._queue.put_nowait((-priority, next(self._sequence), batch, call, unit, contextvars.copy_context()))
+            self.progress.units_total += 1
+            self.progress.agents_total += len(unit)
+        try:
+            await batch.done
+        except asyncio.CancelledError:
+            batch.cancelled = True
+            raise
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, batch, call, unit, context = await self._queue.get()
+            try:
+                if not batch.cancelled:
+                    await context.run(asyncio.create_task, call(unit))
+            except Exception as e:
+                logger.error(f"Unhandled error in scheduled call: {e}")
+            finally:
+                self.progress.units_done += 1
+                self.progress.agents_done += len(unit)
+                batch.remaining -= 1
+                if batch.remaining == 0 and not batch.done.done():
+                    batch.done.set_result(None)
+
+    async def _report(self) -> None:
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            logger.info(f"Sweep progress: {self.progress.describe()}")
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+
+@dataclass
+class SweepCell:
+    """One (scenario, question) of a sweep and the run that answered it."""
+
+    scenario: Scenario
+    question: str
+    countries: Tuple[str, ...]
+    run_id: str
+
+
+@dataclass
+class SweepResult:
+    """Results of a sweep.
+
+    Attributes:
+        sweep_id: Id of the sweep (prefix of its run ids).
+        cells: Every (scenario, question) of the grid.
+        results: Run id -> responses by country code.
+        errors: Run id -> error, for runs that aborted.
+        duplicate_calls: Agent calls saved by deduplicating identical cells.
+    """
+
+    sweep_id: str
+    cells: List[SweepCell]
+    results: Dict[str, Dict[str, List[Dict]]]
+    errors: Dict[str, str] = field(default_factory=dict)
+    duplicate_calls: int = 0
+
+    def _cell_results(self, cell: SweepCell) -> Dict[str, List[Dict]]:
+        run = self.results.get(cell.run_id, {})
+        return {code: run[code] for code in cell.countries if code in run}
+
+    def cell_results(self, scenario: str, question: str) -> Dict[str, List[Dict]]:
+        """Responses by country of one cell (only its own countries)."""
+        for cell in self.cells:
+            if cell.scenario.name == scenario and cell.question == question:
+                return self._cell_results(cell)
+        raise KeyError(f"No cell ({scenario!r}, {question!r}) in sweep {self.sweep_id}")
+
+    def summary(self) -> List[Dict]:
+        """One row per (scenario, question, country) with response counts."""
+        rows = []
+        for cell in self.cells:
+            if cell.run_id in self.errors:
+                continue
+            for country_code, records in self._cell_results(cell).items():
+                distribution: Dict[str, int] = {}
+                for record in records:
+                    distribution[record["response"]] = distribution.get(record["response"], 0) + 1
+                rows.append({
+                    "scenario": cell.scenario.name,
+                    "question": cell.question,
+                    "country_code": country_code,
+                    "run_id": cell.run_id,
+                    "n": len(records),
+                    "distribution": distribution,
+                })
+        return rows
+
+
+def run_sweep(
+    simulation,
+    scenarios: Sequence[Scenario],
+    questions: Sequence[str],
+    concurrency: Optional[int] = None,
+    mode: str = "generate",
+    save_results: bool = True,
+    base_path: Optional[str] = None,
+    result_format: str = "json",
+    checkpoint: Optional[bool] = None,
+    progress_interval: Optional[float] = 30.0,
+) -> SweepResult:
+    """
+    Ask every question under every scenario, sharing one concurrency budget.
+
+    Args:
+        simulation: `Simulation` whose agents answer (its population must
+            cover every scenario's countries)
+        scenarios: Scenarios of the grid (see `scenario_grid`); pass
+            `[Scenario("baseline")]` for questions without context
+        questions: Questions asked under each scenario
+        concurrency: Calls in flight across the whole sweep (default: the
+            simulation's connection pool size)
+        mode, save_results, base_path, result_format, checkpoint: As for
+            `Simulation.ask_question`, applied to every run
+        progress_interval: Seconds between progress/ETA log lines
+
+    Returns:
+        SweepResult; runs that exhaust their error budget are listed in
+        `errors` and the rest of the sweep still completes
+    """
+    from synthcast.simulation.simulation import ASK_MODES, DEFAULT_RESULTS_PATH, country_iso_code
+
+    if mode not in ASK_MODES:
+        raise ValueError(f"Unknown mode '{mode}'. Expected one of {ASK_MODES}")
+    if checkpoint is None:
+        checkpoint = save_results
+    all_countries = tuple(simulation.country_agent_counts)
+    agent_counts = simulation.population.counts()
+    sweep_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+    # One run per distinct prompt text, for the union of its cells' countries
+    runs: Dict[str, Dict] = {}
+    cells: List[SweepCell] = []
+    requested = 0
+    for scenario in scenarios:
+        countries = tuple(country_iso_code(c) for c in scenario.countries) if scenario.countries else all_countries
+        unknown = set(countries) - set(all_countries)
+        if unknown:
+            raise ValueError(f"Scenario {scenario.name!r} asks countries outside the simulation: {sorted(unknown)}")
+        for question in questions:
+            text = scenario_question(scenario, question)
+            run = runs.setdefault(text, {"run_id": f"{sweep_id}.{len(runs):03d}", "countries": [], "priority": scenario.priority})
+            run["countries"] = sorted(set(run["countries"]) | set(countries))
+            run["priority"] = max(run["priority"], scenario.priority)
+            cells.append(SweepCell(scenario, question, countries, run["run_id"]))
+            requested += sum(agent_counts.get(code, 0) for code in countries)
+    scheduled = sum(agent_counts.get(code, 0) for run in runs.values() for code in run["countries"])
+    logger.info(
+        f"Sweep {sweep_id}: {len(cells)} cells as {len(runs)} runs, {scheduled} agent calls"
+        + (f" ({requested - scheduled} duplicate calls skipped)" if requested > scheduled else "")
+    )
+
+    scheduler = CallScheduler(concurrency or simulation.connection_settings.max_concurrency, progress_interval)
+    results: Dict[str, Dict[str, List[Dict]]] = {}
+    errors: Dict[str, str] = {}
+
+    async def _ask(text: str, run: Dict) -> None:
+        countries = None if set(run["countries"]) == set(all_countries) else run["countries"]
+        try:
+            results[run["run_id"]] = await simulation._run_async(
+                text, run["run_id"], save_results, base_path, mode, result_format, checkpoint,
+                countries=countries, scheduler=scheduler, priority=run["priority"],
+            )
+        except Exception as e:
+            logger.error(f"Sweep run {run['run_id']} failed: {e}")
+            errors[run["run_id"]] = f"{type(e).__name__}: {e}"
+
+    async def _main():
+        try:
+            await asyncio.gather(*(_ask(text, run) for text, run in runs.items()))
+        finally:
+            await scheduler.close()
+            await close_async_clients()
+
+    started = time.monotonic()
+    asyncio.run(_main())
+    logger.info(f"Sweep {sweep_id} finished in {time.monotonic() - started:.1f}s: {scheduler.progress.describe()}")
+
+    result = SweepResult(sweep_id, cells, results, errors, requested - scheduled)
+    if save_results:
+        path = Path(base_path or DEFAULT_RESULTS_PATH) / "sweeps" / f"{sweep_id}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "sweep_id": sweep_id,
+                "mode": mode,
+                "model": simulation.model_name,
+                "temperature": simulation.temperature,
+                "questions": list(questions),
+                "scenarios": [asdict(s) for s in scenarios],
+                "duplicate_calls": result.duplicate_calls,
+                "errors": errors,
+                "cells": result.summary(),
+            }, f, indent=2)
+        logger.info(f"Sweep manifest saved to {path}")
+    return result
+
+
+def load_sweep_spec(path: str) -> Tuple[List[Scenario], Dict]:
+    """Read a sweep spec file (see the module docstring) into scenarios and the raw spec."""
+    with open(path, "r", encoding="utf-8") as f:
+        spec = json.load(f)
+    scenarios = []
+    if spec.get("grid"):
+        scenarios += scenario_grid(spec.get("template", ""), spec["grid"], spec.get("priority", 0))
+    for entry in spec.get("scenarios", []):
+        countries = entry.get("countries")
+        scenarios.append(Scenario(
+            name=entry["name"],
+            context=entry.get("context", ""),
+            parameters=entry.get("parameters", {}),
+            priority=entry.get("priority", 0),
+            countries=tuple(countries) if countries else None,
+        ))
+    if not scenarios:
+        scenarios = [Scenario("baseline")]
+    if not spec.get("questions") or not spec.get("countries"):
+        raise ValueError(f"{path} needs 'questions' and 'countries'")
+    return scenarios, spec
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run a scenario sweep")
+    parser.add_argument("spec", help="sweep spec JSON file")
+    parser.add_argument("--concurrency", type=int, default=None, help="calls in flight across the sweep")
+    parser.add_argument("--mode", default=None)
+    parser.add_argument("--base-path", default=None)
+    parser.add_argument("--no-save", action="store_true", help="do not save results or the manifest")
+    parser.add_argument("--progress-interval", type=float, default=30.0)
+    args = parser.parse_args(argv)
+
+    from synthcast.simulation.logger import setup_logging
+    from synthcast.simulation.simulation import Simulation
+    setup_logging()
+    scenarios, spec = load_sweep_spec(args.spec)
+    concurrency = args.concurrency or spec.get("concurrency", 64)
+    simulation = Simulation(
+        spec["countries"],
+        temperature=spec.get("temperature", 0.7),
+        model_name=spec.get("model", "Qwen/Qwen2.5-Coder-7B-fast"),
+        max_concurrency=concurrency,
+        seed=spec.get("seed"),
+    )
+    result = run_sweep(
+        simulation,
+        scenarios,
+        spec["questions"],
+        concurrency=concurrency,
+        mode=args.mode or spec.get("mode", "generate"),
+        save_results=not args.no_save,
+        base_path=args.base_path,
+        result_format=spec.get("result_format", "json"),
+        progress_interval=args.progress_interval,
+    )
+    for row in result.summary():
+        shares = ", ".join(f"{k} {v / row['n']:.0%}" for k, v in sorted(row["distribution"].items()))
+        print(f"{row['scenario'][:40]:<40} {row['question'][:40]:<40} {row['country_code']:<4} n={row['n']:<6} {shares}")
+    for run_id, error in result.errors.items():
+        print(f"FAILED {run_id}: {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Shared fixtures.
+
+Tests that talk to a provider run against the local mock OpenAI-compatible
+endpoint in `benchmarks.mock_server`; `NebiusAgent` reaches it through
+`NEBIUS_API_URL`. Every test runs in its own working directory, since
+`setup_logging` writes `logs/` there.
+"""
+
+import logging
+import os
+
+import pytest
+
+# Read by synthcast.config at import time
+os.environ.setdefault("SYNTHCAST_NEBIUS_APIK", "mock")
+
+from benchmarks.mock_server import MockOpenAIServer, MockSettings  # noqa: E402
+from synthcast.population.persona_generator import PersonaGenerator  # noqa: E402
+from synthcast.population.population import Population  # noqa: E402
+
+FAST = dict(latency="fixed", latency_median=0.001, token_interval=0.0, seed=1)
+
+
+def make_population(counts, seed=7) -> Population:
+    return PersonaGenerator().generate_population(counts, seed=seed)
+
+
+def repeated_population(country_code: str, n: int, seed=7) -> Population:
+    """`n` identical personas, i.e. one persona group."""
+    population = make_population({country_code: 1}, seed=seed)
+    return Population(population.records[[0] * n], population.vocab, population.countries, seed=seed)
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    yield tmp_path
+    logger = logging.getLogger("simulation")
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+
+
+@pytest.fixture
+def start_mock(monkeypatch):
+    """Start a mock endpoint with `MockSettings` overrides and point NebiusAgent at it."""
+    servers = []
+
+    def _start(**overrides) -> MockOpenAIServer:
+        server = MockOpenAIServer(MockSettings(**{**FAST, **overrides})).start()
+        servers.append(server)
+        monkeypatch.setenv("NEBIUS_API_URL", server.url)
+        return server
+
+    yield _start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def mock_server(start_mock) -> MockOpenAIServer:
+    return start_mock()
@@ -0,0 +1,86 @@
+import io
+import json
+
+import pytest
+
+from synthcast.simulation import aggregated_stats
+from synthcast.simulation.aggregated_stats import (
+    _JsonReader,
+    compact_aggregated_stats,
+    iter_aggregated_stats,
+    iter_reasoning,
+    load_compact_stats,
+    split_completion,
+)
+
+STATS = {
+    "DEU": {
+        "meta": {"agents": 3},
+        "questions": {
+            "Will you buy?": {
+                "distribution": {
+                    "ANSWER: NO\nREASONING: Prices are too high.": 1,
+                    "**Answer:** no.\n**Reasoning:** Saving up.": 2,
+                    "ANSWER: YES\nREASONING: Need a car é\"quoted\"": 1,
+                    "I would say very likely": 1,
+                },
+                "total": 5,
+                "category": "spending",
+            },
+        },
+    },
+    "USA": {"meta": {}, "questions": {"Will you buy?": {"distribution": {"ANSWER: MAYBE": 4}, "total": 4}}},
+}
+
+
+def test_split_completion():
+    assert split_completion("ANSWER: NO\nREASONING: Prices are too high.") == ("NO", "Prices are too high.")
+    assert split_completion("**Answer:** yes!\n**Reasoning:** ok") == ("YES", "ok")
+    assert split_completion('Answer: "Maybe".') == ("MAYBE", "")
+    assert split_completion("ANSWER:") == ("invalid_response", "")
+    assert split_completion("Probably very likely.") == ("very likely", "Probably very likely.")
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 16])
+def test_reader_handles_values_split_across_chunks(chunk_size):
+    text = json.dumps({"a": {"b": 12345, "c": "x\\\"yé"}, "d": [1, 2.5, None]})
+    reader = _JsonReader(io.StringIO(text), chunk_size=chunk_size)
+    result = {}
+    for key in reader.iter_object():
+        if key == "a":
+            result[key] = {k: reader.read_value() for k in reader.iter_object()}
+        else:
+            result[key] = reader.read_value()
+    assert result == json.loads(text)
+
+
+def test_compact_aggregated_stats(tmp_path, monkeypatch):
+    source = tmp_path / "aggregated_stats.json"
+    source.write_text(json.dumps(STATS, indent=2))
+    # Force many chunk boundaries through the streaming parser
+    monkeypatch.setattr(aggregated_stats._JsonReader.__init__, "__defaults__", (5,))
+    assert [e[1] for e in iter_aggregated_stats(str(source))][:2] == ["meta", "answer"]
+
+    output = tmp_path / "out" / "compact.json"
+    reasoning = tmp_path / "out" / "reasoning.jsonl.gz"
+    stats = compact_aggregated_stats(str(source), str(output), reasoning_path=str(reasoning))
+    assert stats == {"countries": 2, "questions": 2, "completions": 5}
+
+    compact = load_compact_stats(str(output))
+    question = compact["DEU"]["questions"]["Will you buy?"]
+    assert question == {"distribution": {"NO": 3, "YES": 1, "very likely": 1}, "total": 5, "category": "spending"}
+    assert compact["DEU"]["meta"] == {"agents": 3}
+    assert compact["USA"]["questions"]["Will you buy?"]["distribution"] == {"MAYBE": 4}
+
+    entries = list(iter_reasoning(str(reasoning), country="DEU"))
+    assert {e["reasoning"] for e in entries} == {"Prices are too high.", "Saving up.", "Need a car é\"quoted\"", "I would say very likely"}
+    assert list(iter_reasoning(str(reasoning), country="USA")) == []
+    assert not (tmp_path / "out" / "compact.json.tmp").exists()
+
+
+def test_truncated_input_is_an_error(tmp_path):
+    source = tmp_path / "aggregated_stats.json"
+    source.write_text(json.dumps(STATS)[:-10])
+    with pytest.raises(ValueError):
+        compact_aggregated_stats(str(source), str(tmp_path / "compact.json"))
+    assert not (tmp_path / "compact.json").exists()
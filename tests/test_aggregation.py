@@ -0,0 +1,78 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from synthcast.simulation.aggregation import ResponseFrame
+
+from tests.conftest import make_population
+
+OPTIONS = ["very likely", "likely", "neutral", "unlikely", "highly unlikely"]
+
+
+def _frame():
+    # Group "a": two "very likely", one "likely"; group "b": three "unlikely"
+    response = np.array([0, 0, 1, 3, 3, 3])
+    segments = {
+        "group": (np.array([0, 0, 0, 1, 1, 1]), ["a", "b"]),
+        "income": (np.array([0, 1, 0, 1, 0, 1]), ["high_income", "low_income"]),
+    }
+    return ResponseFrame(response, OPTIONS, segments)
+
+
+def test_group_by_counts_and_scores():
+    table = _frame().group_by(["group"])
+    assert table.keys == [("a",), ("b",)]
+    assert table.counts.tolist() == [[2, 1, 0, 0, 0], [0, 0, 0, 3, 0]]
+    assert table.scores == pytest.approx([2.5 / 3, -0.5])
+    [a, b] = table.to_records()
+    assert a["group"] == "a" and a["n"] == 3 and a["shares"]["very likely"] == pytest.approx(2 / 3)
+    assert "score_ci" not in a
+    assert _frame().group_by().counts.tolist() == [[2, 1, 0, 3, 0]]
+    with pytest.raises(ValueError, match="Unknown segments"):
+        _frame().group_by(["age"])
+
+
+def test_bootstrap_intervals_bracket_the_estimates():
+    table = _frame().bootstrap(["group"], n_boot=500, seed=1)
+    for g, score in enumerate(table.scores):
+        low, high = table.score_ci[g]
+        assert low <= score <= high
+    # A unanimous group has no sampling spread
+    assert table.score_ci[1].tolist() == [-0.5, -0.5]
+    assert table.share_ci.shape == (2, len(OPTIONS), 2)
+    assert _frame().bootstrap(["group"], seed=3).score_ci.tolist() == _frame().bootstrap(["group"], seed=3).score_ci.tolist()
+
+
+def test_segment_gap_and_spread():
+    frame = _frame()
+    [gap] = frame.income_gap(within=(), n_boot=200, seed=1)
+    # high: very likely, likely, unlikely -> 1/3; low: very likely, unlikely, unlikely -> 0
+    assert gap["gap"] == pytest.approx(1 / 3)
+    assert (gap["high_n"], gap["low_n"]) == (3, 3)
+    assert gap["gap_ci"][0] <= gap["gap"] <= gap["gap_ci"][1]
+
+    [spread] = frame.regional_spread(within=(), region="group", min_count=1, n_boot=200, seed=1)
+    assert spread["spread"] == pytest.approx(2.5 / 3 + 0.5)
+    assert (spread["highest"], spread["lowest"]) == ("a", "b")
+
+    frame.map_segment("side", "group", {"a": "left"})
+    assert frame.group_by(["side"]).keys == [("left",), ("other",)]
+    with pytest.raises(ValueError):
+        frame.add_segment("bad", [0], ["x"])
+
+
+def test_frame_from_population_matches_naive_counts():
+    population = make_population({"DEU": 40, "USA": 30})
+    rng = np.random.default_rng(0)
+    records = [{"persona_id": i, "response": OPTIONS[rng.integers(len(OPTIONS))]} for i in range(len(population))]
+    records.append({"persona": "legacy record without an id", "response": "likely"})
+    frame = ResponseFrame.from_records(records, population)
+    assert len(frame) == len(population)
+
+    expected = Counter((population.attributes(r["persona_id"])["country_code"], r["response"]) for r in records[:-1])
+    table = frame.group_by(["country"])
+    for (country,), row in zip(table.keys, table.counts):
+        assert {o: c for o, c in zip(table.options, row) if c} == {o: c for (k, o), c in expected.items() if k == country}
+    assert {k for (k,) in table.keys} == {"DEU", "USA"}
+    assert frame.group_by(["country", "gender", "age_cohort", "income", "city"]).n.sum() == len(population)
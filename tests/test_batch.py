@@ -0,0 +1,138 @@
+import json
+import logging
+
+import pytest
+
+from synthcast.simulation.answers import ANSWER_OPTIONS
+from synthcast.simulation.batch import (
+    BatchExecutor,
+    BatchFailedError,
+    BatchJob,
+    LocalBatchExecutor,
+    chat_request,
+    choice_distribution,
+    read_batch_output,
+    write_batch_file,
+)
+from synthcast.simulation.llm_agent import LLMAgent
+from synthcast.simulation.nebius import NebiusAgent
+from synthcast.simulation.simulation import Simulation
+
+from tests.conftest import make_population, repeated_population
+
+
+class _ScriptedExecutor(BatchExecutor):
+    """Walks a batch through `statuses`, one per poll."""
+
+    def __init__(self, statuses, output_file="out.jsonl"):
+        self.statuses = list(statuses)
+        self.output_file = output_file
+
+    def submit(self, input_path, metadata=None):
+        return BatchJob(id="b1", status=self.statuses.pop(0))
+
+    def poll(self, job):
+        status = self.statuses.pop(0)
+        return BatchJob(id=job.id, status=status, output_file=self.output_file if status in ("completed", "expired") else None)
+
+    def download(self, job, directory):
+        return [job.output_file]
+
+
+def test_executors_must_implement_every_step():
+    with pytest.raises(TypeError):
+        BatchExecutor()
+
+    class _NoDownload(BatchExecutor):
+        def submit(self, input_path, metadata=None):
+            pass
+
+        def poll(self, job):
+            pass
+
+    with pytest.raises(TypeError, match="download"):
+        _NoDownload()
+
+
+def test_run_polls_until_done(caplog):
+    with caplog.at_level(logging.INFO, logger="simulation"):
+        assert _ScriptedExecutor(["validating", "in_progress", "completed"]).run("in.jsonl", "out", poll_interval=0) == ["out.jsonl"]
+    # Progress reaches the handlers setup_logging attaches to "simulation"
+    assert any(r.name == "simulation.batch" and r.message.startswith("Submitted batch b1") for r in caplog.records)
+    # Expired batches still return their partial output
+    assert _ScriptedExecutor(["in_progress", "expired"]).run("in.jsonl", "out", poll_interval=0) == ["out.jsonl"]
+    with pytest.raises(BatchFailedError):
+        _ScriptedExecutor(["in_progress", "failed"]).run("in.jsonl", "out", poll_interval=0)
+    with pytest.raises(TimeoutError):
+        _ScriptedExecutor(["in_progress"] * 100).run("in.jsonl", "out", poll_interval=0.01, timeout=0.0)
+
+
+def test_local_executor_round_trip(tmp_path):
+    requests = [
+        chat_request("a0", "m", [{"role": "user", "content": "Q?"}], n=2),
+        chat_request("a1", "m", [{"role": "user", "content": "Q?"}], logprobs=True, top_logprobs=20, max_tokens=3),
+    ]
+    assert write_batch_file(str(tmp_path / "in.jsonl"), requests) == 2
+    [path] = LocalBatchExecutor().run(str(tmp_path / "in.jsonl"), str(tmp_path / "out"), poll_interval=0)
+    outputs = read_batch_output([path])
+    assert len(outputs["a0"]["choices"]) == 2
+    distribution = choice_distribution(outputs["a1"]["choices"][0])
+    assert set(distribution) == set(ANSWER_OPTIONS) and sum(distribution.values()) == pytest.approx(1.0)
+    # Stand-in answers are deterministic
+    assert read_batch_output(LocalBatchExecutor().run(str(tmp_path / "in.jsonl"), str(tmp_path / "again"), poll_interval=0)) == outputs
+
+
+def test_failed_requests_are_read_as_errors(tmp_path):
+    path = tmp_path / "out.jsonl"
+    path.write_text("\n".join(json.dumps(entry) for entry in [
+        {"custom_id": "a0", "response": {"status_code": 200, "body": {"choices": [{"message": {"content": "likely"}}]}}},
+        {"custom_id": "a1", "response": {"status_code": 400, "body": {"error": {"message": "bad request"}}}},
+        {"custom_id": "a2", "response": None, "error": {"code": "x", "message": "expired"}},
+    ]))
+    outputs = read_batch_output([str(path)])
+    assert outputs["a0"]["choices"][0]["message"]["content"] == "likely"
+    assert outputs["a1"] == {"error": "bad request"}
+    assert outputs["a2"] == {"error": "expired"}
+    assert choice_distribution({"message": {"content": "ANSWER: unlikely"}}) == {o: float(o == "unlikely") for o in ANSWER_OPTIONS}
+
+
+@pytest.mark.parametrize("mode", ["generate", "score"])
+def test_ask_question_batch_offline(mode, tmp_path):
+    simulation = Simulation(population=make_population({"DEU": 4, "USA": 3}), model_name="mock")
+    results = simulation.ask_question_batch(
+        "Q?", executor=LocalBatchExecutor(), base_path=str(tmp_path / "responses"), mode=mode, poll_interval=0,
+    )
+    assert {c: len(r) for c, r in results.items()} == {"DEU": 4, "USA": 3}
+    assert all(r["response"] in ANSWER_OPTIONS for records in results.values() for r in records)
+    if mode == "score":
+        assert all("distribution" in r for records in results.values() for r in records)
+    assert list((tmp_path / "responses").glob("DEU_*.json"))
+
+
+def test_local_executor_sends_requests_to_an_agent(mock_server, tmp_path):
+    simulation = Simulation(population=make_population({"DEU": 3}), model_name="mock")
+    executor = LocalBatchExecutor(agent=NebiusAgent(model_name="mock"))
+    results = simulation.ask_question_batch("Q?", executor=executor, save_results=False, poll_interval=0)
+    assert len(results["DEU"]) == 3
+    assert mock_server.stats.requests >= 3
+
+
+def test_groups_are_split_by_max_n_and_missing_choices_reasked(tmp_path):
+    sent = []
+
+    def _ignore_n(body, custom_id):
+        # A provider that ignores `n` and returns a single choice
+        sent.append(body.get("n", 1))
+        return [{"index": 0, "message": {"role": "assistant", "content": "likely"}, "finish_reason": "stop"}]
+
+    simulation = Simulation(population=repeated_population("DEU", 40), model_name="mock")
+    executor = LocalBatchExecutor(respond=_ignore_n)
+    results = simulation.ask_question_batch("Q?", executor=executor, save_results=False, poll_interval=0, followup_rounds=0)
+    assert sent == [LLMAgent.max_n, LLMAgent.max_n, 8]
+    assert len(results["DEU"]) == 3
+
+    sent.clear()
+    results = simulation.ask_question_batch("Q?", executor=executor, save_results=False, poll_interval=0)
+    assert sent == [LLMAgent.max_n, LLMAgent.max_n, 8] + [1] * 37
+    assert len(results["DEU"]) == 40
+    assert sorted(r["persona_id"] for r in results["DEU"]) == list(range(40))
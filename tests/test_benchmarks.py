@@ -0,0 +1,86 @@
+import argparse
+import json
+import socket
+import urllib.error
+import urllib.request
+
+import pytest
+
+from benchmarks import run_benchmarks
+from benchmarks.mock_server import MockOpenAIServer, MockSettings, _parse_mix
+from benchmarks.run_benchmarks import CaseResult, compare, load_baselines, save_baselines, target_checks
+
+from tests.conftest import FAST
+
+
+def _result(name, throughput, p99=0.5, peak_mb=100.0, items=1000):
+    return CaseResult(name, items, items / throughput, throughput, 0.1, p99, peak_mb)
+
+
+def test_mock_server_answers_and_rejects(start_mock):
+    server = start_mock(max_in_flight=0)
+    with urllib.request.urlopen(f"{server.url}/models") as response:
+        assert json.loads(response.read())["data"][0]["id"] == "mock"
+    request = urllib.request.Request(
+        f"{server.url}/chat/completions", data=json.dumps({"messages": []}).encode(), headers={"Content-Type": "application/json"},
+    )
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(request)
+    assert error.value.code == 429
+    assert server.stats.rate_limited == 1
+    assert _parse_mix("likely=3, very likely=1") == {"likely": 3.0, "very likely": 1.0}
+    with pytest.raises(argparse.ArgumentTypeError):
+        _parse_mix("maybe=1")
+
+
+def test_stop_closes_open_connections():
+    server = MockOpenAIServer(MockSettings(**FAST)).start()
+    # An idle keep-alive connection still has its handler waiting on a read
+    client = socket.create_connection(("127.0.0.1", server.port), timeout=5)
+    try:
+        server.stop()
+        assert server._loop.is_closed()
+        assert client.recv(1) == b""
+    finally:
+        client.close()
+
+
+def test_compare_flags_regressions():
+    baselines = {"a[10]": {"throughput": 100.0, "p99": 0.5, "peak_mb": 100.0}}
+    assert compare([_result("a[10]", 80.0), _result("b[10]", 1.0)], baselines, tolerance=0.35) == []
+    assert len(compare([_result("a[10]", 50.0, p99=1.0, peak_mb=200.0)], baselines, tolerance=0.35)) == 3
+
+
+def test_targets_use_the_largest_size():
+    lines = target_checks([_result("ask_question[100]", 1.0, items=100), _result("ask_question[1000]", 100.0)])
+    assert lines == ["ask_question: 50000 in 8.3 min (from ask_question[1000]) meets the 30 min target"]
+    assert "MISSES" in target_checks([_result("persona_generation[10]", 1.0, items=10)])[0]
+
+
+def test_baselines_round_trip(tmp_path):
+    path = tmp_path / "baselines.json"
+    assert load_baselines(path) == {"environment": None, "results": {}}
+    save_baselines([_result("b[10]", 10.0)], MockSettings(), path)
+    save_baselines([_result("a[10]", 20.0)], MockSettings(), path)
+    stored = load_baselines(path)
+    assert list(stored["results"]) == ["a[10]", "b[10]"]
+    assert stored["results"]["a[10]"]["throughput"] == 20.0
+
+
+@pytest.mark.parametrize("case", ["save_results", "aggregation"])
+def test_offline_cases(case):
+    result = run_benchmarks.CASES[case](50, 1)
+    assert result.name == f"{case}[50]" and result.items == 50 and result.throughput > 0
+
+
+def test_ask_question_case(mock_server):
+    result = run_benchmarks.bench_ask_question(20, 1, max_concurrency=8)
+    assert result.name == "ask_question[20]" and result.p50 is not None
+    assert mock_server.stats.completed >= 20
+
+
+def test_cases_run_in_their_own_process():
+    result = run_benchmarks.run_case("persona_generation", 50, 1)
+    assert result.name == "persona_generation[50]" and result.peak_mb > 0
+    with pytest.raises(RuntimeError, match="failed"):
+        run_benchmarks.run_case("persona_generation", 50, 1, {"unknown": 1})
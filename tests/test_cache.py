@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+import pytest
+
+from synthcast.simulation.cache import CacheMissError, ResponseCache, cache_key
+from synthcast.simulation.client_pool import close_async_clients
+from synthcast.simulation.nebius import NebiusAgent
+
+
+def _ask(agent, sample_index=0):
+    async def _main():
+        try:
+            return await agent.generate_response_async("persona", "question", sample_index=sample_index)
+        finally:
+            await close_async_clients()
+
+    return asyncio.run(_main())
+
+
+def test_key_separates_samples_and_request_shapes():
+    base = cache_key("p", "m", "s", "u", 0.7, 512, 0)
+    assert cache_key("p", "m", "s", "u", 0.7, 512, 0) == base
+    assert cache_key("p", "m", "s", "u", 0.7, 512, 1) != base
+    assert cache_key("p", "m", "s", "u", 0.7, 512, 0, mode="logprobs") != base
+
+
+def test_read_through_serves_hits_without_calling(mock_server, tmp_path):
+    cache = ResponseCache(str(tmp_path / "c.sqlite"))
+    agent = NebiusAgent(model_name="mock", cache=cache)
+    first = _ask(agent)
+    assert _ask(agent) == first
+    assert mock_server.stats.completed == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+    _ask(agent, sample_index=1)
+    assert mock_server.stats.completed == 2
+
+
+def test_record_only_always_calls(mock_server, tmp_path):
+    agent = NebiusAgent(model_name="mock", cache=ResponseCache(str(tmp_path / "c.sqlite"), mode="record_only"))
+    _ask(agent)
+    _ask(agent)
+    assert mock_server.stats.completed == 2
+    assert len(agent.cache) == 1
+
+
+def test_replay_only_replays_and_raises_on_miss(mock_server, tmp_path):
+    path = str(tmp_path / "c.sqlite")
+    recorded = _ask(NebiusAgent(model_name="mock", cache=ResponseCache(path, mode="record_only")))
+    replay = NebiusAgent(model_name="mock", cache=ResponseCache(path, mode="replay_only"))
+    assert _ask(replay) == recorded
+    with pytest.raises(CacheMissError):
+        _ask(replay, sample_index=5)
+    assert mock_server.stats.completed == 1
+
+
+def test_off_bypasses_cache(mock_server, tmp_path):
+    agent = NebiusAgent(model_name="mock", cache=ResponseCache(str(tmp_path / "c.sqlite"), mode="off"))
+    _ask(agent)
+    _ask(agent)
+    assert mock_server.stats.completed == 2 and len(agent.cache) == 0
+
+
+def test_lru_and_age_eviction(tmp_path):
+    cache = ResponseCache(str(tmp_path / "c.sqlite"), max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.put(key, key)
+        time.sleep(0.01)
+    cache.get("a")
+    cache.evict()
+    assert cache.get("a") == "a" and cache.get("b") is None and cache.get("c") == "c"
+
+    aged = ResponseCache(str(tmp_path / "aged.sqlite"), max_age_seconds=0.01)
+    aged.put("k", "v")
+    time.sleep(0.02)
+    assert aged.get("k") is None and len(aged) == 0
@@ -0,0 +1,127 @@
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from synthcast.simulation import results as results_module
+from synthcast.simulation.catalog import RESULT_FILE_PATTERN, ResultsCatalog
+from synthcast.simulation.results import save_simulation_results
+
+
+def _write(directory, name, run_id, responses, question="Q?", model="m1", temperature=0.7):
+    path = directory / name
+    country_code, timestamp = name.rsplit(".", 1)[0].split("_", 1)
+    distribution = {}
+    for response in responses:
+        distribution[response] = distribution.get(response, 0) + 1
+    path.write_text(json.dumps({
+        "timestamp": timestamp, "country_code": country_code, "question": question,
+        "responses": [{"response": r} for r in responses],
+        "metadata": {"total_responses": len(responses), "response_distribution": distribution,
+                     "run_id": run_id, "model": model, "temperature": temperature, "mode": "generate"},
+    }))
+    return path
+
+
+def test_ingest_and_distribution(tmp_path):
+    _write(tmp_path, "DEU_20240101_000000.json", "r1", ["likely", "likely", "neutral"])
+    _write(tmp_path, "USA_20240101_000000.json", "r1", ["unlikely"])
+    _write(tmp_path, "DEU_20240102_000000.json", "r2", ["likely"], model="m2")
+    (tmp_path / "notes.json").write_text("{}")
+    catalog = ResultsCatalog(str(tmp_path))
+
+    assert catalog.ingest() == 3
+    assert catalog.ingest() == 0
+    assert len(catalog) == 3
+    assert catalog.distribution(question="Q?", country_code="DEU") == {"likely": 3, "neutral": 1}
+    assert catalog.distribution(country_code=["DEU", "USA"], until="20240102_000000") == {"likely": 2, "neutral": 1, "unlikely": 1}
+    assert catalog.distribution(group_by=["model"]) == {"m1": {"likely": 2, "neutral": 1, "unlikely": 1}, "m2": {"likely": 1}}
+    assert catalog.distribution(group_by=["run_id", "day"])[("r2", "20240102")] == {"likely": 1}
+    assert catalog.distribution(since=timedelta(days=1)) == {}
+    assert [r["run_id"] for r in catalog.runs(temperature=0.7, country_code="DEU")] == ["r1", "r2"]
+    with pytest.raises(ValueError):
+        catalog.distribution(group_by=["persona"])
+    catalog.close()
+
+
+def test_resumed_run_supersedes_its_partial_file(tmp_path):
+    _write(tmp_path, "DEU_20240101_000000.json", "r1", ["likely"])
+    _write(tmp_path, "DEU_20240101_000500.json", "r1", ["likely", "neutral"])
+    catalog = ResultsCatalog(str(tmp_path))
+    catalog.ingest()
+    assert len(catalog) == 1
+    assert catalog.distribution(run_id="r1") == {"likely": 1, "neutral": 1}
+    catalog.close()
+
+
+def test_overwritten_file_keeps_the_earlier_run(tmp_path, caplog):
+    path = _write(tmp_path, "DEU_20240101_000000.json", "r1", ["likely", "likely"])
+    catalog = ResultsCatalog(str(tmp_path))
+    catalog.ingest()
+
+    _write(tmp_path, path.name, "r2", ["unlikely"])
+    with caplog.at_level(logging.WARNING, logger="simulation.catalog"):
+        assert catalog.add_file(str(path))
+    assert "no longer the results of run(s) r1" in caplog.text
+    assert catalog.distribution(group_by=["run_id"]) == {"r1": {"likely": 2}, "r2": {"unlikely": 1}}
+    # The file's current contents are known, so a rescan skips it
+    assert catalog.ingest() == 0
+
+    # Re-indexing the same run replaces its row
+    _write(tmp_path, path.name, "r2", ["unlikely", "neutral"])
+    catalog.ingest()
+    assert catalog.distribution(run_id="r2") == {"unlikely": 1, "neutral": 1}
+    assert len(catalog) == 2
+    catalog.close()
+
+
+def test_catalogs_keyed_by_path_are_migrated(tmp_path):
+    db = tmp_path / "results_catalog.sqlite"
+    conn = sqlite3.connect(db)
+    conn.execute(
+        "CREATE TABLE runs (id INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT NOT NULL UNIQUE, size INTEGER,"
+        " mtime_ns INTEGER, run_id TEXT NOT NULL, timestamp TEXT NOT NULL, country_code TEXT NOT NULL,"
+        " question_hash TEXT NOT NULL, question TEXT NOT NULL, model TEXT, temperature REAL, mode TEXT,"
+        " population_snapshot TEXT, total_responses INTEGER)"
+    )
+    conn.execute(
+        "CREATE TABLE counts (run INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE, response TEXT NOT NULL,"
+        " count INTEGER NOT NULL, expected REAL, PRIMARY KEY (run, response))"
+    )
+    conn.execute(
+        "INSERT INTO runs (id, path, run_id, timestamp, country_code, question_hash, question)"
+        " VALUES (7, '/gone/DEU_20240101_000000.json', 'r0', '20240101_000000', 'DEU', 'h', 'Q?')"
+    )
+    conn.execute("INSERT INTO counts VALUES (7, 'likely', 4, NULL)")
+    conn.commit()
+    conn.close()
+
+    catalog = ResultsCatalog(str(tmp_path))
+    assert catalog.distribution(run_id="r0") == {"likely": 4}
+    path = _write(tmp_path, "DEU_20240101_000000.json", "r1", ["neutral"])
+    _write(tmp_path, "USA_20240101_000000.json", "r1", ["neutral"])
+    catalog.add_file(str(path))
+    _write(tmp_path, path.name, "r2", ["likely"])
+    catalog.add_file(str(path))
+    assert len(catalog) == 3
+    catalog.close()
+
+
+def test_saves_in_the_same_second_keep_their_own_files(tmp_path, monkeypatch):
+    class _FrozenClock(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime(2024, 1, 1, 12, 0, 0)
+
+    monkeypatch.setattr(results_module, "datetime", _FrozenClock)
+    first = save_simulation_results([{"response": "likely"}], "Q?", "DEU", base_path=str(tmp_path), metadata={"run_id": "r1"})
+    second = save_simulation_results([{"response": "neutral"}], "Q?", "DEU", base_path=str(tmp_path), metadata={"run_id": "r2"})
+    assert first != second
+    assert RESULT_FILE_PATTERN.match(os.path.basename(first))["timestamp"] == "20240101_120000"
+    catalog = ResultsCatalog(str(tmp_path))
+    catalog.ingest()
+    assert catalog.distribution(group_by=["run_id"]) == {"r1": {"likely": 1}, "r2": {"neutral": 1}}
+    catalog.close()
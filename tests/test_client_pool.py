@@ -0,0 +1,42 @@
+import asyncio
+
+from synthcast.simulation.client_pool import close_async_clients, get_async_client, get_client
+from synthcast.simulation.nebius import NebiusAgent
+
+
+def test_sync_client_is_shared_per_backend():
+    a = get_client("p", "m", "http://x/v1/", "k")
+    assert get_client("p", "m", "http://x/v1/", "k") is a
+    assert get_client("p", "other", "http://x/v1/", "k") is not a
+
+
+def test_async_client_is_shared_per_loop_and_closed():
+    async def _clients():
+        first = get_async_client("p", "m", "http://x/v1/", "k")
+        second = get_async_client("p", "m", "http://x/v1/", "k")
+        await close_async_clients()
+        return first, second
+
+    first, second = asyncio.run(_clients())
+    assert first is second
+    assert first.is_closed()
+    # A new loop gets a new pool
+    other, _ = asyncio.run(_clients())
+    assert other is not first
+
+
+def test_agents_share_one_client(mock_server):
+    agent = NebiusAgent(model_name="mock")
+
+    async def _ask():
+        clients = set()
+        for _ in range(3):
+            clients.add(id(agent.async_client))
+        answers = await asyncio.gather(*(agent.generate_response_async("persona", "question") for _ in range(5)))
+        await close_async_clients()
+        return clients, answers
+
+    clients, answers = asyncio.run(_ask())
+    assert len(clients) == 1
+    assert len(answers) == 5 and all(answers)
+    assert mock_server.stats.completed == 5
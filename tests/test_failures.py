@@ -0,0 +1,64 @@
+import pytest
+
+from synthcast.simulation.errors import ProviderServerError
+from synthcast.simulation.failures import ErrorBudget, ErrorBudgetExceeded, FailureSettings
+from synthcast.simulation.journal import journal_path, read_journal
+from synthcast.simulation.rate_limit import RateLimitSettings
+from synthcast.simulation.simulation import Simulation
+
+from tests.conftest import make_population
+
+# No retries inside the rate limiter, so every 5xx reaches the retry queue
+NO_LIMITER_RETRIES = RateLimitSettings(max_retries=0)
+
+
+def test_error_budget():
+    budget = ErrorBudget(FailureSettings(error_budget=0.1, min_error_budget=2), agent_count=50)
+    assert budget.limit == 5
+    assert not any(budget.charge(ProviderServerError("down")) for _ in range(5))
+    assert budget.charge(ProviderServerError("down"))
+    assert isinstance(budget.exceeded, ErrorBudgetExceeded) and "budget of 5" in str(budget.exceeded)
+    assert ErrorBudget(FailureSettings(min_error_budget=20), agent_count=10).limit == 20
+
+
+def test_failed_agents_are_retried_on_the_queue(start_mock):
+    server = start_mock(error_rate_5xx=0.3)
+    simulation = Simulation(
+        population=make_population({"DEU": 30}),
+        model_name="mock",
+        rate_limit_settings=NO_LIMITER_RETRIES,
+        failure_settings=FailureSettings(max_agent_retries=10, retry_delay=0.001, min_error_budget=1000),
+    )
+    results = simulation.ask_question("Q?", save_results=False, checkpoint=False)
+    assert server.stats.injected_5xx > 0
+    assert len(results["DEU"]) == 30
+    assert len({r["persona_id"] for r in results["DEU"]}) == 30
+
+
+def test_agents_that_keep_failing_are_left_out(start_mock, tmp_path):
+    start_mock(error_rate_5xx=1.0)
+    base_path = str(tmp_path / "responses")
+    simulation = Simulation(
+        population=make_population({"DEU": 5}),
+        model_name="mock",
+        rate_limit_settings=NO_LIMITER_RETRIES,
+        failure_settings=FailureSettings(max_agent_retries=1, retry_delay=0.001, min_error_budget=1000),
+    )
+    results = simulation.ask_question("Q?", base_path=base_path, save_results=False, checkpoint=True)
+    assert results.get("DEU", []) == []
+    # The run stays resumable
+    assert not read_journal(str(journal_path(simulation.last_run_id, base_path))).complete
+
+
+def test_exhausted_budget_aborts_the_run(start_mock):
+    server = start_mock(error_rate_5xx=1.0)
+    simulation = Simulation(
+        population=make_population({"DEU": 40}),
+        model_name="mock",
+        rate_limit_settings=NO_LIMITER_RETRIES,
+        failure_settings=FailureSettings(max_agent_retries=5, retry_delay=0.001, error_budget=0.0, min_error_budget=3),
+    )
+    with pytest.raises(ErrorBudgetExceeded):
+        simulation.ask_question("Q?", save_results=False, checkpoint=False)
+    # Aborted well before every retry round was spent
+    assert server.stats.requests < 40 * 6
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from synthcast.simulation.journal import RunJournal, journal_path, read_journal
+from synthcast.simulation.simulation import Simulation
+
+from tests.conftest import make_population
+
+
+def test_torn_lines_are_skipped(tmp_path):
+    path = tmp_path / "run.jsonl"
+    with RunJournal(str(path), header={"question": "Q?"}) as journal:
+        journal.append(0, "DEU", {"response": "likely"})
+        journal.append(1, "DEU", {"response": "unlikely"})
+    with open(path, "a") as f:
+        f.write('{"type": "result", "agent": 2, "coun')
+
+    state = read_journal(str(path))
+    assert state.header["question"] == "Q?"
+    assert sorted(state.results) == [0, 1]
+    assert not state.complete
+
+    # Appending after a torn line starts on a fresh line
+    with RunJournal(str(path)) as journal:
+        journal.append(2, "USA", {"response": "likely"})
+        journal.mark_complete()
+    state = read_journal(str(path))
+    assert state.results[2] == ("USA", {"response": "likely"})
+    assert state.complete
+
+
+def test_header_is_required(tmp_path):
+    with pytest.raises(ValueError):
+        RunJournal(str(tmp_path / "new.jsonl"))
+    (tmp_path / "headless.jsonl").write_text('{"type": "result", "agent": 0}\n')
+    with pytest.raises(ValueError, match="no run header"):
+        read_journal(str(tmp_path / "headless.jsonl"))
+
+
+def test_resume_queries_only_missing_agents(mock_server, tmp_path):
+    base_path = str(tmp_path / "responses")
+    population = make_population({"DEU": 6, "USA": 4})
+    simulation = Simulation(population=population, model_name="mock")
+    original = simulation.ask_question("Q?", base_path=base_path, save_results=False, checkpoint=True)
+    run_id = simulation.last_run_id
+    assert mock_server.stats.requests == 10
+
+    # Keep the header and four results, then a line torn by a killed process
+    path = journal_path(run_id, base_path)
+    lines = path.read_text().splitlines()
+    assert json.loads(lines[-1])["type"] == "complete"
+    path.write_text("\n".join(lines[:5]) + "\n" + lines[5][:20])
+
+    resumed = Simulation.from_run(run_id, base_path=base_path).resume(run_id, base_path=base_path, save_results=False)
+    assert mock_server.stats.requests == 16
+    assert {c: len(r) for c, r in resumed.items()} == {"DEU": 6, "USA": 4}
+    assert sorted(r["persona"] for r in resumed["DEU"]) == sorted(r["persona"] for r in original["DEU"])
+    assert read_journal(str(path)).complete
+
+    # A completed run is read back without any calls
+    again = simulation.resume(run_id, base_path=base_path, save_results=False)
+    assert mock_server.stats.requests == 16
+    assert {c: len(r) for c, r in again.items()} == {"DEU": 6, "USA": 4}
+
+
+def test_resume_rejects_another_population(mock_server, tmp_path):
+    base_path = str(tmp_path / "responses")
+    simulation = Simulation(population=make_population({"DEU": 3}), model_name="mock")
+    simulation.ask_question("Q?", base_path=base_path, save_results=False, checkpoint=True)
+    other = Simulation(population=make_population({"DEU": 3}, seed=8), model_name="mock")
+    with pytest.raises(ValueError, match="was started with population"):
+        other.resume(simulation.last_run_id, base_path=base_path)
@@ -0,0 +1,120 @@
+import json
+import urllib.request
+
+import pytest
+
+from synthcast.simulation import metrics
+from synthcast.simulation.rate_limit import RateLimitSettings
+from synthcast.simulation.simulation import Simulation
+
+from tests.conftest import make_population
+
+PRICES = {"mock": (1.0, 0.5, 2.0)}
+
+
+def test_histogram_quantiles_interpolate_within_buckets():
+    histogram = metrics.Histogram((1, 2, 4))
+    for value in (0.5, 1.5, 1.5, 3.0, 10.0):
+        histogram.observe(value)
+    assert histogram.counts == [1, 2, 1, 1]
+    assert histogram.quantile(0.5) == pytest.approx(1.75)
+    assert histogram.quantile(1.0) == 4
+    assert metrics.Histogram((1,)).quantile(0.5) is None
+    assert histogram.to_dict()["buckets"] == {"1": 1, "2": 2, "4": 1, "+Inf": 1}
+
+
+def test_recording_is_a_no_op_without_a_registry():
+    metrics.inc("calls_total")
+    registry = metrics.MetricsRegistry("r1")
+    with metrics.collecting(registry):
+        metrics.set_labels(country="DEU")
+        metrics.inc("calls_total", 1, {"model": "mock"})
+        metrics.observe("call_seconds", 0.2, {"model": "mock"})
+    metrics.inc("calls_total", 1, {"model": "mock"})
+    assert metrics.current() is None
+    assert registry.counter("calls_total") == 1
+    assert registry.counter("calls_total", country="DEU", model="mock") == 1
+    assert registry.histogram("call_seconds", country="USA").count == 0
+
+
+def test_breakdowns_and_cost():
+    registry = metrics.MetricsRegistry("r1", prices=PRICES)
+    labels = ("DEU", "mock", "b1", None)
+    registry.inc("prompt_tokens_total", 1_000_000, labels)
+    registry.inc("cached_tokens_total", 400_000, labels)
+    registry.inc("completion_tokens_total", 100_000, labels)
+    registry.inc("calls_total", 3, labels)
+    registry.inc("errors_total", 1, ("USA", "other", "b2", "RateLimitError"))
+    # 0.6M uncached at $1, 0.4M cached at $0.5, 0.1M completion at $2
+    assert registry.breakdown("country")["DEU"]["cost_usd"] == pytest.approx(1.0)
+    assert registry.breakdown("country")["USA"]["cost_usd"] is None
+    assert registry.breakdown("error")["RateLimitError"]["errors_total"] == 1
+    summary = registry.summary()
+    assert summary["totals"]["calls_total"] == 3 and summary["totals"]["cost_usd"] == pytest.approx(1.0)
+    assert sum(summary["throughput"]["calls"]) == 3
+
+
+def test_prometheus_text():
+    registry = metrics.MetricsRegistry("r1")
+    registry.observe("call_seconds", 0.2, ("DEU", "mock", None, None))
+    registry.inc("calls_total", 1, ('a "quoted" country', "mock", None, None))
+    text = registry.prometheus_text()
+    assert "# TYPE synthcast_call_seconds histogram" in text
+    assert 'synthcast_call_seconds_bucket{country="DEU",model="mock",run_id="r1",le="0.25"} 1' in text
+    assert 'synthcast_call_seconds_bucket{country="DEU",model="mock",run_id="r1",le="+Inf"} 1' in text
+    assert 'synthcast_calls_total{country="a \\"quoted\\" country",model="mock",run_id="r1"} 1' in text
+
+
+def test_summary_is_strict_json(tmp_path):
+    registry = metrics.MetricsRegistry("r1")
+    registry.observe("call_seconds", float("inf"), ("DEU", "mock", None, None))
+    registry.observe("request_seconds", float("nan"), ("DEU", "mock", None, None))
+    summary_path, _ = registry.write(str(tmp_path))
+    summary = json.loads((tmp_path / "r1.json").read_text(), parse_constant=pytest.fail)
+    assert summary_path == str(tmp_path / "r1.json")
+    assert summary["call_seconds"]["sum"] is None and summary["request_seconds"]["mean"] is None
+    assert summary["call_seconds"]["count"] == 1
+
+
+def test_prometheus_endpoint():
+    registry = metrics.MetricsRegistry("r1")
+    registry.inc("calls_total", 2, ("DEU", None, None, None))
+    server = metrics.serve_prometheus(lambda: registry, port=0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url) as response:
+            assert 'synthcast_calls_total{country="DEU",run_id="r1"} 2' in response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_run_metrics(start_mock, tmp_path):
+    server = start_mock(error_rate_429=0.3, retry_after=0.001)
+    base_path = str(tmp_path / "responses")
+    simulation = Simulation(
+        population=make_population({"DEU": 12, "USA": 8}),
+        model_name="mock",
+        token_prices=PRICES,
+        rate_limit_settings=RateLimitSettings(max_retries=20, base_backoff=0.001, max_backoff=0.01),
+    )
+    simulation.ask_question("Q?", base_path=base_path, checkpoint=False)
+    registry = simulation.last_metrics
+    assert registry.counter("calls_total") == 20
+    assert registry.counter("agents_total", country="DEU") == 12
+    assert registry.counter("errors_total") == server.stats.injected_429 > 0
+    assert registry.histogram("retries").sum == server.stats.injected_429
+    assert registry.counter("prompt_tokens_total") > 0
+    by_country = registry.breakdown("country")
+    assert by_country["DEU"]["calls_total"] == 12 and by_country["USA"]["calls_total"] == 8
+    assert by_country["DEU"]["cost_usd"] > 0
+
+    summary = json.loads((tmp_path / "responses" / "metrics" / f"{simulation.last_run_id}.json").read_text())
+    assert summary["totals"]["calls_total"] == 20
+    assert (tmp_path / "responses" / "metrics" / f"{simulation.last_run_id}.prom").exists()
+
+
+def test_metrics_can_be_turned_off(mock_server):
+    simulation = Simulation(population=make_population({"DEU": 2}), model_name="mock", collect_metrics=False)
+    simulation.ask_question("Q?", save_results=False, checkpoint=False)
+    assert simulation.last_metrics is None
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from synthcast.simulation.llm_agent import estimate_tokens
+from synthcast.simulation.multi_period import (
+    EMOTIONS,
+    MemorySettings,
+    MemoryStore,
+    MultiPeriodSimulation,
+    Period,
+    hash_embed,
+)
+
+from tests.conftest import make_population
+
+
+def test_hash_embed_is_normalized_and_stable():
+    vectors = hash_embed(["energy prices doubled", "energy prices doubled", ""])
+    assert np.linalg.norm(vectors[0]) == pytest.approx(1.0)
+    assert np.array_equal(vectors[0], vectors[1])
+    assert not vectors[2].any()
+
+
+def test_texts_are_interned_once():
+    store = MemoryStore(3)
+    store.add([0, 1, 2], "Energy prices doubled.", period=1)
+    store.add([0, 1], ["Lost my job.", "Energy prices doubled."], period=2)
+    assert len(store) == 5
+    assert store.texts == ["Energy prices doubled.", "Lost my job."]
+    assert store._vectors.shape[0] == 2
+
+
+def test_retrieval_prefers_relevant_recent_memories():
+    store = MemoryStore(2, MemorySettings(top_k=1))
+    store.add([0], "The supermarket raised food prices.", period=1, importance=0.5)
+    store.add([0], "My daughter started school.", period=1, importance=0.5)
+    offsets, memories = store.retrieve("Will food prices keep rising?", period=2)
+    assert offsets.tolist() == [0, 1, 1]
+    assert store.texts[store.text[memories[0]]] == "The supermarket raised food prices."
+
+
+def test_compaction_bounds_memories_per_agent():
+    settings = MemorySettings(max_episodic=2, summary_events=1)
+    store = MemoryStore(2, settings)
+    for period in range(1, 6):
+        store.add([0, 1], f"Event {period}", period=period, valence=-0.5, importance=period / 10)
+    assert store.compact() == 6
+    assert np.bincount(store.owner).tolist() == [2, 2]
+    assert set(store.period.tolist()) == {4, 5}
+    assert store.summary_count.tolist() == [3, 3]
+    assert store.summary_valence[0] == pytest.approx(-0.5, abs=1e-3)
+    # The most important folded event is kept verbatim
+    assert store.texts[store.summary_text[0, 0]] == "Event 3"
+    assert store.compact() == 0
+
+
+def test_rendered_state_stays_within_budget():
+    simulation = MultiPeriodSimulation(population=make_population({"DEU": 2}), model_name="mock", memory_settings=MemorySettings(token_budget=40))
+    for period in range(1, 6):
+        simulation.memory.add([0], f"A long and memorable experience number {period} " * 3, period=period, importance=0.9)
+    offsets, memories = simulation.memory.retrieve("experience", 6)
+    state = simulation.render_state(0, offsets, memories)
+    assert state.startswith("Your current state of mind:")
+    assert estimate_tokens(state) <= 40 + 6
+
+
+def test_periods_update_emotions_and_memories(mock_server, tmp_path):
+    population = make_population({"DEU": 4, "USA": 4})
+    simulation = MultiPeriodSimulation(population=population, model_name="mock", years_per_period=1.0)
+    periods = [
+        Period("Will you cut spending?"),
+        Period("Will you cut spending?", event="Energy prices doubled.", valence=-0.8,
+               shock={"financial_anxiety": 0.9}, countries=["germany"]),
+    ]
+    history = simulation.run(periods, save_results=False, checkpoint=False, state_path=str(tmp_path / "state"))
+    assert [sum(len(r) for r in results.values()) for results in history] == [8, 8]
+
+    anxiety = simulation.emotions[:, EMOTIONS.index("financial_anxiety")]
+    deu = np.array([a["country_code"] == "DEU" for a in simulation.agents])
+    assert (anxiety[deu] > anxiety[~deu]).all()
+    # Every agent remembers its two answers; only DEU agents the event
+    assert np.bincount(simulation.memory.owner).tolist() == (2 + deu).tolist()
+    assert simulation.memory.texts.count("Energy prices doubled.") == 1
+
+    restored = MultiPeriodSimulation(population=population, model_name="mock")
+    restored.load_state(str(tmp_path / "state"))
+    assert restored.period == 2
+    assert np.array_equal(restored.emotions, simulation.emotions)
+    assert restored.memory.texts == simulation.memory.texts
+
+    # The next period's prompts carry the aged persona and the event
+    simulation.period += 1
+    simulation._prepare_agents(Period("Will prices rise?"))
+    agent = next(a for a in simulation.agents if a["country_code"] == "DEU")
+    persona = simulation._persona(agent)
+    assert persona.startswith(population.render(agent["persona_id"], 2))
+    assert "Energy prices doubled." in persona
+
+    with pytest.raises(ValueError):
+        MultiPeriodSimulation(population=make_population({"DEU": 3}), model_name="mock").load_state(str(tmp_path / "state"))
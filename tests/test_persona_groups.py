@@ -0,0 +1,37 @@
+import asyncio
+
+from synthcast.simulation.client_pool import close_async_clients
+from synthcast.simulation.nebius import NebiusAgent
+from synthcast.simulation.simulation import Simulation
+
+from tests.conftest import repeated_population
+
+
+def test_n_samples_in_one_request(mock_server):
+    agent = NebiusAgent(model_name="mock")
+
+    async def _ask(n):
+        try:
+            return await agent.generate_responses_async("persona", "question", n=n)
+        finally:
+            await close_async_clients()
+
+    assert len(asyncio.run(_ask(5))) == 5
+    assert mock_server.stats.requests == 1
+    # Groups above max_n are split across requests
+    assert len(asyncio.run(_ask(NebiusAgent.max_n + 4))) == NebiusAgent.max_n + 4
+    assert mock_server.stats.requests == 3
+
+
+def test_identical_personas_share_a_request(mock_server):
+    simulation = Simulation(population=repeated_population("DEU", 6), model_name="mock")
+    results = simulation.ask_question("Q?", save_results=False, checkpoint=False)
+    assert len(results["DEU"]) == 6
+    assert mock_server.stats.requests == 1
+
+
+def test_grouping_can_be_turned_off(mock_server):
+    simulation = Simulation(population=repeated_population("DEU", 6), model_name="mock", group_identical_personas=False)
+    results = simulation.ask_question("Q?", save_results=False, checkpoint=False)
+    assert len(results["DEU"]) == 6
+    assert mock_server.stats.requests == 6
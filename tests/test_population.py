@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from synthcast.population.population import Population
+from synthcast.simulation.multi_period import MultiPeriodSimulation, Period
+from synthcast.simulation.simulation import Simulation
+
+from tests.conftest import make_population, repeated_population
+
+
+def test_snapshot_round_trip(tmp_path):
+    population = make_population({"DEU": 20, "USA": 10})
+    path = population.save_to_directory(str(tmp_path / "snapshots"))
+    assert path.endswith(f"{population.snapshot_id}.synthpop")
+    # Saving the same population again reuses the file
+    assert population.save_to_directory(str(tmp_path / "snapshots")) == path
+
+    for mmap in (True, False):
+        loaded = Population.load(path, mmap=mmap)
+        assert isinstance(loaded.records, np.memmap) == mmap
+        assert loaded.snapshot_id == population.snapshot_id
+        assert loaded.counts() == population.counts()
+        assert [loaded.render(i) for i in range(len(loaded))] == list(population.iter_prompts())
+
+
+def test_agents_hold_no_prompt_text():
+    population = make_population({"DEU": 5})
+    simulation = Simulation(population=population, model_name="mock")
+    assert len(simulation.agents) == 5
+    for agent in simulation.agents:
+        assert "persona" not in agent
+        assert simulation._persona(agent) == population.render(agent["persona_id"])
+
+
+def test_countries_are_keyed_by_iso_code():
+    simulation = Simulation({"Germany": 5, "usa": 3, "DEU": 1}, model_name="mock", seed=1)
+    assert simulation.country_agent_counts == {"DEU": 6, "USA": 3}
+    assert len(simulation.agents) == 9
+    assert {a["country_code"] for a in simulation.agents} == {"DEU", "USA"}
+    with pytest.raises(ValueError, match="Unknown country"):
+        Simulation({"Atlantis": 2}, model_name="mock")
+    with pytest.raises(ValueError, match="at least one agent"):
+        Simulation({"DEU": 2, "USA": 0}, model_name="mock")
+
+
+def test_identical_records_share_a_persona_key():
+    simulation = Simulation(population=repeated_population("DEU", 4), model_name="mock")
+    assert len({simulation._persona_key(a) for a in simulation.agents}) == 1
+    assert [a["sample_index"] for a in simulation.agents] == [0, 1, 2, 3]
+
+
+def test_records_carry_rendered_personas(mock_server):
+    population = make_population({"DEU": 4})
+    simulation = Simulation(population=population, model_name="mock")
+    results = simulation.ask_question("Q?", save_results=False, checkpoint=False)
+    assert sorted(r["persona"] for r in results["DEU"]) == sorted(population.iter_prompts())
+
+
+def test_multi_period_personas_age_and_remember(mock_server):
+    population = make_population({"DEU": 3})
+    simulation = MultiPeriodSimulation(population=population, model_name="mock", years_per_period=1.0)
+    periods = [Period("Q1?", event="Energy prices doubled."), Period("Q2?")]
+    history = simulation.run(periods, save_results=False, checkpoint=False)
+    assert [len(results["DEU"]) for results in history] == [3, 3]
+
+    agent = simulation.agents[0]
+    persona = simulation._persona(agent)
+    assert persona.startswith(population.render(agent["persona_id"], 1))
+    assert "Energy prices doubled." in persona
+    assert "persona" not in agent
@@ -0,0 +1,65 @@
+import json
+import logging
+
+import pytest
+
+from synthcast.simulation.journal import journal_path, read_journal
+from synthcast.simulation.prompts import PromptAssembler, PromptBudgetError
+from synthcast.simulation.simulation import Simulation
+
+from tests.conftest import make_population
+
+
+def test_persona_first_is_the_default_layout():
+    prompts = PromptAssembler("Q?", "Answer.")
+    assert prompts.layout == "persona_first"
+    assert prompts.assemble("I am Anna.") == ("I am Anna.", "Q?\nAnswer.")
+    assert Simulation(population=make_population({"DEU": 1}), model_name="mock").prompt_layout == "persona_first"
+
+
+def test_shared_first_puts_the_persona_last():
+    prompts = PromptAssembler("Q?", "Answer.", layout="shared_first")
+    first, second = prompts.assemble("I am Anna."), prompts.assemble("I am Ben.", followup="Try again.")
+    assert first[0] == second[0] == "Answer."
+    assert first[1].startswith("Q?") and first[1].endswith("I am Anna.")
+    assert second[1].endswith("FOLLOW-UP: Try again.")
+    assert prompts.stats.shared_tokens == 2 * prompts.shared_prefix_tokens
+    with pytest.raises(ValueError):
+        PromptAssembler("Q?", "Answer.", layout="question_first")
+
+
+@pytest.mark.parametrize("layout", ["shared_first", "persona_first"])
+def test_personas_are_trimmed_to_the_budget(layout):
+    prompts = PromptAssembler("Q?", "Answer.", layout=layout, max_prompt_tokens=60)
+    system, user = prompts.assemble("I live in a small town. " * 50)
+    assert prompts.count(system) + prompts.count(user) <= 60
+    assert prompts.stats.truncated == 1
+    with pytest.raises(PromptBudgetError):
+        PromptAssembler("A very long question. " * 50, "Answer.", layout=layout, max_prompt_tokens=60)
+
+
+def test_layout_is_recorded_with_the_run(mock_server, tmp_path):
+    base_path = str(tmp_path / "responses")
+    simulation = Simulation(population=make_population({"DEU": 3}), model_name="mock", prompt_layout="shared_first")
+    simulation.ask_question("Q?", base_path=base_path, checkpoint=True)
+    [path] = (tmp_path / "responses").glob("DEU_*.json")
+    assert json.loads(path.read_text())["metadata"]["prompt_layout"] == "shared_first"
+    assert read_journal(str(journal_path(simulation.last_run_id, base_path))).header["prompt_layout"] == "shared_first"
+
+
+def test_resume_keeps_the_journaled_layout(mock_server, tmp_path, caplog):
+    base_path = str(tmp_path / "responses")
+    simulation = Simulation(population=make_population({"DEU": 4}), model_name="mock", prompt_layout="shared_first")
+    simulation.ask_question("Q?", base_path=base_path, save_results=False, checkpoint=True)
+    run_id = simulation.last_run_id
+    path = journal_path(run_id, base_path)
+    path.write_text("\n".join(path.read_text().splitlines()[:3]) + "\n")
+
+    assert Simulation.from_run(run_id, base_path=base_path).prompt_layout == "shared_first"
+    other = Simulation(population=simulation.population, model_name="mock")
+    with caplog.at_level(logging.WARNING, logger="simulation"):
+        resumed = other.resume(run_id, base_path=base_path)
+    assert len(resumed["DEU"]) == 4
+    assert "shared_first prompt layout" in caplog.text
+    [result] = (tmp_path / "responses").glob("DEU_*.json")
+    assert json.loads(result.read_text())["metadata"]["prompt_layout"] == "shared_first"
@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from synthcast.simulation.client_pool import close_async_clients
+from synthcast.simulation.errors import (
+    LLMError,
+    ProviderRequestError,
+    ProviderServerError,
+    RateLimitedError,
+    classify_error,
+    _parse_retry_after,
+)
+from synthcast.simulation.nebius import NebiusAgent
+from synthcast.simulation.rate_limit import AIMDConcurrencyLimiter, RateLimiter, RateLimitSettings, TokenBucket
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": headers or {}})()
+
+
+def test_classify_error_by_status():
+    assert isinstance(classify_error(_StatusError(429, {"retry-after": "3"})), RateLimitedError)
+    assert classify_error(_StatusError(429, {"retry-after": "3"})).retry_after == 3.0
+    assert isinstance(classify_error(_StatusError(503)), ProviderServerError)
+    error = classify_error(_StatusError(400))
+    assert isinstance(error, ProviderRequestError) and not error.retryable
+
+
+def test_retry_after_header_forms():
+    assert _parse_retry_after({"retry-after-ms": "1500"}) == 1.5
+    assert _parse_retry_after({"retry-after": "2"}) == 2.0
+    assert _parse_retry_after({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 0.0
+    assert _parse_retry_after({}) is None
+
+
+def test_aimd_increases_additively_and_halves_on_overload():
+    limiter = AIMDConcurrencyLimiter(initial=4, minimum=1, maximum=8)
+    for _ in range(4):
+        limiter.on_success(0.1)
+    assert limiter.current_limit == 4 and limiter.limit > 4.9
+    limiter.on_overload()
+    assert limiter.current_limit == 2
+    # A second failure from the same burst does not back off again
+    limiter.on_overload()
+    assert limiter.current_limit == 2
+
+
+def test_aimd_never_exceeds_maximum():
+    limiter = AIMDConcurrencyLimiter(initial=2, maximum=3)
+    for _ in range(100):
+        limiter.on_success(0.1)
+    assert limiter.current_limit == 3
+
+
+def test_token_bucket_delay():
+    bucket = TokenBucket(60, period=60.0)
+    assert bucket.delay_for(60) == 0.0
+    bucket.adjust(60)
+    assert bucket.delay_for(1) == pytest.approx(1.0, abs=0.05)
+
+
+def test_limiter_retries_retryable_errors():
+    calls = []
+
+    async def _call():
+        calls.append(1)
+        if len(calls) < 3:
+            raise _StatusError(503)
+        return "ok"
+
+    limiter = RateLimiter(RateLimitSettings(base_backoff=0.001, max_retries=5))
+    assert asyncio.run(limiter.run(_call)) == "ok"
+    assert len(calls) == 3
+    assert limiter.concurrency.in_flight == 0
+
+
+def test_limiter_does_not_retry_request_errors():
+    calls = []
+
+    async def _call():
+        calls.append(1)
+        raise _StatusError(400)
+
+    with pytest.raises(ProviderRequestError):
+        asyncio.run(RateLimiter(RateLimitSettings(base_backoff=0.001)).run(_call))
+    assert len(calls) == 1
+
+
+def test_agent_backs_off_on_mock_429s(start_mock):
+    server = start_mock(error_rate_429=0.3, retry_after=0.01)
+    agent = NebiusAgent(model_name="mock", rate_limit_settings=RateLimitSettings(base_backoff=0.001, max_retries=20))
+
+    async def _ask():
+        try:
+            return await asyncio.gather(*(agent.generate_response_async("persona", "question") for _ in range(40)))
+        finally:
+            await close_async_clients()
+
+    answers = asyncio.run(_ask())
+    assert len(answers) == 40
+    assert server.stats.injected_429 > 0
+    assert server.stats.completed == 40
+
+
+def test_agent_raises_typed_error_when_retries_run_out(start_mock):
+    start_mock(error_rate_5xx=1.0)
+    agent = NebiusAgent(model_name="mock", rate_limit_settings=RateLimitSettings(base_backoff=0.001, max_retries=1))
+
+    async def _ask():
+        try:
+            return await agent.generate_response_async("persona", "question")
+        finally:
+            await close_async_clients()
+
+    with pytest.raises(ProviderServerError) as info:
+        asyncio.run(_ask())
+    assert isinstance(info.value, LLMError)
@@ -0,0 +1,73 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from synthcast.population import reference
+from synthcast.population.persona_generator import PersonaGenerator, default_vocabulary
+from synthcast.population.reference import DEFAULT_REFERENCE_PATH, ReferenceData, get_reference_data, validate_country
+
+
+@pytest.fixture
+def reference_copy(tmp_path):
+    path = tmp_path / "population.json"
+    shutil.copy(DEFAULT_REFERENCE_PATH, path)
+    return path
+
+
+def test_registry_shares_one_instance_per_path(reference_copy):
+    first = get_reference_data(str(reference_copy))
+    assert get_reference_data(str(reference_copy)) is first
+    assert get_reference_data() is not first
+    assert PersonaGenerator(str(reference_copy)).reference is first
+
+
+def test_lookups():
+    data = get_reference_data()
+    assert data.country("DEU") is data.country("deu") is data.country("Germany") is data.country("germany")
+    assert "DEU" in data.bloc("EU") and "USA" not in data.bloc("EU")
+    assert data.bloc("no such bloc") == []
+    with pytest.raises(KeyError):
+        data.country("XXX")
+
+
+def test_validation_names_the_broken_entry():
+    entry = dict(get_reference_data().country("DEU"))
+    del entry["currency"]
+    with pytest.raises(ValueError, match="Broken.*currency"):
+        validate_country("Broken", entry)
+    entry = {**get_reference_data().country("DEU"), "age_distribution": {}}
+    with pytest.raises(ValueError, match="age_distribution"):
+        ReferenceData({"Broken": entry})
+
+
+def test_sampling_tables_are_built_once():
+    data = get_reference_data()
+    vocab = default_vocabulary()
+    assert data.sampling_tables("DEU", vocab) is data.sampling_tables("Germany", vocab)
+
+
+def test_disk_cache_is_invalidated_by_source_changes(reference_copy, monkeypatch):
+    get_reference_data(str(reference_copy), disk_cache=True)
+    cache_path = reference._pickle_path(reference_copy.resolve())
+    assert cache_path.exists()
+
+    # A fresh process loads the pickle, with tables precompiled
+    monkeypatch.setattr(reference, "_registry", {})
+    cached = get_reference_data(str(reference_copy), disk_cache=True)
+    assert cached._tables
+
+    # Editing the source invalidates it
+    countries = json.loads(reference_copy.read_text())
+    countries["Germany"]["currency"] = "DM"
+    reference_copy.write_text(json.dumps(countries))
+    stat = reference_copy.stat()
+    os.utime(reference_copy, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    monkeypatch.setattr(reference, "_registry", {})
+    assert get_reference_data(str(reference_copy), disk_cache=True).country("DEU")["currency"] == "DM"
+
+
+def test_corrupt_disk_cache_is_ignored(reference_copy):
+    reference._pickle_path(reference_copy.resolve()).write_bytes(b"not a pickle")
+    assert get_reference_data(str(reference_copy), disk_cache=True).country("DEU")
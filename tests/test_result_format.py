@@ -0,0 +1,110 @@
+import json
+
+import pytest
+
+from synthcast.simulation.result_format import (
+    CompactResultWriter,
+    convert_json_results,
+    iter_compact_batches,
+    load_compact_results,
+    read_compact_header,
+    read_compact_summary,
+    write_compact_results,
+)
+from synthcast.simulation.results import load_simulation_results
+from synthcast.simulation.simulation import Simulation
+
+from tests.conftest import make_population
+
+RECORDS = [
+    {"persona": "p0", "persona_id": 0, "response": "likely", "raw": "ANSWER: likely"},
+    {"persona": "p1", "persona_id": 1, "response": "Unlikely ", "temperature": 0.7},
+    {"persona": "p2", "persona_id": 2, "response": "neutral", "distribution": {"neutral": 0.75, "likely": 0.25}},
+]
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "DEU_20240101_000000.scr")
+    write_compact_results(RECORDS, "Q?", "DEU", path, timestamp="20240101_000000", population_snapshot="abc", metadata={"run_id": "r1"})
+
+    header = read_compact_header(path)
+    assert (header["question"], header["population_snapshot"], header["run_id"]) == ("Q?", "abc", "r1")
+    summary = read_compact_summary(path)
+    assert summary["total_responses"] == 3
+    assert summary["response_distribution"] == {"likely": 1, "unlikely": 1, "neutral": 1}
+    assert summary["expected_distribution"] == {"neutral": 0.75, "likely": 0.25}
+
+    data = load_compact_results(path)
+    assert data["metadata"]["run_id"] == "r1"
+    first, second, third = data["responses"]
+    # Persona text is dropped for records with an id
+    assert first == {"persona_id": 0, "response": "likely", "raw": "ANSWER: likely"}
+    # Responses are normalized and extra fields come back as they were
+    assert (second["response"], second["temperature"]) == ("unlikely", 0.7)
+    assert third["distribution"]["neutral"] == pytest.approx(0.75)
+    assert third["distribution"]["unlikely"] == 0.0
+    assert "distribution" not in first
+
+
+def test_batches_stream(tmp_path):
+    path = str(tmp_path / "DEU.scr")
+    records = [{"persona_id": i, "response": ("likely", "unlikely")[i % 2]} for i in range(25)]
+    with CompactResultWriter(path, "Q?", "DEU", batch_size=10) as writer:
+        writer.write(records)
+    batches = list(iter_compact_batches(path))
+    assert [len(b) for b in batches] == [10, 10, 5]
+    assert [r["persona_id"] for b in batches for r in b.records()] == list(range(25))
+    assert batches[0].responses()[:2] == ["likely", "unlikely"]
+
+
+def test_truncated_file_has_no_summary(tmp_path):
+    path = tmp_path / "DEU.scr"
+    write_compact_results(RECORDS, "Q?", "DEU", str(path))
+    path.write_bytes(path.read_bytes()[:-4])
+    with pytest.raises(ValueError, match="truncated"):
+        read_compact_summary(str(path))
+    with pytest.raises(ValueError, match="not a compact result file"):
+        read_compact_header(__file__)
+
+
+def test_personas_render_from_the_snapshot(tmp_path):
+    population = make_population({"DEU": 3})
+    population.save_to_directory(str(tmp_path))
+    records = [{"persona": population.render(i), "persona_id": i, "response": "likely"} for i in range(3)]
+    path = write_compact_results(records, "Q?", "DEU", str(tmp_path / "DEU.scr"), population_snapshot=population.snapshot_id)
+
+    assert [r["persona"] for r in load_compact_results(path, population=population)["responses"]] == list(population.iter_prompts())
+    other = make_population({"DEU": 3}, seed=8)
+    other.save_to_directory(str(tmp_path))
+    with pytest.raises(ValueError, match="references population snapshot"):
+        load_compact_results(path, population=other)
+
+
+def test_convert_json_results(tmp_path):
+    json_path = tmp_path / "DEU_20240101_000000.json"
+    responses = [{"persona": "old prompt", "response": "likely"}, {"persona": "old prompt", "response": "neutral"}]
+    json_path.write_text(json.dumps({
+        "timestamp": "20240101_000000", "country_code": "DEU", "question": "Q?", "responses": responses,
+        "metadata": {"total_responses": 2, "response_distribution": {"likely": 1, "neutral": 1}, "model": "m"},
+    }))
+    path = convert_json_results(str(json_path))
+    assert path.endswith("DEU_20240101_000000.scr")
+    data = load_simulation_results(path)
+    # Without persona ids the persona text is kept
+    assert data["responses"] == responses
+    assert data["metadata"]["model"] == "m"
+    assert data["timestamp"] == "20240101_000000"
+
+
+def test_simulation_writes_compact_results(mock_server, tmp_path):
+    population = make_population({"DEU": 5})
+    simulation = Simulation(population=population, model_name="mock")
+    base_path = str(tmp_path / "responses")
+    simulation.ask_question("Q?", base_path=base_path, result_format="compact", checkpoint=False)
+
+    [path] = (tmp_path / "responses").glob("DEU_*.scr")
+    data = load_simulation_results(str(path))
+    assert data["metadata"]["total_responses"] == 5
+    assert data["metadata"]["population_snapshot"] == population.snapshot_id
+    assert all("persona" not in r for r in data["responses"])
+    assert sorted(r["persona_id"] for r in data["responses"]) == list(range(5))
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+
+import pytest
+
+from synthcast.simulation.client_pool import close_async_clients
+from synthcast.simulation.errors import LLMError
+from synthcast.simulation.nebius import NebiusAgent
+from synthcast.simulation.rate_limit import RateLimitSettings
+from synthcast.simulation.router import Backend, LLMRouter, RouterSettings
+from synthcast.simulation.simulation import Simulation
+
+from tests.conftest import make_population
+
+
+def _backend(server, name, weight=1.0):
+    agent = NebiusAgent(model_name="mock", base_url=server.url, rate_limit_settings=RateLimitSettings(max_retries=0))
+    return Backend(agent, weight=weight, name=name)
+
+
+def _ask(router, calls):
+    async def _run():
+        try:
+            for i in range(calls):
+                await router.generate_response_async("persona", "question", sample_index=i)
+        finally:
+            await close_async_clients()
+
+    asyncio.run(_run())
+
+
+def test_backend_names_must_be_unique(mock_server):
+    with pytest.raises(ValueError, match="unique"):
+        LLMRouter([_backend(mock_server, "a"), _backend(mock_server, "a")])
+    with pytest.raises(ValueError):
+        LLMRouter([])
+
+
+def test_shares_follow_latency_and_errors(mock_server):
+    fast, slow, failing = _backend(mock_server, "fast"), _backend(mock_server, "slow"), _backend(mock_server, "failing")
+    router = LLMRouter([fast, slow, failing], RouterSettings(min_samples=5, min_share=0.05))
+    assert router.shares() == pytest.approx({"fast": 1 / 3, "slow": 1 / 3, "failing": 1 / 3})
+    for _ in range(10):
+        fast.record(0.1, ok=True)
+        slow.record(1.0, ok=True)
+        failing.record(None, ok=False)
+    shares = router.shares()
+    assert shares["fast"] > 0.8
+    assert shares["slow"] == pytest.approx(shares["fast"] / 10)
+    # Every backend keeps min_share of its weight so it is still probed
+    assert shares["failing"] == pytest.approx(shares["fast"] * 0.05)
+
+
+def test_failed_calls_fail_over(start_mock, caplog):
+    healthy = _backend(start_mock(), "healthy")
+    broken = _backend(start_mock(error_rate_5xx=1.0), "broken")
+    router = LLMRouter([broken, healthy], RouterSettings(min_samples=5), seed=1)
+    with caplog.at_level(logging.DEBUG, logger="simulation"):
+        _ask(router, 30)
+    assert any(r.name == "simulation.router" and "failing over to healthy" in r.message for r in caplog.records)
+    assert broken.errors == broken.calls > 0
+    assert healthy.calls == 30
+    assert router.shares()["broken"] < 0.1
+
+    without_failover = LLMRouter([_backend(start_mock(error_rate_5xx=1.0), "down")], RouterSettings(failover=False))
+    with pytest.raises(LLMError):
+        _ask(without_failover, 1)
+
+
+def test_slow_calls_are_hedged(start_mock):
+    slow = _backend(start_mock(latency="exponential", latency_median=0.02), "slow")
+    fast = _backend(start_mock(), "fast")
+    router = LLMRouter([slow, fast], RouterSettings(min_samples=3, hedge=True, hedge_quantile=0.5, hedge_budget=1.0), seed=1)
+    # Until "fast" has samples it is scored with the best latency seen, so
+    # "slow" needs most of the weight to keep receiving traffic
+    slow.weight = 1000.0
+    _ask(router, 40)
+    assert fast.hedges > 0 and fast.hedge_wins > 0
+    assert router._hedges == slow.hedges + fast.hedges
+
+
+def test_simulation_routes_across_backends(start_mock):
+    first, second = start_mock(), start_mock()
+    simulation = Simulation(
+        population=make_population({"DEU": 20}),
+        backends=[_backend(first, "first"), _backend(second, "second")],
+        seed=3,
+    )
+    assert simulation.model_name == "first+second"
+    results = simulation.ask_question("Q?", save_results=False, checkpoint=False)
+    assert len(results["DEU"]) == 20
+    assert first.stats.requests > 0 and second.stats.requests > 0
+    assert first.stats.requests + second.stats.requests == 20
@@ -0,0 +1,75 @@
+import json
+import threading
+from datetime import datetime
+
+from synthcast.simulation.results import append_aggregated_datapoint, load_aggregated_datapoints
+from synthcast.simulation.run_store import RunStore
+
+
+def _datapoint(timestamp, country_code="DEU", question="Q?", n=10):
+    return {"timestamp": timestamp, "country_code": country_code, "num_agents": n, "question": question, "distribution": {"likely": n}}
+
+
+def test_query_filters(tmp_path):
+    store = RunStore(str(tmp_path / "runs.sqlite"))
+    store.append(_datapoint("20240102_000000"))
+    store.append(_datapoint("20240101_000000", country_code="USA"))
+    store.append(_datapoint("20240103_000000", question="Other?"))
+    assert len(store) == 3
+
+    assert [d["timestamp"] for d in store.query()] == ["20240101_000000", "20240102_000000", "20240103_000000"]
+    assert [d["country_code"] for d in store.query(country_code="USA")] == ["USA"]
+    assert [d["timestamp"] for d in store.query(question="Q?")] == ["20240101_000000", "20240102_000000"]
+    assert [d["timestamp"] for d in store.query(since=datetime(2024, 1, 2), until="20240103_000000")] == ["20240102_000000"]
+    assert len(store.query(limit=2)) == 2
+    store.close()
+
+
+def test_legacy_history_is_imported_once(tmp_path):
+    lines = [json.dumps(_datapoint("20240101_000000")), "{torn", "", json.dumps(_datapoint("20240102_000000"))]
+    (tmp_path / "aggregated_runs.jsonl").write_text("\n".join(lines) + "\n")
+    # The JSON array is only read when there is no JSONL log
+    (tmp_path / "aggregated_runs.json").write_text(json.dumps([_datapoint("20230101_000000")]))
+
+    store = RunStore(str(tmp_path / "aggregated_runs.sqlite"))
+    assert [d["timestamp"] for d in store.query()] == ["20240101_000000", "20240102_000000"]
+    store.close()
+    store = RunStore(str(tmp_path / "aggregated_runs.sqlite"))
+    assert len(store) == 2
+    store.close()
+
+
+def test_legacy_json_array_is_imported(tmp_path):
+    (tmp_path / "aggregated_runs.json").write_text(json.dumps([_datapoint("20230101_000000")]))
+    store = RunStore(str(tmp_path / "aggregated_runs.sqlite"))
+    assert len(store) == 1
+    store.close()
+
+
+def test_concurrent_appends(tmp_path):
+    store = RunStore(str(tmp_path / "runs.sqlite"))
+
+    def _append(worker):
+        for i in range(50):
+            store.append(_datapoint(f"2024010{worker}_0000{i:02d}"))
+
+    threads = [threading.Thread(target=_append, args=(w,)) for w in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(store) == 200
+    store.close()
+
+
+def test_append_aggregated_datapoint(tmp_path):
+    base_path = str(tmp_path / "responses")
+    append_aggregated_datapoint("DEU", 3, "Q?", {"likely": 3}, base_path=base_path)
+    append_aggregated_datapoint("USA", 2, "Q?", {"unlikely": 2}, base_path=base_path, expected_distribution={"unlikely": 1.5})
+
+    assert [d["country_code"] for d in load_aggregated_datapoints(base_path)] == ["DEU", "USA"]
+    [usa] = load_aggregated_datapoints(base_path, country_code="USA")
+    assert usa["expected_distribution"] == {"unlikely": 1.5}
+    with open(tmp_path / "responses" / "aggregated_runs.jsonl") as f:
+        assert len(f.readlines()) == 2
+    assert load_aggregated_datapoints(str(tmp_path / "missing")) == []
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from synthcast.population.persona_generator import PersonaGenerator
+from synthcast.population.sampler import BulkPersonaSampler
+
+COLUMNS = ("gender", "age", "occupation", "income", "city", "personality", "financial_attitude", "economic_concern")
+
+
+@pytest.fixture(scope="module")
+def generator():
+    return PersonaGenerator()
+
+
+def _columns(batch):
+    return {c: getattr(batch, c) for c in COLUMNS}
+
+
+def test_same_seed_same_personas(generator):
+    a = generator.generate_country_personas_bulk("DEU", 200, seed=1)
+    b = PersonaGenerator().generate_country_personas_bulk("DEU", 200, seed=1)
+    c = generator.generate_country_personas_bulk("DEU", 200, seed=2)
+    for column in COLUMNS:
+        np.testing.assert_array_equal(getattr(a, column), getattr(b, column))
+    assert any(not np.array_equal(getattr(a, column), getattr(c, column)) for column in COLUMNS)
+
+
+def test_persona_depends_only_on_its_index(generator):
+    country = generator.reference.country("DEU")
+    sampler = BulkPersonaSampler(generator.vocabulary, seed=3)
+    full = sampler.sample(country, 20)
+    window = sampler.sample(country, 10, start=4)
+    for column, values in _columns(window).items():
+        np.testing.assert_array_equal(values, getattr(full, column)[4:14])
+
+
+def test_countries_are_sampled_independently(generator):
+    alone = generator.generate_population({"DEU": 50}, seed=4)
+    together = generator.generate_population({"USA": 30, "DEU": 50}, seed=4)
+    assert [alone.render(i) for i in range(50)] == [together.render(i) for i in together.indices_for("DEU")]
+
+
+def test_marginals_follow_the_reference_data(generator):
+    country = generator.reference.country("DEU")
+    batch = generator.generate_country_personas_bulk("DEU", 20000, seed=5)
+    gender = country["gender_distribution"]
+    expected_male = float(gender["male"]) / (float(gender["male"]) + float(gender["female"]))
+    assert np.mean(batch.gender == 0) == pytest.approx(expected_male, abs=0.02)
+    income = country["income_distribution"]
+    total = sum(float(v) for v in income.values())
+    for code, level in enumerate(batch.tables.income_levels):
+        assert np.mean(batch.income == code) == pytest.approx(float(income[level]) / total, abs=0.02)
+
+
+def test_render_describes_the_sampled_attributes(generator):
+    batch = generator.generate_country_personas_bulk("DEU", 3, seed=6)
+    prompt = batch.render(0)
+    assert prompt.startswith(f"You are a {int(batch.age[0])}-year-old {batch.vocab.genders[batch.gender[0]]}")
+    assert batch.vocab.occupations[batch.occupation[0]] in prompt
@@ -0,0 +1,51 @@
+import asyncio
+import math
+
+import pytest
+
+from synthcast.simulation.answers import ANSWER_OPTIONS, distribution_from_top_logprobs
+from synthcast.simulation.client_pool import close_async_clients
+from synthcast.simulation.nebius import NebiusAgent
+from synthcast.simulation.simulation import Simulation
+
+from tests.conftest import make_population
+
+
+def test_partial_tokens_count_for_the_option_they_start():
+    distribution = distribution_from_top_logprobs([("un", math.log(0.5)), ("l", math.log(0.3)), ("Very", math.log(0.2))])
+    assert distribution == pytest.approx({"very likely": 0.2, "likely": 0.3, "unlikely": 0.5, "highly unlikely": 0.0})
+
+
+def test_shared_prefix_splits_mass_evenly():
+    options = ["very likely", "very unlikely", "unlikely"]
+    distribution = distribution_from_top_logprobs([("very", math.log(0.6)), ("un", math.log(0.4))], options)
+    assert distribution == pytest.approx({"very likely": 0.3, "very unlikely": 0.3, "unlikely": 0.4})
+
+
+def test_unmatched_mass_is_dropped_and_renormalized():
+    distribution = distribution_from_top_logprobs([("likely", math.log(0.3)), ("maybe", math.log(0.5)), ("highly", math.log(0.1))])
+    assert distribution == pytest.approx({"very likely": 0.0, "likely": 0.75, "unlikely": 0.0, "highly unlikely": 0.25})
+    assert distribution_from_top_logprobs([("maybe", 0.0)]) is None
+
+
+def test_score_options_uses_top_logprobs(start_mock):
+    start_mock(answer_mix={"very likely": 1, "likely": 3, "unlikely": 3, "highly unlikely": 1})
+    agent = NebiusAgent(model_name="mock")
+
+    async def _score():
+        try:
+            return await agent.score_options_async("persona", "question")
+        finally:
+            await close_async_clients()
+
+    distribution = asyncio.run(_score())
+    assert distribution == pytest.approx({"very likely": 0.125, "likely": 0.375, "unlikely": 0.375, "highly unlikely": 0.125})
+
+
+def test_score_mode_records_distributions(mock_server):
+    simulation = Simulation(population=make_population({"DEU": 5}), model_name="mock")
+    results = simulation.ask_question("Q?", save_results=False, checkpoint=False, mode="score")
+    for record in results["DEU"]:
+        assert set(record["distribution"]) == set(ANSWER_OPTIONS)
+        assert sum(record["distribution"].values()) == pytest.approx(1.0)
+        assert record["response"] in ANSWER_OPTIONS
@@ -0,0 +1,118 @@
+import math
+
+import pytest
+
+from synthcast.simulation.journal import journal_path
+from synthcast.simulation.sequential import SequentialSampler, SequentialSettings, required_sample, wilson_half_width
+from synthcast.simulation.simulation import Simulation
+
+from tests.conftest import make_population
+
+Z95 = 1.959963984540054
+
+
+def _agents(counts):
+    agents = []
+    for country_code, n in counts.items():
+        for _ in range(n):
+            agents.append({"index": len(agents), "persona_id": len(agents), "country_code": country_code})
+    return agents
+
+
+def _answer(sampler, wave, answers):
+    for agent in wave:
+        sampler.observe(agent, answers[agent["country_code"]](agent["index"]))
+
+
+def test_interval_and_sample_size():
+    assert wilson_half_width(0, 0, Z95) == math.inf
+    assert wilson_half_width(50, 100, Z95) == pytest.approx(0.0962, abs=1e-4)
+    # Asking the whole stratum leaves no sampling error
+    assert wilson_half_width(50, 100, Z95, population=100) == 0
+    assert required_sample(0.25, 0.05, Z95, 10**9) == 385
+    assert required_sample(0.25, 0.05, Z95, 1000) == 278
+    assert required_sample(0.25, 0.05, Z95, 50) == 45
+
+
+def test_lopsided_strata_stop_early():
+    settings = SequentialSettings(target_half_width=0.05, min_samples=50, wave_size=500)
+    sampler = SequentialSampler(settings, _agents({"DEU": 2000, "USA": 2000}), seed=1)
+    answers = {"DEU": lambda i: "likely", "USA": lambda i: ("likely", "unlikely")[i % 2]}
+    for wave in sampler.waves():
+        _answer(sampler, wave, answers)
+    rows = {row["stratum"]: row for row in sampler.summary()}
+    assert rows["DEU"]["status"] == rows["USA"]["status"] == "settled"
+    assert rows["DEU"]["asked"] < 100 < rows["USA"]["asked"] < 400
+    assert rows["USA"]["half_width"] <= 0.05
+    assert sampler.finished
+
+
+def test_same_seed_same_order_and_resume():
+    settings = SequentialSettings(min_samples=10)
+    agents = _agents({"DEU": 100})
+    first = SequentialSampler(settings, agents, seed=3).next_wave()
+    assert [a["index"] for a in first] == [a["index"] for a in SequentialSampler(settings, agents, seed=3).next_wave()]
+
+    # Resuming with the first wave answered continues the same order
+    answered = {a["index"]: ("likely", "unlikely")[a["index"] % 2] for a in first}
+    resumed = SequentialSampler(settings, agents, seed=3, answered=answered)
+    assert resumed.issued == 10 and resumed.strata[0].answered == 10
+    second = resumed.next_wave()
+    assert not {a["index"] for a in second} & set(answered)
+
+
+def test_budget_is_split_between_open_strata():
+    settings = SequentialSettings(min_samples=100, max_calls=150)
+    sampler = SequentialSampler(settings, _agents({"DEU": 1000, "FRA": 1000, "USA": 1000}), seed=1)
+    wave = sampler.next_wave()
+    assert len(wave) == 150
+    assert sorted(sum(a["country_code"] == c for a in wave) for c in ("DEU", "FRA", "USA")) == [50, 50, 50]
+    _answer(sampler, wave, {c: (lambda i: ("likely", "unlikely")[i % 2]) for c in ("DEU", "FRA", "USA")})
+    assert sampler.next_wave() == []
+    assert {row["status"] for row in sampler.summary()} == {"budget"}
+    assert sampler.planned_calls() == 150
+
+
+def test_caps_and_small_strata():
+    answers = {"DEU": lambda i: ("likely", "unlikely")[i % 2], "LUX": lambda i: "likely"}
+    sampler = SequentialSampler(SequentialSettings(target_half_width=0.01, min_samples=20, max_share=0.1), _agents({"DEU": 500}), seed=1)
+    for wave in sampler.waves():
+        _answer(sampler, wave, answers)
+    assert sampler.summary()[0]["status"] == "capped" and sampler.summary()[0]["asked"] == 50
+
+    sampler = SequentialSampler(SequentialSettings(min_samples=20), _agents({"LUX": 5}), seed=1)
+    for wave in sampler.waves():
+        _answer(sampler, wave, answers)
+    # Five agents, all asked: the shares are exact
+    [row] = sampler.summary()
+    assert (row["asked"], row["half_width"], row["status"]) == (5, 0, "settled")
+
+
+def test_segments_are_separate_strata():
+    population = make_population({"DEU": 300})
+    agents = _agents({"DEU": 300})
+    sampler = SequentialSampler(SequentialSettings(segment_by=("income_level",)), agents, population=population, seed=1)
+    levels = {population.attributes(i)["income_level"] for i in range(300)}
+    assert [s.key for s in sampler.strata] == [("DEU", level) for level in sorted(levels)]
+    assert sum(s.size for s in sampler.strata) == 300
+
+
+def test_adaptive_run_asks_fewer_agents(start_mock, tmp_path):
+    server = start_mock(answer_mix={"likely": 1.0})
+    base_path = str(tmp_path / "responses")
+    simulation = Simulation(population=make_population({"DEU": 200, "USA": 150}), model_name="mock", seed=5)
+    settings = SequentialSettings(target_half_width=0.1, min_samples=20)
+    results = simulation.ask_question("Q?", base_path=base_path, save_results=False, checkpoint=True, sequential=settings)
+    assert {c: len(r) for c, r in results.items()} == {"DEU": 20, "USA": 20}
+    assert server.stats.requests == 40
+    assert [(row["stratum"], row["status"]) for row in simulation.last_sampling] == [("DEU", "settled"), ("USA", "settled")]
+
+    # Resuming after every stratum stopped, but before the run was marked
+    # complete, makes no further calls
+    run_id = simulation.last_run_id
+    path = journal_path(run_id, base_path)
+    lines = path.read_text().splitlines()
+    path.write_text("\n".join(lines[:-1]) + "\n")
+    resumed = Simulation.from_run(run_id, base_path=base_path, seed=5).resume(run_id, base_path=base_path, save_results=False)
+    assert {c: len(r) for c, r in resumed.items()} == {"DEU": 20, "USA": 20}
+    assert server.stats.requests == 40
@@ -0,0 +1,111 @@
+import json
+import time
+
+import pytest
+
+from synthcast.simulation.journal import journal_path
+from synthcast.simulation.sharding import ShardedRunner, ShardedRunSpec, ShardQueue, shard_ranges, shard_run_id
+
+from tests.conftest import make_population
+
+
+def _spec(run_id="r1", shards=3):
+    return ShardedRunSpec(run_id, "Q?", "generate", "json", "mock", 0.7, "snap", 10, shards)
+
+
+def test_shard_ranges_cover_every_agent_once():
+    assert shard_ranges(10, 3) == [(0, 4), (4, 7), (7, 10)]
+    assert shard_ranges(2, 5) == [(0, 1), (1, 2)]
+    assert shard_ranges(0, 3) == [(0, 0)]
+    with pytest.raises(ValueError):
+        shard_ranges(10, 0)
+
+
+def test_claims_fail_and_retry(tmp_path):
+    queue = ShardQueue(str(tmp_path / "shards.sqlite"), max_attempts=2)
+    queue.add_run(_spec(), shard_ranges(10, 3))
+    assert queue.run("r1") == _spec()
+    first = queue.claim("r1", "w1")
+    assert (first.index, first.start, first.stop, first.attempts) == (0, 0, 4, 1)
+    assert queue.claim("r1", "w2").index == 1
+
+    assert queue.fail(first, "w1", "boom")
+    again = queue.claim("r1", "w2")
+    assert (again.index, again.attempts) == (0, 2)
+    assert queue.fail(again, "w2", "boom")
+    assert queue.status("r1") == {"pending": 1, "running": 1, "done": 0, "failed": 1}
+    assert queue.reset_failed("r1") == 1
+    assert queue.shards("r1")[0]["status"] == "pending"
+    with pytest.raises(KeyError):
+        queue.run("missing")
+
+
+def test_abandoned_shards_are_reclaimed(tmp_path):
+    queue = ShardQueue(str(tmp_path / "shards.sqlite"), lease=0.05)
+    queue.add_run(_spec(shards=1), [(0, 10)])
+    shard = queue.claim("r1", "dead")
+    assert queue.claim("r1", "w2") is None
+    time.sleep(0.1)
+    reclaimed = queue.claim("r1", "w2")
+    assert (reclaimed.index, reclaimed.attempts) == (shard.index, 2)
+    assert queue.shards("r1")[0]["worker"] == "w2"
+
+    # The worker whose lease lapsed can neither finish nor release the shard
+    assert not queue.complete(shard, "dead")
+    assert not queue.fail(shard, "dead", "boom")
+    assert queue.shards("r1")[0]["status"] == "running"
+    assert queue.complete(reclaimed, "w2")
+    assert queue.shards("r1")[0]["status"] == "done"
+
+
+def test_shards_that_keep_killing_workers_fail(tmp_path):
+    queue = ShardQueue(str(tmp_path / "shards.sqlite"), lease=0, max_attempts=3)
+    queue.add_run(_spec(shards=1), [(0, 10)])
+    claims = []
+    while (shard := queue.claim("r1", f"w{len(claims)}")) is not None:
+        claims.append(shard.attempts)
+        time.sleep(0.01)
+    assert claims == [1, 2, 3]
+    [row] = queue.shards("r1")
+    assert (row["status"], row["error"]) == ("failed", "lease expired after 3 attempts")
+
+
+def test_workers_share_a_run_and_merge(mock_server, tmp_path):
+    base_path = str(tmp_path / "responses")
+    population = make_population({"DEU": 6, "USA": 5})
+    runner = ShardedRunner(base_path)
+    run_id = runner.submit("Q?", population, shards=4, model_name="mock")
+    assert runner.work(run_id, worker="w1", max_shards=1) == 1
+    with pytest.raises(RuntimeError, match="3 unfinished shards"):
+        runner.merge(run_id)
+
+    assert ShardedRunner(base_path).work(run_id, worker="w2") == 3
+    results = runner.merge(run_id)
+    assert mock_server.stats.requests == 11
+    assert {c: len(r) for c, r in results.items()} == {"DEU": 6, "USA": 5}
+    assert [r["persona_id"] for r in results["DEU"] + results["USA"]] == list(range(11))
+    [path] = (tmp_path / "responses").glob("DEU_*.json")
+    metadata = json.loads(path.read_text())["metadata"]
+    assert metadata["run_id"] == run_id and metadata["prompt_layout"] == "persona_first"
+
+
+def test_reclaimed_shards_resume_from_their_journal(mock_server, tmp_path):
+    base_path = str(tmp_path / "responses")
+    runner = ShardedRunner(base_path, lease=0.05)
+    run_id = runner.submit("Q?", make_population({"DEU": 8}), shards=1, model_name="mock")
+    assert runner.work(run_id) == 1
+
+    # Roll the shard back to a worker that died after journaling three agents
+    path = journal_path(shard_run_id(run_id, 0), base_path)
+    path.write_text("\n".join(path.read_text().splitlines()[:4]) + "\n")
+    runner.queue._conn.execute("UPDATE shards SET status = 'running', heartbeat = 0")
+    assert runner.work(run_id) == 1
+    assert mock_server.stats.requests == 8 + 5
+    assert len(runner.merge(run_id, save_results=False)["DEU"]) == 8
+
+
+def test_run_local(mock_server, tmp_path):
+    runner = ShardedRunner(str(tmp_path / "responses"))
+    results = runner.run_local("Q?", make_population({"DEU": 4, "USA": 4}), processes=2, save_results=False, model_name="mock")
+    assert {c: len(r) for c, r in results.items()} == {"DEU": 4, "USA": 4}
+    assert mock_server.stats.requests == 8
@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+
+from benchmarks.mock_server import REASONING_REPLY
+from synthcast.simulation.answers import IncrementalAnswerParser, normalize_response
+from synthcast.simulation.client_pool import close_async_clients
+from synthcast.simulation.errors import LLMError
+from synthcast.simulation.nebius import NebiusAgent
+from synthcast.simulation.rate_limit import RateLimitSettings
+from synthcast.simulation.simulation import Simulation
+
+from tests.conftest import make_population
+
+
+def _parse(chunks):
+    parser = IncrementalAnswerParser()
+    early = None
+    for chunk in chunks:
+        if parser.feed(chunk) is not None and early is None:
+            early = parser.answer
+    return early, parser.finish()
+
+
+def test_reasoning_before_the_label_is_ignored():
+    text = "REASONING: It seems unlikely prices fall soon.\nANSWER: likely"
+    early, answer = _parse(text.split(" "))
+    assert early is None
+    assert answer == "likely" == normalize_response(text)
+
+
+def test_labeled_answer_resolves_early():
+    early, answer = _parse(["ANS", "WER: ", "very", " likely", "\nREASONING: ", "because"])
+    assert early == "very likely" == answer
+
+
+def test_option_needs_a_boundary():
+    parser = IncrementalAnswerParser()
+    assert parser.feed("ANSWER: highly un") is None
+    assert parser.feed("likely") is None
+    assert parser.feed(".") == "highly unlikely"
+
+
+def test_unlabeled_text_defers_to_normalize_response():
+    for text in ("I think it is unlikely, though likely for others", "very unlikely", "Unlikely.", "no idea"):
+        early, answer = _parse([text])
+        assert answer == normalize_response(text)
+
+
+class _FakeStream:
+    def __init__(self, fail: bool):
+        self.fail = fail
+        self.closed = False
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        chunk = type("Chunk", (), {"choices": [type("Choice", (), {"delta": type("Delta", (), {"content": "REASONING: "})()})()]})()
+        yield chunk
+        if self.fail:
+            raise ConnectionError("connection reset")
+        await asyncio.sleep(3600)
+
+    async def close(self):
+        self.closed = True
+
+
+def _agent_with_stream(monkeypatch, stream):
+    async def _create(**kwargs):
+        return stream
+
+    client = type("Client", (), {})()
+    client.chat = type("Chat", (), {})()
+    client.chat.completions = type("Completions", (), {"create": staticmethod(_create)})()
+    monkeypatch.setattr(NebiusAgent, "async_client", property(lambda self: client))
+    return NebiusAgent(model_name="mock", rate_limit_settings=RateLimitSettings(max_retries=0))
+
+
+def test_stream_is_closed_after_a_transport_error(monkeypatch):
+    stream = _FakeStream(fail=True)
+    agent = _agent_with_stream(monkeypatch, stream)
+    with pytest.raises(LLMError):
+        asyncio.run(agent.stream_response_async("persona", "question"))
+    assert stream.closed
+
+
+def test_stream_is_closed_when_cancelled(monkeypatch):
+    stream = _FakeStream(fail=False)
+    agent = _agent_with_stream(monkeypatch, stream)
+
+    async def _cancel():
+        task = asyncio.create_task(agent.stream_response_async("persona", "question"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(_cancel())
+    assert stream.closed
+
+
+def test_stream_mode_records_reasoning_and_timings(mock_server):
+    simulation = Simulation(population=make_population({"DEU": 4}), model_name="mock")
+    results = simulation.ask_question("Q?", save_results=False, checkpoint=False, mode="stream")
+    assert mock_server.stats.streamed == 4
+    for record in results["DEU"]:
+        assert "REASONING:" in record["raw"]
+        assert record["response"] == normalize_response(record["raw"])
+        assert record["timing"]["time_to_first_token"] is not None
+
+
+def test_answer_only_cancels_after_the_label(start_mock):
+    start_mock(token_interval=0.01)
+    agent = NebiusAgent(model_name="mock")
+
+    async def _stream():
+        try:
+            # The reasoning instruction makes the mock reply "ANSWER: <option>\nREASONING: ..."
+            return await agent.stream_response_async("persona", "ANSWER: <option>", stop_on_answer=True)
+        finally:
+            await close_async_clients()
+
+    result = asyncio.run(_stream())
+    assert result.cancelled
+    assert REASONING_REPLY not in result.text
+    assert result.answer == normalize_response(result.text)
@@ -0,0 +1,84 @@
+import asyncio
+import contextvars
+import json
+
+import pytest
+
+from synthcast.simulation.simulation import Simulation
+from synthcast.simulation.sweep import CallScheduler, Scenario, load_sweep_spec, run_sweep, scenario_grid, scenario_question
+
+from tests.conftest import make_population
+
+current_run = contextvars.ContextVar("current_run", default=None)
+
+
+def test_scenario_grid():
+    scenarios = scenario_grid("Subsidy: {subsidy}. Income: {income}.", {"subsidy": ["none", "30%"], "income": ["-10%"]}, priority=2)
+    assert [s.name for s in scenarios] == ["subsidy=none,income=-10%", "subsidy=30%,income=-10%"]
+    assert scenarios[1].context == "Subsidy: 30%. Income: -10%." and scenarios[1].priority == 2
+    assert scenario_question(scenarios[0], "Q?") == "Scenario: Subsidy: none. Income: -10%.\n\nQ?"
+    assert scenario_question(Scenario("baseline"), "Q?") == "Q?"
+
+
+def test_load_sweep_spec(tmp_path):
+    path = tmp_path / "sweep.json"
+    path.write_text(json.dumps({
+        "questions": ["Q?"], "countries": {"DEU": 2},
+        "template": "Subsidy: {subsidy}.", "grid": {"subsidy": ["none", "30%"]},
+        "scenarios": [{"name": "baseline", "priority": 1, "countries": ["DEU"]}],
+    }))
+    scenarios, spec = load_sweep_spec(str(path))
+    assert [s.name for s in scenarios] == ["subsidy=none", "subsidy=30%", "baseline"]
+    assert scenarios[2].countries == ("DEU",)
+    path.write_text(json.dumps({"questions": ["Q?"]}))
+    with pytest.raises(ValueError):
+        load_sweep_spec(str(path))
+
+
+def test_scheduler_orders_by_priority_and_keeps_each_runs_context():
+    seen = []
+
+    async def _call(unit):
+        seen.append((current_run.get(), unit[0]))
+        await asyncio.sleep(0)
+
+    async def _run(name, units, priority):
+        current_run.set(name)
+        await scheduler.run(units, _call, priority=priority)
+
+    async def _main():
+        try:
+            # The first run starts the workers; the second must not inherit its context
+            await asyncio.gather(_run("low", [["a"], ["b"]], 0), _run("high", [["c"]], 5))
+        finally:
+            await scheduler.close()
+
+    scheduler = CallScheduler(concurrency=1, progress_interval=None)
+    asyncio.run(_main())
+    assert seen == [("high", "c"), ("low", "a"), ("low", "b")]
+    assert scheduler.progress.units_done == scheduler.progress.units_total == 3
+    with pytest.raises(ValueError):
+        CallScheduler(concurrency=0)
+
+
+def test_sweep_deduplicates_cells_and_keeps_per_run_metrics(mock_server, tmp_path):
+    base_path = str(tmp_path / "responses")
+    simulation = Simulation(population=make_population({"DEU": 4, "USA": 3}), model_name="mock")
+    scenarios = [Scenario("all"), Scenario("germany", countries=("Germany",)), Scenario("subsidy", context="Subsidy: 30%.")]
+    result = run_sweep(simulation, scenarios, ["Q1?", "Q2?"], concurrency=4, base_path=base_path, progress_interval=None)
+
+    # "all" and "germany" ask the same text, so they share runs
+    assert len(result.cells) == 6 and len(result.results) == 4
+    assert result.duplicate_calls == 2 * 4
+    assert mock_server.stats.requests == 4 * 7
+    assert {c: len(r) for c, r in result.cell_results("germany", "Q1?").items()} == {"DEU": 4}
+    assert {c: len(r) for c, r in result.cell_results("subsidy", "Q2?").items()} == {"DEU": 4, "USA": 3}
+
+    # Each run's calls are counted in that run's own metrics
+    for run_id in result.results:
+        summary = json.loads((tmp_path / "responses" / "metrics" / f"{run_id}.json").read_text())
+        assert summary["totals"]["calls_total"] == 7
+        assert {c: row["calls_total"] for c, row in summary["by_country"].items()} == {"DEU": 4, "USA": 3}
+
+    manifest = json.loads((tmp_path / "responses" / "sweeps" / f"{result.sweep_id}.json").read_text())
+    assert len(manifest["cells"]) == len(result.summary()) == 10